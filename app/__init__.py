@@ -58,6 +58,10 @@ def create_app(config_class=Config):
     csrf.init_app(app)
     login_manager.init_app(app)
     
+    # Count and time the SQL each request sends
+    from app.utils.sql_metrics import init_sql_metrics
+    init_sql_metrics(app)
+    
     # Initialize payment gateways
     with app.app_context():
         # Comment out Stripe initialization
@@ -87,6 +91,8 @@ def create_app(config_class=Config):
     # Import models here to avoid circular imports
     from app.models import Product, Category, Review, Cart, Wishlist, Order, User
     from app.models.shipping import ShippingCarrier, ShippingMethod, ShippingQuote
+    from app.utils.category_cache import get_categories
+    from app.utils.counters import get_user_counts, EMPTY_COUNTS
 
     # Configure login manager
     login_manager.login_view = 'auth.login'
@@ -123,13 +129,11 @@ def create_app(config_class=Config):
     @app.context_processor
     def inject_common_data():
         """Inject common data into all templates."""
-        cart_total = 0
+        counts = EMPTY_COUNTS
         categories = []
         try:
-            if current_user.is_authenticated:
-                cart_items = Cart.query.filter_by(user_id=current_user.id).all()
-                cart_total = sum(item.quantity for item in cart_items)
-            categories = Category.query.all()
+            counts = get_user_counts()
+            categories = get_categories()
         except Exception as e:
             app.logger.error(f"Error in context processor: {e}")
 
@@ -137,7 +141,8 @@ def create_app(config_class=Config):
             return current_user.is_authenticated and getattr(current_user, 'is_admin', False)
 
         return dict(
-            cart_total=cart_total,
+            cart_total=counts.cart,
+            wishlist_total=counts.wishlist,
             categories=categories,
             current_year=datetime.now().year,
             now=datetime.utcnow(),
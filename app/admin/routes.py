@@ -1,8 +1,10 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app, jsonify, send_file
+from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app, jsonify, Response, stream_with_context
 from flask_login import login_required, current_user
 from werkzeug.utils import secure_filename
 from werkzeug.datastructures import FileStorage
 from datetime import datetime, timedelta
+from sqlalchemy import func, select
+from sqlalchemy.orm import joinedload
 import os
 import logging
 import sys
@@ -14,28 +16,39 @@ from app.models.user import User
 from app.models.order import Order
 from app.models.coupon import Coupon
 from app.models.shipping import ShippingCarrier, ShippingMethod
-from app.shipping.services import BostaShippingService
+from app.shipping.jobs import queue_shipment, queue_shipment_cancellation
+from app.shipping.quote_cache import get_quote_cache
 from app.utils import allowed_file
+from app.utils.category_cache import invalidate_categories
+from app.utils.http_client import upstream_stats
+from app.utils.sql_metrics import endpoint_stats
+from app.utils.sales_export import XLSX_MIMETYPE, csv_chunks, parse_date, sales_rows, xlsx_chunks
+from app.utils.sales_rollups import daily_sales, dashboard_totals, sales_totals, top_categories, top_products
 from app.decorators import admin_required
 from app.extensions import db, csrf
 from functools import wraps
 from . import bp
 from .forms import CategoryForm, ProductForm
-import openpyxl
 
 @bp.route('/')
 @login_required
 @admin_required
 def index():
     """Admin dashboard"""
-    total_users = User.query.count()
-    total_products = Product.query.count()
-    total_orders = Order.query.count()
-    recent_orders = Order.query.order_by(Order.date_created.desc()).limit(5).all()
+    total_users, total_products = db.session.execute(select(
+        select(func.count(User.id)).scalar_subquery(),
+        select(func.count(Product.id)).scalar_subquery()
+    )).one()
+    # Order figures come from the daily sales rollups
+    sales = dashboard_totals()
+    recent_orders = Order.query.options(joinedload(Order.user))\
+        .order_by(Order.date_created.desc()).limit(5).all()
     return render_template('admin/index.html',
                          total_users=total_users,
                          total_products=total_products,
-                         total_orders=total_orders,
+                         total_orders=sales['orders'],
+                         revenue_today=sales['revenue_today'],
+                         revenue_recent=sales['revenue_recent'],
                          recent_orders=recent_orders)
 
 @bp.route('/products')
@@ -129,6 +142,7 @@ def new_product():
                         db.session.add(image)
                         current_app.logger.info(f'Added image to database: {filename}')
 
+            product.refresh_primary_image()
             db.session.commit()
             flash('Product created successfully!', 'success')
             return redirect(url_for('admin.products'))
@@ -306,6 +320,7 @@ def edit_product(product_id):
                         if other_img != first_image:
                             other_img.is_primary = False
 
+            product.refresh_primary_image()
             logger.debug('Committing changes to database')
             db.session.commit()
             logger.info('Product updated successfully')
@@ -380,6 +395,7 @@ def delete_product_image(product_id, image_id):
                 logger.error(f'Error deleting image file: {str(e)}')
         
         db.session.delete(image)
+        product.refresh_primary_image()
         db.session.commit()
         logger.debug('Successfully deleted image from database')
         flash('Image deleted successfully.', 'success')
@@ -452,6 +468,7 @@ def new_category():
             description=form.description.data
         )
         db.session.add(category)
+        invalidate_categories()
         db.session.commit()
         flash('Category created successfully!', 'success')
         return redirect(url_for('admin.categories'))
@@ -467,6 +484,7 @@ def edit_category(category_id):
     if form.validate_on_submit():
         form.populate_obj(category)
         category.updated_at = datetime.utcnow()
+        invalidate_categories()
         db.session.commit()
         flash('Category updated successfully!', 'success')
         return redirect(url_for('admin.categories'))
@@ -479,6 +497,7 @@ def delete_category(category_id):
     """Delete category"""
     category = Category.query.get_or_404(category_id)
     db.session.delete(category)
+    invalidate_categories()
     db.session.commit()
     flash('Category deleted successfully!', 'success')
     return redirect(url_for('admin.categories'))
@@ -489,7 +508,7 @@ def delete_category(category_id):
 def orders():
     """Order management page"""
     page = request.args.get('page', 1, type=int)
-    orders = Order.query.order_by(Order.date_created.desc()).paginate(
+    orders = Order.query.options(joinedload(Order.user)).order_by(Order.date_created.desc()).paginate(
         page=page, per_page=20, error_out=False)
     return render_template('admin/orders.html', orders=orders)
 
@@ -506,7 +525,7 @@ def order_detail(order_id):
 @admin_required
 @csrf.exempt
 def confirm_order(order_id):
-    """Confirm order and create Bosta shipping order"""
+    """Confirm order and queue creating its Bosta shipping order"""
     order = Order.query.get_or_404(order_id)
     
     if not order.can_update_status:
@@ -532,23 +551,15 @@ def confirm_order(order_id):
         order.shipping_carrier = bosta_carrier
         order.shipping_method = shipping_method
         
-        # Create Bosta shipping order
-        bosta_service = BostaShippingService()
-        shipping_result = bosta_service.create_shipping_order(order)
-        
-        # Update order with Bosta details
-        order.delivery_tracking_number = shipping_result.get('tracking_number')
-        order.delivery_id = shipping_result.get('delivery_id')
-        order.delivery_status = shipping_result.get('status')
-        order.delivery_status_code = shipping_result.get('status_code')
-        order.delivery_created_at = datetime.utcnow()
-        order.status = 'processing'
+        # The job worker creates the Bosta delivery and moves the order to processing
+        queue_shipment(order)
         db.session.commit()
         
-        flash('Order confirmed and shipping created successfully.', 'success')
+        flash('Order confirmed. The shipping order is being created.', 'success')
     except Exception as e:
-        current_app.logger.error(f'Error creating Bosta shipping order: {str(e)}')
-        flash('Failed to create shipping order. Please try again.', 'error')
+        db.session.rollback()
+        current_app.logger.error(f'Error confirming order {order.id}: {str(e)}')
+        flash('Failed to confirm the order. Please try again.', 'error')
         
     return redirect(url_for('admin.order_detail', order_id=order.id))
 
@@ -569,18 +580,11 @@ def cancel_order(order_id):
         return redirect(url_for('admin.order_detail', order_id=order.id))
     
     try:
-        # If order has a Bosta delivery, cancel it first
+        # If order has a Bosta delivery, the job worker terminates it
         if order.delivery_id:
-            try:
-                bosta_service = BostaShippingService()
-                bosta_service.cancel_shipping_order(order.delivery_id)
-                current_app.logger.info(f"Successfully cancelled Bosta delivery for order {order.id}")
-            except Exception as e:
-                current_app.logger.error(f"Failed to cancel Bosta delivery for order {order.id}: {str(e)}")
-                flash('Failed to cancel shipping delivery. Please try again or contact support.', 'error')
-                return redirect(url_for('admin.order_detail', order_id=order.id))
+            queue_shipment_cancellation(order.delivery_id)
         
-        # Cancel the order in our system
+        # Cancel the order in our system (commits the queued job too)
         order.cancel_order('admin')
         flash('Order cancelled successfully.', 'success')
         
@@ -867,6 +871,23 @@ def manage_coupon(coupon_id):
         db.session.rollback()
         return jsonify({'error': str(e)}), 400
 
+@bp.route('/api/upstreams')
+@login_required
+@admin_required
+def upstreams():
+    """Latency, error and circuit metrics for this worker's outbound APIs,
+    plus its shipping quote cache counters"""
+    stats = upstream_stats()
+    stats['shipping_quote_cache'] = get_quote_cache().stats()
+    return jsonify(stats)
+
+@bp.route('/api/queries')
+@login_required
+@admin_required
+def queries():
+    """Query counts, DB time and N+1 hits per endpoint for this worker"""
+    return jsonify(endpoint_stats())
+
 @bp.route('/sales_report')
 @login_required
 @admin_required
@@ -874,62 +895,32 @@ def sales_report():
     """Sales report page"""
     # Get filter parameters
     status = request.args.get('status', 'all')  # Default to all statuses
-    
-    # Base query - only get paid orders
-    query = Order.query.filter(Order.payment_status == 'paid')
-    
-    # Apply status filter
-    if status != 'all':
-        query = query.filter(Order.status == status)
-    
-    # Get orders with applied filters
-    orders = query.order_by(Order.date_created.desc()).all()
-
-    # Check if the request wants to download Excel
-    if request.args.get('format') == 'excel':
-        import os
-        from tempfile import gettempdir
-        
-        # Create a new Excel workbook
-        workbook = openpyxl.Workbook()
-        sheet = workbook.active
-
-        # Write headers to the Excel sheet
-        sheet.append(['Order ID', 'User ID', 'Product Name', 'Quantity', 'Price', 'Date Created', 'Status', 'Payment Status'])
-
-        # Write data to the Excel sheet
-        for order in orders:
-            for item in order.items:
-                sheet.append([
-                    order.id,
-                    order.user_id,
-                    item.ordered_product.name,
-                    item.quantity,
-                    item.ordered_product.price,
-                    order.date_created.strftime('%Y-%m-%d %H:%M:%S'),
-                    order.status,
-                    order.payment_status
-                ])
-
-        # Save the Excel file to a temporary location
-        temp_dir = gettempdir()
-        filename = os.path.join(temp_dir, 'sales_report.xlsx')
-        workbook.save(filename)
+    try:
+        date_from = parse_date(request.args.get('date_from'))
+        date_to = parse_date(request.args.get('date_to'))
+    except ValueError:
+        flash('Dates must be given as YYYY-MM-DD', 'error')
+        date_from = date_to = None
+
+    # Exports stream the rows in batches instead of loading every order
+    export_format = request.args.get('format')
+    if export_format in ('excel', 'csv'):
+        batches = sales_rows(status, date_from, date_to)
+        if export_format == 'csv':
+            chunks, mimetype, filename = csv_chunks(batches), 'text/csv', 'sales_report.csv'
+        else:
+            chunks, mimetype, filename = xlsx_chunks(batches), XLSX_MIMETYPE, 'sales_report.xlsx'
+        return Response(
+            stream_with_context(chunks),
+            mimetype=mimetype,
+            headers={'Content-Disposition': f'attachment; filename={filename}'}
+        )
 
-        try:
-            # Return the Excel file as a response
-            return send_file(
-                filename,
-                mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-                as_attachment=True,
-                download_name='sales_report.xlsx'
-            )
-        finally:
-            # Clean up the temporary file after sending
-            try:
-                os.remove(filename)
-            except:
-                pass  # Ignore cleanup errors
+    # Totals, per-day figures and best sellers from the daily rollups
+    totals = sales_totals(status, date_from, date_to)
+    days = daily_sales(status, date_from, date_to)
+    products = top_products(status, date_from, date_to)
+    categories = top_categories(status, date_from, date_to)
 
     # Get all possible order statuses for the filter dropdown
     statuses = [
@@ -943,6 +934,11 @@ def sales_report():
 
     # Render the template for web view
     return render_template('admin/sales_report.html', 
-                         orders=orders,
+                         totals=totals,
+                         days=days,
+                         products=products,
+                         categories=categories,
                          statuses=statuses,
-                         current_status=status)
+                         current_status=status,
+                         date_from=request.args.get('date_from', ''),
+                         date_to=request.args.get('date_to', ''))
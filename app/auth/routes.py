@@ -3,10 +3,10 @@ from flask import render_template, redirect, url_for, flash, request, jsonify, c
 from flask_login import login_required, current_user, login_user, logout_user
 from app.models.user import User
 from app.models.address import Address
-from app.utils.city_mapping import BostaCityMapping
-from app.extensions import db, limiter, bcrypt, mail
+from app.utils.city_mapping import BostaCityMapping, resolve_city
+from app.extensions import db, limiter, bcrypt
+from app.utils.email import send_email, send_reset_password_email
 from datetime import datetime
-from flask_mail import Message
 import jwt
 from time import time
 import os
@@ -122,7 +122,7 @@ def profile():
     return render_template('auth/profile.html', 
                          user=current_user, 
                          addresses=addresses,
-                         bosta_cities=BostaCityMapping.CITY_MAPPING)
+                         bosta_cities=BostaCityMapping.get_city_choices())
 
 @auth.route('/change_password', methods=['GET', 'POST'])
 @login_required
@@ -169,15 +169,8 @@ def reset_password_request():
                 algorithm='HS256'
             )
             
-            msg = Message('Password Reset Request',
-                        sender='noreply@flaskshop.com',
-                        recipients=[user.email])
-            msg.body = f'''To reset your password, visit the following link:
-{url_for('auth.reset_password', token=token, _external=True)}
-
-If you did not make this request then simply ignore this email and no changes will be made.
-'''
-            mail.send(msg)
+            send_reset_password_email(user, token)
+            db.session.commit()
             flash('Check your email for the instructions to reset your password', 'info')
             return redirect(url_for('auth.login'))
         else:
@@ -259,7 +252,8 @@ def add_address():
         return redirect(url_for('auth.profile'))
     
     # Validate city against Bosta city list
-    if city not in BostaCityMapping.CITY_MAPPING:
+    city = resolve_city(city)
+    if not city:
         flash('Please select a valid city from the list.', 'error')
         return redirect(url_for('auth.profile'))
     
@@ -326,9 +320,9 @@ def suspend_user(user_id):
     user = User.query.get_or_404(user_id)
     try:
         user.suspend_profile()
-        db.session.commit()
-        # Send email to user about suspension
+        # Queue the email to the user about the suspension
         send_suspension_email(user)
+        db.session.commit()
         flash(f'User {user.username} has been suspended.', 'success')
     except Exception as e:
         current_app.logger.error(f"Error suspending user: {str(e)}")
@@ -348,10 +342,10 @@ def admin_reset_password(user_id):
         # Generate random password
         new_password = ''.join(random.choices(string.ascii_letters + string.digits, k=12))
         user.set_password(new_password)
-        db.session.commit()
         
-        # Send email with new password
+        # Queue the email with the new password
         send_password_reset_email(user, new_password)
+        db.session.commit()
         flash(f'Password reset for user {user.username}. Email sent.', 'success')
     except Exception as e:
         current_app.logger.error(f"Error resetting password: {str(e)}")
@@ -361,25 +355,24 @@ def admin_reset_password(user_id):
     return redirect(url_for('admin.users'))
 
 def send_suspension_email(user):
-    msg = Message(
+    send_email(
         'Account Suspended',
-        recipients=[user.email]
-    )
-    msg.body = f'''Dear {user.username},
+        sender=None,
+        recipients=[user.email],
+        text_body=f'''Dear {user.first_name},
 
 Your account has been suspended by an administrator.
 If you believe this is an error, please contact support.
 
 Best regards,
-The Team'''
-    mail.send(msg)
+The Team''')
 
 def send_password_reset_email(user, new_password):
-    msg = Message(
+    send_email(
         'Password Reset by Administrator',
-        recipients=[user.email]
-    )
-    msg.body = f'''Dear {user.username},
+        sender=None,
+        recipients=[user.email],
+        text_body=f'''Dear {user.first_name},
 
 Your password has been reset by an administrator.
 Your new password is: {new_password}
@@ -387,5 +380,4 @@ Your new password is: {new_password}
 Please change this password after logging in.
 
 Best regards,
-The Team'''
-    mail.send(msg)
+The Team''')
@@ -3,8 +3,9 @@ from flask_login import login_required, current_user
 from app.models.product import Product
 from app.models.cart import Cart
 from app.extensions import db
+from app.utils.counters import get_user_counts, invalidate_user_counts
+from app.utils.cart_pricing import CartPricing
 from app.cart import bp
-from sqlalchemy import func
 from app.models.coupon import Coupon  # Assuming you have a Coupon model
 from datetime import datetime, timedelta
 from functools import wraps
@@ -39,30 +40,15 @@ def rate_limit(seconds=2):
 def cart():
     """Shopping cart page route"""
     try:
-        cart_items = Cart.query.filter_by(user_id=current_user.id).all()
-        subtotal = sum(item.product.price * item.quantity for item in cart_items)
-        
-        # Get applied coupon from session if it exists
-        coupon_code = session.get('coupon_code')
-        discount = 0
-        
-        if coupon_code:
-            coupon = Coupon.query.filter_by(code=coupon_code).first()
-            if coupon:
-                if coupon.discount_type == 'percentage':
-                    discount = subtotal * (coupon.discount_amount / 100)
-                else:  # fixed amount
-                    discount = coupon.discount_amount
-                    
-        total = subtotal - discount
+        totals = CartPricing.for_request().totals()
         
         return render_template(
             'cart/cart.html',
-            cart_items=cart_items,
-            subtotal=subtotal,
-            discount=discount,
-            total=total,
-            coupon_code=coupon_code
+            cart_items=totals.items,
+            subtotal=totals.subtotal,
+            discount=totals.discount,
+            total=totals.total,
+            coupon_code=session.get('coupon_code')
         )
     except Exception as e:
         current_app.logger.error(f"Error in cart route: {str(e)}")
@@ -125,11 +111,10 @@ def add_to_cart(product_id):
                 db.session.add(cart_item)
             
             db.session.commit()
+            invalidate_user_counts()
             
             # Get updated cart total
-            cart_total = Cart.query.filter_by(user_id=current_user.id).with_entities(
-                func.sum(Cart.quantity)
-            ).scalar() or 0
+            cart_total = get_user_counts().cart
             
             return jsonify({
                 'success': True,
@@ -164,6 +149,7 @@ def remove_from_cart(item_id):
     try:
         db.session.delete(cart_item)
         db.session.commit()
+        invalidate_user_counts()
         flash('Item removed from cart.', 'success')
     except:
         db.session.rollback()
@@ -194,31 +180,18 @@ def update_cart(item_id):
         
         cart_item.quantity = quantity
         db.session.commit()
+        invalidate_user_counts()
+        CartPricing.invalidate()
         
         # Calculate new totals
-        cart_items = Cart.query.filter_by(user_id=current_user.id).all()
-        subtotal = sum(item.product.price * item.quantity for item in cart_items)
-        
-        # Get coupon discount if any
-        coupon_code = session.get('coupon_code')
-        discount = 0
-        if coupon_code:
-            coupon = Coupon.query.filter_by(code=coupon_code).first()
-            if coupon:
-                if coupon.discount_type == 'percentage':
-                    discount = subtotal * (coupon.discount_amount / 100)
-                else:  # fixed amount
-                    discount = coupon.discount_amount
-        
-        total = subtotal - discount
-        cart_count = sum(item.quantity for item in cart_items)
+        totals = CartPricing.for_request().totals()
         
         return jsonify({
             'success': True,
             'message': 'Cart updated successfully.',
-            'total': total,
-            'subtotal': subtotal,
-            'cart_count': cart_count,
+            'total': totals.total,
+            'subtotal': totals.subtotal,
+            'cart_count': totals.item_count,
             'item_total': cart_item.product.price * quantity
         })
     except (ValueError, TypeError):
@@ -253,7 +226,8 @@ def apply_coupon():
             })
         
         # Check if coupon exists
-        coupon = Coupon.query.filter_by(code=code).first()
+        pricing = CartPricing.for_request(coupon_code=code)
+        coupon = pricing.coupon
         if not coupon:
             current_app.logger.info(f"Coupon not found: {code}")
             return jsonify({
@@ -262,28 +236,23 @@ def apply_coupon():
             })
         
         # Get cart items and calculate total
-        cart_items = Cart.query.filter_by(user_id=current_user.id).all()
-        if not cart_items:
+        if not pricing.items:
             return jsonify({
                 'success': False,
                 'error': 'Your cart is empty'
             })
         
-        subtotal = sum(item.product.price * item.quantity for item in cart_items)
-        current_app.logger.info(f"Cart subtotal: {subtotal}")
+        totals = pricing.totals()
+        current_app.logger.info(f"Cart subtotal: {totals.subtotal}")
         
         # Validate coupon
-        is_valid, message = coupon.is_valid(subtotal)
+        is_valid, message = coupon.is_valid(totals.subtotal)
         if not is_valid:
             return jsonify({
                 'success': False,
                 'error': message
             })
         
-        # Calculate discount
-        discount = coupon.calculate_discount(subtotal)
-        total = subtotal - discount
-        
         # Store coupon in session
         session['coupon_code'] = code
         
@@ -301,9 +270,9 @@ def apply_coupon():
         return jsonify({
             'success': True,
             'message': 'Coupon applied successfully!',
-            'subtotal': subtotal,
-            'discount': discount,
-            'total': total,
+            'subtotal': totals.subtotal,
+            'discount': totals.discount,
+            'total': totals.total,
             'coupon_details': coupon_details
         })
         
@@ -329,15 +298,14 @@ def remove_coupon():
             })
         
         # Recalculate totals
-        cart_items = Cart.query.filter_by(user_id=current_user.id).all()
-        subtotal = sum(item.product.price * item.quantity for item in cart_items)
+        totals = CartPricing.for_request(coupon_code=None).totals()
         
         return jsonify({
             'success': True,
             'message': 'Coupon removed successfully',
-            'subtotal': subtotal,
-            'total': subtotal,
-            'discount': 0
+            'subtotal': totals.subtotal,
+            'total': totals.total,
+            'discount': totals.discount
         })
         
     except Exception as e:
@@ -1,28 +1,19 @@
-from flask import Blueprint, render_template, request, flash, redirect, url_for, current_app, jsonify, g
+from flask import Blueprint, render_template, request, flash, redirect, url_for, current_app, jsonify
 from flask_login import login_required, current_user
 from app.models.product import Product
 from app.models.category import Category
-from app.models.cart import Cart
 from app.models.wishlist import Wishlist
-from app.models.review import Review
+from app.models.review import Review, ProductRatingSummary
 from app.forms.contact import ContactForm
 from app.forms.review import ReviewForm
-from app.extensions import db, mail
-from flask_mail import Message
+from app.utils.search import match_products
+from app.utils.pagination import keyset_paginate, get_sort_keys
+from app.utils.category_cache import get_categories
+from app.utils.counters import get_user_counts
+from app.extensions import db
+from app.utils.email import send_email
 from datetime import datetime, timedelta
 from app.main import bp
-from sqlalchemy import func
-
-@bp.before_app_request
-def before_request():
-    if current_user.is_authenticated:
-        # Get cart total
-        cart_total = db.session.query(func.sum(Cart.quantity)).filter_by(user_id=current_user.id).scalar() or 0
-        g.cart_total = cart_total
-        
-        # Get wishlist total
-        wishlist_total = Wishlist.query.filter_by(user_id=current_user.id).count()
-        g.wishlist_total = wishlist_total
 
 @bp.context_processor
 def utility_processor():
@@ -30,8 +21,6 @@ def utility_processor():
         return current_user.is_authenticated and current_user.is_admin
         
     return {
-        'cart_total': getattr(g, 'cart_total', 0),
-        'wishlist_total': getattr(g, 'wishlist_total', 0),
         'is_admin': is_admin,
     }
 
@@ -46,32 +35,48 @@ def index():
         current_app.logger.error(f'Error in index route: {str(e)}')
         return render_template('errors/500.html'), 500
 
+def _paginate_listing(query, sort_keys, scope):
+    """Paginate a product listing
+
+    Listings are cursor-paginated via the ``after`` token. An explicit
+    ``page`` number (old links and bookmarks) still gets offset pagination.
+    """
+    per_page = current_app.config.get('PRODUCTS_PER_PAGE', 12)
+    page = request.args.get('page', type=int)
+    if page and not request.args.get('after'):
+        ordering = [expr.desc() if descending else expr for expr, descending in sort_keys]
+        return query.order_by(*ordering).paginate(page=page, per_page=per_page)
+
+    return keyset_paginate(
+        query,
+        sort_keys,
+        scope,
+        after=request.args.get('after'),
+        per_page=per_page,
+        with_total=current_app.config.get('LISTING_SHOW_TOTAL', True)
+    )
+
+def _listing_scope(sort_by, category_id=None, search_query=''):
+    """Identify a listing so cursors are shared by the HTML and JSON views"""
+    return f'{category_id or "all"}:{sort_by}:{search_query}'
+
+def _mark_new_products(products):
+    """Flag products added in the last 30 days"""
+    thirty_days_ago = datetime.now() - timedelta(days=30)
+    for product in products:
+        product.is_new = product.created_at >= thirty_days_ago
+
 @bp.route('/shop')
 def shop():
-    page = request.args.get('page', 1, type=int)
     sort_by = request.args.get('sort', 'default')
     
     # Base query
     query = Product.query.filter_by(is_active=True, is_deleted=False)
     
-    # Apply sorting
-    if sort_by == 'price_low':
-        query = query.order_by(Product.price.asc())
-    elif sort_by == 'price_high':
-        query = query.order_by(Product.price.desc())
-    elif sort_by == 'newest':
-        query = query.order_by(Product.created_at.desc())
-    elif sort_by == 'name_asc':
-        query = query.order_by(Product.name.asc())
-    elif sort_by == 'name_desc':
-        query = query.order_by(Product.name.desc())
-    
-    # Paginate results
-    products = query.paginate(
-        page=page, per_page=current_app.config.get('PRODUCTS_PER_PAGE', 12)
-    )
+    # Paginate results in the requested order
+    products = _paginate_listing(query, get_sort_keys(sort_by), _listing_scope(sort_by))
     
-    categories = Category.query.all()
+    categories = get_categories()
     
     # Get wishlist items for the current user
     wishlist_items = set()
@@ -79,10 +84,8 @@ def shop():
         wishlist_items = {item.product_id for item in Wishlist.query.filter_by(user_id=current_user.id).all()}
     
     # Check if any product is new
-    current_time = datetime.now()
-    thirty_days_ago = current_time - timedelta(days=30)
-    for product in products:
-        product.is_new = product.created_at >= thirty_days_ago
+    _mark_new_products(products)
+    Product.preload_images(products.items)
     
     return render_template('main/shop.html', 
                          products=products, 
@@ -97,9 +100,10 @@ def product_detail(product_id):
     
     product = Product.query.filter_by(id=product_id, is_deleted=False).first_or_404()
     current_app.logger.debug(f'Found product: {product.name}')
-    current_app.logger.debug(f'Product has {product.images.count()} images')
     
-    reviews = Review.query.filter_by(product_id=product_id).order_by(Review.created_at.desc()).all()
+    # Review authors are shown next to each review
+    reviews = Review.query.filter_by(product_id=product_id).options(db.joinedload(Review.user))\
+        .order_by(Review.created_at.desc()).all()
     form = ReviewForm()
     
     current_app.logger.debug(f'Product has {len(reviews)} reviews')
@@ -118,23 +122,26 @@ def product_detail(product_id):
 
 @bp.route('/category/<int:category_id>')
 def category_products(category_id):
-    page = request.args.get('page', 1, type=int)
+    sort_by = request.args.get('sort', 'default')
     category = Category.query.get_or_404(category_id)
-    products = Product.query.filter_by(category_id=category_id, is_active=True, is_deleted=False).paginate(
-        page=page, per_page=current_app.config.get('PRODUCTS_PER_PAGE', 12)
-    )
-    categories = Category.query.all()
+    query = Product.query.filter_by(category_id=category_id, is_active=True, is_deleted=False)
+    products = _paginate_listing(query, get_sort_keys(sort_by), _listing_scope(sort_by, category_id))
+    categories = get_categories()
     
     # Get wishlist items for the current user (same as shop route)
     wishlist_items = set()
     if current_user.is_authenticated:
         wishlist_items = {item.product_id for item in Wishlist.query.filter_by(user_id=current_user.id).all()}
     
+    _mark_new_products(products)
+    Product.preload_images(products.items)
+    
     return render_template('main/shop.html', 
                          products=products, 
                          categories=categories,
                          category=category,
-                         wishlist_items=wishlist_items)
+                         wishlist_items=wishlist_items,
+                         sort_by=sort_by)
 
 @bp.route('/search')
 def search():
@@ -142,15 +149,18 @@ def search():
     query = request.args.get('q', '')
     current_app.logger.debug(f'Search query: "{query}"')
     
-    page = request.args.get('page', 1, type=int)
-    products = Product.query.filter(
-        Product.is_deleted == False,
-        Product.is_active == True,
-        (Product.name.ilike(f'%{query}%') | Product.description.ilike(f'%{query}%'))
-    ).paginate(page=page, per_page=current_app.config.get('PRODUCTS_PER_PAGE', 12))
+    products_query, sort_keys = match_products(
+        Product.query.filter(Product.is_deleted == False, Product.is_active == True),
+        query
+    )
+    products = _paginate_listing(
+        products_query,
+        sort_keys or get_sort_keys('default'),
+        _listing_scope('relevance', search_query=query)
+    )
     
     current_app.logger.debug(f'Found {products.total} products matching search')
-    current_app.logger.debug(f'Displaying page {page} of {products.pages}')
+    Product.preload_images(products.items)
     
     return render_template('main/search.html', products=products, query=query)
 
@@ -170,6 +180,7 @@ def add_review(product_id):
                 comment=form.comment.data
             )
             db.session.add(review)
+            ProductRatingSummary.record(review)
             db.session.commit()
             flash('Your review has been added!', 'success')
         except Exception as e:
@@ -190,16 +201,17 @@ def contact():
     form = ContactForm()
     if form.validate_on_submit():
         try:
-            msg = Message(
-                subject=f'Contact Form: {form.subject.data}',
+            send_email(
+                f'Contact Form: {form.subject.data}',
                 sender=current_app.config['MAIL_DEFAULT_SENDER'],
                 recipients=[current_app.config['MAIL_DEFAULT_RECIPIENT']],
-                body=f'From: {form.name.data} <{form.email.data}>\n\n{form.message.data}'
+                text_body=f'From: {form.name.data} <{form.email.data}>\n\n{form.message.data}'
             )
-            mail.send(msg)
+            db.session.commit()
             flash('Your message has been sent!', 'success')
             return redirect(url_for('main.contact'))
         except Exception as e:
+            db.session.rollback()
             current_app.logger.error(f'Error sending contact email: {str(e)}')
             flash('Error sending message. Please try again later.', 'danger')
     
@@ -215,6 +227,51 @@ def terms():
     """Terms of service page route"""
     return render_template('main/terms.html')
 
+@bp.route('/api/products')
+def product_listing():
+    """Cursor-paginated product listing for infinite scroll
+
+    Accepts the same ``sort``, ``q`` and ``category_id`` filters as the
+    HTML listings, plus the ``after`` token from the previous response.
+    """
+    sort_by = request.args.get('sort', 'default')
+    search_query = request.args.get('q', '')
+    category_id = request.args.get('category_id', type=int)
+    
+    query = Product.query.filter_by(is_active=True, is_deleted=False)
+    sort_keys = get_sort_keys(sort_by)
+    
+    if category_id:
+        query = query.filter_by(category_id=category_id)
+    
+    if search_query:
+        query, search_keys = match_products(query, search_query)
+        if search_keys:
+            sort_keys = search_keys
+            sort_by = 'relevance'
+    
+    products = keyset_paginate(
+        query,
+        sort_keys,
+        _listing_scope(sort_by, category_id, search_query),
+        after=request.args.get('after'),
+        per_page=current_app.config.get('PRODUCTS_PER_PAGE', 12),
+        with_total=current_app.config.get('LISTING_SHOW_TOTAL', True)
+    )
+    
+    return jsonify({
+        'items': [{
+            'id': product.id,
+            'name': product.name,
+            'price': float(product.price),
+            'stock': product.stock,
+            'image_url': product.image_url,
+            'url': url_for('main.product_detail', product_id=product.id)
+        } for product in products.items],
+        'next_after': products.next_after,
+        'total': products.total
+    })
+
 @bp.route('/get-product-details/<int:product_id>')
 def get_product_details(product_id):
     """Get product details for quick view"""
@@ -240,15 +297,11 @@ def get_product_details(product_id):
 def get_counts():
     """Get cart and wishlist counts"""
     try:
-        cart_count = Cart.query.filter_by(user_id=current_user.id).with_entities(
-            func.sum(Cart.quantity)
-        ).scalar() or 0
-        
-        wishlist_count = Wishlist.query.filter_by(user_id=current_user.id).count()
+        counts = get_user_counts()
         
         return jsonify({
-            'cart_count': int(cart_count),
-            'wishlist_count': wishlist_count
+            'cart_count': counts.cart,
+            'wishlist_count': counts.wishlist
         })
     except Exception as e:
         current_app.logger.error(f"Error getting counts: {str(e)}")
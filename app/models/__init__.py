@@ -1,19 +1,32 @@
 from app.models.user import User
 from app.models.product import Product
 from app.models.category import Category
-from app.models.review import Review
+from app.models.review import Review, ProductRatingSummary
 from app.models.cart import Cart
 from app.models.wishlist import Wishlist
 from app.models.order import Order
 from app.models.coupon import Coupon
+from app.models.inventory import StockReservation
+from app.models.api_token import ApiToken
+from app.models.job import Job
+from app.models.email_outbox import OutboxEmail
+from app.models.sales_rollup import DailySales, DailyProductSales, DailyCategorySales
 
 __all__ = [
     'User',
     'Product',
     'Category',
     'Review',
+    'ProductRatingSummary',
     'Cart',
     'Wishlist',
     'Order',
-    'Coupon'
+    'Coupon',
+    'StockReservation',
+    'ApiToken',
+    'Job',
+    'OutboxEmail',
+    'DailySales',
+    'DailyProductSales',
+    'DailyCategorySales'
 ]
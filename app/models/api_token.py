@@ -0,0 +1,20 @@
+from datetime import datetime
+from app.extensions import db
+
+class ApiToken(db.Model):
+    """Access token for an upstream API, shared by every worker
+
+    ``locked_until``/``lock_owner`` mark a refresh in progress so only one
+    worker logs in at a time; see app.utils.token_store.
+    """
+    __tablename__ = 'api_tokens'
+
+    name = db.Column(db.String(64), primary_key=True)  # e.g. 'bosta'
+    token = db.Column(db.Text, nullable=True)
+    expires_at = db.Column(db.DateTime, nullable=True)
+    locked_until = db.Column(db.DateTime, nullable=True)
+    lock_owner = db.Column(db.String(64), nullable=True)
+    date_updated = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<ApiToken {self.name}>'
@@ -3,7 +3,10 @@ from datetime import datetime
 from app.models.product import Product
 
 class Cart(db.Model):
-    __table_args__ = {'extend_existing': True}
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'product_id', name='uq_cart_user_product'),
+        {'extend_existing': True}
+    )
     __tablename__ = 'cart'
     
     id = db.Column(db.Integer, primary_key=True)
@@ -28,3 +28,30 @@ class Category(db.Model):
 
     def __repr__(self):
         return f'<Category {self.name}>'
+
+
+class CatalogVersion(db.Model):
+    """Named counters bumped whenever cached catalog data changes
+
+    Workers compare the counter with the version of their cached copy and
+    reload only when it moved.
+    """
+    __tablename__ = 'catalog_versions'
+
+    name = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+    @classmethod
+    def current(cls, name):
+        """Get the counter's value, 0 if it was never bumped"""
+        return db.session.query(cls.version).filter_by(name=name).scalar() or 0
+
+    @classmethod
+    def bump(cls, name):
+        """Increment the counter as part of the current transaction"""
+        updated = cls.query.filter_by(name=name).update({cls.version: cls.version + 1})
+        if not updated:
+            db.session.add(cls(name=name, version=1))
+
+    def __repr__(self):
+        return f'<CatalogVersion {self.name}={self.version}>'
@@ -0,0 +1,38 @@
+from datetime import datetime
+from flask_mail import Message
+from app.extensions import db
+
+class OutboxEmail(db.Model):
+    """Rendered email waiting to be sent by the outbox drainer
+
+    Rows are added by app.utils.email.send_email() in the caller's
+    transaction and deleted once the SMTP server accepted them. A rejected
+    message is not tried again before ``next_attempt_at``, and one the server
+    keeps rejecting ends up with status ``failed``.
+    """
+    __tablename__ = 'email_outbox'
+    __table_args__ = (
+        db.Index('ix_email_outbox_status_id', 'status', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    subject = db.Column(db.String(255), nullable=False)
+    sender = db.Column(db.String(255), nullable=True)  # MAIL_DEFAULT_SENDER when empty
+    recipients = db.Column(db.JSON, nullable=False)
+    text_body = db.Column(db.Text, nullable=True)
+    html_body = db.Column(db.Text, nullable=True)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text, nullable=True)
+    next_attempt_at = db.Column(db.DateTime, nullable=True)  # Set when the server rejected the message
+    date_created = db.Column(db.DateTime, default=datetime.utcnow)
+    date_updated = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_message(self):
+        msg = Message(self.subject, sender=self.sender or None, recipients=list(self.recipients))
+        msg.body = self.text_body
+        msg.html = self.html_body
+        return msg
+
+    def __repr__(self):
+        return f'<OutboxEmail {self.id} {self.subject!r} {self.status}>'
@@ -0,0 +1,32 @@
+from datetime import datetime
+from app.extensions import db
+
+class StockReservation(db.Model):
+    """Stock taken from a product on behalf of an order
+
+    A row with ``expires_at`` set is a temporary hold (the customer is still
+    paying); once the order is placed or paid the hold is committed by
+    clearing ``expires_at``. Either way the quantity has already been
+    subtracted from ``products.stock``, so releasing a row gives it back.
+    """
+    __tablename__ = 'stock_reservations'
+
+    id = db.Column(db.Integer, primary_key=True)
+    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False, index=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=True, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __init__(self, order_id, product_id, quantity, expires_at=None):
+        self.order_id = order_id
+        self.product_id = product_id
+        self.quantity = quantity
+        self.expires_at = expires_at
+
+    @property
+    def is_hold(self):
+        return self.expires_at is not None
+
+    def __repr__(self):
+        return f'<StockReservation order={self.order_id} product={self.product_id} x{self.quantity}>'
@@ -0,0 +1,32 @@
+from datetime import datetime
+from app.extensions import db
+
+class Job(db.Model):
+    """Background work waiting for, or being done by, a job worker
+
+    ``status`` moves from ``queued`` to ``running`` when a worker claims the
+    job. A finished job is deleted. A failed one goes back to ``queued``
+    with a later ``run_at``, or to ``dead`` once it has used up its
+    attempts. See app.utils.jobs.
+    """
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        db.Index('ix_jobs_status_run_at', 'status', 'run_at'),
+        db.Index('ix_jobs_type_status', 'type', 'status'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    type = db.Column(db.String(64), nullable=False)
+    key = db.Column(db.String(200), nullable=True, index=True)  # Deduplicates unfinished jobs
+    payload = db.Column(db.JSON, nullable=False, default=dict)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, dead
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_by = db.Column(db.String(64), nullable=True)
+    locked_until = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    date_created = db.Column(db.DateTime, default=datetime.utcnow)
+    date_updated = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<Job {self.id} {self.type} {self.status}>'
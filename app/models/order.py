@@ -7,6 +7,10 @@ class Order(db.Model):
     __tablename__ = 'orders'
     __table_args__ = (
         db.UniqueConstraint('stripe_payment_id', name='uq_order_stripe_payment_id'),
+        db.Index('ix_orders_user_date', 'user_id', 'date_created'),
+        db.Index('ix_orders_payment_status', 'payment_status', 'status', 'date_created'),
+        db.Index('ix_orders_delivery_id', 'delivery_id'),
+        db.Index('ix_orders_paymob_order_id', 'paymob_order_id'),
         {'extend_existing': True}
     )
     
@@ -18,6 +22,7 @@ class Order(db.Model):
     status = db.Column(db.String(20), nullable=False, default='pending')
     payment_status = db.Column(db.String(20), nullable=False, default='pending')
     payment_method = db.Column(db.String(20), nullable=False, default='card')  # 'card' or 'cod'
+    is_draft = db.Column(db.Boolean, nullable=False, default=False)  # Opened from a checkout draft, not yet paid
     cancelled_by = db.Column(db.String(20), nullable=True)  # 'user' or 'admin'
     subtotal = db.Column(db.Float, nullable=False)
     shipping_cost = db.Column(db.Float, nullable=False)
@@ -30,6 +35,9 @@ class Order(db.Model):
     refund_id = db.Column(db.String(100), nullable=True)  # Stripe Refund ID
     paymob_order_id = db.Column(db.String(100), nullable=True)
     paymob_payment_id = db.Column(db.String(100), nullable=True)
+    paymob_amount_cents = db.Column(db.Integer, nullable=True)  # Amount the PayMob order was registered with
+    paymob_payment_key = db.Column(db.Text, nullable=True)  # Last payment key, reused until it expires
+    paymob_payment_key_expires_at = db.Column(db.DateTime, nullable=True)
     # Delivery fields
     delivery_id = db.Column(db.String(100), nullable=True)  # Bosta delivery ID
     
@@ -101,15 +109,12 @@ class Order(db.Model):
     
     def cancel_order(self, cancelled_by):
         """Cancel order and track who cancelled it"""
-        from app.shipping.services import cancel_shipping_order
+        from app.shipping.jobs import queue_shipment_cancellation
+        from app.utils.inventory import release_order_stock
         
-        # First try to cancel shipping order if it exists
+        # The job worker cancels the shipping order if it exists
         if self.delivery_order_id:
-            try:
-                cancel_shipping_order(self)
-            except Exception as e:
-                current_app.logger.error(f"Error cancelling shipping order: {str(e)}")
-                # Continue with order cancellation even if shipping cancellation fails
+            queue_shipment_cancellation(self.delivery_order_id)
         
         # Handle payment refund if needed
         if self.payment_status == 'paid' and self.stripe_payment_id:
@@ -124,6 +129,9 @@ class Order(db.Model):
         self.status = 'cancelled'
         self.cancelled_by = cancelled_by
         
+        # Give back the stock taken for the order
+        release_order_stock(self)
+        
         # Clear shipping fields
         self.delivery_status = 'CANCELLED'
         self.delivery_updated_at = datetime.utcnow()
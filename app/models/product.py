@@ -1,6 +1,8 @@
 from datetime import datetime
+from sqlalchemy import event
 from app.extensions import db
 from app.models.category import Category
+from app.utils.search import on_products_created
 
 class ProductImage(db.Model):
     __tablename__ = 'product_images'
@@ -44,9 +46,23 @@ class ProductColor(db.Model):
             'stock': self.stock
         }
 
+def _listing_index(name, *columns):
+    """Index for storefront listings, partial on live products where supported"""
+    # Rendered per dialect (``= 0`` on SQLite) to match what filter_by() emits
+    live = db.column('is_deleted', db.Boolean) == db.false()
+    return db.Index(name, 'is_active', *columns, postgresql_where=live, sqlite_where=live)
+
+
 class Product(db.Model):
     __tablename__ = 'products'
-    __table_args__ = {'extend_existing': True}
+    __table_args__ = (
+        # Shop and category listings in each keyset sort order
+        _listing_index('ix_products_listing_price', 'price', 'id'),
+        _listing_index('ix_products_listing_created', 'created_at', 'id'),
+        _listing_index('ix_products_listing_category_price', 'category_id', 'price', 'id'),
+        _listing_index('ix_products_listing_category_created', 'category_id', 'created_at', 'id'),
+        {'extend_existing': True}
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
@@ -66,12 +82,17 @@ class Product(db.Model):
     weight = db.Column(db.Float)
     dimensions = db.Column(db.String(50))
     
+    # Denormalized from product_images so listings don't query per product;
+    # kept current by refresh_primary_image()
+    primary_image_url = db.Column(db.String(200))
+    
     # Relationships
     images = db.relationship('ProductImage', backref='product', lazy='dynamic', cascade='all, delete-orphan')
     colors = db.relationship('ProductColor', backref='product', lazy='dynamic', cascade='all, delete-orphan')
     reviews = db.relationship('Review', backref=db.backref('product', lazy='select'), lazy='dynamic', cascade='all, delete-orphan')
     cart_items = db.relationship('Cart', backref=db.backref('product', lazy='select'), lazy='dynamic', cascade='all, delete-orphan')
     wishlist_items = db.relationship('Wishlist', backref=db.backref('product', lazy='select'), lazy='dynamic', cascade='all, delete-orphan')
+    rating_summary = db.relationship('ProductRatingSummary', uselist=False, lazy='joined', cascade='all, delete-orphan')
 
     def __init__(self, name, description, price, category_id, stock=0, sku=None, weight=None, dimensions=None, is_active=True):
         self.name = name
@@ -88,23 +109,61 @@ class Product(db.Model):
     @property
     def primary_image(self):
         """Get the primary image for the product"""
-        primary = self.images.filter_by(is_primary=True).first()
-        if primary:
-            return primary
-        # Fallback to first image or default image
-        first_image = self.images.first()
-        return first_image
+        # Fallback to first image when none is flagged primary
+        return self.images.order_by(ProductImage.is_primary.desc(), ProductImage.id).first()
 
     @property
     def image_url(self):
         """Backward compatibility for old code that expects image_url"""
-        return self.primary_image.image_url if self.primary_image else None
+        return self.primary_image_url
+
+    @property
+    def gallery(self):
+        """Product images, primary first, using preload_images() results if available"""
+        preloaded = getattr(self, '_gallery', None)
+        if preloaded is not None:
+            return preloaded
+        return self.images.order_by(ProductImage.is_primary.desc(), ProductImage.id).all()
+
+    def refresh_primary_image(self):
+        """Recompute primary_image_url after images are added, removed or re-flagged"""
+        primary = self.primary_image
+        self.primary_image_url = primary.image_url if primary else None
+        self._gallery = None
+
+    @classmethod
+    def preload_images(cls, products):
+        """Load the images of a page of products in a single query
+
+        Afterwards ``product.gallery`` needs no further queries.
+        """
+        products = [product for product in products if product is not None]
+        if not products:
+            return
+        images = {}
+        for image in ProductImage.query.filter(
+            ProductImage.product_id.in_({product.id for product in products})
+        ).order_by(ProductImage.is_primary.desc(), ProductImage.id):
+            images.setdefault(image.product_id, []).append(image)
+        for product in products:
+            product._gallery = images.get(product.id, [])
 
     @property
     def average_rating(self):
-        """Calculate the average rating for the product"""
-        ratings = [review.rating for review in self.reviews]
-        return sum(ratings) / len(ratings) if ratings else 0
+        """Average rating for the product, 0 when it has no reviews"""
+        return self.rating_summary.average if self.rating_summary else 0
+
+    @property
+    def rating_count(self):
+        """Number of reviews for the product"""
+        return self.rating_summary.review_count if self.rating_summary else 0
+
+    @property
+    def rating_histogram(self):
+        """Number of reviews per star rating, keyed 1 to 5"""
+        if self.rating_summary:
+            return self.rating_summary.histogram
+        return {stars: 0 for stars in range(1, 6)}
     
     def update_stock(self, quantity):
         """Update product stock"""
@@ -124,12 +183,16 @@ class Product(db.Model):
             'sku': self.sku,
             'weight': self.weight,
             'dimensions': self.dimensions,
-            'image_url': self.primary_image.image_url if self.primary_image else None,
+            'image_url': self.image_url,
             'colors': [color.to_dict() for color in self.colors],
             'average_rating': self.average_rating,
+            'rating_count': self.rating_count,
             'is_active': self.is_active,
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
     
     def __repr__(self):
         return f'<Product {self.name}>'
+
+# Build the full-text search index whenever the products table is created
+event.listen(Product.__table__, 'after_create', on_products_created)
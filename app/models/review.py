@@ -1,9 +1,13 @@
 from datetime import datetime
+from sqlalchemy import event, update
 from app.extensions import db
 
 class Review(db.Model):
     """Review model for product reviews"""
-    __table_args__ = {'extend_existing': True}
+    __table_args__ = (
+        db.Index('ix_reviews_product_created', 'product_id', 'created_at'),
+        {'extend_existing': True}
+    )
     __tablename__ = 'reviews'
 
     id = db.Column(db.Integer, primary_key=True)
@@ -36,3 +40,117 @@ class Review(db.Model):
         
     def __repr__(self):
         return f'<Review {self.id}>'
+
+
+class ProductRatingSummary(db.Model):
+    """Running review totals for a product
+
+    Maintained alongside reviews by record() and discard() so the average
+    rating and star histogram can be read without loading any reviews.
+    rebuild() recomputes everything from the reviews table.
+    """
+    __tablename__ = 'product_rating_summaries'
+
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), primary_key=True)
+    review_count = db.Column(db.Integer, nullable=False, default=0)
+    rating_sum = db.Column(db.Integer, nullable=False, default=0)
+    stars_1 = db.Column(db.Integer, nullable=False, default=0)
+    stars_2 = db.Column(db.Integer, nullable=False, default=0)
+    stars_3 = db.Column(db.Integer, nullable=False, default=0)
+    stars_4 = db.Column(db.Integer, nullable=False, default=0)
+    stars_5 = db.Column(db.Integer, nullable=False, default=0)
+
+    def __init__(self, product_id):
+        self.product_id = product_id
+        self.review_count = 0
+        self.rating_sum = 0
+        for stars in range(1, 6):
+            setattr(self, f'stars_{stars}', 0)
+
+    @property
+    def average(self):
+        return self.rating_sum / self.review_count if self.review_count else 0
+
+    @property
+    def histogram(self):
+        """Number of reviews per star rating, keyed 1 to 5"""
+        return {stars: getattr(self, f'stars_{stars}') for stars in range(1, 6)}
+
+    @classmethod
+    def record(cls, review):
+        """Count a newly added review (call before committing)"""
+        cls._adjust(review.product_id, review.rating, 1)
+
+    @classmethod
+    def discard(cls, review):
+        """Remove a deleted review from the totals (call before committing)"""
+        cls._adjust(review.product_id, review.rating, -1)
+
+    @classmethod
+    def _adjust(cls, product_id, rating, delta):
+        # Upsert with in-SQL increments, so concurrent reviews add up and the
+        # first two reviews of a product don't race to insert the row
+        table = cls.__table__
+        amounts = {'review_count': delta, 'rating_sum': rating * delta, f'stars_{rating}': delta}
+        dialect = db.session.get_bind().dialect.name
+        if dialect in ('sqlite', 'postgresql'):
+            if dialect == 'sqlite':
+                from sqlalchemy.dialects.sqlite import insert
+            else:
+                from sqlalchemy.dialects.postgresql import insert
+            stmt = insert(table).values(product_id=product_id, **amounts)
+            db.session.execute(stmt.on_conflict_do_update(
+                index_elements=['product_id'],
+                set_={name: table.c[name] + stmt.excluded[name] for name in amounts}
+            ))
+            return
+        result = db.session.execute(
+            update(table).where(table.c.product_id == product_id)
+            .values({name: table.c[name] + value for name, value in amounts.items()})
+        )
+        if result.rowcount == 0:
+            db.session.execute(table.insert().values(product_id=product_id, **amounts))
+
+    @classmethod
+    def rebuild(cls):
+        """Recompute every summary from the reviews table
+
+        Returns:
+            int: Number of products with reviews
+        """
+        rows = db.session.query(
+            Review.product_id,
+            db.func.count(Review.id),
+            db.func.sum(Review.rating),
+            *[db.func.sum(db.case((Review.rating == stars, 1), else_=0)) for stars in range(1, 6)]
+        ).group_by(Review.product_id).all()
+
+        cls.query.delete()
+        for product_id, count, total, *histogram in rows:
+            summary = cls(product_id)
+            summary.review_count = count
+            summary.rating_sum = total
+            for stars, stars_count in zip(range(1, 6), histogram):
+                setattr(summary, f'stars_{stars}', stars_count)
+            db.session.add(summary)
+        db.session.commit()
+        return len(rows)
+
+    def __repr__(self):
+        return f'<ProductRatingSummary {self.product_id}: {self.review_count}>'
+
+
+def _discard_cascaded_reviews(session, flush_context, instances):
+    """Take the reviews of deleted users out of the summaries
+
+    Deleting a user cascades to their reviews without going through
+    ProductRatingSummary.discard(), so do it here before the flush.
+    """
+    from app.models.user import User
+    for user in session.deleted:
+        if isinstance(user, User):
+            for review in user.reviews:
+                ProductRatingSummary.discard(review)
+
+
+event.listen(db.session, 'before_flush', _discard_cascaded_reviews)
@@ -0,0 +1,312 @@
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from sqlalchemy import delete, event, func, inspect, select, update
+from app.extensions import db
+from app.models.order import Order, OrderItem
+from app.models.product import Product
+
+# Order columns that decide which rollup row an order counts in, and the
+# order-level amounts it adds there
+ORDER_KEY = ('date_created', 'status', 'payment_status')
+ORDER_AMOUNTS = ('total', 'discount', 'shipping_cost')
+ITEM_FIELDS = ('product_id', 'quantity', 'price')
+# Primary key of each rollup table, in the order its row keys are built
+SALES_KEY = ('day', 'status', 'payment_status')
+PRODUCT_KEY = SALES_KEY + ('product_id',)
+CATEGORY_KEY = SALES_KEY + ('category_id',)
+
+
+class DailySales(db.Model):
+    """Orders per day, order status and payment status
+
+    ``revenue`` is the sum of order totals (after discount, with shipping);
+    ``units`` the number of items ordered.
+    """
+    __tablename__ = 'sales_daily'
+
+    day = db.Column(db.Date, primary_key=True)
+    status = db.Column(db.String(20), primary_key=True)
+    payment_status = db.Column(db.String(20), primary_key=True)
+    orders = db.Column(db.Integer, nullable=False, default=0)
+    units = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0.0)
+    discount = db.Column(db.Float, nullable=False, default=0.0)
+    shipping = db.Column(db.Float, nullable=False, default=0.0)
+
+    def __repr__(self):
+        return f'<DailySales {self.day} {self.status}/{self.payment_status}: {self.orders}>'
+
+
+class DailyProductSales(db.Model):
+    """Order lines, units and item revenue per day, product and order state"""
+    __tablename__ = 'product_sales_daily'
+    __table_args__ = (
+        db.Index('ix_product_sales_daily_product_day', 'product_id', 'day'),
+    )
+
+    day = db.Column(db.Date, primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), primary_key=True)
+    status = db.Column(db.String(20), primary_key=True)
+    payment_status = db.Column(db.String(20), primary_key=True)
+    orders = db.Column(db.Integer, nullable=False, default=0)
+    units = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0.0)
+
+    def __repr__(self):
+        return f'<DailyProductSales {self.day} product {self.product_id}: {self.units}>'
+
+
+class DailyCategorySales(db.Model):
+    """Order lines, units and item revenue per day, category and order state"""
+    __tablename__ = 'category_sales_daily'
+    __table_args__ = (
+        db.Index('ix_category_sales_daily_category_day', 'category_id', 'day'),
+    )
+
+    day = db.Column(db.Date, primary_key=True)
+    category_id = db.Column(db.Integer, db.ForeignKey('categories.id'), primary_key=True)
+    status = db.Column(db.String(20), primary_key=True)
+    payment_status = db.Column(db.String(20), primary_key=True)
+    orders = db.Column(db.Integer, nullable=False, default=0)
+    units = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0.0)
+
+    def __repr__(self):
+        return f'<DailyCategorySales {self.day} category {self.category_id}: {self.units}>'
+
+
+def _value(obj, name, old):
+    """Current value of an attribute, or the one it had before this flush"""
+    if old:
+        history = inspect(obj).attrs[name].history
+        if history.deleted:
+            return history.deleted[0]
+    return getattr(obj, name)
+
+
+def _changed(obj, names):
+    state = inspect(obj)
+    return any(state.attrs[name].history.has_changes() for name in names)
+
+
+def _order_key(order, old=False):
+    created, status, payment_status = (_value(order, name, old) for name in ORDER_KEY)
+    return ((created or datetime.utcnow()).date(), status or 'pending', payment_status or 'pending')
+
+
+def _line(item, old=False):
+    product_id, quantity, price = (_value(item, name, old) for name in ITEM_FIELDS)
+    return product_id, quantity or 0, price or 0.0
+
+
+def record_order_changes(session, flush_context):
+    """Apply the orders and order items of a flush to the rollup tables
+
+    Runs after every flush of the app session, while the pre-flush values
+    are still available. An order moved to another day or state is taken
+    out of its old rows and added to the new ones; the rows are updated
+    with in-SQL increments so concurrent requests add up.
+    """
+    orders = defaultdict(Counter)
+    lines = []  # (sign, order key, product_id, quantity, price)
+    handled = set()
+
+    for item in session.new:
+        if isinstance(item, OrderItem) and item.order is not None:
+            lines.append((1, _order_key(item.order), *_line(item)))
+            handled.add(item)
+    for item in session.deleted:
+        if isinstance(item, OrderItem) and item.order is not None:
+            lines.append((-1, _order_key(item.order, old=True), *_line(item, old=True)))
+            handled.add(item)
+    for item in session.dirty:
+        if isinstance(item, OrderItem) and item.order is not None and _changed(item, ITEM_FIELDS):
+            lines.append((-1, _order_key(item.order, old=True), *_line(item, old=True)))
+            lines.append((1, _order_key(item.order), *_line(item)))
+            handled.add(item)
+
+    for order in session.new:
+        if isinstance(order, Order):
+            _count_order(orders, _order_key(order), order, 1)
+    for order in session.deleted:
+        if isinstance(order, Order):
+            _count_order(orders, _order_key(order, old=True), order, -1, old=True)
+    for order in session.dirty:
+        if not isinstance(order, Order) or not _changed(order, ORDER_KEY + ORDER_AMOUNTS):
+            continue
+        old_key, new_key = _order_key(order, old=True), _order_key(order)
+        _count_order(orders, old_key, order, -1, old=True)
+        _count_order(orders, new_key, order, 1)
+        if old_key != new_key:
+            # Move the lines that did not change themselves along with the order
+            for item in order.items:
+                if item not in handled:
+                    lines.append((-1, old_key, *_line(item)))
+                    lines.append((1, new_key, *_line(item)))
+
+    if not orders and not lines:
+        return
+
+    products, categories = defaultdict(Counter), defaultdict(Counter)
+    product_ids = {product_id for _, _, product_id, _, _ in lines}
+    category_of = dict(session.execute(
+        select(Product.id, Product.category_id).where(Product.id.in_(product_ids))
+    ).all()) if product_ids else {}
+    for sign, key, product_id, quantity, price in lines:
+        amounts = {'orders': sign, 'units': sign * quantity, 'revenue': sign * quantity * price}
+        orders[key]['units'] += sign * quantity
+        products[key + (product_id,)].update(amounts)
+        if category_of.get(product_id) is not None:
+            categories[key + (category_of[product_id],)].update(amounts)
+
+    _increment(session, DailySales, SALES_KEY, orders)
+    _increment(session, DailyProductSales, PRODUCT_KEY, products)
+    _increment(session, DailyCategorySales, CATEGORY_KEY, categories)
+
+
+def _count_order(orders, key, order, sign, old=False):
+    counter = orders[key]
+    counter['orders'] += sign
+    for name, column in zip(ORDER_AMOUNTS, ('revenue', 'discount', 'shipping')):
+        counter[column] += sign * (_value(order, name, old) or 0.0)
+
+
+def _increment(session, model, key_columns, deltas):
+    """Add deltas to rollup rows, creating the rows that don't exist yet"""
+    table = model.__table__
+    dialect = session.get_bind().dialect.name
+    for key, amounts in deltas.items():
+        amounts = {name: value for name, value in amounts.items() if value}
+        if not amounts:
+            continue
+        row = dict(zip(key_columns, key))
+        if dialect in ('sqlite', 'postgresql'):
+            if dialect == 'sqlite':
+                from sqlalchemy.dialects.sqlite import insert
+            else:
+                from sqlalchemy.dialects.postgresql import insert
+            stmt = insert(table).values(**row, **amounts)
+            session.execute(stmt.on_conflict_do_update(
+                index_elements=list(key_columns),
+                set_={name: table.c[name] + stmt.excluded[name] for name in amounts}
+            ))
+            continue
+        result = session.execute(
+            update(table).where(*(table.c[name] == value for name, value in row.items()))
+            .values({name: table.c[name] + value for name, value in amounts.items()})
+        )
+        if result.rowcount == 0:
+            session.execute(table.insert().values(**row, **amounts))
+
+
+def rebuild_sales_rollups(date_from=None, date_to=None):
+    """Recompute the rollups from the orders table; the caller commits
+
+    Args:
+        date_from (date): First day to rebuild, all history when None
+        date_to (date): Last day to rebuild (inclusive), up to today when None
+
+    Returns:
+        int: Number of days with orders
+    """
+    conditions = []
+    if date_from:
+        conditions.append(Order.date_created >= datetime.combine(date_from, datetime.min.time()))
+    if date_to:
+        conditions.append(Order.date_created < datetime.combine(date_to + timedelta(days=1), datetime.min.time()))
+
+    for model in (DailySales, DailyProductSales, DailyCategorySales):
+        query = delete(model)
+        if date_from:
+            query = query.where(model.day >= date_from)
+        if date_to:
+            query = query.where(model.day <= date_to)
+        db.session.execute(query)
+
+    orders, products, categories = _totals(*conditions)
+    for key, amounts in orders.items():
+        db.session.add(DailySales(**dict(zip(SALES_KEY, key)), **amounts))
+    for key, amounts in products.items():
+        db.session.add(DailyProductSales(**dict(zip(PRODUCT_KEY, key)), **amounts))
+    for key, amounts in categories.items():
+        db.session.add(DailyCategorySales(**dict(zip(CATEGORY_KEY, key)), **amounts))
+
+    db.session.flush()
+    return len({key[0] for key in orders})
+
+
+def discard_orders(order_ids):
+    """Take orders out of the rollups before they are bulk-deleted
+
+    A bulk DELETE never reaches the after_flush listener, so call this in
+    the same transaction, before deleting the orders or their items.
+
+    Args:
+        order_ids: Order ids, or a subquery selecting them
+    """
+    for model, key_columns, totals in zip((DailySales, DailyProductSales, DailyCategorySales),
+                                          (SALES_KEY, PRODUCT_KEY, CATEGORY_KEY),
+                                          _totals(Order.id.in_(order_ids))):
+        deltas = {key: Counter({name: -value for name, value in amounts.items()}) for key, amounts in totals.items()}
+        _increment(db.session, model, key_columns, deltas)
+
+
+def _totals(*conditions):
+    """Rollup amounts of the orders matching ``conditions``, from the orders table
+
+    Returns:
+        tuple: (sales_daily, product_sales_daily, category_sales_daily), each
+        a dict of row key (as in SALES_KEY etc.) -> column amounts
+    """
+    day = func.date(Order.date_created)
+    units = select(OrderItem.order_id, func.sum(OrderItem.quantity).label('units'))\
+        .group_by(OrderItem.order_id).subquery()
+    order_rows = db.session.execute(
+        select(day, Order.status, Order.payment_status, func.count(Order.id),
+               func.coalesce(func.sum(units.c.units), 0), func.coalesce(func.sum(Order.total), 0.0),
+               func.coalesce(func.sum(Order.discount), 0.0), func.coalesce(func.sum(Order.shipping_cost), 0.0))
+        .outerjoin(units, units.c.order_id == Order.id)
+        .where(*conditions)
+        .group_by(day, Order.status, Order.payment_status)
+    ).all()
+    orders = {
+        (_as_date(created), status, payment_status): {
+            'orders': count, 'units': unit_count, 'revenue': revenue, 'discount': discount, 'shipping': shipping
+        }
+        for created, status, payment_status, count, unit_count, revenue, discount, shipping in order_rows
+    }
+
+    lines = []
+    for column in (Product.id, Product.category_id):
+        rows = db.session.execute(
+            select(day, Order.status, Order.payment_status, column, func.count(OrderItem.id),
+                   func.sum(OrderItem.quantity), func.sum(OrderItem.quantity * OrderItem.price))
+            .join(OrderItem, OrderItem.order_id == Order.id)
+            .join(Product, Product.id == OrderItem.product_id)
+            .where(*conditions)
+            .group_by(day, Order.status, Order.payment_status, column)
+        ).all()
+        lines.append({
+            (_as_date(created), status, payment_status, value): {'orders': count, 'units': unit_count, 'revenue': revenue}
+            for created, status, payment_status, value, count, unit_count, revenue in rows
+        })
+    return orders, lines[0], lines[1]
+
+
+def _as_date(value):
+    # func.date() gives a string on SQLite and a date on Postgres
+    return datetime.strptime(value, '%Y-%m-%d').date() if isinstance(value, str) else value
+
+
+def _load_old_value(target, value, oldvalue, initiator):
+    pass
+
+
+# Load the previous value when these attributes are set on an expired
+# object, so record_order_changes() knows which rows to take an order out of
+for attribute in [getattr(Order, name) for name in ORDER_KEY + ORDER_AMOUNTS] + \
+        [getattr(OrderItem, name) for name in ITEM_FIELDS]:
+    event.listen(attribute, 'set', _load_old_value, active_history=True)
+
+# Keep the rollups in step with every flush of the app session
+event.listen(db.session, 'after_flush', record_order_changes)
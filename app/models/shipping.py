@@ -39,13 +39,18 @@ class ShippingMethod(db.Model):
         return f'<ShippingMethod {self.name}>'
 
 class ShippingQuote(db.Model):
-    """Stores shipping cost calculations for orders"""
+    """Stores shipping cost calculations for orders
+    
+    Rows with a ``quote_key`` and no order are cached carrier quotes, see
+    app.shipping.quote_cache.
+    """
     __tablename__ = 'shipping_quotes'
     
     id = db.Column(db.Integer, primary_key=True)
-    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False)
-    carrier_id = db.Column(db.Integer, db.ForeignKey('shipping_carriers.id'), nullable=False)
-    method_id = db.Column(db.Integer, db.ForeignKey('shipping_methods.id'), nullable=False)
+    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=True)
+    carrier_id = db.Column(db.Integer, db.ForeignKey('shipping_carriers.id'), nullable=True)
+    method_id = db.Column(db.Integer, db.ForeignKey('shipping_methods.id'), nullable=True)
+    quote_key = db.Column(db.String(200), nullable=True, index=True)
     cost = db.Column(db.Float, nullable=False)
     currency = db.Column(db.String(3), default='EGP')
     quote_data = db.Column(db.JSON, nullable=True)  # Store full quote response
@@ -60,3 +65,45 @@ class ShippingQuote(db.Model):
     
     def __repr__(self):
         return f'<ShippingQuote {self.id} for Order {self.order_id}>'
+
+class BostaCity(db.Model):
+    """Local copy of Bosta's /cities list
+
+    Shipments resolve their drop-off zone and district from these rows
+    instead of downloading the whole list from Bosta each time. Refreshed by
+    app.shipping.city_index.refresh_city_index().
+    """
+    __tablename__ = 'bosta_cities'
+    
+    id = db.Column(db.String(64), primary_key=True)  # Bosta city _id, used as the zone ID
+    name = db.Column(db.String(100), nullable=False)
+    name_ar = db.Column(db.String(100), nullable=True)
+    code = db.Column(db.String(20), nullable=True, index=True)
+    district_id = db.Column(db.String(64), nullable=True)  # First district of the first zone
+    aliases = db.Column(db.JSON, nullable=True)
+    data = db.Column(db.JSON, nullable=True)  # Full city record from the API
+    date_updated = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<BostaCity {self.name} ({self.code})>'
+
+class BostaRateCard(db.Model):
+    """Bosta pricing tier for one route and package size
+
+    Quotes are computed locally from these rows (see app.shipping.rate_card);
+    Bosta's calculator is only used to refresh them.
+    """
+    __tablename__ = 'bosta_rate_cards'
+    __table_args__ = (
+        db.UniqueConstraint('pickup_city', 'dropoff_city', 'size', name='uq_bosta_rate_card_route'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    pickup_city = db.Column(db.String(100), nullable=False)
+    dropoff_city = db.Column(db.String(100), nullable=False)
+    size = db.Column(db.String(20), nullable=False, default='MEDIUM')
+    tier = db.Column(db.JSON, nullable=False)  # Tier object from the pricing calculator
+    date_updated = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<BostaRateCard {self.pickup_city} -> {self.dropoff_city} ({self.size})>'
@@ -2,7 +2,10 @@ from app.extensions import db
 from datetime import datetime
 
 class Wishlist(db.Model):
-    __table_args__ = {'extend_existing': True}
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'product_id', name='uq_wishlist_user_product'),
+        {'extend_existing': True}
+    )
     __tablename__ = 'wishlist'
     
     id = db.Column(db.Integer, primary_key=True)
@@ -4,14 +4,20 @@ from app.models.order import Order, OrderItem
 from app.models.cart import Cart
 from app.models.address import Address
 from app.models.shipping import ShippingCarrier, ShippingMethod, ShippingQuote
-from app.models.coupon import Coupon
 from app.shipping.services import BostaShippingService, calculate_shipping_cost
-from app.extensions import db
+from app.extensions import db, csrf
+from app.utils.cart_pricing import CartPricing
+from app.utils.inventory import (InsufficientStockError, hold_order_stock, commit_order_stock, release_order_stock,
+                                 release_holds)
+from app.utils.checkout import CheckoutDraft
+from app.utils.email import send_order_confirmation
+from app.shipping.jobs import queue_shipment_cancellation
 from app.order import bp
 from datetime import datetime, timedelta
+from sqlalchemy import update
 from app.utils.stripe_utils import create_payment_intent, confirm_payment_intent
 import stripe
-from app.utils.paymob_utils import create_order, get_payment_key, verify_webhook_signature, process_transaction_response
+from app.utils.paymob_utils import payment_key_for_order, verify_webhook_signature, process_transaction_response
 import json
 
 @bp.route('/')
@@ -25,15 +31,12 @@ def orders():
 @login_required
 def checkout():
     """Checkout page"""
-    # Use eager loading to load product relationships
-    cart_items = Cart.query.filter_by(user_id=current_user.id).join(Cart.product).options(db.contains_eager(Cart.product)).all()
+    pricing = CartPricing.for_request()
+    cart_items = pricing.items
     if not cart_items:
         flash('Your cart is empty.', 'warning')
         return redirect(url_for('cart.cart'))
     
-    # Calculate cart totals
-    subtotal = sum(item.product.price * item.quantity for item in cart_items)
-    
     # Get user addresses with one query
     addresses = Address.query.filter_by(user_id=current_user.id).all()
     if not addresses:
@@ -50,64 +53,22 @@ def checkout():
         flash('No shipping methods available.', 'error')
         return redirect(url_for('cart.cart'))
     
-    # Get applied coupon from session
-    coupon_code = session.get('coupon_code')
-    discount = 0
-    coupon = None
-    
-    if coupon_code:
-        coupon = Coupon.query.filter_by(code=coupon_code).first()
-        if coupon:
-            if coupon.discount_type == 'percentage':
-                discount = subtotal * (coupon.discount_amount / 100)
-                if coupon.max_discount_amount and discount > coupon.max_discount_amount:
-                    discount = coupon.max_discount_amount
-            else:  # fixed amount
-                discount = min(coupon.discount_amount, subtotal)  # Don't exceed subtotal
-    
     # Default shipping cost (will be updated when user selects shipping method)
-    shipping_cost = 0.0
-    
-    # Calculate final total
-    total = subtotal + shipping_cost - discount
-    
-    # Create a pending order with default shipping address
-    order = Order(
-        user_id=current_user.id,
-        status='pending',
-        payment_status='pending',
-        payment_method='cod',  # Default to COD
-        shipping_address_id=addresses[0].id,  # Use first address as default
-        subtotal=subtotal,
-        shipping_cost=shipping_cost,
-        discount=discount,
-        total=total
-    )
-    
-    # Add order items
-    for cart_item in cart_items:
-        order_item = OrderItem(
-            product_id=cart_item.product_id,
-            quantity=cart_item.quantity,
-            price=cart_item.product.price
-        )
-        order.items.append(order_item)
+    totals = pricing.totals(shipping_cost=0.0)
     
-    db.session.add(order)
-    db.session.commit()
-    
-    current_app.logger.info(f'Created pending order {order.id} with shipping address {order.shipping_address_id}')
+    # Keep the priced cart in the session; the order is only created on submit
+    draft = CheckoutDraft.start(totals)
     
     return render_template('order/checkout.html',
-                         order=order,
+                         checkout_token=draft.token,
                          cart_items=cart_items,
                          addresses=addresses,
                          carriers=carriers,
-                         subtotal=subtotal,
-                         shipping_cost=shipping_cost,
-                         coupon=coupon,
-                         discount=discount,
-                         total=total)
+                         subtotal=totals.subtotal,
+                         shipping_cost=totals.shipping_cost,
+                         coupon=totals.coupon,
+                         discount=totals.discount,
+                         total=totals.total)
 
 @bp.route('/calculate-shipping', methods=['POST'])
 @login_required
@@ -130,21 +91,18 @@ def calculate_shipping():
             
         # Get address and cart items
         address = Address.query.get_or_404(address_id)
-        cart_items = Cart.query.filter_by(user_id=current_user.id).join(Cart.product).options(db.contains_eager(Cart.product)).all()
+        pricing = CartPricing.for_request()
         
-        if not cart_items:
+        if not pricing.items:
             return jsonify({'error': 'Cart is empty'}), 400
         
         # Calculate subtotal
-        subtotal = sum(item.product.price * item.quantity for item in cart_items)
+        subtotal = pricing.subtotal
         
         # Initialize Bosta shipping service
         bosta_service = BostaShippingService()
         
-        # Get the default pickup location
-        bosta_service._ensure_token()
-        bosta_service._get_default_location()
-        
+        # Get the default pickup location (cached by the service)
         if not bosta_service.default_location:
             return jsonify({'error': 'Could not get default pickup location'}), 500
             
@@ -166,31 +124,10 @@ def calculate_shipping():
             if shipping_cost is None:
                 return jsonify({'error': 'Could not calculate shipping cost'}), 400
 
-            # Get applied coupon from session
-            coupon_code = session.get('coupon_code')
-            discount = 0
-            coupon = None
-            
-            if coupon_code:
-                coupon = Coupon.query.filter_by(code=coupon_code).first()
-                if coupon:
-                    if coupon.discount_type == 'percentage':
-                        discount = subtotal * (coupon.discount_amount / 100)
-                        if coupon.max_discount_amount and discount > coupon.max_discount_amount:
-                            discount = coupon.max_discount_amount
-                    else:  # fixed amount
-                        discount = min(coupon.discount_amount, subtotal)  # Don't exceed subtotal
-            
             # Calculate total
-            total = subtotal + shipping_cost - discount
+            totals = pricing.totals(shipping_cost)
             
-            return jsonify({
-                'success': True,
-                'shipping_cost': shipping_cost,
-                'subtotal': subtotal,
-                'discount': discount,
-                'total': total
-            })
+            return jsonify(dict(totals.to_dict(), success=True))
             
         except Exception as e:
             current_app.logger.error(f"Error estimating shipping cost: {str(e)}")
@@ -246,14 +183,12 @@ def process_checkout():
             return redirect(url_for('order.checkout'))
             
         # Get cart items
-        cart_items = Cart.query.filter_by(user_id=current_user.id).all()
+        pricing = CartPricing.for_request()
+        cart_items = pricing.items
         if not cart_items:
             flash('Your cart is empty.', 'error')
             return redirect(url_for('cart.cart'))
             
-        # Calculate totals
-        subtotal = sum(item.product.price * item.quantity for item in cart_items)
-        
         # Get shipping cost from session
         shipping_cost = session.get('shipping_cost')
         stored_address_id = session.get('shipping_address_id')
@@ -263,37 +198,13 @@ def process_checkout():
             flash('Please recalculate shipping cost before proceeding.', 'error')
             return redirect(url_for('order.checkout'))
             
-        # Apply coupon if exists
-        coupon_code = session.get('coupon_code')
-        discount = 0
-        
-        if coupon_code:
-            coupon = Coupon.query.filter_by(code=coupon_code).first()
-            if coupon:
-                if coupon.discount_type == 'percentage':
-                    discount = subtotal * (coupon.discount_amount / 100)
-                    if coupon.max_discount_amount and discount > coupon.max_discount_amount:
-                        discount = coupon.max_discount_amount
-                else:  # fixed amount
-                    discount = min(coupon.discount_amount, subtotal)
-        
-        # Calculate final total
-        total = subtotal + shipping_cost - discount
-        
-        # For card payments, confirm the payment intent
-        if payment_method == 'card':
-            if not payment_intent_id:
-                flash('Payment processing failed. Please try again.', 'error')
-                return redirect(url_for('order.checkout'))
-                
-            try:
-                payment = confirm_payment_intent(payment_intent_id)
-                if not payment.status == 'succeeded':
-                    flash('Payment failed. Please try again.', 'error')
-                    return redirect(url_for('order.checkout'))
-            except stripe.error.StripeError as e:
-                flash(f'Payment failed: {str(e)}', 'error')
-                return redirect(url_for('order.checkout'))
+        # Calculate final total, applying the coupon if one exists
+        totals = pricing.totals(shipping_cost)
+        
+        # A card order needs a payment intent to confirm once its stock is held
+        if payment_method == 'card' and not payment_intent_id:
+            flash('Payment processing failed. Please try again.', 'error')
+            return redirect(url_for('order.checkout'))
         
         # Check if address belongs to user, if not clone it to user's addresses
         shipping_address = Address.query.get(shipping_address_id)
@@ -315,18 +226,18 @@ def process_checkout():
             shipping_address_id = new_address.id
             current_app.logger.info(f'Cloned shipping address {shipping_address.id} to user profile as address {new_address.id}')
         
-        # Create order
+        # Create order; a card order stays pending until its payment succeeds
         order = Order(
             user_id=current_user.id,
             shipping_address_id=shipping_address_id,
             payment_method=payment_method,
             stripe_payment_id=payment_intent_id if payment_method == 'card' else None,
-            subtotal=subtotal,
-            shipping_cost=shipping_cost,
-            discount=discount,
-            total=total,
-            status='pending' if payment_method == 'cod' else 'paid',
-            payment_status='pending' if payment_method == 'cod' else 'paid'
+            subtotal=totals.subtotal,
+            shipping_cost=totals.shipping_cost,
+            discount=totals.discount,
+            total=totals.total,
+            status='pending',
+            payment_status='pending'
         )
         
         db.session.add(order)
@@ -340,17 +251,48 @@ def process_checkout():
                 price=cart_item.product.price
             )
             db.session.add(order_item)
+        
+        # Take the stock with conditional updates so concurrent orders can't oversell
+        db.session.flush()
+        if payment_method == 'card':
+            # Hold the stock before charging the card, so a customer is never
+            # charged for an order that can't be filled
+            try:
+                hold_order_stock(order)
+            except InsufficientStockError:
+                db.session.rollback()
+                flash('Some items in your cart are no longer available in the requested quantity.', 'error')
+                return redirect(url_for('cart.cart'))
+            db.session.commit()
             
-            # Update product stock
-            product = cart_item.product
-            product.stock -= cart_item.quantity
-            db.session.add(product)
+            try:
+                payment = confirm_payment_intent(payment_intent_id)
+                error = None if payment.status == 'succeeded' else 'Payment failed. Please try again.'
+            except stripe.error.StripeError as e:
+                error = f'Payment failed: {str(e)}'
+            if error:
+                release_holds([order.id])
+                db.session.delete(order)
+                db.session.commit()
+                flash(error, 'error')
+                return redirect(url_for('order.checkout'))
+            
+            order.status = 'paid'
+            order.payment_status = 'paid'
+            shortfalls = commit_order_stock(order)
+            if shortfalls:
+                current_app.logger.error(f'Order {order.id} was paid but stock ran out for products {shortfalls}')
+        elif commit_order_stock(order):
+            db.session.rollback()
+            flash('Some items in your cart are no longer available in the requested quantity.', 'error')
+            return redirect(url_for('cart.cart'))
         
         # Clear cart, shipping cost, and coupon from session
         Cart.query.filter_by(user_id=current_user.id).delete()
         session.pop('shipping_cost', None)
         session.pop('shipping_address_id', None)
         session.pop('coupon_code', None)
+        CheckoutDraft.clear()
         
         db.session.commit()
         
@@ -368,29 +310,17 @@ def process_checkout():
 def create_payment():
     """Create a payment intent for Stripe"""
     try:
-        cart_items = Cart.query.filter_by(user_id=current_user.id).join(Cart.product).options(db.contains_eager(Cart.product)).all()
+        pricing = CartPricing.for_request()
+        cart_items = pricing.items
         if not cart_items:
             return jsonify({'error': 'Cart is empty'}), 400
 
         # Calculate totals
-        subtotal = sum(item.product.price * item.quantity for item in cart_items)
-        shipping_cost = 10.0  # Fixed shipping cost
-        discount = 0
-        coupon_code = session.get('coupon_code')
-        if coupon_code:
-            coupon = Coupon.query.filter_by(code=coupon_code).first()
-            if coupon:
-                if coupon.discount_type == 'percentage':
-                    discount = subtotal * (coupon.discount_amount / 100)
-                    if coupon.max_discount_amount and discount > coupon.max_discount_amount:
-                        discount = coupon.max_discount_amount
-                else:  # fixed amount
-                    discount = min(coupon.discount_amount, subtotal)  # Don't exceed subtotal
-        total = subtotal + shipping_cost - discount
+        totals = pricing.totals(shipping_cost=10.0)  # Fixed shipping cost
 
         # Create a PaymentIntent with the order amount and currency
         intent = create_payment_intent(
-            amount=total,
+            amount=totals.total,
             currency='egp',  # Use Egyptian Pounds
             metadata={
                 'user_id': current_user.id,
@@ -420,8 +350,7 @@ def order_detail(order_id):
 def apply_promo():
     """Apply promotional code"""
     promo_code = request.form.get('promo_code', '').upper()
-    cart_items = Cart.query.filter_by(user_id=current_user.id).join(Cart.product).options(db.contains_eager(Cart.product)).all()
-    total = sum(item.product.price * item.quantity for item in cart_items)
+    total = CartPricing.for_request().subtotal
     
     # Simple promo code logic (should be replaced with proper promo code system)
     valid_codes = {
@@ -463,25 +392,15 @@ def cancel_order(order_id):
             flash('This order cannot be cancelled.', 'error')
             return redirect(url_for('order.orders'))
             
-        # Cancel Bosta delivery if exists
+        # The job worker cancels the Bosta delivery if one exists
         if order.delivery_order_id:
-            try:
-                bosta_service = BostaShippingService()
-                bosta_service.cancel_shipping_order(order.delivery_order_id)
-                
-                # Update delivery status
-                order.delivery_status = 'CANCELLED'
-                order.delivery_updated_at = datetime.utcnow()
-                
-                current_app.logger.info(f"Cancelled Bosta delivery for order {order_id}")
-            except Exception as e:
-                current_app.logger.error(f"Failed to cancel Bosta delivery for order {order_id}: {str(e)}")
-                # Continue with order cancellation even if delivery cancellation fails
+            queue_shipment_cancellation(order.delivery_order_id)
+            order.delivery_status = 'CANCELLED'
+            order.delivery_updated_at = datetime.utcnow()
         
         # Restore product stock
-        for item in order.items:
-            item.ordered_product.stock += item.quantity
-            current_app.logger.info(f"Restored {item.quantity} items to stock for product {item.ordered_product.name}")
+        released = release_order_stock(order)
+        current_app.logger.info(f"Released {released} stock reservations for order {order_id}")
         
         # Update order status
         order.status = 'cancelled'
@@ -509,10 +428,7 @@ def calculate_shipping_cost(address_id):
         # Initialize Bosta shipping service
         bosta_service = BostaShippingService()
         
-        # Get the default pickup location
-        bosta_service._ensure_token()
-        bosta_service._get_default_location()
-        
+        # Get the default pickup location (cached by the service)
         if not bosta_service.default_location:
             current_app.logger.error("Could not get default pickup location")
             return None
@@ -619,8 +535,27 @@ def validate_credit_card(cc_number, cc_name, cc_exp_month, cc_exp_year, cc_cvv):
 def process_paymob_payment():
     """Process PayMob payment and return payment URL"""
     try:
-        # Get order ID from request
+        # Turn the checkout draft into an order, or pay for an existing order
         order_id = request.json.get('order_id')
+        draft_token = request.json.get('draft_token')
+        if draft_token:
+            draft = CheckoutDraft.load(draft_token)
+            if not draft:
+                current_app.logger.warning('Expired or unknown checkout draft')
+                return jsonify({'success': False, 'error': 'Your checkout session expired. Please reload the page.'})
+            
+            shipping_address_id = request.json.get('shipping_address_id')
+            address = Address.query.filter_by(id=shipping_address_id, user_id=current_user.id).first()
+            if not address:
+                return jsonify({'success': False, 'error': 'Please select a shipping address'})
+            
+            # Only charge the shipping quoted for this address
+            shipping_cost = session.get('shipping_cost')
+            if shipping_cost is None or str(session.get('shipping_address_id')) != str(address.id):
+                shipping_cost = 0.0
+            order_id = draft.to_order(current_user.id, address.id, shipping_cost).id
+            db.session.commit()
+        
         if not order_id:
             current_app.logger.error('No order ID provided')
             return jsonify({'success': False, 'error': 'Invalid order ID'})
@@ -636,14 +571,25 @@ def process_paymob_payment():
             current_app.logger.error(f'Unauthorized access to order {order_id}')
             return jsonify({'success': False, 'error': 'Unauthorized'})
         
+        # Only a card order still waiting for its payment can be paid for
+        if order.payment_method != 'card' or order.status != 'pending' or \
+                order.payment_status not in ('pending', 'failed'):
+            current_app.logger.warning(f'Order {order_id} is not awaiting a card payment')
+            return jsonify({'success': False, 'error': 'This order cannot be paid for'})
+        
         # Check if order has shipping address
         if not order.shipping_address_id:
             current_app.logger.error(f'No shipping address for order {order_id}')
             return jsonify({'success': False, 'error': 'Please select a shipping address'})
         
-        # Convert amount to cents (PayMob requires amount in cents)
-        amount_cents = int(order.total * 100)
-        current_app.logger.debug(f'Processing payment for amount: {amount_cents} cents')
+        # Hold the stock while the customer is on the payment page
+        try:
+            hold_order_stock(order)
+            db.session.commit()
+        except InsufficientStockError as e:
+            db.session.rollback()
+            current_app.logger.warning(f'Cannot hold stock for order {order_id}: {str(e)}')
+            return jsonify({'success': False, 'error': 'Some items in your order are no longer in stock'})
         
         # Create order items list for PayMob
         items = [{
@@ -653,19 +599,6 @@ def process_paymob_payment():
             'quantity': item.quantity
         } for item in order.items]
         
-        current_app.logger.debug(f'Creating PayMob order with {len(items)} items')
-        
-        try:
-            # Create order in PayMob
-            paymob_order_id, auth_token = create_order(
-                amount_cents=amount_cents,
-                items=items
-            )
-            current_app.logger.info(f'PayMob order created: {paymob_order_id}')
-        except Exception as e:
-            current_app.logger.error(f'Error creating PayMob order: {str(e)}')
-            return jsonify({'success': False, 'error': 'Failed to create payment order'})
-        
         # Get shipping address
         shipping_address = Address.query.get(order.shipping_address_id)
         if not shipping_address:
@@ -691,16 +624,18 @@ def process_paymob_payment():
         current_app.logger.debug(f'Getting payment key with billing data: {json.dumps(billing_data)}')
         
         try:
-            # Get payment key
-            payment_key = get_payment_key(
-                order_id=paymob_order_id,
-                auth_token=auth_token,
-                amount_cents=amount_cents,
+            # Reuses the PayMob order and payment key from an earlier attempt
+            payment_key = payment_key_for_order(
+                order,
+                items=items,
                 billing_data=billing_data,
                 integration_id=current_app.config.get('PAYMOB_INTEGRATION_ID')
             )
-            current_app.logger.info('Payment key generated successfully')
+            db.session.commit()
+            current_app.logger.info(f'Payment key ready for order {order_id} (PayMob order {order.paymob_order_id})')
         except Exception as e:
+            # Keep a PayMob order registered before the failure for the retry
+            db.session.commit()
             current_app.logger.error(f'Error getting payment key: {str(e)}')
             return jsonify({'success': False, 'error': 'Failed to generate payment key'})
         
@@ -710,15 +645,11 @@ def process_paymob_payment():
             current_app.logger.error('PayMob iframe ID not configured')
             return jsonify({'success': False, 'error': 'Payment system not properly configured'})
         
-        # Save PayMob order ID
-        order.paymob_order_id = str(paymob_order_id)
-        db.session.commit()
-        current_app.logger.info(f'Updated order {order_id} with PayMob order ID: {paymob_order_id}')
-        
         return jsonify({
             'success': True,
             'payment_key': payment_key,
-            'iframe_id': iframe_id
+            'iframe_id': iframe_id,
+            'status_url': url_for('order.payment_status', order_id=order.id)
         })
         
     except Exception as e:
@@ -728,24 +659,54 @@ def process_paymob_payment():
             'error': str(e) if current_app.debug else 'Payment processing failed. Please try again.'
         }), 500
 
+def _claim_payment(order, transaction_id):
+    """Record a successful transaction unless the order is already paid
+
+    The conditional UPDATE lets only one of two concurrent callbacks for
+    the same payment through: the other waits on the row, then finds the
+    order paid.
+
+    Returns:
+        bool: True if this callback is the one that marks the order paid
+    """
+    if order.payment_status == 'paid':
+        return False
+    result = db.session.execute(
+        update(Order)
+        .where(Order.id == order.id, Order.payment_status != 'paid')
+        .values(paymob_payment_id=transaction_id)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
 @bp.route('/paymob-callback', methods=['GET', 'POST'])
+@csrf.exempt
 def paymob_callback():
     """Handle PayMob payment callback"""
     try:
         current_app.logger.info('Received PayMob callback')
         
-        # Get data from request
+        # Get data from request; PayMob posts the transaction as the body's obj
         if request.method == 'GET':
             data = request.args.to_dict()
         else:
-            data = request.json
+            data = request.get_json(silent=True) or {}
+            data = data.get('obj') or data
             
         current_app.logger.debug(f'Callback data: {json.dumps(data)}')
         
+        # The callback URL is public, so only trust what PayMob signed
+        signature = request.args.get('hmac') or data.get('hmac')
+        if not verify_webhook_signature(data, signature, current_app.config.get('PAYMOB_HMAC_SECRET')):
+            current_app.logger.warning('Rejected PayMob callback with a missing or invalid HMAC')
+            return jsonify({'success': False, 'error': 'Invalid signature'}), 403
+        
         # Get transaction ID and success status
         transaction_id = data.get('id') or data.get('transaction_id')
         success = data.get('success') == 'true' or data.get('success') == True
         order_id = data.get('order')
+        if isinstance(order_id, dict):
+            order_id = order_id.get('id')
         
         current_app.logger.info(f'Processing transaction {transaction_id} for order {order_id}, success: {success}')
         
@@ -761,37 +722,59 @@ def paymob_callback():
             current_app.logger.error(error_msg)
             return jsonify({'success': False, 'error': error_msg}), 404
         
-        if success:
+        if success and not _claim_payment(order, transaction_id):
+            # PayMob sends a webhook and a redirect for every payment; the
+            # callback that arrived first has already applied it
+            current_app.logger.info(f'Order {order.id} is already paid, ignoring transaction {transaction_id}')
+            response_data = {
+                'success': True,
+                'redirect_url': url_for('order.order_confirmation', order_id=order.id)
+            }
+        elif success:
             # Update order status
             order.payment_status = 'paid'
             order.status = 'processing'
             order.payment_method = 'card'
+            order.is_draft = False
             order.paid_at = datetime.utcnow()
             order.paymob_payment_id = transaction_id
             
-            # Clear cart
+            # Turn the stock hold into a permanent reservation
+            shortfalls = commit_order_stock(order)
+            if shortfalls:
+                current_app.logger.error(f'Order {order.id} was paid but stock ran out for products {shortfalls}')
+            
+            # Clear cart and the checkout draft it was priced from
             Cart.query.filter_by(user_id=order.user_id).delete()
+            CheckoutDraft.clear()
             
             db.session.commit()
             
             current_app.logger.info(f'Payment successful for order {order.id}')
             
-            # Send order confirmation email
+            # Queue the order confirmation email
             try:
-                send_order_confirmation_email(order)
+                send_order_confirmation(order)
+                db.session.commit()
             except Exception as e:
-                current_app.logger.error(f'Failed to send order confirmation email: {str(e)}')
+                db.session.rollback()
+                current_app.logger.error(f'Failed to queue order confirmation email: {str(e)}')
             
             response_data = {
                 'success': True,
                 'redirect_url': url_for('order.order_confirmation', order_id=order.id)
             }
         else:
-            # Payment failed
-            order.payment_status = 'failed'
-            db.session.commit()
+            if order.payment_status == 'paid':
+                # A late or repeated failure must not undo a payment that went through
+                current_app.logger.warning(f'Ignoring failed transaction {transaction_id} for paid order {order.id}')
+            else:
+                # Payment failed; give back the held stock (never stock already sold)
+                order.payment_status = 'failed'
+                release_holds([order.id])
+                db.session.commit()
+                current_app.logger.error(f'Payment failed for order {order.id}')
             
-            current_app.logger.error(f'Payment failed for order {order.id}')
             response_data = {
                 'success': False,
                 'error': 'Payment failed. Please try again or choose a different payment method.'
@@ -819,6 +802,21 @@ def paymob_callback():
             flash(error_response['error'], 'error')
             return redirect(url_for('order.orders'))
 
+@bp.route('/payment-status/<int:order_id>')
+@login_required
+def payment_status(order_id):
+    """Payment status of an order, polled by the checkout page until PayMob's callback sets it"""
+    order = Order.query.get_or_404(order_id)
+    
+    # Ensure user can only view their own orders
+    if order.user_id != current_user.id:
+        return jsonify({'success': False, 'error': 'Unauthorized access.'}), 403
+    
+    response_data = {'success': True, 'payment_status': order.payment_status}
+    if order.payment_status == 'paid':
+        response_data['redirect_url'] = url_for('order.order_confirmation', order_id=order.id)
+    return jsonify(response_data)
+
 @bp.route('/order-confirmation/<int:order_id>')
 @login_required
 def order_confirmation(order_id):
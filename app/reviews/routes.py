@@ -1,7 +1,7 @@
 from flask import jsonify, request, flash, redirect, url_for
 from flask_login import login_required, current_user
 from app.reviews import bp
-from app.models.review import Review
+from app.models.review import Review, ProductRatingSummary
 from app.models.product import Product
 from app.extensions import db
 
@@ -36,6 +36,7 @@ def add_review(product_id):
     )
     
     db.session.add(review)
+    ProductRatingSummary.record(review)
     db.session.commit()
     
     flash('Thank you for your review!', 'success')
@@ -70,6 +71,7 @@ def delete_review(review_id):
         return jsonify({'error': 'Unauthorized'}), 403
     
     db.session.delete(review)
+    ProductRatingSummary.discard(review)
     db.session.commit()
     
     return jsonify({'message': 'Review deleted successfully'})
@@ -0,0 +1,175 @@
+"""
+Local index of Bosta cities, zones and districts.
+
+Bosta's ``/cities`` list changes rarely, so it is stored in the
+``bosta_cities`` table and refreshed by ``scripts/refresh_bosta_cities.py``
+(run from cron with ``--if-stale``, it only calls Bosta once the list is
+older than ``BOSTA_CITY_INDEX_TTL_HOURS``). Each worker keeps a lookup dict
+keyed by English name, Arabic name, city code and aliases (normalized like
+app.utils.city_mapping keys), reloaded only when the ``bosta_cities``
+catalog version moves, so resolving a shipment's drop-off zone and
+district needs no network round trip.
+"""
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import delete
+from sqlalchemy.exc import SQLAlchemyError
+from app.extensions import db
+from app.models.category import CatalogVersion
+from app.models.shipping import BostaCity
+from app.utils.city_mapping import CITIES, city_key, resolve_city
+
+CITIES_VERSION = 'bosta_cities'
+
+IndexedCity = namedtuple('IndexedCity', ['zone_id', 'district_id', 'name', 'name_ar', 'code'])
+
+
+def _district_id(city):
+    """First district of the city's first zone, as shipments have always used"""
+    zones = city.get('zones') or []
+    districts = zones[0].get('districts') or [] if zones else []
+    return districts[0].get('_id') if districts else None
+
+
+def _known_aliases(code):
+    """Aliases for a city code from the static city table"""
+    for name, data in CITIES.items():
+        if data['code'] == code:
+            return [name] + data.get('aliases', [])
+    return []
+
+
+def refresh_city_index(cities=None):
+    """Replace the stored city list
+
+    Args:
+        cities (list): City records as returned by Bosta's ``/cities``;
+            fetched from the API when omitted
+
+    Returns:
+        int: Number of cities stored. The caller commits.
+    """
+    if cities is None:
+        from app.shipping.services import BostaShippingService
+        cities = BostaShippingService().get_cities()
+
+    now = datetime.utcnow()
+    rows = [
+        BostaCity(
+            id=city['_id'],
+            name=city.get('name', ''),
+            name_ar=city.get('nameAr'),
+            code=city.get('code'),
+            district_id=_district_id(city),
+            aliases=_known_aliases(city.get('code')),
+            data=city,
+            date_updated=now
+        )
+        for city in cities if city.get('_id')
+    ]
+    db.session.execute(delete(BostaCity))
+    db.session.add_all(rows)
+    CatalogVersion.bump(CITIES_VERSION)
+    invalidate_city_index()
+    return len(rows)
+
+
+def _build_index():
+    index = {}
+    refreshed_at = None
+    for row in BostaCity.query.order_by(BostaCity.name):
+        entry = IndexedCity(row.id, row.district_id or row.id, row.name, row.name_ar, row.code)
+        for key in [row.name, row.name_ar, row.code] + (row.aliases or []):
+            index.setdefault(city_key(key), entry)
+        if refreshed_at is None or row.date_updated < refreshed_at:
+            refreshed_at = row.date_updated
+    index.pop(None, None)
+    return index, refreshed_at
+
+
+def get_city_index():
+    """Get the worker's lookup dict, reloading it when the stored list changed
+
+    Returns:
+        dict: city_key -> IndexedCity
+    """
+    cache = current_app.extensions.get('bosta_city_index')
+    now = time.monotonic()
+    interval = current_app.config.get('CATALOG_VERSION_CHECK_INTERVAL', 5)
+
+    if cache and now - cache['checked_at'] < interval:
+        return cache['index']
+
+    version = CatalogVersion.current(CITIES_VERSION)
+    if cache and cache['version'] == version:
+        index, refreshed_at = cache['index'], cache['refreshed_at']
+    else:
+        index, refreshed_at = _build_index()
+
+    current_app.extensions['bosta_city_index'] = {
+        'version': version,
+        'index': index,
+        'refreshed_at': refreshed_at,
+        'checked_at': now,
+    }
+    return index
+
+
+def invalidate_city_index():
+    """Make this worker re-check the stored list on its next lookup"""
+    cache = current_app.extensions.get('bosta_city_index')
+    if cache:
+        current_app.extensions['bosta_city_index'] = dict(cache, checked_at=float('-inf'))
+
+
+def city_index_stale():
+    """Whether the stored list is missing or older than the TTL"""
+    get_city_index()
+    refreshed_at = current_app.extensions['bosta_city_index']['refreshed_at']
+    ttl = timedelta(hours=current_app.config.get('BOSTA_CITY_INDEX_TTL_HOURS', 24))
+    return refreshed_at is None or datetime.utcnow() - refreshed_at > ttl
+
+
+def _fill_city_index():
+    """Store Bosta's city list when there is none yet
+
+    Runs in a savepoint: if another worker is filling the table at the same
+    time and this insert collides with its rows, the savepoint is rolled
+    back and the rows that worker stored are used.
+    """
+    from app.shipping.services import BostaShippingService
+    try:
+        cities = BostaShippingService().get_cities()
+    except Exception as e:
+        current_app.logger.warning(f'Could not fetch Bosta cities for the city index: {str(e)}')
+        return
+    try:
+        with db.session.begin_nested():
+            refresh_city_index(cities)
+    except SQLAlchemyError as e:
+        current_app.logger.warning(f'Bosta city index filled concurrently, using the stored list: {str(e)}')
+        invalidate_city_index()
+
+
+def find_city(name):
+    """Resolve a city name, Arabic name, code or alias to its Bosta IDs
+
+    Only an empty index is filled here (the new rows are committed with the
+    caller's transaction); a list past its TTL is still used as it is, and
+    refreshed from ``scripts/refresh_bosta_cities.py`` rather than on the
+    shipment path.
+
+    Returns:
+        IndexedCity or None if the city is unknown
+    """
+    index = get_city_index()
+    if not index:
+        _fill_city_index()
+        index = get_city_index()
+    city = index.get(city_key(name))
+    if city is None:
+        # Misspellings the resolver recognizes map to their standard name
+        city = index.get(city_key(resolve_city(name)))
+    return city
@@ -0,0 +1,52 @@
+"""
+Background jobs for Bosta shipments.
+
+Creating and cancelling deliveries used to happen inside the admin's and
+customer's requests; they are now queued (see app.utils.jobs) and run by
+the job worker.
+"""
+from datetime import datetime
+from flask import current_app
+from app.extensions import db
+from app.models.order import Order
+from app.shipping.services import BostaShippingService
+from app.utils.jobs import enqueue, job_handler
+
+
+def queue_shipment(order):
+    """Queue creating the Bosta delivery for a confirmed order; the caller commits"""
+    return enqueue('bosta.create_shipment', key=f'bosta.create_shipment:{order.id}', order_id=order.id)
+
+
+def queue_shipment_cancellation(delivery_id):
+    """Queue terminating a Bosta delivery; the caller commits"""
+    return enqueue('bosta.cancel_shipment', key=f'bosta.cancel_shipment:{delivery_id}', delivery_id=delivery_id)
+
+
+@job_handler('bosta.create_shipment', max_attempts=5, concurrency=2)
+def create_shipment(order_id):
+    """Create the Bosta delivery for an order and move it to processing
+
+    Orders that already have a delivery, or were cancelled meanwhile, are
+    left alone. Bosta gets the order ID as business reference.
+    """
+    order = db.session.get(Order, order_id)
+    if order is None or order.delivery_id or order.status == 'cancelled':
+        return
+
+    shipping_result = BostaShippingService().create_shipping_order(order)
+
+    order.delivery_tracking_number = shipping_result.get('tracking_number')
+    order.delivery_id = shipping_result.get('delivery_id')
+    order.delivery_status = shipping_result.get('status')
+    order.delivery_status_code = shipping_result.get('status_code')
+    order.delivery_created_at = datetime.utcnow()
+    order.status = 'processing'
+    db.session.commit()
+    current_app.logger.info(f'Created Bosta delivery {order.delivery_id} for order {order.id}')
+
+
+@job_handler('bosta.cancel_shipment', max_attempts=5, concurrency=2)
+def cancel_shipment(delivery_id):
+    """Terminate a Bosta delivery"""
+    BostaShippingService().cancel_shipping_order(delivery_id)
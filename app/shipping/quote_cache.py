@@ -0,0 +1,196 @@
+"""
+Two-level cache for Bosta shipping quotes.
+
+A Bosta quote only depends on the pickup city, drop-off city, package size
+and (roughly) the COD amount, so the pricing tier returned by the calculator
+is cached under that key:
+
+1. an in-process LRU with a TTL, checked first;
+2. ``shipping_quotes`` rows (``quote_key`` set, no order), shared by all
+   workers and surviving restarts.
+
+Only on a miss in both is the loader (the live API call) run, and concurrent
+identical misses in a worker wait for a single call instead of each making
+their own. Hits, misses and coalesced waits are counted per worker; see
+QuoteCache.stats().
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy.orm import Session
+from app.extensions import db
+from app.models.shipping import ShippingQuote
+
+
+def quote_key(pickup_city, dropoff_city, size, cod_amount, bucket=None):
+    """Cache key for a quote; COD amounts are grouped into buckets"""
+    if bucket is None:
+        bucket = current_app.config.get('SHIPPING_QUOTE_COD_BUCKET', 500)
+    cod_bucket = math.ceil(cod_amount / bucket) if cod_amount and cod_amount > 0 else 0
+    return f'bosta:{pickup_city}:{dropoff_city}:{size}:{cod_bucket}'.lower()
+
+
+class _Flight:
+    """A load in progress that other callers can wait for"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class QuoteCache:
+    """LRU + database cache of quote data with single-flight loading
+
+    Args:
+        maxsize (int): Entries kept in memory
+        ttl (int): Seconds a quote stays valid
+        wait_timeout (int): Seconds to wait for another caller's load
+    """
+
+    def __init__(self, maxsize=1024, ttl=21600, wait_timeout=30):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.wait_timeout = wait_timeout
+        self._entries = OrderedDict()
+        self._flights = {}
+        self._lock = threading.Lock()
+        self._stats = dict.fromkeys(['hits', 'db_hits', 'misses', 'coalesced', 'errors'], 0)
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def stats(self):
+        """Counters since the worker started, plus the current size"""
+        with self._lock:
+            return dict(self._stats, size=len(self._entries))
+
+    def _get_memory(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def _put_memory(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def _get_persisted(self, key):
+        """Newest unexpired stored quote as (quote_data, seconds left)"""
+        now = datetime.utcnow()
+        quote = ShippingQuote.query.filter(
+            ShippingQuote.quote_key == key,
+            ShippingQuote.valid_until > now
+        ).order_by(ShippingQuote.valid_until.desc()).first()
+        if quote is None:
+            return None, 0
+        return quote.quote_data, (quote.valid_until - now).total_seconds()
+
+    def get_stale(self, key):
+        """Newest stored quote data for a key even if expired, or None
+
+        Used as a fallback while Bosta can't be reached.
+        """
+        quote = ShippingQuote.query.filter(
+            ShippingQuote.quote_key == key
+        ).order_by(ShippingQuote.valid_until.desc()).first()
+        return quote.quote_data if quote else None
+
+    def _persist(self, key, value, cost):
+        """Store a fresh quote in its own transaction, leaving the caller's alone"""
+        try:
+            with Session(db.engine) as session:
+                session.query(ShippingQuote).filter(
+                    ShippingQuote.quote_key == key,
+                    ShippingQuote.order_id.is_(None)
+                ).delete(synchronize_session=False)
+                session.add(ShippingQuote(
+                    quote_key=key,
+                    cost=cost,
+                    quote_data=value,
+                    valid_until=datetime.utcnow() + timedelta(seconds=self.ttl)
+                ))
+                session.commit()
+        except Exception as e:
+            current_app.logger.warning(f'Could not store shipping quote {key}: {str(e)}')
+
+    def get_or_load(self, key, loader, cost=None):
+        """Get cached quote data, running ``loader`` once on a miss
+
+        Args:
+            key (str): See quote_key()
+            loader (callable): Returns fresh quote data, or None if no quote
+                is available (None is not cached)
+            cost (callable): Gives the cost stored alongside the quote data
+
+        Returns:
+            The quote data, or None
+        """
+        value = self._get_memory(key)
+        if value is not None:
+            self._count('hits')
+            return value
+
+        value, remaining = self._get_persisted(key)
+        if value is not None:
+            self._count('db_hits')
+            self._put_memory(key, value, remaining)
+            return value
+
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            self._count('coalesced')
+            flight.done.wait(self.wait_timeout)
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            self._count('misses')
+            value = flight.value = loader()
+            if value is not None:
+                self._put_memory(key, value, self.ttl)
+                self._persist(key, value, cost(value) if cost else 0.0)
+            return value
+        except Exception as e:
+            self._count('errors')
+            flight.error = e
+            raise
+        finally:
+            flight.done.set()
+            with self._lock:
+                self._flights.pop(key, None)
+
+    def clear(self):
+        """Drop this worker's in-memory entries"""
+        with self._lock:
+            self._entries.clear()
+
+
+def get_quote_cache():
+    """The worker's quote cache, created from config on first use"""
+    cache = current_app.extensions.get('shipping_quote_cache')
+    if cache is None:
+        cache = current_app.extensions.setdefault('shipping_quote_cache', QuoteCache(
+            maxsize=current_app.config.get('SHIPPING_QUOTE_CACHE_SIZE', 1024),
+            ttl=current_app.config.get('SHIPPING_QUOTE_TTL', 21600)
+        ))
+    return cache
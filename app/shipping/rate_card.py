@@ -0,0 +1,149 @@
+"""
+Local Bosta rate card.
+
+A Bosta price is a formula over the route's pricing tier (price_from_tier()),
+and tiers only change when Bosta changes its prices. refresh_rate_cards()
+asks the calculator once per governorate and stores the tiers in
+``bosta_rate_cards``; after that every quote is computed locally. Each
+worker keeps the tiers in memory, reloaded only when the
+``bosta_rate_cards`` catalog version moves.
+
+Cards are stored and looked up under the Bosta code of the pickup city
+(``EG-11`` for Ismailia), so any spelling of the city finds them.
+
+Refresh periodically with ``scripts/refresh_bosta_rate_cards.py``.
+"""
+import time
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import delete
+from app.extensions import db
+from app.models.category import CatalogVersion
+from app.models.shipping import BostaRateCard
+from app.utils.city_mapping import CITIES, get_city_code, resolve_city
+
+RATE_CARDS_VERSION = 'bosta_rate_cards'
+
+
+def price_from_tier(tier, cod_amount=0):
+    """Total shipping cost from a Bosta pricing tier
+
+    The tier cost plus the opening package and material fees, plus the COD
+    fee (a percentage of the collected amount, with a minimum) when cash is
+    collected on delivery.
+    """
+    base_cost = float(tier['cost'])
+
+    # Add opening package fee if applicable
+    if 'amount' in tier.get('openingPackageFee', {}):
+        base_cost += float(tier['openingPackageFee']['amount'])
+
+    # Add bosta material fee if applicable
+    if 'amount' in tier.get('bostaMaterialFee', {}):
+        base_cost += float(tier['bostaMaterialFee']['amount'])
+
+    # Calculate COD fee if applicable
+    cod_fee = tier.get('extraCodFee', {})
+    if cod_amount > 0 and 'percentage' in cod_fee:
+        cod_fee_amount = float(cod_fee['percentage']) * cod_amount
+        if 'minimumFeeAmount' in cod_fee:
+            cod_fee_amount = max(cod_fee_amount, float(cod_fee['minimumFeeAmount']))
+        base_cost += cod_fee_amount
+
+    return base_cost
+
+
+def refresh_rate_cards(service, pickup_city=None, sizes=('MEDIUM',)):
+    """Fetch the tier for every governorate from Bosta and store them
+
+    Routes the calculator has no tier for keep their previous card. The
+    caller commits.
+
+    Args:
+        service (BostaShippingService): Used to call the calculator
+        pickup_city (str): Defaults to BOSTA_PICKUP_CITY
+        sizes (tuple): Package sizes to fetch
+
+    Returns:
+        int: Number of rate cards stored
+    """
+    pickup_city = resolve_city(pickup_city or current_app.config.get('BOSTA_PICKUP_CITY', 'Ismailia'))
+    pickup_code = get_city_code(pickup_city)
+    now = datetime.utcnow()
+    stored = 0
+    for size in sizes:
+        for dropoff_city in CITIES:
+            tier = service._fetch_pricing_tier(pickup_city, dropoff_city, size, 0)
+            if tier is None:
+                current_app.logger.warning(f'No Bosta tier for {pickup_city} -> {dropoff_city} ({size})')
+                continue
+            # Cards stored before they were keyed by code have the city name
+            db.session.execute(delete(BostaRateCard).where(
+                BostaRateCard.pickup_city.in_([pickup_code, pickup_city]),
+                BostaRateCard.dropoff_city == dropoff_city,
+                BostaRateCard.size == size
+            ))
+            db.session.add(BostaRateCard(pickup_city=pickup_code, dropoff_city=dropoff_city,
+                                         size=size, tier=tier, date_updated=now))
+            stored += 1
+    CatalogVersion.bump(RATE_CARDS_VERSION)
+    invalidate_rate_cards()
+    return stored
+
+
+def get_rate_cards():
+    """Get the worker's tiers, reloading them when the stored cards changed
+
+    Returns:
+        dict: (pickup city code, size) -> {dropoff_city: tier}
+    """
+    cache = current_app.extensions.get('bosta_rate_cards')
+    now = time.monotonic()
+    interval = current_app.config.get('CATALOG_VERSION_CHECK_INTERVAL', 5)
+
+    if cache and now - cache['checked_at'] < interval:
+        return cache['cards']
+
+    version = CatalogVersion.current(RATE_CARDS_VERSION)
+    if cache and cache['version'] == version:
+        cards = cache['cards']
+    else:
+        cards = {}
+        for card in BostaRateCard.query:
+            pickup_code = get_city_code(card.pickup_city) or card.pickup_city
+            cards.setdefault((pickup_code, card.size), {})[card.dropoff_city] = card.tier
+
+    current_app.extensions['bosta_rate_cards'] = {
+        'version': version,
+        'cards': cards,
+        'checked_at': now,
+    }
+    return cards
+
+
+def invalidate_rate_cards():
+    """Make this worker re-check the stored cards on its next lookup"""
+    cache = current_app.extensions.get('bosta_rate_cards')
+    if cache:
+        current_app.extensions['bosta_rate_cards'] = dict(cache, checked_at=float('-inf'))
+
+
+def rate_card_tier(pickup_city, dropoff_city, size='MEDIUM'):
+    """Stored tier for a route, or None
+
+    Args:
+        pickup_city (str): Any name or the code of the pickup city
+        dropoff_city (str): Standard name of the destination
+    """
+    return get_rate_cards().get((get_city_code(pickup_city), size), {}).get(dropoff_city)
+
+
+def quote_all_destinations(pickup_city=None, cod_amount=0, size='MEDIUM'):
+    """Price a shipment to every destination with a rate card at once
+
+    Returns:
+        dict: Standard city name -> shipping cost, in city name order
+    """
+    pickup_code = get_city_code(pickup_city or current_app.config.get('BOSTA_PICKUP_CITY', 'Ismailia'))
+    tiers = get_rate_cards().get((pickup_code, size), {})
+    return {city: price_from_tier(tiers[city], cod_amount) for city in sorted(tiers)}
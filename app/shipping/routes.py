@@ -1,6 +1,7 @@
 from flask import jsonify, request, session
 from app.shipping import bp
 from app.shipping.services import BostaShippingService
+from app.shipping.rate_card import quote_all_destinations
 from app.models.shipping import ShippingCarrier
 from app.models.address import Address
 from app.models.cart import Cart
@@ -101,7 +102,17 @@ def calculate_cost():
 def get_cities():
     """Get list of available cities"""
     return jsonify({
-        'cities': BostaCityMapping.get_city_choices()
+        'cities': [city for city, label in BostaCityMapping.get_city_choices()]
+    })
+
+@bp.route('/rates')
+def get_rates():
+    """Shipping cost to every city from the local rate card"""
+    cod_amount = request.args.get('cod', 0, type=float)
+    rates = quote_all_destinations(cod_amount=cod_amount)
+    return jsonify({
+        'currency': 'EGP',
+        'rates': [{'city': city, 'cost': cost} for city, cost in rates.items()]
     })
 
 @bp.route('/track/<tracking_number>', methods=['GET'])
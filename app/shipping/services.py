@@ -7,6 +7,12 @@ from flask import current_app
 from datetime import datetime, timedelta
 from functools import lru_cache
 import threading
+from app.shipping.city_index import find_city
+from app.shipping.quote_cache import get_quote_cache, quote_key
+from app.shipping.rate_card import price_from_tier, rate_card_tier
+from app.utils.city_mapping import BostaCityMapping
+from app.utils.http_client import get_client
+from app.utils.token_store import get_token_store
 
 # Configure Bosta logger
 bosta_logger = logging.getLogger('bosta')
@@ -38,100 +44,10 @@ bosta_logger.addHandler(bosta_handler)
 # Initialize logger
 logger = logging.getLogger(__name__)
 
-class BostaCityMapping:
-    """Mapping class for Bosta city codes and names"""
-    
-    CITIES = {
-        'Cairo': {'ar': 'القاهرة', 'code': 'EG-01'},
-        'Sohag': {'ar': 'سوهاج', 'code': 'EG-18'},
-        'Alexandria': {'ar': 'الإسكندرية', 'code': 'EG-02'},
-        'Menya': {'ar': 'المنيا', 'aliases': ['Minya'], 'code': 'EG-19'},
-        'Dakahlia': {'ar': 'الدقهلية', 'code': 'EG-05'},
-        'Luxor': {'ar': 'الأقصر', 'code': 'EG-22'},
-        'Behira': {'ar': 'البحيرة', 'aliases': ['Beheira'], 'code': 'EG-04'},
-        'Ismailia': {'ar': 'الإسماعيلية', 'aliases': ['Isamilia'], 'code': 'EG-11'},
-        'Assuit': {'ar': 'أسيوط', 'aliases': ['Asyut'], 'code': 'EG-17'},
-        'Aswan': {'ar': 'أسوان', 'code': 'EG-21'},
-        'Suez': {'ar': 'السويس', 'code': 'EG-12'},
-        'Monufia': {'ar': 'المنوفية', 'aliases': ['Menofia'], 'code': 'EG-09'},
-        'Sharqia': {'ar': 'الشرقية', 'code': 'EG-10'},
-        'Gharbia': {'ar': 'الغربية', 'code': 'EG-07'},
-        'Kafr Alsheikh': {'ar': 'كفر الشيخ', 'aliases': ['Kafr Al-Sheikh'], 'code': 'EG-08'},
-        'El Kalioubia': {'ar': 'القليوبية', 'aliases': ['Qalyubia'], 'code': 'EG-06'},
-        'North Coast': {'ar': 'الساحل الشمالي', 'code': 'EG-03'},
-        'Qena': {'ar': 'قنا', 'code': 'EG-20'},
-        'Bani Suif': {'ar': 'بني سويف', 'aliases': ['Beni Suef'], 'code': 'EG-16'},
-        'Damietta': {'ar': 'دمياط', 'code': 'EG-14'},
-        'Red Sea': {'ar': 'البحر الأحمر', 'code': 'EG-23'},
-        'Fayoum': {'ar': 'الفيوم', 'aliases': ['Faiyum'], 'code': 'EG-15'},
-        'Port Said': {'ar': 'بور سعيد', 'code': 'EG-13'},
-        'New Valley': {'ar': 'الوادى الجديد', 'code': 'EG-24'},
-        'Giza': {'ar': 'الجيزة', 'code': 'EG-25'},
-        'Matrouh': {'ar': 'مرسى مطروح', 'code': 'EG-28'},
-        'North Sinai': {'ar': 'شمال سيناء', 'code': 'EG-27'},
-        'South Sinai': {'ar': 'جنوب سيناء', 'code': 'EG-26'}
-    }
-
-    @classmethod
-    def get_city_choices(cls):
-        """Get list of city choices for forms"""
-        return [(city, f"{city} ({data['ar']})") for city, data in sorted(cls.CITIES.items())]
-
-    @classmethod
-    def get_code(cls, city_name):
-        """Get city code for a given city name"""
-        if not city_name:
-            return None
-            
-        # Direct match
-        if city_name in cls.CITIES:
-            return cls.CITIES[city_name]['code']
-            
-        # Arabic name match
-        for city, data in cls.CITIES.items():
-            if data['ar'] == city_name:
-                return data['code']
-                
-        # Alias match
-        for city, data in cls.CITIES.items():
-            if 'aliases' in data and city_name in data['aliases']:
-                return data['code']
-                
-        # Case-insensitive match
-        city_upper = city_name.upper()
-        for city, data in cls.CITIES.items():
-            if city.upper() == city_upper:
-                return data['code']
-                
-        return None
-
-    @classmethod
-    def normalize_name(cls, city_name):
-        """Normalize city name to standard English form"""
-        if not city_name:
-            return None
-            
-        # Direct match
-        if city_name in cls.CITIES:
-            return city_name
-            
-        # Arabic name match
-        for city, data in cls.CITIES.items():
-            if data['ar'] == city_name:
-                return city
-                
-        # Alias match
-        for city, data in cls.CITIES.items():
-            if 'aliases' in data and city_name in data['aliases']:
-                return city
-                
-        # Case-insensitive match
-        city_upper = city_name.upper()
-        for city in cls.CITIES:
-            if city.upper() == city_upper:
-                return city
-                
-        return None
+# Name of the Bosta token in the shared token store
+BOSTA_TOKEN = 'bosta'
+# Bosta's production API, used when BOSTA_BASE_URL is not set
+DEFAULT_BASE_URL = 'https://app.bosta.co/api/v2'
 
 class BostaShippingService:
     """Service class for Bosta shipping integration"""
@@ -139,6 +55,14 @@ class BostaShippingService:
     # Class-level cache for token and location
     _instance = None
     _lock = threading.Lock()
+
+    # (connect, read) timeouts per endpoint, in seconds; others use HTTP_TIMEOUT
+    TIMEOUTS = {
+        'login': (3.05, 10),
+        'calculator': (3.05, 5),
+        'tracking': (3.05, 10),
+        'deliveries': (3.05, 30),
+    }
     
     def __new__(cls):
         """Implement singleton pattern to ensure one instance per application"""
@@ -154,9 +78,6 @@ class BostaShippingService:
             self.email = email or current_app.config.get('BOSTA_EMAIL')
             self.password = password or current_app.config.get('BOSTA_PASSWORD')
             self.api_key = api_key or current_app.config.get('BOSTA_API_KEY')
-            self.base_url = "https://app.bosta.co/api/v2"
-            self._token = None
-            self._token_expiry = None
             self._default_location = None
             self._location_expiry = None
             
@@ -171,31 +92,69 @@ class BostaShippingService:
                 
             self._initialized = True
     
+    @property
+    def base_url(self):
+        """API root from BOSTA_BASE_URL, read per call as the service is a singleton"""
+        return current_app.config.get('BOSTA_BASE_URL', DEFAULT_BASE_URL).rstrip('/')
+
     @property
     def token(self):
-        """Get the authentication token, refreshing if needed"""
-        now = datetime.now()
-        if not self._token or not self._token_expiry or now >= self._token_expiry:
-            self._login()
-        return self._token
+        """Get the authentication token shared by all workers, refreshing if needed"""
+        return get_token_store().get(BOSTA_TOKEN, self._login, self._token_ttl)
     
     @token.setter
     def token(self, value):
-        """Set the authentication token with expiry"""
-        self._token = value
-        self._token_expiry = datetime.now() + timedelta(hours=1)  # Token expires in 1 hour
+        """Store an authentication token for all workers"""
+        get_token_store().put(BOSTA_TOKEN, value, self._token_ttl)
+
+    @property
+    def _token_ttl(self):
+        return current_app.config.get('BOSTA_TOKEN_TTL', 3600)
+
+    @property
+    def default_location(self):
+        """Default pickup location, fetched at most once an hour"""
+        now = datetime.now()
+        if not self._default_location or not self._location_expiry or now >= self._location_expiry:
+            location = self._get_default_location()
+            if location:
+                self._default_location = location
+                self._location_expiry = now + timedelta(hours=1)
+        return self._default_location
+
+    @property
+    def http(self):
+        """Pooled client for the Bosta API"""
+        return get_client('bosta')
 
     @property
     def headers(self):
         """Get headers for API requests"""
+        return self._auth_headers(self.token)
+
+    def _auth_headers(self, token):
         return {
             "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.token}",
+            "Authorization": f"Bearer {token}",
             "ApiKey": self.api_key
         }
+
+    def _api(self, method, url, **kwargs):
+        """Call the Bosta API with the shared token
+
+        A 401 expires the token and the request is sent once more with a new
+        one; concurrent rejections of the same token share a single login.
+        """
+        token = self.token
+        response = self.http.request(method, url, headers=self._auth_headers(token), **kwargs)
+        if response.status_code == 401:
+            bosta_logger.info("Bosta rejected the token, logging in again")
+            get_token_store().invalidate(BOSTA_TOKEN, token)
+            response = self.http.request(method, url, headers=self.headers, **kwargs)
+        return response
         
     def _login(self):
-        """Authenticate with Bosta API"""
+        """Authenticate with Bosta API and return a new token"""
         try:
             bosta_logger.info(f"Authenticating with Bosta using email: {self.email}")
             
@@ -203,7 +162,7 @@ class BostaShippingService:
             auth_header = f"Bearer {self.api_key}" if self.api_key else None
             bosta_logger.debug(f"Using Authorization header: {auth_header}")
             
-            response = requests.post(
+            response = self.http.post(
                 f"{self.base_url}/users/login",
                 json={
                     "email": self.email,
@@ -213,7 +172,7 @@ class BostaShippingService:
                     "Content-Type": "application/json",
                     "Authorization": auth_header
                 },
-                timeout=30
+                timeout=self.TIMEOUTS['login']
             )
             
             # Log raw response for debugging
@@ -244,10 +203,9 @@ class BostaShippingService:
             if token.startswith('Bearer '):
                 token = token[7:]
                 
-            # Store token and update headers
-            self.token = token
             bosta_logger.debug(f"Received token: {token[:10]}...")
             bosta_logger.info("Successfully authenticated with Bosta")
+            return token
             
         except requests.exceptions.RequestException as e:
             error_msg = f"Failed to connect to Bosta API: {str(e)}"
@@ -256,20 +214,12 @@ class BostaShippingService:
             
     def _ensure_token(self):
         """Ensure we have a valid token for API calls"""
-        if not self.token:
-            self._login()
+        return self.token
             
     def get_cities(self):
         """Get list of cities from Bosta API"""
         try:
-            if not self.token:
-                self._login()
-                
-            response = requests.get(
-                f"{self.base_url}/cities",
-                headers=self.headers,
-                timeout=30
-            )
+            response = self._api('GET', f"{self.base_url}/cities")
             
             # Log raw response for debugging
             bosta_logger.info(f"Bosta Cities API Response Status: {response.status_code}")
@@ -316,28 +266,11 @@ class BostaShippingService:
     
     @property
     def token_valid(self):
-        """Check if current token is valid"""
-        if not self._token:
-            return False
-            
-        # Check if token is valid by making a test API call
-        headers = {
-            "Authorization": f"Bearer {self.token}",
-            "Content-Type": "application/json"
-        }
-        
-        try:
-            response = requests.get(
-                f"{self.base_url}/users/me",
-                headers=headers
-            )
-            if response.status_code == 401:
-                self._login()
-                return bool(self.token)
-            return response.status_code == 200
-            
-        except requests.exceptions.RequestException:
-            return False
+        """Check if there is an unexpired token, without calling the API
+
+        Rejected tokens are replaced when a request gets a 401, see _api().
+        """
+        return get_token_store().peek(BOSTA_TOKEN) is not None
 
     def calculate_shipping_cost(self, order_id, weight, dimensions, city):
         """Calculate shipping cost with caching"""
@@ -351,9 +284,9 @@ class BostaShippingService:
             # Your existing shipping cost calculation code here
             # The @lru_cache decorator will handle caching the results
             
-            response = requests.post(
+            response = self._api(
+                'POST',
                 f"{self.base_url}/deliveries/rate",
-                headers=self.headers,
                 json={
                     "type": 10,
                     "pickupLocationId": self.default_location['_id'],
@@ -364,7 +297,8 @@ class BostaShippingService:
                         "weight": weight,
                         "dimensions": dimensions
                     }
-                }
+                },
+                timeout=self.TIMEOUTS['calculator']
             )
             
             if response.status_code != 200:
@@ -392,11 +326,11 @@ class BostaShippingService:
             
             # Make API request
             try:
-                response = requests.post(
+                response = self._api(
+                    'POST',
                     f"{self.base_url}/deliveries",
-                    headers=self.headers,
                     json=payload,
-                    timeout=30
+                    timeout=self.TIMEOUTS['deliveries']
                 )
                 
                 # Log response for debugging
@@ -450,10 +384,8 @@ class BostaShippingService:
             if not order.shipping_address:
                 raise ValueError("Shipping address is required")
                 
-            if not self._default_location:
-                self._default_location = self._get_default_location()
-                if not self._default_location:
-                    raise ValueError("No pickup location configured")
+            if not self.default_location:
+                raise ValueError("No pickup location configured")
 
             # Get zone and district IDs for dropoff city
             zone_id, district_id = self._get_zone_and_district(order.shipping_address.city)
@@ -467,8 +399,11 @@ class BostaShippingService:
             # Extract pickup address from default location
             pickup_address = self._default_location.get('address', {})
             pickup_city = pickup_address.get('city', {})
-            pickup_zone = pickup_address.get('zone', {})
-            pickup_district = pickup_address.get('district', {})
+            pickup_zone = pickup_address.get('zone') or {}
+            pickup_district = pickup_address.get('district') or {}
+            # Bosta's spec gives the district as a plain name
+            if isinstance(pickup_district, str):
+                pickup_district = {'name': pickup_district}
             
             # Calculate COD amount if needed
             is_cod = order.payment_method == 'cod'
@@ -535,20 +470,11 @@ class BostaShippingService:
     def _get_default_location(self):
         """Get default pickup location"""
         try:
-            # Ensure we have a valid token
-            if not self.token:
-                bosta_logger.info("No token available, attempting to login")
-                self._login()
-                
             # Get default location data
             bosta_logger.info("Fetching default pickup location")
             try:
                 # Make API request
-                response = requests.get(
-                    f"{self.base_url}/pickup-locations",
-                    headers=self.headers,
-                    timeout=30
-                )
+                response = self._api('GET', f"{self.base_url}/pickup-locations")
                 
                 # Log raw response for debugging
                 bosta_logger.info(f"Bosta Pickup Locations API Response Status: {response.status_code}")
@@ -558,19 +484,6 @@ class BostaShippingService:
                 response_text = response.text[:1000] + "..." if len(response.text) > 1000 else response.text
                 bosta_logger.debug(f"Bosta Pickup Locations API Response Body (truncated): {response_text}")
                 
-                if response.status_code == 401:
-                    # Token might be expired, try to refresh
-                    bosta_logger.info("Token might be expired, attempting to refresh")
-                    self._token = None  # Force new token
-                    self._login()
-                    
-                    # Retry the request
-                    response = requests.get(
-                        f"{self.base_url}/pickup-locations",
-                        headers=self.headers,
-                        timeout=30
-                    )
-                
                 if response.status_code != 200:
                     error_msg = f"Failed to get pickup locations: {response.text}"
                     bosta_logger.error(error_msg)
@@ -624,121 +537,25 @@ class BostaShippingService:
             return None
 
     def _get_zone_and_district(self, city_name):
-        """Get zone and district IDs for a city from Bosta API"""
-        try:
-            # Ensure we have a valid token
-            if not self.token:
-                bosta_logger.info("No token available, attempting to login")
-                self._login()
-                
-            # Normalize city name for better matching
-            city_name = city_name.strip().lower()
-            bosta_logger.info(f"Getting zone and district IDs for city: {city_name}")
-            
-            # Get city data from Bosta API
-            try:
-                response = requests.get(
-                    f"{self.base_url}/cities",
-                    headers=self.headers,
-                    timeout=30
-                )
-                
-                # Log raw response for debugging
-                bosta_logger.info(f"Bosta Cities API Response Status: {response.status_code}")
-                bosta_logger.debug(f"Bosta Cities API Response Headers: {dict(response.headers)}")
-                
-                # Log first 1000 characters of response for debugging
-                response_text = response.text[:1000] + "..." if len(response.text) > 1000 else response.text
-                bosta_logger.debug(f"Bosta Cities API Response Body (truncated): {response_text}")
-                
-                if response.status_code != 200:
-                    error_msg = f"Failed to get cities from Bosta. Status: {response.status_code}, Response: {response.text}"
-                    bosta_logger.error(error_msg)
-                    raise ValueError(error_msg)
-                    
-            except requests.exceptions.RequestException as e:
-                error_msg = f"Failed to connect to Bosta Cities API: {str(e)}"
-                bosta_logger.error(error_msg)
-                raise ValueError(error_msg)
-                
-            # Parse response data
-            try:
-                response_data = response.json()
-            except json.JSONDecodeError as e:
-                error_msg = f"Invalid JSON response from Bosta API: {str(e)}"
-                bosta_logger.error(error_msg)
-                raise ValueError(error_msg)
-                
-            if not response_data.get('success'):
-                error_msg = f"API error: {response_data.get('message', 'Unknown error')}"
-                bosta_logger.error(error_msg)
-                raise ValueError(error_msg)
-                
-            # Cities are in the data list
-            cities_data = response_data.get('data', {}).get('list', [])
-            if not cities_data:
-                error_msg = "No cities data returned from Bosta API"
-                bosta_logger.error(error_msg)
-                raise ValueError(error_msg)
-                
-            # Log available cities for debugging
-            city_names = [(c.get('name', ''), c.get('nameAr', ''), c.get('code', '')) for c in cities_data]
-            bosta_logger.debug(f"Available cities from Bosta API (name, nameAr, code): {city_names}")
-            
-            # Find matching city by name or code
-            city = None
-            for c in cities_data:
-                current_city_name = c.get('name', '').strip().lower()
-                current_city_name_ar = c.get('nameAr', '').strip()
-                current_city_code = c.get('code', '').strip().lower()
-                
-                bosta_logger.debug(f"Comparing '{city_name}' with name:'{current_city_name}', nameAr:'{current_city_name_ar}', code:'{current_city_code}'")
-                
-                # Check all possible matches
-                if city_name in (current_city_name, current_city_name_ar, current_city_code):
-                    city = c
-                    bosta_logger.info(f"Found city match: {c}")
-                    break
-                    
-            if not city:
-                error_msg = f"City not found in Bosta API: {city_name}. Available cities: {city_names}"
-                bosta_logger.error(error_msg)
-                raise ValueError(error_msg)
-                
-            # Get city ID as zone ID
-            zone_id = city.get('_id')
-            if not zone_id:
-                error_msg = f"No ID found for city: {city_name}"
-                bosta_logger.error(error_msg)
-                raise ValueError(error_msg)
-            
-            # Get first district ID from the city's zones
-            district_id = None
-            if 'zones' in city:
-                zones = city.get('zones', [])
-                if zones and 'districts' in zones[0]:
-                    districts = zones[0].get('districts', [])
-                    if districts:
-                        district_id = districts[0].get('_id')
-            
-            # If no district found, use city ID as district ID
-            if not district_id:
-                district_id = zone_id
-                
-            bosta_logger.info(f"Found zone ID: {zone_id} and district ID: {district_id} for city: {city_name}")
-            return zone_id, district_id
-            
-        except Exception as e:
-            bosta_logger.error(f"Error getting zone and district IDs: {str(e)}")
-            raise ValueError(f"Failed to get zone and district IDs: {str(e)}")
+        """Get zone and district IDs for a city from the local city index"""
+        city = find_city(city_name)
+        if not city:
+            error_msg = f"City not found in Bosta city index: {city_name}"
+            bosta_logger.error(error_msg)
+            raise ValueError(f"Failed to get zone and district IDs: {error_msg}")
+        
+        bosta_logger.info(f"Found zone ID: {city.zone_id} and district ID: {city.district_id} for city: {city_name}")
+        return city.zone_id, city.district_id
 
-    def estimate_shipping_cost(self, pickup_city, dropoff_city, cod_amount=0):
-        """Estimate shipping cost between two cities"""
+    def estimate_shipping_cost(self, pickup_city, dropoff_city, cod_amount=0, size='MEDIUM'):
+        """Estimate shipping cost between two cities
+        
+        The route's pricing tier comes from the local rate card, or for
+        routes without one from the quote cache; Bosta's calculator is only
+        called when neither has it, and if it can't be reached the last
+        stored quote for the route is used even when expired.
+        """
         try:
-            if not self.token and not self._login():
-                bosta_logger.error("Failed to authenticate with Bosta")
-                return None
-
             # Normalize city names to standard English form
             pickup_city = BostaCityMapping.normalize_name(pickup_city)
             dropoff_city = BostaCityMapping.normalize_name(dropoff_city)
@@ -747,59 +564,61 @@ class BostaShippingService:
                 bosta_logger.error(f"Invalid city names: pickup={pickup_city}, dropoff={dropoff_city}")
                 return None
 
-            params = {
-                'cod': cod_amount,
-                'pickupCity': pickup_city,
-                'dropOffCity': dropoff_city,
-                'size': 'MEDIUM',
-                'type': 'SEND'  # Using SEND from allowed types: [SEND, CASH_COLLECTION, CUSTOMER_RETURN_PICKUP, EXCHANGE, SIGN_AND_RETURN]
-            }
-
-            response = requests.get(
-                f"{self.base_url}/pricing/shipment/calculator",
-                headers=self.headers,
-                params=params
-            )
-
-            if response.status_code != 200:
-                bosta_logger.error(f"Error estimating shipping cost: {response.status_code} {response.reason} for url: {response.url}")
-                bosta_logger.error(f"Response content: {response.text}")
+            # Routes without a local rate card fall back to the cached calculator
+            tier = rate_card_tier(pickup_city, dropoff_city, size)
+            if tier is None:
+                key = quote_key(pickup_city, dropoff_city, size, cod_amount)
+                try:
+                    tier = get_quote_cache().get_or_load(
+                        key,
+                        lambda: self._fetch_pricing_tier(pickup_city, dropoff_city, size, cod_amount),
+                        cost=price_from_tier
+                    )
+                except (requests.exceptions.RequestException, ValueError) as e:
+                    # Bosta (or logging in to it) is down or its circuit is
+                    # open: an expired quote beats none
+                    bosta_logger.warning(f"Bosta calculator unavailable, using last stored quote: {str(e)}")
+                    tier = get_quote_cache().get_stale(key)
+            if tier is None:
                 return None
-
-            data = response.json()
-            # Extract the base shipping cost from the tier
-            if 'data' in data and 'tier' in data['data'] and 'cost' in data['data']['tier']:
-                base_cost = float(data['data']['tier']['cost'])
-                
-                # Add opening package fee if applicable
-                if ('openingPackageFee' in data['data']['tier'] and 
-                    'amount' in data['data']['tier']['openingPackageFee']):
-                    base_cost += float(data['data']['tier']['openingPackageFee']['amount'])
-                
-                # Add bosta material fee if applicable
-                if ('bostaMaterialFee' in data['data']['tier'] and 
-                    'amount' in data['data']['tier']['bostaMaterialFee']):
-                    base_cost += float(data['data']['tier']['bostaMaterialFee']['amount'])
                 
-                # Calculate COD fee if applicable
-                if cod_amount > 0 and 'extraCodFee' in data['data']['tier']:
-                    cod_fee = data['data']['tier']['extraCodFee']
-                    if 'percentage' in cod_fee:
-                        cod_fee_amount = float(cod_fee['percentage']) * cod_amount
-                        if 'minimumFeeAmount' in cod_fee:
-                            cod_fee_amount = max(cod_fee_amount, float(cod_fee['minimumFeeAmount']))
-                        base_cost += cod_fee_amount
-                
-                bosta_logger.info(f"Calculated total shipping cost: {base_cost}")
-                return base_cost
-            else:
-                bosta_logger.error(f"Unexpected response format: {data}")
-                return None
+            base_cost = price_from_tier(tier, cod_amount)
+            bosta_logger.info(f"Calculated total shipping cost: {base_cost}")
+            return base_cost
 
         except Exception as e:
             bosta_logger.error(f"Error in estimate_shipping_cost: {str(e)}")
             return None
 
+    def _fetch_pricing_tier(self, pickup_city, dropoff_city, size, cod_amount):
+        """Get the pricing tier for a route from Bosta's calculator"""
+        params = {
+            'cod': cod_amount,
+            'pickupCity': pickup_city,
+            'dropOffCity': dropoff_city,
+            'size': size,
+            'type': 'SEND'  # Using SEND from allowed types: [SEND, CASH_COLLECTION, CUSTOMER_RETURN_PICKUP, EXCHANGE, SIGN_AND_RETURN]
+        }
+
+        response = self._api(
+            'GET',
+            f"{self.base_url}/pricing/shipment/calculator",
+            params=params,
+            timeout=self.TIMEOUTS['calculator']
+        )
+
+        if response.status_code != 200:
+            bosta_logger.error(f"Error estimating shipping cost: {response.status_code} {response.reason} for url: {response.url}")
+            bosta_logger.error(f"Response content: {response.text}")
+            return None
+
+        data = response.json()
+        tier = data.get('data', {}).get('tier')
+        if not tier or 'cost' not in tier:
+            bosta_logger.error(f"Unexpected response format: {data}")
+            return None
+        return tier
+
     def get_cod_fee(self, base_cost):
         """Calculate cash on delivery fee based on the base shipping cost"""
         # Bosta typically charges 1% of the shipping cost for COD, minimum 10 EGP
@@ -809,12 +628,10 @@ class BostaShippingService:
     def track_shipment(self, tracking_number):
         """Track shipment status with Bosta"""
         try:
-            if not self.token and not self._login():
-                raise Exception("Failed to authenticate with Bosta")
-            
-            response = requests.get(
+            response = self._api(
+                'GET',
                 f"{self.base_url}/deliveries/tracking/{tracking_number}",
-                headers=self.headers
+                timeout=self.TIMEOUTS['tracking']
             )
             
             if response.status_code == 200:
@@ -829,13 +646,11 @@ class BostaShippingService:
     def cancel_shipping_order(self, delivery_id):
         """Cancel a delivery order with Bosta"""
         try:
-            if not self.token and not self._login():
-                raise Exception("Failed to authenticate with Bosta")
-
             # Call Bosta's terminate delivery API
-            response = requests.delete(
+            response = self._api(
+                'DELETE',
                 f"{self.base_url}/deliveries/business/{delivery_id}/terminate",
-                headers=self.headers
+                retries=0
             )
 
             if response.status_code == 200:
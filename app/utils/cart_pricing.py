@@ -0,0 +1,119 @@
+"""
+Cart pricing shared by the cart, coupon and checkout routes.
+
+CartPricing loads the user's cart lines together with their products in one
+joined query, looks up the applied coupon (if any), and turns that into a
+CartTotals result: line items, subtotal, coupon discount, shipping and grand
+total. for_request() memoizes the pricing per request so a route that needs
+the numbers several times (or calls helpers that do) only queries once.
+"""
+from collections import namedtuple
+from flask import g, session
+from flask_login import current_user
+from app.extensions import db
+from app.models.cart import Cart
+from app.models.coupon import Coupon
+
+# Sentinel: use the coupon code stored in the session
+SESSION_COUPON = object()
+
+
+class CartTotals(namedtuple('CartTotals', [
+        'items', 'item_count', 'subtotal', 'discount', 'shipping_cost', 'total', 'coupon'])):
+    """Priced cart
+
+    ``items`` are the Cart rows with ``product`` already loaded.
+    """
+    __slots__ = ()
+
+    def to_dict(self):
+        """Amounts for JSON responses"""
+        return {
+            'subtotal': self.subtotal,
+            'discount': self.discount,
+            'shipping_cost': self.shipping_cost,
+            'total': self.total
+        }
+
+
+class CartPricing:
+    """Prices one user's cart
+
+    Args:
+        user_id (int): Owner of the cart
+        coupon_code (str): Code of the applied coupon, or None
+    """
+
+    def __init__(self, user_id, coupon_code=None):
+        self.user_id = user_id
+        self.coupon_code = coupon_code
+        self._items = None
+        self._coupon = None
+
+    @classmethod
+    def for_request(cls, coupon_code=SESSION_COUPON):
+        """Get the current user's pricing, memoized for the rest of the request
+
+        Args:
+            coupon_code: Coupon code to price with; defaults to the one
+                applied in the session
+        """
+        if coupon_code is SESSION_COUPON:
+            coupon_code = session.get('coupon_code')
+        memo = g.setdefault('cart_pricing', {})
+        key = (current_user.id, coupon_code)
+        if key not in memo:
+            memo[key] = cls(current_user.id, coupon_code)
+        return memo[key]
+
+    @staticmethod
+    def invalidate():
+        """Drop memoized pricing after the cart changed in this request"""
+        g.pop('cart_pricing', None)
+
+    @property
+    def items(self):
+        """Cart rows with their products, loaded in a single joined query"""
+        if self._items is None:
+            self._items = Cart.query.filter_by(user_id=self.user_id)\
+                .join(Cart.product)\
+                .options(db.contains_eager(Cart.product))\
+                .order_by(Cart.id)\
+                .all()
+        return self._items
+
+    @property
+    def coupon(self):
+        """The applied Coupon, or None if no (existing) coupon is applied"""
+        if self._coupon is None and self.coupon_code:
+            self._coupon = Coupon.query.filter_by(code=self.coupon_code).first() or False
+        return self._coupon or None
+
+    @property
+    def subtotal(self):
+        return sum(item.product.price * item.quantity for item in self.items)
+
+    def totals(self, shipping_cost=0.0):
+        """Price the cart
+
+        Args:
+            shipping_cost (float): Shipping charged for the order
+
+        Returns:
+            CartTotals
+        """
+        items = self.items
+        subtotal = self.subtotal
+        coupon = self.coupon
+        discount = 0
+        if coupon and items:
+            discount = coupon.calculate_discount(subtotal, shipping_cost)
+        return CartTotals(
+            items=items,
+            item_count=sum(item.quantity for item in items),
+            subtotal=subtotal,
+            discount=discount,
+            shipping_cost=shipping_cost,
+            total=subtotal + shipping_cost - discount,
+            coupon=coupon
+        )
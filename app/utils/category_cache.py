@@ -0,0 +1,62 @@
+"""
+Per-worker cache of the category list shown in the navigation and shop.
+
+Categories only change through the admin, which bumps the ``categories``
+catalog version in the same transaction. Each worker keeps a read-only
+snapshot of the list together with the version it was loaded at, and only
+re-reads the (single-row) counter every ``CATALOG_VERSION_CHECK_INTERVAL``
+seconds. Requests in between run no category queries at all.
+"""
+import time
+from collections import namedtuple
+from flask import current_app
+from app.models.category import Category, CatalogVersion
+
+CATEGORIES_VERSION = 'categories'
+
+# Detached, immutable stand-in for Category rows, safe to share between
+# requests and threads
+CachedCategory = namedtuple('CachedCategory', ['id', 'name', 'description', 'slug'])
+
+
+def get_categories():
+    """Get all categories, from the worker's cache when it is current
+
+    Returns:
+        list: CachedCategory tuples ordered by id
+    """
+    cache = current_app.extensions.get('category_cache')
+    now = time.monotonic()
+    interval = current_app.config.get('CATALOG_VERSION_CHECK_INTERVAL', 5)
+
+    if cache and now - cache['checked_at'] < interval:
+        return cache['categories']
+
+    version = CatalogVersion.current(CATEGORIES_VERSION)
+    if cache and cache['version'] == version:
+        categories = cache['categories']
+    else:
+        categories = [
+            CachedCategory(c.id, c.name, c.description, c.slug)
+            for c in Category.query.order_by(Category.id)
+        ]
+
+    # Replace rather than mutate so concurrent readers see a consistent entry
+    current_app.extensions['category_cache'] = {
+        'version': version,
+        'categories': categories,
+        'checked_at': now,
+    }
+    return categories
+
+
+def invalidate_categories():
+    """Record a category change
+
+    Bumps the shared version (committed with the caller's transaction) so
+    every worker reloads, and makes this worker re-check on its next read.
+    """
+    CatalogVersion.bump(CATEGORIES_VERSION)
+    cache = current_app.extensions.get('category_cache')
+    if cache:
+        current_app.extensions['category_cache'] = dict(cache, checked_at=float('-inf'))
@@ -0,0 +1,169 @@
+"""
+Draft checkouts and cleanup of abandoned orders.
+
+Viewing the checkout page no longer writes to the database. The priced
+cart is kept as a CheckoutDraft in the user's session and only becomes an
+Order when the customer submits it (placing a COD order or opening the
+PayMob payment frame).
+
+Orders created from a draft are flagged ``is_draft`` until they are paid
+for. sweep_abandoned_orders() bulk-deletes the old unpaid ones, and the
+ones the old checkout page created on every visit (flagged by the
+migration that added the column).
+"""
+import secrets
+from datetime import datetime, timedelta
+from flask import session, current_app
+from sqlalchemy import delete, exists
+from app.extensions import db
+from app.models.order import Order, OrderItem
+from app.models.inventory import StockReservation
+from app.models.sales_rollup import discard_orders
+from app.models.shipping import ShippingQuote
+from app.utils.inventory import release_holds
+
+SESSION_KEY = 'checkout_draft'
+
+
+class CheckoutDraft:
+    """A priced cart waiting to be turned into an Order
+
+    Attributes:
+        token (str): Identifies the draft in requests from the checkout page
+        items (list): ``[product_id, quantity, unit_price]`` lines
+        order_id (int): Order created from the draft, once submitted
+    """
+
+    def __init__(self, token, items, subtotal, discount, created_at, order_id=None):
+        self.token = token
+        self.items = items
+        self.subtotal = subtotal
+        self.discount = discount
+        self.created_at = created_at
+        self.order_id = order_id
+
+    @classmethod
+    def start(cls, totals):
+        """Store a fresh draft for the given CartTotals in the session
+
+        An unchanged cart keeps its existing draft (and token), so reloading
+        the checkout page doesn't orphan an order already created from it.
+        """
+        items = [[item.product_id, item.quantity, item.product.price] for item in totals.items]
+        draft = cls.load()
+        if draft and draft.items == items and draft.discount == totals.discount:
+            return draft
+        draft = cls(secrets.token_urlsafe(16), items, totals.subtotal, totals.discount,
+                    datetime.utcnow().isoformat())
+        draft.save()
+        return draft
+
+    @classmethod
+    def load(cls, token=None):
+        """Get the session's draft, optionally requiring a matching token
+
+        Returns:
+            CheckoutDraft or None if missing, expired or not matching
+        """
+        data = session.get(SESSION_KEY)
+        if not data or (token is not None and data.get('token') != token):
+            return None
+        max_age = timedelta(minutes=current_app.config.get('CHECKOUT_DRAFT_MINUTES', 60))
+        if datetime.utcnow() - datetime.fromisoformat(data['created_at']) > max_age:
+            session.pop(SESSION_KEY, None)
+            return None
+        return cls(**data)
+
+    def save(self):
+        session[SESSION_KEY] = {
+            'token': self.token,
+            'items': self.items,
+            'subtotal': self.subtotal,
+            'discount': self.discount,
+            'created_at': self.created_at,
+            'order_id': self.order_id,
+        }
+
+    @staticmethod
+    def clear():
+        session.pop(SESSION_KEY, None)
+
+    def to_order(self, user_id, shipping_address_id, shipping_cost=0.0, payment_method='card'):
+        """Create (or refresh) the pending Order for this draft
+
+        Submitting the same draft again, e.g. after switching the shipping
+        address, updates the order created the first time instead of adding
+        another one. The caller commits.
+        """
+        order = None
+        if self.order_id:
+            order = Order.query.filter_by(id=self.order_id, user_id=user_id,
+                                          status='pending', payment_status='pending').first()
+        if order is None:
+            order = Order(user_id=user_id, status='pending', payment_status='pending', is_draft=True)
+            for product_id, quantity, price in self.items:
+                order.items.append(OrderItem(product_id=product_id, quantity=quantity, price=price))
+            db.session.add(order)
+
+        if order.shipping_address_id != shipping_address_id:
+            # The payment key carries the old address as billing data
+            order.paymob_payment_key = None
+        order.payment_method = payment_method
+        order.shipping_address_id = shipping_address_id
+        order.subtotal = self.subtotal
+        order.shipping_cost = shipping_cost
+        order.discount = self.discount
+        order.total = self.subtotal + shipping_cost - self.discount
+        db.session.flush()
+
+        self.order_id = order.id
+        self.save()
+        return order
+
+
+def abandoned_orders_query(older_than):
+    """Unpaid draft orders created before ``older_than``
+
+    Orders holding stock that was committed to them are left alone, so
+    sweeping can never lose sold stock.
+    """
+    committed = exists().where(StockReservation.order_id == Order.id, StockReservation.expires_at.is_(None))
+    return db.session.query(Order.id).filter(
+        Order.is_draft.is_(True),
+        Order.status == 'pending',
+        Order.payment_status.in_(['pending', 'failed']),
+        Order.paymob_payment_id.is_(None),
+        Order.stripe_payment_id.is_(None),
+        Order.delivery_order_id.is_(None),
+        Order.date_created < older_than,
+        ~committed
+    )
+
+
+def sweep_abandoned_orders(hours=24, dry_run=False):
+    """Bulk-delete abandoned draft orders and their dependent rows
+
+    Args:
+        hours (int): Only orders older than this are touched
+        dry_run (bool): Count the orders without deleting anything
+
+    Returns:
+        int: Number of orders (that would be) deleted
+    """
+    older_than = datetime.utcnow() - timedelta(hours=hours)
+    order_ids = abandoned_orders_query(older_than)
+    count = order_ids.count()
+    if dry_run or not count:
+        return count
+
+    # Held stock goes back to the shelf first; none of these orders has
+    # committed stock, so no reservations are left after that
+    ids = order_ids.scalar_subquery()
+    release_holds(ids)
+    # Bulk deletes bypass the listener that maintains the sales rollups
+    discard_orders(ids)
+    for model in (ShippingQuote, OrderItem):
+        db.session.execute(delete(model).where(model.order_id.in_(ids)).execution_options(synchronize_session=False))
+    db.session.execute(delete(Order).where(Order.id.in_(ids)).execution_options(synchronize_session=False))
+    db.session.commit()
+    return count
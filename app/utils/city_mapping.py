@@ -1,44 +1,143 @@
 """
-City mapping utilities for shipping services.
-This module provides city code mappings for various shipping carriers.
+City name resolution for shipping.
+
+Addresses carry free-text city names: English, Arabic, an alias or a
+different spelling. CITIES is the one table of Bosta governorates; at import
+time it is turned into a hash index over normalized keys (casefolded English
+names and aliases, and Arabic names with alef/hamza, ta marbuta and ya
+variants and diacritics folded), so resolving a name is a single dict
+lookup. Names that still don't match fall back to a bounded fuzzy match
+whose results are memoized.
 """
+import difflib
+import re
+from functools import lru_cache
 
-class BostaCityMapping:
-    """
-    Maps city names to Bosta city codes.
-    Used for shipping cost calculations and address validation.
+CITIES = {
+    'Cairo': {'ar': 'القاهرة', 'code': 'EG-01'},
+    'Sohag': {'ar': 'سوهاج', 'code': 'EG-18'},
+    'Alexandria': {'ar': 'الإسكندرية', 'code': 'EG-02'},
+    'Menya': {'ar': 'المنيا', 'aliases': ['Minya'], 'code': 'EG-19'},
+    'Dakahlia': {'ar': 'الدقهلية', 'code': 'EG-05'},
+    'Luxor': {'ar': 'الأقصر', 'code': 'EG-22'},
+    'Behira': {'ar': 'البحيرة', 'aliases': ['Beheira'], 'code': 'EG-04'},
+    'Ismailia': {'ar': 'الإسماعيلية', 'aliases': ['Isamilia'], 'code': 'EG-11'},
+    'Assuit': {'ar': 'أسيوط', 'aliases': ['Asyut'], 'code': 'EG-17'},
+    'Aswan': {'ar': 'أسوان', 'code': 'EG-21'},
+    'Suez': {'ar': 'السويس', 'code': 'EG-12'},
+    'Monufia': {'ar': 'المنوفية', 'aliases': ['Menofia'], 'code': 'EG-09'},
+    'Sharqia': {'ar': 'الشرقية', 'code': 'EG-10'},
+    'Gharbia': {'ar': 'الغربية', 'code': 'EG-07'},
+    'Kafr Alsheikh': {'ar': 'كفر الشيخ', 'aliases': ['Kafr Al-Sheikh'], 'code': 'EG-08'},
+    'El Kalioubia': {'ar': 'القليوبية', 'aliases': ['Qalyubia'], 'code': 'EG-06'},
+    'North Coast': {'ar': 'الساحل الشمالي', 'code': 'EG-03'},
+    'Qena': {'ar': 'قنا', 'code': 'EG-20'},
+    'Bani Suif': {'ar': 'بني سويف', 'aliases': ['Beni Suef'], 'code': 'EG-16'},
+    'Damietta': {'ar': 'دمياط', 'code': 'EG-14'},
+    'Red Sea': {'ar': 'البحر الأحمر', 'code': 'EG-23'},
+    'Fayoum': {'ar': 'الفيوم', 'aliases': ['Faiyum'], 'code': 'EG-15'},
+    'Port Said': {'ar': 'بور سعيد', 'code': 'EG-13'},
+    'New Valley': {'ar': 'الوادى الجديد', 'code': 'EG-24'},
+    'Giza': {'ar': 'الجيزة', 'code': 'EG-25'},
+    'Matrouh': {'ar': 'مرسى مطروح', 'code': 'EG-28'},
+    'North Sinai': {'ar': 'شمال سيناء', 'code': 'EG-27'},
+    'South Sinai': {'ar': 'جنوب سيناء', 'code': 'EG-26'}
+}
+
+# Fuzzy matching only considers inputs up to this long and this similar
+FUZZY_MAX_LENGTH = 40
+FUZZY_CUTOFF = 0.85
+
+_ARABIC_FOLDS = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ؤ': 'و', 'ئ': 'ي',
+    'ة': 'ه',
+    'ى': 'ي',
+})
+# Harakat, superscript alef and tatweel
+_ARABIC_MARKS = re.compile('[\u064b-\u065f\u0670\u0640]')
+_SEPARATORS = re.compile(r'[\s\-_.]+')
+
+
+def normalize_arabic(text):
+    """Fold Arabic spelling variants and strip diacritics"""
+    return _ARABIC_MARKS.sub('', text).translate(_ARABIC_FOLDS)
+
+
+def city_key(name):
+    """Normalized lookup key for a city name in any supported form"""
+    if not name:
+        return None
+    key = _SEPARATORS.sub(' ', normalize_arabic(name.strip()).casefold()).strip()
+    return key or None
+
+
+def _build_index():
+    index = {}
+    for city, data in CITIES.items():
+        for name in [city, data['ar'], data['code']] + data.get('aliases', []):
+            index.setdefault(city_key(name), city)
+    return index
+
+
+_INDEX = _build_index()
+_KEYS = list(_INDEX)
+
+
+@lru_cache(maxsize=1024)
+def _fuzzy_match(key):
+    if len(key) > FUZZY_MAX_LENGTH:
+        return None
+    matches = difflib.get_close_matches(key, _KEYS, n=1, cutoff=FUZZY_CUTOFF)
+    return _INDEX[matches[0]] if matches else None
+
+
+def resolve_city(city_name, fuzzy=True):
+    """Get the standard English name of a city
+
+    Args:
+        city_name (str): English or Arabic name, code or alias
+        fuzzy (bool): Also accept close misspellings
+
+    Returns:
+        str or None if the city is unknown
     """
-    
-    # Mapping of city names to Bosta city codes
-    CITY_MAPPING = {
-        'Cairo': 'CAI',
-        'Alexandria': 'ALX',
-        'Giza': 'GIZ',
-        'Port Said': 'PSD',
-        'Suez': 'SUZ',
-        'Luxor': 'LXR',
-        'Aswan': 'ASW',
-        'Ismailia': 'ISM',
-        'Hurghada': 'HRG',
-        'Sharm El Sheikh': 'SSH',
-        'Mansoura': 'MNS',
-        'Tanta': 'TNT',
-        'Damietta': 'DMT',
-        'Fayoum': 'FYM',
-        'Zagazig': 'ZAG',
-        'Asyut': 'ASY',
-        'Beni Suef': 'BSF',
-        'Sohag': 'SOH',
-        'Qena': 'QEN',
-        'Minya': 'MNA'
-    }
+    key = city_key(city_name)
+    if not key:
+        return None
+    city = _INDEX.get(key)
+    if city is None and fuzzy:
+        city = _fuzzy_match(key)
+    return city
+
+
+def get_city_code(city_name):
+    """Get the Bosta city code (e.g. ``EG-01``) for a city name"""
+    city = resolve_city(city_name)
+    return CITIES[city]['code'] if city else None
+
+
+def is_valid_city(city_name):
+    """Check if a city name resolves to a supported city"""
+    return resolve_city(city_name) is not None
 
-    @classmethod
-    def get_code(cls, city_name):
-        """Get the Bosta city code for a given city name"""
-        return cls.CITY_MAPPING.get(city_name)
+
+class BostaCityMapping:
+    """Class interface to the city resolver used by forms and services"""
+
+    CITIES = CITIES
 
     @classmethod
     def get_city_choices(cls):
         """Get list of city choices for forms"""
-        return sorted(cls.CITY_MAPPING.keys())
+        return [(city, f"{city} ({data['ar']})") for city, data in sorted(CITIES.items())]
+
+    @classmethod
+    def get_code(cls, city_name):
+        """Get city code for a given city name"""
+        return get_city_code(city_name)
+
+    @classmethod
+    def normalize_name(cls, city_name):
+        """Normalize city name to standard English form"""
+        return resolve_city(city_name)
@@ -0,0 +1,45 @@
+"""
+Per-request cart and wishlist counters for the current user.
+
+The navbar badges, ``/api/counts`` and the cart/wishlist JSON endpoints all
+need the same two numbers. get_user_counts() fetches both in one query the
+first time they are needed in a request and reuses the result afterwards.
+Endpoints that change the cart or wishlist call invalidate_user_counts()
+after committing so the next read reflects the write.
+"""
+from collections import namedtuple
+from flask import g
+from flask_login import current_user
+from sqlalchemy import func, select
+from app.extensions import db
+from app.models.cart import Cart
+from app.models.wishlist import Wishlist
+
+UserCounts = namedtuple('UserCounts', ['cart', 'wishlist'])
+
+EMPTY_COUNTS = UserCounts(0, 0)
+
+
+def get_user_counts():
+    """Get the current user's cart quantity and wishlist size
+
+    Returns:
+        UserCounts: (cart, wishlist); zeros for anonymous users
+    """
+    if not current_user.is_authenticated:
+        return EMPTY_COUNTS
+
+    counts = g.get('user_counts')
+    if counts is None:
+        cart_total = select(func.coalesce(func.sum(Cart.quantity), 0))\
+            .where(Cart.user_id == current_user.id).scalar_subquery()
+        wishlist_total = select(func.count(Wishlist.id))\
+            .where(Wishlist.user_id == current_user.id).scalar_subquery()
+        cart, wishlist = db.session.execute(select(cart_total, wishlist_total)).one()
+        counts = g.user_counts = UserCounts(int(cart), int(wishlist))
+    return counts
+
+
+def invalidate_user_counts():
+    """Forget the counts read so far in this request"""
+    g.pop('user_counts', None)
@@ -1,33 +1,171 @@
+"""
+Outgoing email.
+
+Messages are rendered when they are queued: send_email() stores the
+finished message in the ``email_outbox`` table as part of the caller's
+transaction and makes sure an ``email.drain`` job is queued. The job
+worker then sends the outbox in batches, each over a single SMTP
+connection, so a burst of order confirmations costs a handful of SMTP
+sessions and TLS handshakes instead of one per message.
+
+Config:
+    MAIL_BATCH_SIZE: messages sent per SMTP connection
+    MAIL_RATE_LIMIT: messages per second, 0 for no limit
+    MAIL_BATCH_DELAY: seconds the drain job waits so a burst shares batches
+    MAIL_MAX_ATTEMPTS: rejections before a message is marked failed
+    MAIL_RETRY_DELAY: seconds before a rejected message is tried again,
+        doubled after each further rejection
+"""
+import smtplib
+import time
+from datetime import datetime, timedelta
 from flask import current_app, render_template
-from flask_mail import Message
-from threading import Thread
-from app.extensions import mail
-
-def send_async_email(app, msg):
-    with app.app_context():
-        mail.send(msg)
-
-def send_email(subject, sender, recipients, text_body, html_body):
-    msg = Message(subject, sender=sender, recipients=recipients)
-    msg.body = text_body
-    msg.html = html_body
-    Thread(target=send_async_email, args=(current_app._get_current_object(), msg)).start()
-
-def send_password_reset_email(user):
-    token = user.get_reset_password_token()
+from flask_mail import BadHeaderError
+from sqlalchemy import func, or_
+from app.extensions import db, mail
+from app.models.email_outbox import OutboxEmail
+from app.models.job import Job
+from app.utils.jobs import enqueue, job_handler
+
+DRAIN_JOB = 'email.drain'
+
+# Errors that concern one message; anything else (a dropped connection, a
+# failed login) aborts the batch and the drain job is retried
+MESSAGE_ERRORS = (
+    smtplib.SMTPRecipientsRefused,
+    smtplib.SMTPSenderRefused,
+    smtplib.SMTPDataError,
+    BadHeaderError,
+    AssertionError,
+)
+
+
+def send_email(subject, sender, recipients, text_body, html_body=None):
+    """Add an email to the outbox; the caller commits
+
+    Returns:
+        OutboxEmail
+    """
+    email = OutboxEmail(subject=subject, sender=sender, recipients=list(recipients),
+                        text_body=text_body, html_body=html_body, status='queued')
+    db.session.add(email)
+    schedule_drain()
+    return email
+
+
+def schedule_drain(delay=None):
+    """Queue a drain job unless one is already waiting to run"""
+    if delay is None:
+        delay = current_app.config.get('MAIL_BATCH_DELAY', 0)
+    if Job.query.filter_by(type=DRAIN_JOB, status='queued').first() is None:
+        enqueue(DRAIN_JOB, delay=delay)
+
+
+@job_handler(DRAIN_JOB, max_attempts=10, concurrency=1)
+def drain_outbox(batch_size=None, rate_limit=None, max_batches=None):
+    """Send queued outbox messages in batches over reused SMTP connections
+
+    Args:
+        batch_size (int): Messages per connection, MAIL_BATCH_SIZE by default
+        rate_limit (float): Messages per second, MAIL_RATE_LIMIT by default
+        max_batches (int): Stop after this many batches
+
+    Returns:
+        int: Number of messages sent
+    """
+    config = current_app.config
+    batch_size = batch_size or config.get('MAIL_BATCH_SIZE', 50)
+    if rate_limit is None:
+        rate_limit = config.get('MAIL_RATE_LIMIT', 0)
+    throttle = _Throttle(rate_limit)
+
+    sent = batches = 0
+    now = datetime.utcnow()
+    while max_batches is None or batches < max_batches:
+        # A rejected message waits out its backoff, so it is tried at most
+        # once per drain
+        batch = (OutboxEmail.query
+                 .filter(OutboxEmail.status == 'queued',
+                         or_(OutboxEmail.next_attempt_at.is_(None), OutboxEmail.next_attempt_at <= now))
+                 .order_by(OutboxEmail.id).limit(batch_size).all())
+        if not batch:
+            break
+        batches += 1
+        try:
+            sent += _send_batch(batch, throttle)
+        finally:
+            # Keep what was sent even if the connection dropped mid-batch
+            db.session.commit()
+    if sent:
+        current_app.logger.info(f'Sent {sent} emails in {batches} batches')
+
+    # Drain again when the first rejected message is due
+    retry_at = db.session.query(func.min(OutboxEmail.next_attempt_at))\
+        .filter(OutboxEmail.status == 'queued').scalar()
+    if retry_at is not None:
+        schedule_drain(delay=max((retry_at - datetime.utcnow()).total_seconds(), 0))
+        db.session.commit()
+    return sent
+
+
+def _send_batch(batch, throttle):
+    sent = 0
+    max_attempts = current_app.config.get('MAIL_MAX_ATTEMPTS', 3)
+    retry_delay = current_app.config.get('MAIL_RETRY_DELAY', 300)
+    with mail.connect() as connection:
+        for email in batch:
+            throttle.wait()
+            try:
+                connection.send(email.to_message())
+            except MESSAGE_ERRORS as e:
+                email.attempts += 1
+                email.last_error = f'{type(e).__name__}: {str(e)}'[:2000]
+                if email.attempts >= max_attempts:
+                    email.status = 'failed'
+                    current_app.logger.error(f'Giving up on email {email.id} to {email.recipients}: {str(e)}')
+                else:
+                    email.next_attempt_at = datetime.utcnow() + \
+                        timedelta(seconds=retry_delay * 2 ** (email.attempts - 1))
+                continue
+            db.session.delete(email)
+            sent += 1
+    return sent
+
+
+class _Throttle:
+    """Spaces calls to wait() at least 1/rate seconds apart"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0
+        self.next_at = 0
+
+    def wait(self):
+        if not self.interval:
+            return
+        now = time.monotonic()
+        if now < self.next_at:
+            time.sleep(self.next_at - now)
+            now = self.next_at
+        self.next_at = now + self.interval
+
+
+def send_reset_password_email(user, token):
     send_email(
         '[Flask Shop] Reset Your Password',
         sender=current_app.config['MAIL_USERNAME'],
         recipients=[user.email],
         text_body=render_template('email/reset_password.txt', user=user, token=token),
-        html_body=render_template('email/reset_password.html', user=user, token=token)
+        html_body=render_template('email/reset_password.html', user=user, token=token,
+                                  year=datetime.utcnow().year)
     )
 
+
 def send_order_confirmation(order):
     send_email(
         '[Flask Shop] Order Confirmation',
         sender=current_app.config['MAIL_USERNAME'],
         recipients=[order.user.email],
         text_body=render_template('email/order_confirmation.txt', order=order),
-        html_body=render_template('email/order_confirmation.html', order=order)
+        html_body=render_template('email/order_confirmation.html', order=order,
+                                  year=datetime.utcnow().year)
     )
@@ -0,0 +1,292 @@
+"""
+Shared outbound HTTP layer for carrier and payment APIs.
+
+Every upstream (Bosta, PayMob, EgyPost) gets one HttpClient per worker
+process, holding a ``requests.Session`` whose keep-alive pool is reused
+across calls instead of opening a new TLS connection each time. A client
+adds:
+
+* a default (connect, read) timeout, overridable per call, so no request
+  can hang a worker indefinitely;
+* bounded retries with full jitter for idempotent requests that fail to
+  get a response (connection error, timeout) or get a 429/502/503/504;
+* a circuit breaker: after HTTP_BREAKER_THRESHOLD consecutive failures the
+  upstream is not called for HTTP_BREAKER_RESET seconds and requests fail
+  at once with CircuitOpenError (a ``requests`` ConnectionError, so
+  existing error handling and cached fallbacks apply), then one trial
+  request decides whether it closes again;
+* per-upstream request, error, retry and latency counters, see
+  upstream_stats().
+"""
+import random
+import threading
+import time
+from collections import Counter, deque
+from flask import current_app, has_app_context
+import requests
+from requests.adapters import HTTPAdapter
+
+# Requests that can safely be sent again
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'])
+# Responses worth retrying after a pause
+RETRY_STATUSES = frozenset([429, 502, 503, 504])
+# Longest pause between retries, in seconds
+MAX_BACKOFF = 5
+
+DEFAULTS = {
+    'HTTP_TIMEOUT': (3.05, 15),
+    'HTTP_RETRIES': 2,
+    'HTTP_BACKOFF': 0.3,
+    'HTTP_POOL_SIZE': 10,
+    'HTTP_BREAKER_THRESHOLD': 5,
+    'HTTP_BREAKER_RESET': 30,
+}
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised instead of calling an upstream whose circuit is open"""
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker
+
+    Args:
+        threshold (int): Consecutive failures that open the circuit
+        reset_timeout (float): Seconds the circuit stays open before a
+            single trial request is let through
+    """
+
+    def __init__(self, threshold=5, reset_timeout=30):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self._opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return 'closed'
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                return 'open'
+            return 'half_open'
+
+    def allow(self):
+        """Whether a request may be sent now"""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_timeout or self._trial:
+                return False
+            self._trial = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial or self.failures >= self.threshold:
+                self._opened_at = time.monotonic()
+            self._trial = False
+
+
+class UpstreamMetrics:
+    """Request counters and latencies for one upstream
+
+    Args:
+        window (int): Recent latencies kept for the percentile
+    """
+
+    def __init__(self, window=512):
+        self._lock = threading.Lock()
+        self._counts = dict.fromkeys(['requests', 'errors', 'retries', 'short_circuited'], 0)
+        self._statuses = Counter()
+        self._latency_total = 0.0
+        self._latency_max = 0.0
+        self._recent = deque(maxlen=window)
+
+    def count(self, name):
+        with self._lock:
+            self._counts[name] += 1
+
+    def observe(self, seconds, status=None, error=False):
+        """Record one completed (or failed) request"""
+        with self._lock:
+            self._counts['requests'] += 1
+            if error:
+                self._counts['errors'] += 1
+            self._statuses[str(status) if status else 'error'] += 1
+            self._latency_total += seconds
+            self._latency_max = max(self._latency_max, seconds)
+            self._recent.append(seconds)
+
+    def snapshot(self):
+        with self._lock:
+            recent = sorted(self._recent)
+            requests_made = self._counts['requests']
+            return dict(
+                self._counts,
+                statuses=dict(self._statuses),
+                latency_avg_ms=round(1000 * self._latency_total / requests_made, 1) if requests_made else 0.0,
+                latency_p95_ms=round(1000 * recent[int(0.95 * (len(recent) - 1))], 1) if recent else 0.0,
+                latency_max_ms=round(1000 * self._latency_max, 1),
+            )
+
+
+class HttpClient:
+    """Pooled, timed, retrying and circuit-broken client for one upstream
+
+    Args:
+        name (str): Upstream name used in errors and metrics
+        timeout (tuple): Default (connect, read) timeout in seconds
+        retries (int): Retries for idempotent requests
+        backoff (float): Base of the exponential backoff, in seconds
+        pool_size (int): Keep-alive connections kept per host
+        breaker (CircuitBreaker): Defaults to one with default settings
+        session (requests.Session): Session to send requests with; one with
+            a ``pool_size`` connection pool is created when omitted
+    """
+
+    def __init__(self, name, timeout=(3.05, 15), retries=2, backoff=0.3, pool_size=10,
+                 breaker=None, session=None):
+        self.name = name
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.breaker = breaker or CircuitBreaker()
+        self.metrics = UpstreamMetrics()
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+        self.session = session
+
+    def _pause(self, attempt):
+        """Full-jitter exponential backoff before retry number ``attempt``"""
+        time.sleep(random.uniform(0, min(MAX_BACKOFF, self.backoff * 2 ** (attempt - 1))))
+
+    def request(self, method, url, timeout=None, retries=None, **kwargs):
+        """Send a request through the pool
+
+        Args:
+            method (str): HTTP method
+            url (str): Full URL
+            timeout: (connect, read) seconds for this call; defaults to the
+                client's
+            retries (int): Overrides the retry count; non-idempotent
+                requests are not retried unless given one
+            **kwargs: Passed on to ``requests.Session.request``
+
+        Returns:
+            requests.Response: The last response, whatever its status
+
+        Raises:
+            CircuitOpenError: The upstream's circuit is open
+            requests.exceptions.RequestException: The request failed on its
+                last attempt
+        """
+        method = method.upper()
+        if retries is None:
+            retries = self.retries if method in IDEMPOTENT_METHODS else 0
+
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                self.metrics.count('short_circuited')
+                raise CircuitOpenError(f'{self.name} is unavailable (circuit open)')
+
+            started = time.monotonic()
+            try:
+                response = self.session.request(method, url, timeout=timeout or self.timeout, **kwargs)
+            except requests.exceptions.RequestException:
+                self.metrics.observe(time.monotonic() - started, error=True)
+                self.breaker.record_failure()
+                if attempt >= retries:
+                    raise
+            except Exception:
+                # Anything else still counts, so a half-open trial always ends
+                self.metrics.observe(time.monotonic() - started, error=True)
+                self.breaker.record_failure()
+                raise
+            else:
+                failed = response.status_code >= 500
+                self.metrics.observe(time.monotonic() - started, response.status_code, error=failed)
+                if failed:
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+                if response.status_code not in RETRY_STATUSES or attempt >= retries:
+                    return response
+                response.close()
+
+            attempt += 1
+            self.metrics.count('retries')
+            self._pause(attempt)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request('DELETE', url, **kwargs)
+
+    def stats(self):
+        return dict(self.metrics.snapshot(), circuit=self.breaker.state)
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def _setting(name):
+    if has_app_context():
+        return current_app.config.get(name, DEFAULTS[name])
+    return DEFAULTS[name]
+
+
+def get_client(name, session_factory=None):
+    """The worker's client for an upstream, created from config on first use
+
+    Args:
+        name (str): Upstream name, e.g. ``bosta``
+        session_factory (callable): Builds the session for a new client,
+            for upstreams that need a special one
+    """
+    client = _clients.get(name)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(name)
+            if client is None:
+                client = _clients[name] = HttpClient(
+                    name,
+                    timeout=tuple(_setting('HTTP_TIMEOUT')),
+                    retries=_setting('HTTP_RETRIES'),
+                    backoff=_setting('HTTP_BACKOFF'),
+                    pool_size=_setting('HTTP_POOL_SIZE'),
+                    breaker=CircuitBreaker(_setting('HTTP_BREAKER_THRESHOLD'), _setting('HTTP_BREAKER_RESET')),
+                    session=session_factory() if session_factory else None
+                )
+    return client
+
+
+def upstream_stats():
+    """Metrics and circuit state of every upstream this worker has called"""
+    return {name: client.stats() for name, client in sorted(_clients.items())}
+
+
+def reset_clients():
+    """Drop every client, closing its connections"""
+    with _clients_lock:
+        for client in _clients.values():
+            client.session.close()
+        _clients.clear()
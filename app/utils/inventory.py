@@ -0,0 +1,176 @@
+"""
+Stock reservation for checkout.
+
+Stock is taken from ``products.stock`` with a single conditional UPDATE
+(``stock = stock - q WHERE stock >= q``), so two concurrent checkouts can
+never both get the last unit and no row is locked across statements. What
+was taken is recorded in ``stock_reservations``:
+
+* hold_order_stock() takes stock for an order that is waiting for payment
+  and records temporary holds that expire after STOCK_RESERVATION_MINUTES.
+* commit_order_stock() turns the order's holds into permanent reservations,
+  taking stock for anything that was never held or whose hold lapsed.
+* release_order_stock() gives back everything recorded for an order
+  (cancellation, failed payment).
+* release_expired() gives back all lapsed holds in bulk.
+
+Releases delete the reservation rows with ``DELETE ... RETURNING`` before
+adding stock back, so a row can only ever be released once even when a
+release races a commit or another release.
+
+None of these functions commit; callers commit or roll back the whole
+checkout step.
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import update, delete
+from app.extensions import db
+from app.models.product import Product
+from app.models.inventory import StockReservation
+
+
+class InsufficientStockError(ValueError):
+    """Raised when a product does not have enough stock left to hold"""
+
+    def __init__(self, product_id, quantity):
+        self.product_id = product_id
+        self.quantity = quantity
+        super().__init__(f'Not enough stock for product {product_id} (wanted {quantity})')
+
+
+def _order_quantities(order):
+    """Quantity per product for an order's items"""
+    quantities = defaultdict(int)
+    for item in order.items:
+        quantities[item.product_id] += item.quantity
+    return quantities
+
+
+def take_stock(product_id, quantity):
+    """Subtract stock if (and only if) enough is left
+
+    Returns:
+        bool: True if the stock was taken
+    """
+    result = db.session.execute(
+        update(Product)
+        .where(Product.id == product_id, Product.stock >= quantity)
+        .values(stock=Product.stock - quantity)
+    )
+    return result.rowcount == 1
+
+
+def _return_stock(quantities):
+    """Add released quantities back, one UPDATE per product"""
+    for product_id, quantity in quantities.items():
+        db.session.execute(
+            update(Product)
+            .where(Product.id == product_id)
+            .values(stock=Product.stock + quantity)
+        )
+
+
+def _release(*criteria):
+    """Delete matching reservations and give their stock back
+
+    Returns:
+        int: Number of reservations released
+    """
+    rows = db.session.execute(
+        delete(StockReservation)
+        .where(*criteria)
+        .returning(StockReservation.product_id, StockReservation.quantity)
+        .execution_options(synchronize_session=False)
+    ).all()
+    quantities = defaultdict(int)
+    for product_id, quantity in rows:
+        quantities[product_id] += quantity
+    _return_stock(quantities)
+    return len(rows)
+
+
+def hold_order_stock(order, minutes=None):
+    """Hold stock for an order that is about to be paid for
+
+    Any earlier holds for the order are released first, so calling this
+    again (e.g. the customer retries payment) refreshes the expiry.
+
+    Raises:
+        InsufficientStockError: if any product is short; the caller must
+            roll back to undo the holds already taken
+    """
+    if minutes is None:
+        minutes = current_app.config.get('STOCK_RESERVATION_MINUTES', 15)
+    release_expired()
+    _release(StockReservation.order_id == order.id, StockReservation.expires_at.isnot(None))
+
+    expires_at = datetime.utcnow() + timedelta(minutes=minutes)
+    for product_id, quantity in _order_quantities(order).items():
+        if not take_stock(product_id, quantity):
+            raise InsufficientStockError(product_id, quantity)
+        db.session.add(StockReservation(order.id, product_id, quantity, expires_at))
+
+
+def commit_order_stock(order):
+    """Make the order's stock reservation permanent
+
+    Live holds are committed as they are; products that were never held,
+    or whose hold already lapsed, are taken now with a conditional UPDATE.
+
+    Returns:
+        dict: product_id -> quantity that could not be taken (empty if the
+        whole order is covered)
+    """
+    db.session.execute(
+        update(StockReservation)
+        .where(StockReservation.order_id == order.id, StockReservation.expires_at.isnot(None))
+        .values(expires_at=None)
+        .execution_options(synchronize_session=False)
+    )
+    covered = defaultdict(int)
+    for product_id, quantity in db.session.query(StockReservation.product_id, StockReservation.quantity)\
+            .filter(StockReservation.order_id == order.id):
+        covered[product_id] += quantity
+
+    shortfalls = {}
+    for product_id, quantity in _order_quantities(order).items():
+        missing = quantity - covered[product_id]
+        if missing <= 0:
+            continue
+        if take_stock(product_id, missing):
+            db.session.add(StockReservation(order.id, product_id, missing))
+        else:
+            shortfalls[product_id] = missing
+    return shortfalls
+
+
+def release_order_stock(order):
+    """Give back all stock held or committed for an order
+
+    Returns:
+        int: Number of reservations released
+    """
+    return _release(StockReservation.order_id == order.id)
+
+
+def release_holds(order_ids):
+    """Give back the stock of all holds (live or lapsed) for the given orders
+
+    Args:
+        order_ids: Order ids, or a subquery selecting them
+
+    Returns:
+        int: Number of holds released
+    """
+    return _release(StockReservation.order_id.in_(order_ids), StockReservation.expires_at.isnot(None))
+
+
+def release_expired(now=None):
+    """Give back the stock of every lapsed hold
+
+    Returns:
+        int: Number of holds released
+    """
+    now = now or datetime.utcnow()
+    return _release(StockReservation.expires_at.isnot(None), StockReservation.expires_at <= now)
@@ -0,0 +1,233 @@
+"""
+Durable background jobs.
+
+Work that talks to third parties (email, Bosta shipments, PayMob
+follow-ups) is queued as a row in the ``jobs`` table instead of being done
+during the request. enqueue() adds the row to the caller's transaction, so
+the job only exists if the change that asked for it is committed.
+
+A separate worker process (``scripts/run_worker.py``) claims due jobs and
+runs their handlers:
+
+* a claim is a conditional UPDATE, so only one worker wins a job; this
+  works the same on SQLite and Postgres without row locks;
+* a job type may cap how many of its jobs run at once across all
+  workers (``concurrency``), checked in the same UPDATE;
+* a failed job is retried after an exponential backoff with jitter, and
+  after ``max_attempts`` it is left with status ``dead`` (the dead-letter
+  list, see retry_dead_jobs());
+* a claim lapses after JOB_LOCK_TIMEOUT seconds, so jobs held by a worker
+  that died are picked up again.
+
+Handlers register with @job_handler in the modules listed in
+HANDLER_MODULES and are called with the job's payload as keyword
+arguments.
+"""
+import os
+import random
+import socket
+import time
+import uuid
+from collections import namedtuple
+from datetime import datetime, timedelta
+from importlib import import_module
+from flask import current_app
+from sqlalchemy import and_, delete, func, or_, select, update
+from app.extensions import db
+from app.models.job import Job
+
+# Modules defining job handlers, imported by the worker
+HANDLER_MODULES = ['app.utils.email', 'app.shipping.jobs']
+
+DEFAULT_MAX_ATTEMPTS = 5
+
+JobType = namedtuple('JobType', ['handler', 'max_attempts', 'concurrency'])
+ClaimedJob = namedtuple('ClaimedJob', ['id', 'type', 'payload', 'attempts'])
+
+_handlers = {}
+
+
+def job_handler(name, max_attempts=DEFAULT_MAX_ATTEMPTS, concurrency=None):
+    """Register a function as the handler of a job type
+
+    Args:
+        name (str): Job type, e.g. ``email.drain``
+        max_attempts (int): Attempts before the job is dead-lettered
+        concurrency (int): Jobs of this type running at once across all
+            workers; unlimited when None
+    """
+    def decorator(f):
+        _handlers[name] = JobType(f, max_attempts, concurrency)
+        return f
+    return decorator
+
+
+def load_handlers():
+    for module in HANDLER_MODULES:
+        import_module(module)
+    return _handlers
+
+
+def enqueue(name, key=None, delay=0, **payload):
+    """Queue a job as part of the current transaction; the caller commits
+
+    Args:
+        name (str): Job type
+        key (str): If an unfinished job with this key exists, it is
+            returned instead of queuing another one
+        delay (int): Seconds before the job may run
+        **payload: JSON-serializable arguments for the handler
+
+    Returns:
+        Job
+    """
+    if key is not None:
+        existing = Job.query.filter(Job.key == key, Job.status.in_(['queued', 'running'])).first()
+        if existing is not None:
+            return existing
+    job = Job(type=name, key=key, payload=payload, status='queued',
+              run_at=datetime.utcnow() + timedelta(seconds=delay))
+    db.session.add(job)
+    db.session.flush()
+    return job
+
+
+def backoff_seconds(attempts):
+    """Pause before retrying a job that failed ``attempts`` times"""
+    base = current_app.config.get('JOB_BACKOFF', 30)
+    cap = current_app.config.get('JOB_MAX_BACKOFF', 3600)
+    return random.uniform(0.5, 1.0) * min(cap, base * 2 ** (attempts - 1))
+
+
+def retry_dead_jobs(name=None):
+    """Queue dead-lettered jobs again with fresh attempts; the caller commits
+
+    Returns:
+        int: Number of jobs queued
+    """
+    query = update(Job).where(Job.status == 'dead')
+    if name:
+        query = query.where(Job.type == name)
+    result = db.session.execute(
+        query.values(status='queued', attempts=0, run_at=datetime.utcnow(), last_error=None)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount
+
+
+class Worker:
+    """Claims and runs due jobs; use inside an application context
+
+    Args:
+        name (str): Identifies the worker's claims; defaults to host, pid
+            and a random suffix
+        poll_interval (float): Seconds to sleep when no job is due
+        lock_timeout (int): Seconds a claimed job belongs to this worker
+        batch_size (int): Due jobs considered per claim attempt
+    """
+
+    def __init__(self, name=None, poll_interval=None, lock_timeout=None, batch_size=20):
+        config = current_app.config
+        self.name = name or f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}'
+        self.poll_interval = poll_interval or config.get('JOB_POLL_INTERVAL', 1.0)
+        self.lock_timeout = timedelta(seconds=lock_timeout or config.get('JOB_LOCK_TIMEOUT', 300))
+        self.batch_size = batch_size
+        self.handlers = load_handlers()
+
+    def claim(self):
+        """Claim the next due job, if any
+
+        Returns:
+            ClaimedJob or None
+        """
+        now = datetime.utcnow()
+        due = or_(
+            and_(Job.status == 'queued', Job.run_at <= now),
+            and_(Job.status == 'running', Job.locked_until < now)
+        )
+        candidates = db.session.query(Job.id, Job.type).filter(due).order_by(Job.run_at).limit(self.batch_size).all()
+        db.session.commit()
+
+        for job_id, job_type in candidates:
+            conditions = [Job.id == job_id, due]
+            spec = self.handlers.get(job_type)
+            if spec is not None and spec.concurrency:
+                running = select(func.count(Job.id)).where(
+                    Job.type == job_type, Job.status == 'running', Job.locked_until >= now
+                ).scalar_subquery()
+                conditions.append(running < spec.concurrency)
+            result = db.session.execute(
+                update(Job).where(*conditions)
+                .values(status='running', locked_by=self.name, locked_until=now + self.lock_timeout,
+                        attempts=Job.attempts + 1)
+                .execution_options(synchronize_session=False)
+            )
+            db.session.commit()
+            if result.rowcount == 1:
+                job = db.session.get(Job, job_id, populate_existing=True)
+                return ClaimedJob(job.id, job.type, dict(job.payload or {}), job.attempts)
+        return None
+
+    def run(self, job):
+        """Run a claimed job and record the outcome
+
+        Returns:
+            bool: Whether the job succeeded
+        """
+        spec = self.handlers.get(job.type)
+        try:
+            if spec is None:
+                raise LookupError(f'No handler for job type {job.type}')
+            spec.handler(**job.payload)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            self._failed(job, spec, e)
+            return False
+
+        db.session.execute(delete(Job).where(Job.id == job.id, Job.locked_by == self.name))
+        db.session.commit()
+        current_app.logger.info(f'Job {job.id} ({job.type}) done')
+        return True
+
+    def _failed(self, job, spec, error):
+        max_attempts = spec.max_attempts if spec else DEFAULT_MAX_ATTEMPTS
+        values = {
+            'locked_by': None,
+            'locked_until': None,
+            'last_error': f'{type(error).__name__}: {str(error)}'[:2000],
+        }
+        if job.attempts >= max_attempts:
+            values['status'] = 'dead'
+            current_app.logger.error(f'Job {job.id} ({job.type}) failed for good after {job.attempts} attempts: {str(error)}')
+        else:
+            values['status'] = 'queued'
+            values['run_at'] = datetime.utcnow() + timedelta(seconds=backoff_seconds(job.attempts))
+            current_app.logger.warning(f'Job {job.id} ({job.type}) failed, attempt {job.attempts}: {str(error)}')
+        db.session.execute(
+            update(Job).where(Job.id == job.id, Job.locked_by == self.name).values(**values)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+
+    def work(self, once=False, max_jobs=None):
+        """Run jobs until stopped
+
+        Args:
+            once (bool): Return when no job is due instead of waiting
+            max_jobs (int): Return after running this many jobs
+
+        Returns:
+            int: Number of jobs run
+        """
+        processed = 0
+        while max_jobs is None or processed < max_jobs:
+            job = self.claim()
+            if job is None:
+                if once:
+                    break
+                time.sleep(self.poll_interval)
+                continue
+            self.run(job)
+            processed += 1
+        return processed
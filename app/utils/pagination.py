@@ -0,0 +1,156 @@
+"""
+Keyset (cursor) pagination for product listings.
+
+Instead of OFFSET plus a COUNT(*) on every page, each page remembers the sort
+key of its last row in an opaque, signed ``after`` token. The next page
+starts strictly after that row, so deep pages cost the same as the first.
+The total, when requested, is counted once on the first page and carried
+forward inside the token.
+"""
+from datetime import datetime
+from flask import current_app
+from itsdangerous import URLSafeSerializer, BadSignature
+from sqlalchemy import and_, or_
+from app.models.product import Product
+
+# Sort orders offered by the shop; every one ends with a unique column so
+# that rows with equal prices or names still have a stable position.
+SORT_KEYS = {
+    'default': [(Product.id, False)],
+    'price_low': [(Product.price, False), (Product.id, False)],
+    'price_high': [(Product.price, True), (Product.id, True)],
+    'newest': [(Product.created_at, True), (Product.id, True)],
+    'name_asc': [(Product.name, False), (Product.id, False)],
+    'name_desc': [(Product.name, True), (Product.id, True)],
+}
+
+
+def get_sort_keys(sort_by):
+    """Get the keyset columns for a shop sort option, defaulting by id"""
+    return SORT_KEYS.get(sort_by, SORT_KEYS['default'])
+
+
+class KeysetPagination:
+    """One page of a keyset-paginated query
+
+    Exposes ``items``, ``has_next`` and ``total`` like Flask-SQLAlchemy's
+    Pagination, plus ``next_after`` (the token for the following page).
+    """
+
+    def __init__(self, items, per_page, next_after=None, after=None, total=None):
+        self.items = items
+        self.per_page = per_page
+        self.next_after = next_after
+        self.after = after
+        self.total = total
+
+    @property
+    def has_next(self):
+        return self.next_after is not None
+
+    @property
+    def is_first(self):
+        return self.after is None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def _serializer():
+    return URLSafeSerializer(current_app.config['SECRET_KEY'], salt='keyset-cursor')
+
+
+def _dump_value(value):
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    return value
+
+
+def _load_value(value):
+    if isinstance(value, dict) and 'dt' in value:
+        return datetime.fromisoformat(value['dt'])
+    return value
+
+
+def encode_cursor(scope, values, total=None):
+    """Build an opaque ``after`` token for the row with the given key values"""
+    return _serializer().dumps({
+        's': scope,
+        'v': [_dump_value(v) for v in values],
+        't': total,
+    })
+
+
+def decode_cursor(token, scope):
+    """Decode an ``after`` token
+
+    Returns:
+        tuple: (values, total), or (None, None) when the token is missing,
+        tampered with, or was issued for a different listing/sort.
+    """
+    if not token:
+        return None, None
+    try:
+        data = _serializer().loads(token)
+    except BadSignature:
+        current_app.logger.warning('Ignoring invalid pagination cursor')
+        return None, None
+    if data.get('s') != scope:
+        return None, None
+    return [_load_value(v) for v in data['v']], data.get('t')
+
+
+def _after_clause(sort_keys, values):
+    """WHERE clause selecting rows that sort strictly after ``values``"""
+    clauses = []
+    for i, (expr, descending) in enumerate(sort_keys):
+        equal_prefix = [sort_keys[j][0] == values[j] for j in range(i)]
+        beyond = expr < values[i] if descending else expr > values[i]
+        clauses.append(and_(*equal_prefix, beyond))
+    return or_(*clauses)
+
+
+def keyset_paginate(query, sort_keys, scope, after=None, per_page=12, with_total=False):
+    """Fetch one page of ``query`` ordered by ``sort_keys``
+
+    Args:
+        query: Unordered SQLAlchemy query whose first entity is the row type
+        sort_keys (list): ``(expression, descending)`` pairs, last one unique
+        scope (str): Identifies the listing and sort; tokens from another
+            scope are ignored so switching sort restarts at the first page
+        after (str): Token from a previous page's ``next_after``
+        per_page (int): Number of rows per page
+        with_total (bool): Count matching rows on the first page and carry
+            the count in subsequent tokens
+
+    Returns:
+        KeysetPagination
+    """
+    values, total = decode_cursor(after, scope)
+    if values is None:
+        after = None
+        if with_total:
+            total = query.order_by(None).count()
+
+    if values is not None:
+        query = query.filter(_after_clause(sort_keys, values))
+
+    key_columns = [expr.label(f'_key{i}') for i, (expr, _) in enumerate(sort_keys)]
+    ordering = [expr.desc() if descending else expr.asc() for expr, descending in sort_keys]
+    rows = query.add_columns(*key_columns).order_by(None).order_by(*ordering).limit(per_page + 1).all()
+
+    next_after = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        next_after = encode_cursor(scope, list(rows[-1][1:]), total)
+
+    return KeysetPagination(
+        items=[row[0] for row in rows],
+        per_page=per_page,
+        next_after=next_after,
+        after=after,
+        total=total
+    )
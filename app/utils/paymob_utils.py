@@ -2,14 +2,35 @@ import requests
 import hmac
 import hashlib
 import json
+from datetime import datetime, timedelta
 from functools import wraps
 from flask import current_app
+from app.utils.http_client import get_client
+from app.utils.token_store import get_token_store
 
-# PayMob API endpoints
+# PayMob API endpoints, under PAYMOB_BASE_URL
 PAYMOB_BASE_URL = 'https://accept.paymob.com/api'
-AUTH_URL = f'{PAYMOB_BASE_URL}/auth/tokens'
-ORDER_URL = f'{PAYMOB_BASE_URL}/ecommerce/orders'
-PAYMENT_KEY_URL = f'{PAYMOB_BASE_URL}/acceptance/payment_keys'
+AUTH_PATH = '/auth/tokens'
+ORDER_PATH = '/ecommerce/orders'
+PAYMENT_KEY_PATH = '/acceptance/payment_keys'
+# Endpoint URLs with the default base URL
+AUTH_URL = f'{PAYMOB_BASE_URL}{AUTH_PATH}'
+ORDER_URL = f'{PAYMOB_BASE_URL}{ORDER_PATH}'
+PAYMENT_KEY_URL = f'{PAYMOB_BASE_URL}{PAYMENT_KEY_PATH}'
+
+# (connect, read) timeout for PayMob calls, in seconds
+PAYMOB_TIMEOUT = (3.05, 15)
+# Name of the auth token in the shared token store
+PAYMOB_TOKEN = 'paymob'
+# Seconds a payment key is valid, and how long before that it stops being reused
+PAYMENT_KEY_EXPIRATION = 3600
+PAYMENT_KEY_MARGIN = 300
+# Transaction fields PayMob signs callbacks over, in order
+HMAC_FIELDS = (
+    'amount_cents', 'created_at', 'currency', 'error_occured', 'has_parent_transaction', 'id',
+    'integration_id', 'is_3d_secure', 'is_auth', 'is_capture', 'is_refunded', 'is_standalone_payment',
+    'order', 'owner', 'pending', 'source_data.pan', 'source_data.sub_type', 'source_data.type', 'success',
+)
 
 def init_paymob():
     """Initialize PayMob configuration"""
@@ -17,6 +38,10 @@ def init_paymob():
         current_app.logger.error('PayMob API key not configured')
         raise ValueError('PayMob API key not configured')
 
+def paymob_url(path):
+    """URL of a PayMob endpoint under the configured PAYMOB_BASE_URL"""
+    return current_app.config.get('PAYMOB_BASE_URL', PAYMOB_BASE_URL).rstrip('/') + path
+
 def require_paymob(f):
     """Decorator to ensure PayMob is initialized"""
     @wraps(f)
@@ -27,14 +52,34 @@ def require_paymob(f):
 
 @require_paymob
 def get_auth_token():
-    """Get authentication token from PayMob"""
+    """Get the PayMob authentication token shared by all workers
+
+    PayMob is only asked for a new one shortly before the stored token
+    expires (see app.utils.token_store).
+    """
+    return get_token_store().get(PAYMOB_TOKEN, _request_auth_token,
+                                 current_app.config.get('PAYMOB_TOKEN_TTL', 3600))
+
+def _post_authenticated(url, data):
+    """POST ``data`` with the shared auth token, renewing it once on a 401"""
+    auth_token = data['auth_token'] = get_auth_token()
+    response = get_client('paymob').post(url, json=data, timeout=PAYMOB_TIMEOUT)
+    if response.status_code == 401:
+        current_app.logger.info('PayMob rejected the auth token, requesting a new one')
+        get_token_store().invalidate(PAYMOB_TOKEN, auth_token)
+        data['auth_token'] = get_auth_token()
+        response = get_client('paymob').post(url, json=data, timeout=PAYMOB_TIMEOUT)
+    return response
+
+def _request_auth_token():
+    """Get a new authentication token from PayMob"""
     try:
         api_key = current_app.config.get('PAYMOB_API_KEY')
         if not api_key:
             raise ValueError('PayMob API key not configured')
             
         current_app.logger.debug(f'Getting auth token from PayMob')
-        response = requests.post(AUTH_URL, json={'api_key': api_key})
+        response = get_client('paymob').post(paymob_url(AUTH_PATH), json={'api_key': api_key}, timeout=PAYMOB_TIMEOUT)
         
         # Log response for debugging
         current_app.logger.debug(f'PayMob auth response status: {response.status_code}')
@@ -71,12 +116,8 @@ def create_order(amount_cents, items, shipping_data=None, currency='EGP'):
         tuple: (order_id, token)
     """
     try:
-        # Get authentication token
-        auth_token = get_auth_token()
-        
         # Create order data
         order_data = {
-            'auth_token': auth_token,
             'delivery_needed': 'false',
             'amount_cents': amount_cents,
             'currency': currency,
@@ -90,7 +131,7 @@ def create_order(amount_cents, items, shipping_data=None, currency='EGP'):
         # Log request data
         current_app.logger.debug(f'Creating PayMob order with data: {json.dumps(order_data)}')
         
-        response = requests.post(ORDER_URL, json=order_data)
+        response = _post_authenticated(paymob_url(ORDER_PATH), order_data)
         
         # Log response for debugging
         current_app.logger.debug(f'PayMob order creation response status: {response.status_code}')
@@ -104,7 +145,7 @@ def create_order(amount_cents, items, shipping_data=None, currency='EGP'):
             raise ValueError('No order ID in PayMob response')
             
         current_app.logger.info(f'Successfully created PayMob order: {order_id}')
-        return order_id, auth_token
+        return order_id, order_data['auth_token']
     except requests.exceptions.RequestException as e:
         current_app.logger.error(f'PayMob order creation error: {str(e)}')
         current_app.logger.error(f'Response: {e.response.text if hasattr(e, "response") else "No response"}')
@@ -114,14 +155,14 @@ def create_order(amount_cents, items, shipping_data=None, currency='EGP'):
         raise
 
 @require_paymob
-def get_payment_key(order_id, auth_token, amount_cents, currency='EGP', 
+def get_payment_key(order_id, auth_token=None, amount_cents=0, currency='EGP', 
                    integration_id=None, billing_data=None):
     """
     Get payment key for the iframe
     
     Args:
         order_id (int): PayMob order ID
-        auth_token (str): Authentication token
+        auth_token (str): Ignored; the shared token is used
         amount_cents (int): Amount in cents
         currency (str): Currency code
         integration_id (str): Integration ID (optional)
@@ -147,9 +188,8 @@ def get_payment_key(order_id, auth_token, amount_cents, currency='EGP',
                 billing_data[field] = 'NA'
         
         payment_data = {
-            'auth_token': auth_token,
             'amount_cents': amount_cents,
-            'expiration': 3600,
+            'expiration': PAYMENT_KEY_EXPIRATION,
             'order_id': order_id,
             'billing_data': billing_data,
             'currency': currency,
@@ -160,7 +200,7 @@ def get_payment_key(order_id, auth_token, amount_cents, currency='EGP',
         # Log request data
         current_app.logger.debug(f'Getting payment key with data: {json.dumps(payment_data)}')
         
-        response = requests.post(PAYMENT_KEY_URL, json=payment_data)
+        response = _post_authenticated(paymob_url(PAYMENT_KEY_PATH), payment_data)
         
         # Log response for debugging
         current_app.logger.debug(f'PayMob payment key response status: {response.status_code}')
@@ -183,34 +223,98 @@ def get_payment_key(order_id, auth_token, amount_cents, currency='EGP',
         current_app.logger.error(f'PayMob payment key error: {str(e)}')
         raise
 
-def verify_webhook_signature(request_data, hmac_secret):
+def payment_key_for_order(order, items, billing_data, integration_id=None):
+    """
+    Get a payment key for a local order, reusing what PayMob already has
+    
+    The PayMob order registered for ``order`` is reused as long as the
+    amount is unchanged, and so is its payment key until shortly before it
+    expires, so retries and double clicks on "pay" make no PayMob calls at
+    all. Updates the order's PayMob fields; the caller commits.
+    
+    Args:
+        order (Order): Order being paid for
+        items (list): PayMob order items, used if a PayMob order is created
+        billing_data (dict): Customer billing information
+        integration_id (str): Integration ID (optional)
+    
+    Returns:
+        str: Payment key token
+    """
+    amount_cents = int(round(order.total * 100))
+    now = datetime.utcnow()
+    
+    if order.paymob_amount_cents != amount_cents:
+        # A PayMob order's amount is fixed; register a new one
+        order.paymob_order_id = None
+        order.paymob_payment_key = None
+    
+    expires_at = order.paymob_payment_key_expires_at
+    if order.paymob_payment_key and expires_at and expires_at - timedelta(seconds=PAYMENT_KEY_MARGIN) > now:
+        current_app.logger.info(f'Reusing PayMob payment key for order {order.id}')
+        return order.paymob_payment_key
+    
+    if not order.paymob_order_id:
+        paymob_order_id, _ = create_order(amount_cents=amount_cents, items=items)
+        order.paymob_order_id = str(paymob_order_id)
+        order.paymob_amount_cents = amount_cents
+    
+    payment_key = get_payment_key(
+        order_id=int(order.paymob_order_id),
+        amount_cents=amount_cents,
+        billing_data=billing_data,
+        integration_id=integration_id
+    )
+    order.paymob_payment_key = payment_key
+    order.paymob_payment_key_expires_at = now + timedelta(seconds=PAYMENT_KEY_EXPIRATION)
+    return payment_key
+
+def _hmac_value(transaction, field):
+    """A field of the transaction as PayMob writes it into the HMAC message"""
+    if field in transaction:
+        value = transaction[field]
+    else:
+        # POST bodies nest source_data; GET callbacks flatten it
+        value = transaction
+        for part in field.split('.'):
+            value = value.get(part) if isinstance(value, dict) else None
+    if isinstance(value, dict):
+        value = value.get('id')
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return '' if value is None else str(value)
+
+def transaction_hmac(transaction, hmac_secret):
+    """
+    Calculate PayMob's HMAC of a transaction callback
+    
+    Args:
+        transaction (dict): Transaction, the ``obj`` of a POST callback or the GET query
+        hmac_secret (str): HMAC secret key
+    
+    Returns:
+        str: Hex HMAC-SHA512 of the HMAC_FIELDS values, concatenated in order
+    """
+    message = ''.join(_hmac_value(transaction, field) for field in HMAC_FIELDS)
+    return hmac.new(hmac_secret.encode('utf-8'), message.encode('utf-8'), hashlib.sha512).hexdigest()
+
+def verify_webhook_signature(transaction, received_signature, hmac_secret):
     """
     Verify PayMob webhook signature
     
     Args:
-        request_data (dict): Webhook request data
+        transaction (dict): Transaction, the ``obj`` of a POST callback or the GET query
+        received_signature (str): The ``hmac`` query parameter PayMob sent
         hmac_secret (str): HMAC secret key
     
     Returns:
         bool: True if signature is valid
     """
+    if not received_signature or not hmac_secret:
+        return False
     try:
-        # Get the signature from headers
-        received_signature = request_data.get('hmac')
-        if not received_signature:
-            return False
-            
-        # Sort request data alphabetically
-        sorted_data = json.dumps(request_data, sort_keys=True).encode('utf-8')
-        
-        # Calculate HMAC
-        calculated_signature = hmac.new(
-            hmac_secret.encode('utf-8'),
-            sorted_data,
-            hashlib.sha512
-        ).hexdigest()
-        
-        return hmac.compare_digest(received_signature, calculated_signature)
+        calculated_signature = transaction_hmac(transaction, hmac_secret)
+        return hmac.compare_digest(received_signature.lower(), calculated_signature)
     except Exception as e:
         current_app.logger.error(f'PayMob webhook signature verification error: {str(e)}')
         return False
@@ -0,0 +1,119 @@
+"""
+Reads for the admin dashboard and sales report.
+
+Everything here sums the daily rollup tables (app.models.sales_rollup)
+instead of scanning orders, so the cost depends on the number of days in
+the range, not on how many orders were placed in them. The filters match
+the sales report export: paid orders, an optional order status and an
+inclusive date range.
+"""
+from collections import namedtuple
+from datetime import datetime, timedelta
+from sqlalchemy import and_, case, func, select
+from app.extensions import db
+from app.models.category import Category
+from app.models.product import Product
+from app.models.sales_rollup import DailyCategorySales, DailyProductSales, DailySales
+
+SalesTotals = namedtuple('SalesTotals', ['orders', 'units', 'revenue', 'discount', 'shipping'])
+DaySales = namedtuple('DaySales', ['day', 'orders', 'units', 'revenue', 'discount', 'shipping'])
+RankedSales = namedtuple('RankedSales', ['id', 'name', 'orders', 'units', 'revenue'])
+
+
+def _filter(query, model, status=None, date_from=None, date_to=None, paid_only=True):
+    if paid_only:
+        query = query.where(model.payment_status == 'paid')
+    if status and status != 'all':
+        query = query.where(model.status == status)
+    if date_from:
+        query = query.where(model.day >= _day(date_from))
+    if date_to:
+        query = query.where(model.day <= _day(date_to))
+    return query
+
+
+def _day(value):
+    return value.date() if hasattr(value, 'date') else value
+
+
+def _sums(model, *names):
+    return [func.coalesce(func.sum(getattr(model, name)), 0) for name in names]
+
+
+def sales_totals(status=None, date_from=None, date_to=None, paid_only=True):
+    """Orders, units and amounts over a range
+
+    Returns:
+        SalesTotals
+    """
+    row = db.session.execute(_filter(
+        select(*_sums(DailySales, *SalesTotals._fields)), DailySales,
+        status, date_from, date_to, paid_only
+    )).one()
+    return SalesTotals(*row)
+
+
+def daily_sales(status=None, date_from=None, date_to=None):
+    """Per-day totals, newest day first
+
+    Returns:
+        list[DaySales]
+    """
+    rows = db.session.execute(_filter(
+        select(DailySales.day, *_sums(DailySales, *DaySales._fields[1:])), DailySales,
+        status, date_from, date_to
+    ).group_by(DailySales.day).order_by(DailySales.day.desc())).all()
+    return [DaySales(*row) for row in rows]
+
+
+def top_products(status=None, date_from=None, date_to=None, limit=10):
+    """Best-selling products by revenue
+
+    Returns:
+        list[RankedSales]
+    """
+    return _ranked(DailyProductSales, DailyProductSales.product_id, Product, status, date_from, date_to, limit)
+
+
+def top_categories(status=None, date_from=None, date_to=None, limit=10):
+    """Best-selling categories by revenue
+
+    Returns:
+        list[RankedSales]
+    """
+    return _ranked(DailyCategorySales, DailyCategorySales.category_id, Category, status, date_from, date_to, limit)
+
+
+def _ranked(model, key, named, status, date_from, date_to, limit):
+    revenue = func.sum(model.revenue)
+    totals = _filter(
+        select(key.label('id'), func.sum(model.orders).label('orders'), func.sum(model.units).label('units'),
+               revenue.label('revenue')), model, status, date_from, date_to
+    ).group_by(key).order_by(revenue.desc()).limit(limit).subquery()
+    rows = db.session.execute(
+        select(totals.c.id, named.name, totals.c.orders, totals.c.units, totals.c.revenue)
+        .join(named, named.id == totals.c.id)
+        .order_by(totals.c.revenue.desc())
+    ).all()
+    return [RankedSales(*row) for row in rows]
+
+
+def dashboard_totals(days=30):
+    """Figures for the admin dashboard cards, in one query
+
+    Returns:
+        dict: ``orders`` (all time, any state), ``revenue_today`` and
+        ``revenue_recent`` (paid, last ``days`` days)
+    """
+    today = datetime.utcnow().date()
+    paid = DailySales.payment_status == 'paid'
+
+    def paid_revenue(since):
+        return func.coalesce(func.sum(case((and_(paid, DailySales.day >= since), DailySales.revenue), else_=0)), 0)
+
+    orders, revenue_today, revenue_recent = db.session.execute(select(
+        func.coalesce(func.sum(DailySales.orders), 0),
+        paid_revenue(today),
+        paid_revenue(today - timedelta(days=days - 1))
+    )).one()
+    return {'orders': orders, 'revenue_today': revenue_today, 'revenue_recent': revenue_recent}
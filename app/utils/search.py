@@ -0,0 +1,197 @@
+"""
+Full-text product search.
+
+SQLite databases get an FTS5 table (``products_fts``) kept in sync with the
+``products`` table by triggers. PostgreSQL databases get a generated
+``search_vector`` tsvector column with a GIN index. Either way the index is
+maintained by the database itself, so admin create, edit, soft-delete and
+restore need no extra bookkeeping. Other backends fall back to ILIKE scans.
+"""
+import re
+from sqlalchemy import text, literal_column, func, table, column, inspect
+from flask import current_app
+
+FTS_TABLE = 'products_fts'
+
+# Name matches are worth more than description matches when ranking
+NAME_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# Engines already known to have the FTS5 table
+_fts_engines = set()
+
+SQLITE_DDL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        name, description,
+        content='products', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS products_fts_ai AFTER INSERT ON products BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, description)
+        VALUES (new.id, new.name, coalesce(new.description, ''));
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS products_fts_ad AFTER DELETE ON products BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description)
+        VALUES ('delete', old.id, old.name, coalesce(old.description, ''));
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS products_fts_au AFTER UPDATE OF name, description ON products BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description)
+        VALUES ('delete', old.id, old.name, coalesce(old.description, ''));
+        INSERT INTO {FTS_TABLE}(rowid, name, description)
+        VALUES (new.id, new.name, coalesce(new.description, ''));
+    END""",
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rank) VALUES ('rank', 'bm25({NAME_WEIGHT}, {DESCRIPTION_WEIGHT})')",
+]
+
+SQLITE_DROP_DDL = [
+    'DROP TRIGGER IF EXISTS products_fts_ai',
+    'DROP TRIGGER IF EXISTS products_fts_ad',
+    'DROP TRIGGER IF EXISTS products_fts_au',
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+]
+
+POSTGRES_DDL = [
+    """ALTER TABLE products ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('simple', coalesce(name, '')), 'A') ||
+            setweight(to_tsvector('simple', coalesce(description, '')), 'B')
+        ) STORED""",
+    'CREATE INDEX IF NOT EXISTS ix_products_search_vector ON products USING GIN (search_vector)',
+]
+
+POSTGRES_DROP_DDL = [
+    'DROP INDEX IF EXISTS ix_products_search_vector',
+    'ALTER TABLE products DROP COLUMN IF EXISTS search_vector',
+]
+
+
+def create_search_index(connection):
+    """Create the search index objects for the connection's backend
+
+    Safe to call repeatedly. Existing products are indexed as part of the
+    call, so it doubles as the backfill step for databases created before
+    the index existed.
+    """
+    dialect = connection.dialect.name
+    if dialect == 'sqlite':
+        for statement in SQLITE_DDL:
+            connection.execute(text(statement))
+        rebuild_search_index(connection)
+    elif dialect == 'postgresql':
+        for statement in POSTGRES_DDL:
+            connection.execute(text(statement))
+
+
+def drop_search_index(connection):
+    """Remove the search index objects created by create_search_index"""
+    dialect = connection.dialect.name
+    if dialect == 'sqlite':
+        statements = SQLITE_DROP_DDL
+    elif dialect == 'postgresql':
+        statements = POSTGRES_DROP_DDL
+    else:
+        return
+    for statement in statements:
+        connection.execute(text(statement))
+
+
+def rebuild_search_index(connection):
+    """Re-index every product from the products table (SQLite only)
+
+    PostgreSQL's generated column never needs rebuilding.
+    """
+    if connection.dialect.name == 'sqlite':
+        connection.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+
+
+def on_products_created(target, connection, **kw):
+    """``after_create`` hook so db.create_all() also builds the index"""
+    create_search_index(connection)
+
+
+def tokenize(query):
+    """Split a raw search string into index-safe word tokens"""
+    return _TOKEN_RE.findall(query or '')
+
+
+def _fts5_query(tokens):
+    """Build an FTS5 MATCH expression with prefix matching on every token"""
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def _tsquery(tokens):
+    """Build a to_tsquery expression with prefix matching on every token"""
+    return ' & '.join(f'{token}:*' for token in tokens)
+
+
+def match_products(query, search_string):
+    """Restrict a Product query to full-text matches without ordering it
+
+    Args:
+        query: A ``Product.query`` (optionally already filtered)
+        search_string (str): Raw text entered by the user
+
+    Returns:
+        tuple: (query, sort_keys) where sort_keys is a list of
+        ``(expression, descending)`` pairs ranking the best match first,
+        or None when the search string has no usable tokens.
+    """
+    from app.models.product import Product
+
+    tokens = tokenize(search_string)
+    if not tokens:
+        return query, None
+
+    dialect = query.session.get_bind().dialect.name
+
+    if dialect == 'sqlite' and _has_fts_table(query.session.get_bind()):
+        fts = table(FTS_TABLE, column('rowid'), column('rank'))
+        query = query.join(fts, fts.c.rowid == Product.id)\
+            .filter(text(f'{FTS_TABLE} MATCH :fts_query').bindparams(fts_query=_fts5_query(tokens)))
+        # bm25 scores are negative; lower is better
+        return query, [(fts.c.rank, False), (Product.id, False)]
+
+    if dialect == 'postgresql':
+        search_vector = literal_column('products.search_vector')
+        ts_query = func.to_tsquery('simple', _tsquery(tokens))
+        query = query.filter(search_vector.op('@@')(ts_query))
+        return query, [(func.ts_rank(search_vector, ts_query), True), (Product.id, False)]
+
+    # No index available: fall back to substring scans
+    for token in tokens:
+        pattern = f'%{token}%'
+        query = query.filter(Product.name.ilike(pattern) | Product.description.ilike(pattern))
+    return query, [(Product.id, False)]
+
+
+def search_products(query, search_string):
+    """Restrict a Product query to full-text matches, ranked by relevance
+
+    Args:
+        query: A ``Product.query`` (optionally already filtered)
+        search_string (str): Raw text entered by the user
+
+    Returns:
+        The filtered and ordered query. An empty search string leaves the
+        query untouched.
+    """
+    query, sort_keys = match_products(query, search_string)
+    if sort_keys is None:
+        return query
+    return query.order_by(*[expr.desc() if descending else expr for expr, descending in sort_keys])
+
+
+def _has_fts_table(engine):
+    """Check (once per engine) whether the FTS5 table has been created"""
+    if engine in _fts_engines:
+        return True
+    if inspect(engine).has_table(FTS_TABLE):
+        _fts_engines.add(engine)
+        return True
+    current_app.logger.warning(
+        f'{FTS_TABLE} table is missing; falling back to ILIKE search. '
+        'Run the migrations to create the search index.'
+    )
+    return False
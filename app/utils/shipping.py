@@ -4,7 +4,7 @@ from enum import Enum
 from flask import current_app
 from functools import lru_cache
 import logging
-import requests
+from app.utils.http_client import get_client
 import urllib3
 import ssl
 from urllib3.util.ssl_ import create_urllib3_context
@@ -26,14 +26,16 @@ class ShippingService:
         self.base_url = "https://egyptpost.gov.eg"
         self.calculate_url = f"{self.base_url}/ar-EG/CalculatePostage/CalculatePostalFees"
         
-        # Create a scraper instance with specific browser settings
-        self.session = cloudscraper.create_scraper(
+        # Share one scraper session (with specific browser settings) and its
+        # connections between instances
+        self.client = get_client('egypost', session_factory=lambda: cloudscraper.create_scraper(
             browser={
                 'browser': 'chrome',
                 'platform': 'windows',
                 'mobile': False
             }
-        )
+        ))
+        self.session = self.client.session
         
         # Headers for Arabic content - exactly matching test script
         self.headers = {
@@ -47,10 +49,9 @@ class ShippingService:
         # Initialize session
         try:
             # First get the main page to get any necessary cookies
-            main_response = self.session.get(
+            main_response = self.client.get(
                 f"{self.base_url}/ar-EG/CalculatePostage",
-                headers=self.headers,
-                timeout=30
+                headers=self.headers
             )
             logger.info(f"Main page initialized with status code: {main_response.status_code}")
             
@@ -102,12 +103,11 @@ class ShippingService:
             logger.info(f"URL: {self.calculate_url}")
             logger.info(f"Payload: {json.dumps(payload, indent=2)}")
 
-            # Make the API request with explicit timeout
-            response = self.session.post(
+            # Make the API request (with the shared client's timeout)
+            response = self.client.post(
                 self.calculate_url,
                 json=payload,
-                headers=self.headers,
-                timeout=30
+                headers=self.headers
             )
 
             # Log response details
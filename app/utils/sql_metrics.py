@@ -0,0 +1,204 @@
+"""
+Per-request SQL instrumentation.
+
+SQLAlchemy engine events time every statement a request sends. When the
+request ends, the totals are:
+
+* added to the response as a ``Server-Timing`` header
+  (``db;dur=12.3;desc="7 queries"``), which browsers show in their network
+  panel;
+* logged as one JSON line (``sql {...}``): at DEBUG, or at WARNING when the
+  request looks like an N+1, i.e. one statement fingerprint ran at least
+  SQL_REPEAT_THRESHOLD times;
+* folded into per-endpoint counters for this worker, see endpoint_stats().
+
+A fingerprint is the statement with its literals and IN lists collapsed, so
+``SELECT ... WHERE id = ?`` run for each row of a page counts as one
+repeated statement. Tests use record_queries() to assert on the figures.
+Statements run while a streamed response is being sent are not counted.
+"""
+import json
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from flask import current_app, g, has_app_context, request
+from sqlalchemy import event
+from app.extensions import db
+
+DEFAULT_REPEAT_THRESHOLD = 5
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_NAMED_PARAM = re.compile(r'%\(\w+\)s|:\w+')
+_PARAM_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_SPACE = re.compile(r'\s+')
+
+_recorders = []
+
+
+def fingerprint(statement):
+    """Normalize a statement so runs with different values compare equal"""
+    statement = _STRING.sub('?', statement)
+    statement = _NAMED_PARAM.sub('?', statement)
+    statement = _NUMBER.sub('?', statement)
+    statement = _PARAM_LIST.sub('(?)', statement)
+    return _SPACE.sub(' ', statement).strip()
+
+
+class RequestQueries:
+    """Statements sent while handling one request"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+        self.endpoint = None
+        self.method = None
+        self.status = None
+
+    def record(self, statement, seconds):
+        self.count += 1
+        self.duration += seconds
+        self.statements[fingerprint(statement)] += 1
+
+    @property
+    def duration_ms(self):
+        return round(1000 * self.duration, 2)
+
+    def repeated(self, threshold=DEFAULT_REPEAT_THRESHOLD):
+        """Fingerprints run at least ``threshold`` times, most frequent first
+
+        Returns:
+            list: (fingerprint, count) pairs
+        """
+        return [(statement, count) for statement, count in self.statements.most_common() if count >= threshold]
+
+    def to_dict(self, threshold=DEFAULT_REPEAT_THRESHOLD):
+        return {
+            'endpoint': self.endpoint,
+            'method': self.method,
+            'status': self.status,
+            'queries': self.count,
+            'db_ms': self.duration_ms,
+            'repeated': [{'statement': statement, 'count': count} for statement, count in self.repeated(threshold)],
+        }
+
+
+class EndpointMetrics:
+    """Query counts and DB time per endpoint for this worker"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def observe(self, queries, repeated):
+        with self._lock:
+            stats = self._endpoints.get(queries.endpoint)
+            if stats is None:
+                stats = self._endpoints[queries.endpoint] = {
+                    'requests': 0, 'queries': 0, 'max_queries': 0, 'n_plus_one': 0, 'db_ms': 0.0}
+            stats['requests'] += 1
+            stats['queries'] += queries.count
+            stats['max_queries'] = max(stats['max_queries'], queries.count)
+            stats['db_ms'] += queries.duration_ms
+            if repeated:
+                stats['n_plus_one'] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                endpoint: dict(
+                    requests=stats['requests'],
+                    max_queries=stats['max_queries'],
+                    n_plus_one=stats['n_plus_one'],
+                    avg_queries=round(stats['queries'] / stats['requests'], 1),
+                    avg_db_ms=round(stats['db_ms'] / stats['requests'], 2),
+                )
+                for endpoint, stats in sorted(self._endpoints.items(), key=lambda item: str(item[0]))
+            }
+
+
+def init_sql_metrics(app):
+    """Instrument the app's engines and requests, unless SQL_METRICS is off"""
+    if not app.config.get('SQL_METRICS', True):
+        return
+    app.extensions['sql_metrics'] = EndpointMetrics()
+    with app.app_context():
+        for engine in db.engines.values():
+            if not event.contains(engine, 'before_cursor_execute', _before_cursor_execute):
+                event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+                event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+
+
+def _current():
+    return g.get('sql_queries') if has_app_context() else None
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('sql_metrics_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['sql_metrics_start'].pop()
+    queries = _current()
+    if queries is not None:
+        queries.record(statement, time.perf_counter() - started)
+
+
+def _start_request():
+    g.sql_queries = RequestQueries()
+
+
+def _finish_request(response):
+    queries = g.pop('sql_queries', None)
+    if queries is None:
+        return response
+    queries.endpoint = request.endpoint
+    queries.method = request.method
+    queries.status = response.status_code
+
+    threshold = current_app.config.get('SQL_REPEAT_THRESHOLD', DEFAULT_REPEAT_THRESHOLD)
+    repeated = queries.repeated(threshold)
+    timing = f'db;dur={queries.duration_ms};desc="{queries.count} queries"'
+    existing = response.headers.get('Server-Timing')
+    response.headers['Server-Timing'] = f'{existing}, {timing}' if existing else timing
+
+    line = 'sql ' + json.dumps(queries.to_dict(threshold))
+    if repeated:
+        current_app.logger.warning(line)
+    else:
+        current_app.logger.debug(line)
+
+    metrics = current_app.extensions.get('sql_metrics')
+    if metrics is not None:
+        metrics.observe(queries, repeated)
+    for recorder in _recorders:
+        recorder.append(queries)
+    return response
+
+
+def endpoint_stats():
+    """Query counts, DB time and N+1 hits per endpoint for this worker"""
+    metrics = current_app.extensions.get('sql_metrics')
+    return metrics.snapshot() if metrics is not None else {}
+
+
+@contextmanager
+def record_queries():
+    """Collect the RequestQueries of every request finished inside the block
+
+    Example:
+        with record_queries() as requests:
+            client.get('/shop')
+        assert requests[0].count <= 10
+    """
+    recorded = []
+    _recorders.append(recorded)
+    try:
+        yield recorded
+    finally:
+        _recorders.remove(recorded)
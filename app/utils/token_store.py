@@ -0,0 +1,193 @@
+"""
+Upstream API tokens shared across workers.
+
+Tokens are stored in the ``api_tokens`` table, so one login serves every
+gunicorn worker and survives restarts. Each worker also keeps a copy in
+memory and only reads the table once its copy is due for refresh.
+
+A token is refreshed API_TOKEN_REFRESH_MARGIN seconds before it expires.
+Only one refresh runs at a time. Inside a worker, callers queue on a lock.
+Across workers, the refresher claims the row with a conditional UPDATE that
+only one of them can win. The claim lapses after API_TOKEN_LOCK_TIMEOUT
+seconds in case its owner dies. Everyone else keeps using the old token
+while it is still valid, or waits for the new one.
+
+When an upstream rejects a token, invalidate() expires it only if it is
+still the stored one. A burst of 401s therefore causes a single re-login.
+"""
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import or_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.extensions import db
+from app.models.api_token import ApiToken
+
+
+class TokenRefreshError(ValueError):
+    """Raised when no token could be obtained in time"""
+
+
+class TokenStore:
+    """Database-backed token cache with single-flight refresh
+
+    Args:
+        refresh_margin (int): Seconds before expiry a token is refreshed
+        lock_timeout (int): Seconds a refresh claim is held at most
+        poll_interval (float): Seconds between checks while another worker
+            refreshes
+    """
+
+    def __init__(self, refresh_margin=300, lock_timeout=30, poll_interval=0.1):
+        self.refresh_margin = timedelta(seconds=refresh_margin)
+        self.lock_timeout = timedelta(seconds=lock_timeout)
+        self.poll_interval = poll_interval
+        self.owner = uuid.uuid4().hex
+        self._tokens = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def _name_lock(self, name):
+        with self._lock:
+            return self._locks.setdefault(name, threading.Lock())
+
+    def _fresh(self, token, expires_at):
+        return bool(token) and expires_at is not None and expires_at - self.refresh_margin > datetime.utcnow()
+
+    def _memory(self, name):
+        token, expires_at = self._tokens.get(name, (None, None))
+        return token if self._fresh(token, expires_at) else None
+
+    def _load(self, name):
+        with Session(db.engine) as session:
+            row = session.get(ApiToken, name)
+            return (row.token, row.expires_at) if row else (None, None)
+
+    def _claim(self, name):
+        """Try to become the worker refreshing ``name``"""
+        now = datetime.utcnow()
+        with Session(db.engine) as session:
+            if session.get(ApiToken, name) is None:
+                try:
+                    session.add(ApiToken(name=name))
+                    session.commit()
+                except IntegrityError:
+                    session.rollback()
+            result = session.execute(
+                update(ApiToken)
+                .where(ApiToken.name == name,
+                       or_(ApiToken.locked_until.is_(None), ApiToken.locked_until < now))
+                .values(locked_until=now + self.lock_timeout, lock_owner=self.owner)
+            )
+            session.commit()
+            return result.rowcount == 1
+
+    def _release(self, name):
+        with Session(db.engine) as session:
+            session.execute(
+                update(ApiToken)
+                .where(ApiToken.name == name, ApiToken.lock_owner == self.owner)
+                .values(locked_until=None, lock_owner=None)
+            )
+            session.commit()
+
+    def put(self, name, token, ttl):
+        """Store a token valid for ``ttl`` seconds and release any claim"""
+        expires_at = datetime.utcnow() + timedelta(seconds=ttl)
+        with Session(db.engine) as session:
+            row = session.get(ApiToken, name) or ApiToken(name=name)
+            row.token = token
+            row.expires_at = expires_at
+            if row.lock_owner in (None, self.owner):
+                row.locked_until = None
+                row.lock_owner = None
+            session.add(row)
+            session.commit()
+        self._tokens[name] = (token, expires_at)
+
+    def get(self, name, fetch, ttl):
+        """Get a valid token, refreshing it when due
+
+        Args:
+            name (str): Upstream name, e.g. ``bosta``
+            fetch (callable): Logs in and returns a new token
+            ttl (int): Seconds a fetched token is valid
+
+        Raises:
+            TokenRefreshError: Another worker held the refresh for longer
+                than the lock timeout and left no usable token
+        """
+        token = self._memory(name)
+        if token:
+            return token
+
+        with self._name_lock(name):
+            token = self._memory(name)
+            if token:
+                return token
+
+            deadline = time.monotonic() + 2 * self.lock_timeout.total_seconds()
+            while True:
+                token, expires_at = self._load(name)
+                if self._fresh(token, expires_at):
+                    self._tokens[name] = (token, expires_at)
+                    return token
+
+                if self._claim(name):
+                    try:
+                        # Another worker may have finished just before the claim
+                        token, expires_at = self._load(name)
+                        if self._fresh(token, expires_at):
+                            self._release(name)
+                            self._tokens[name] = (token, expires_at)
+                            return token
+                        token = fetch()
+                    except Exception:
+                        self._release(name)
+                        raise
+                    self.put(name, token, ttl)
+                    return token
+
+                # Someone else is refreshing; an unexpired token still works
+                if token and expires_at and expires_at > datetime.utcnow():
+                    return token
+                if time.monotonic() > deadline:
+                    raise TokenRefreshError(f'Timed out waiting for a {name} token')
+                time.sleep(self.poll_interval)
+
+    def peek(self, name):
+        """The current token if it hasn't expired, without refreshing"""
+        token, expires_at = self._tokens.get(name, (None, None))
+        if not token:
+            token, expires_at = self._load(name)
+        return token if token and expires_at and expires_at > datetime.utcnow() else None
+
+    def invalidate(self, name, token):
+        """Expire ``token`` after the upstream rejected it
+
+        Has no effect if the stored token was already replaced, so only the
+        first of several concurrent rejections leads to a new login.
+        """
+        if self._tokens.get(name, (None,))[0] == token:
+            self._tokens.pop(name, None)
+        with Session(db.engine) as session:
+            session.execute(
+                update(ApiToken)
+                .where(ApiToken.name == name, ApiToken.token == token)
+                .values(expires_at=datetime.utcnow())
+            )
+            session.commit()
+
+
+def get_token_store():
+    """The worker's token store, created from config on first use"""
+    store = current_app.extensions.get('api_token_store')
+    if store is None:
+        store = current_app.extensions.setdefault('api_token_store', TokenStore(
+            refresh_margin=current_app.config.get('API_TOKEN_REFRESH_MARGIN', 300),
+            lock_timeout=current_app.config.get('API_TOKEN_LOCK_TIMEOUT', 30)
+        ))
+    return store
@@ -3,13 +3,16 @@ from flask_login import login_required, current_user
 from app.models.product import Product
 from app.models.wishlist import Wishlist
 from app.extensions import db
+from app.utils.counters import get_user_counts, invalidate_user_counts
 from app.wishlist import bp
 
 @bp.route('/')
 @login_required
 def wishlist():
     """Display user's wishlist"""
-    wishlist_items = Wishlist.query.filter_by(user_id=current_user.id).all()
+    wishlist_items = Wishlist.query.filter_by(user_id=current_user.id)\
+        .options(db.joinedload(Wishlist.product)).all()
+    Product.preload_images(item.product for item in wishlist_items)
     return render_template('wishlist/wishlist.html', wishlist_items=wishlist_items)
 
 @bp.route('/add/<int:product_id>', methods=['POST'])
@@ -42,8 +45,10 @@ def add_to_wishlist(product_id):
         db.session.add(wishlist_item)
         db.session.commit()
         
+        invalidate_user_counts()
+        
         # Get updated wishlist total
-        wishlist_total = Wishlist.query.filter_by(user_id=current_user.id).count()
+        wishlist_total = get_user_counts().wishlist
         
         if request.is_json:
             return jsonify({
@@ -91,8 +96,10 @@ def toggle_wishlist(product_id):
             
         db.session.commit()
         
+        invalidate_user_counts()
+        
         # Get updated wishlist total
-        wishlist_total = Wishlist.query.filter_by(user_id=current_user.id).count()
+        wishlist_total = get_user_counts().wishlist
         
         return jsonify({
             'success': True,
@@ -19,6 +19,16 @@ class Config:
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD', '')
     MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER', 'noreply@flaskshop.com')
     
+    # Email outbox: messages sent per SMTP connection, messages per second
+    # (0 for no limit), seconds to collect a burst before sending,
+    # rejections before a message is given up on, and seconds before a
+    # rejected message is retried (doubled after each rejection)
+    MAIL_BATCH_SIZE = int(os.environ.get('MAIL_BATCH_SIZE', 50))
+    MAIL_RATE_LIMIT = float(os.environ.get('MAIL_RATE_LIMIT', 0))
+    MAIL_BATCH_DELAY = 2
+    MAIL_MAX_ATTEMPTS = 3
+    MAIL_RETRY_DELAY = 300
+    
     # Session settings
     PERMANENT_SESSION_LIFETIME = timedelta(days=7)
     SESSION_TYPE = 'filesystem'
@@ -53,17 +63,78 @@ class Config:
     PAYMOB_IFRAME_ID = os.environ.get('PAYMOB_IFRAME_ID')
     PAYMOB_HMAC_SECRET = os.environ.get('PAYMOB_HMAC_SECRET')
     
+    # PayMob API root; point it at a local stand-in for load tests
+    PAYMOB_BASE_URL = os.environ.get('PAYMOB_BASE_URL', 'https://accept.paymob.com/api')
+    
     # PayMob callback URLs
     # For local testing, use ngrok URL. In production, use your domain
     PAYMOB_RETURN_URL = os.environ.get('PAYMOB_RETURN_URL', 'http://127.0.0.1:5000/order/paymob-callback')
     PAYMOB_CALLBACK_URL = os.environ.get('PAYMOB_CALLBACK_URL', PAYMOB_RETURN_URL)  # Use same URL for both by default
     
+    # Minutes stock stays held for an order while the customer is paying
+    STOCK_RESERVATION_MINUTES = int(os.environ.get('STOCK_RESERVATION_MINUTES', 15))
+    # Minutes a checkout draft (the priced cart kept in the session) stays valid
+    CHECKOUT_DRAFT_MINUTES = 60
+    
     # Admin account
     ADMIN_EMAIL = os.environ.get('ADMIN_EMAIL', 'admin@example.com')
     ADMIN_PASSWORD = os.environ.get('ADMIN_PASSWORD', 'admin123')
     
     # Pagination
     PRODUCTS_PER_PAGE = 12
+    LISTING_SHOW_TOTAL = True  # Count listing totals once and carry them in the cursor
+    
+    # Seconds a worker trusts its cached category list before re-checking
+    # the catalog version counter
+    CATALOG_VERSION_CHECK_INTERVAL = 5
+    
+    # Bosta API root; point it at a local stand-in for load tests
+    BOSTA_BASE_URL = os.environ.get('BOSTA_BASE_URL', 'https://app.bosta.co/api/v2')
+    
+    # Hours before the local copy of Bosta's city list is refreshed from the API
+    BOSTA_CITY_INDEX_TTL_HOURS = int(os.environ.get('BOSTA_CITY_INDEX_TTL_HOURS', 24))
+    
+    # Shipping quote cache: seconds a quote stays valid, entries kept in
+    # memory per worker, and the EGP width of the COD amount buckets
+    SHIPPING_QUOTE_TTL = int(os.environ.get('SHIPPING_QUOTE_TTL', 6 * 3600))
+    SHIPPING_QUOTE_CACHE_SIZE = 1024
+    SHIPPING_QUOTE_COD_BUCKET = 500
+    
+    # City Bosta picks orders up from, used for rate cards and quotes
+    BOSTA_PICKUP_CITY = os.environ.get('BOSTA_PICKUP_CITY', 'Ismailia')
+    
+    # Outbound HTTP to carriers and PayMob: default (connect, read) timeout
+    # in seconds, retries for idempotent requests, base of the backoff,
+    # pooled connections per host, and the consecutive failures that open an
+    # upstream's circuit for HTTP_BREAKER_RESET seconds
+    HTTP_TIMEOUT = (3.05, 15)
+    HTTP_RETRIES = 2
+    HTTP_BACKOFF = 0.3
+    HTTP_POOL_SIZE = 10
+    HTTP_BREAKER_THRESHOLD = 5
+    HTTP_BREAKER_RESET = 30
+    
+    # Upstream API tokens shared by all workers: seconds a Bosta login or
+    # PayMob auth token is trusted, how early before expiry a token is refreshed, and how long one
+    # worker may hold the refresh before another takes over
+    BOSTA_TOKEN_TTL = int(os.environ.get('BOSTA_TOKEN_TTL', 3600))
+    PAYMOB_TOKEN_TTL = int(os.environ.get('PAYMOB_TOKEN_TTL', 3600))
+    API_TOKEN_REFRESH_MARGIN = 300
+    API_TOKEN_LOCK_TIMEOUT = 30
+    
+    # SQL instrumentation: Server-Timing header, per-request log line and
+    # per-endpoint counters; a statement run this many times in one request
+    # is reported as a likely N+1
+    SQL_METRICS = os.environ.get('SQL_METRICS', 'true').lower() in ('true', '1', 't')
+    SQL_REPEAT_THRESHOLD = 5
+    
+    # Background jobs: seconds an idle worker waits between polls, seconds a
+    # claimed job belongs to its worker, and the base and cap of the retry
+    # backoff in seconds
+    JOB_POLL_INTERVAL = 1.0
+    JOB_LOCK_TIMEOUT = 300
+    JOB_BACKOFF = 30
+    JOB_MAX_BACKOFF = 3600
     
     # Shipping Services
     ARAMEX_USERNAME = os.environ.get('ARAMEX_USERNAME')
@@ -102,6 +173,7 @@ class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
     WTF_CSRF_ENABLED = False
+    MAIL_BATCH_DELAY = 0
     
     # Bosta test credentials
     BOSTA_EMAIL = os.environ.get('BOSTA_TEST_EMAIL', os.environ.get('BOSTA_EMAIL'))
@@ -0,0 +1,26 @@
+"""Add full-text search index for products
+
+Revision ID: 5b1e9c2d7a40
+Revises: 37f726e80905
+Create Date: 2026-10-18 09:12:44.218303
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from app.utils.search import create_search_index, drop_search_index
+
+
+# revision identifiers, used by Alembic.
+revision = '5b1e9c2d7a40'
+down_revision = '37f726e80905'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # FTS5 table + triggers on SQLite, generated tsvector + GIN on PostgreSQL
+    create_search_index(op.get_bind())
+
+
+def downgrade():
+    drop_search_index(op.get_bind())
@@ -0,0 +1,36 @@
+"""Add denormalized primary image url to products
+
+Revision ID: 8c4f2a6e1d93
+Revises: 5b1e9c2d7a40
+Create Date: 2026-10-18 11:03:27.540918
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8c4f2a6e1d93'
+down_revision = '5b1e9c2d7a40'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('products', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('primary_image_url', sa.String(length=200), nullable=True))
+
+    # Backfill from the flagged primary image, falling back to the first image
+    op.execute("""
+        UPDATE products SET primary_image_url = (
+            SELECT image_url FROM product_images
+            WHERE product_images.product_id = products.id
+            ORDER BY is_primary DESC, id
+            LIMIT 1
+        )
+    """)
+
+
+def downgrade():
+    with op.batch_alter_table('products', schema=None) as batch_op:
+        batch_op.drop_column('primary_image_url')
@@ -0,0 +1,83 @@
+"""Add indexes for hot query shapes
+
+Revision ID: a4d7e2f91c36
+Revises: f3b8d1c05e72
+Create Date: 2026-10-18 16:02:47.318650
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4d7e2f91c36'
+down_revision = 'f3b8d1c05e72'
+branch_labels = None
+depends_on = None
+
+LISTING_INDEXES = [
+    ('ix_products_listing_price', ['price', 'id']),
+    ('ix_products_listing_created', ['created_at', 'id']),
+    ('ix_products_listing_category_price', ['category_id', 'price', 'id']),
+    ('ix_products_listing_category_created', ['category_id', 'created_at', 'id']),
+]
+
+
+def upgrade():
+    # Merge duplicate cart lines and wishlist entries before making the
+    # (user, product) pairs unique
+    op.execute("""
+        UPDATE cart SET quantity = (
+            SELECT SUM(dup.quantity) FROM cart dup
+            WHERE dup.user_id = cart.user_id AND dup.product_id = cart.product_id
+        )
+        WHERE id IN (SELECT MIN(id) FROM cart GROUP BY user_id, product_id HAVING COUNT(*) > 1)
+    """)
+    op.execute("DELETE FROM cart WHERE id NOT IN (SELECT MIN(id) FROM cart GROUP BY user_id, product_id)")
+    op.execute("DELETE FROM wishlist WHERE id NOT IN (SELECT MIN(id) FROM wishlist GROUP BY user_id, product_id)")
+
+    with op.batch_alter_table('cart', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_cart_user_product', ['user_id', 'product_id'])
+
+    with op.batch_alter_table('wishlist', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_wishlist_user_product', ['user_id', 'product_id'])
+
+    # Listings only ever show live products; index just those where the
+    # backend has partial indexes, otherwise lead with is_deleted
+    partial = op.get_bind().dialect.name in ('postgresql', 'sqlite')
+    live = sa.column('is_deleted', sa.Boolean) == sa.false()
+    for name, columns in LISTING_INDEXES:
+        if partial:
+            op.create_index(name, 'products', ['is_active'] + columns, unique=False,
+                            postgresql_where=live, sqlite_where=live)
+        else:
+            op.create_index(name, 'products', ['is_active', 'is_deleted'] + columns, unique=False)
+
+    with op.batch_alter_table('reviews', schema=None) as batch_op:
+        batch_op.create_index('ix_reviews_product_created', ['product_id', 'created_at'], unique=False)
+
+    with op.batch_alter_table('orders', schema=None) as batch_op:
+        batch_op.create_index('ix_orders_user_date', ['user_id', 'date_created'], unique=False)
+        batch_op.create_index('ix_orders_payment_status', ['payment_status', 'status', 'date_created'], unique=False)
+        batch_op.create_index('ix_orders_delivery_id', ['delivery_id'], unique=False)
+        batch_op.create_index('ix_orders_paymob_order_id', ['paymob_order_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('orders', schema=None) as batch_op:
+        batch_op.drop_index('ix_orders_paymob_order_id')
+        batch_op.drop_index('ix_orders_delivery_id')
+        batch_op.drop_index('ix_orders_payment_status')
+        batch_op.drop_index('ix_orders_user_date')
+
+    with op.batch_alter_table('reviews', schema=None) as batch_op:
+        batch_op.drop_index('ix_reviews_product_created')
+
+    for name, columns in reversed(LISTING_INDEXES):
+        op.drop_index(name, table_name='products')
+
+    with op.batch_alter_table('wishlist', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_wishlist_user_product', type_='unique')
+
+    with op.batch_alter_table('cart', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_cart_user_product', type_='unique')
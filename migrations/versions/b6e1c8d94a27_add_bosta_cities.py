@@ -0,0 +1,39 @@
+"""Add local Bosta city index
+
+Revision ID: b6e1c8d94a27
+Revises: a4d7e2f91c36
+Create Date: 2026-10-18 16:41:09.582113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b6e1c8d94a27'
+down_revision = 'a4d7e2f91c36'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('bosta_cities',
+    sa.Column('id', sa.String(length=64), nullable=False),
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('name_ar', sa.String(length=100), nullable=True),
+    sa.Column('code', sa.String(length=20), nullable=True),
+    sa.Column('district_id', sa.String(length=64), nullable=True),
+    sa.Column('aliases', sa.JSON(), nullable=True),
+    sa.Column('data', sa.JSON(), nullable=True),
+    sa.Column('date_updated', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('bosta_cities', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_bosta_cities_code'), ['code'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('bosta_cities', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_bosta_cities_code'))
+
+    op.drop_table('bosta_cities')
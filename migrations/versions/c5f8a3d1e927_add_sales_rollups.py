@@ -0,0 +1,92 @@
+"""Add daily sales rollups
+
+Revision ID: c5f8a3d1e927
+Revises: b4e9f2c7a613
+Create Date: 2026-10-18 21:48:03.217645
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5f8a3d1e927'
+down_revision = 'b4e9f2c7a613'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('sales_daily',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('payment_status', sa.String(length=20), nullable=False),
+    sa.Column('orders', sa.Integer(), nullable=False),
+    sa.Column('units', sa.Integer(), nullable=False),
+    sa.Column('revenue', sa.Float(), nullable=False),
+    sa.Column('discount', sa.Float(), nullable=False),
+    sa.Column('shipping', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('day', 'status', 'payment_status')
+    )
+    op.create_table('product_sales_daily',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('payment_status', sa.String(length=20), nullable=False),
+    sa.Column('orders', sa.Integer(), nullable=False),
+    sa.Column('units', sa.Integer(), nullable=False),
+    sa.Column('revenue', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ),
+    sa.PrimaryKeyConstraint('day', 'product_id', 'status', 'payment_status')
+    )
+    with op.batch_alter_table('product_sales_daily', schema=None) as batch_op:
+        batch_op.create_index('ix_product_sales_daily_product_day', ['product_id', 'day'], unique=False)
+
+    op.create_table('category_sales_daily',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('category_id', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('payment_status', sa.String(length=20), nullable=False),
+    sa.Column('orders', sa.Integer(), nullable=False),
+    sa.Column('units', sa.Integer(), nullable=False),
+    sa.Column('revenue', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['category_id'], ['categories.id'], ),
+    sa.PrimaryKeyConstraint('day', 'category_id', 'status', 'payment_status')
+    )
+    with op.batch_alter_table('category_sales_daily', schema=None) as batch_op:
+        batch_op.create_index('ix_category_sales_daily_category_day', ['category_id', 'day'], unique=False)
+
+    # Backfill from existing orders
+    op.execute("""
+        INSERT INTO sales_daily (day, status, payment_status, orders, units, revenue, discount, shipping)
+        SELECT DATE(o.date_created), o.status, o.payment_status, COUNT(o.id),
+            COALESCE(SUM(u.units), 0), COALESCE(SUM(o.total), 0),
+            COALESCE(SUM(o.discount), 0), COALESCE(SUM(o.shipping_cost), 0)
+        FROM orders o
+        LEFT JOIN (SELECT order_id, SUM(quantity) AS units FROM order_items GROUP BY order_id) u
+            ON u.order_id = o.id
+        GROUP BY DATE(o.date_created), o.status, o.payment_status
+    """)
+    for table, column, source in (('product_sales_daily', 'product_id', 'p.id'),
+                                  ('category_sales_daily', 'category_id', 'p.category_id')):
+        op.execute(f"""
+            INSERT INTO {table} (day, {column}, status, payment_status, orders, units, revenue)
+            SELECT DATE(o.date_created), {source}, o.status, o.payment_status,
+                COUNT(i.id), SUM(i.quantity), SUM(i.quantity * i.price)
+            FROM orders o
+            JOIN order_items i ON i.order_id = o.id
+            JOIN products p ON p.id = i.product_id
+            GROUP BY DATE(o.date_created), {source}, o.status, o.payment_status
+        """)
+
+
+def downgrade():
+    with op.batch_alter_table('category_sales_daily', schema=None) as batch_op:
+        batch_op.drop_index('ix_category_sales_daily_category_day')
+
+    op.drop_table('category_sales_daily')
+    with op.batch_alter_table('product_sales_daily', schema=None) as batch_op:
+        batch_op.drop_index('ix_product_sales_daily_product_day')
+
+    op.drop_table('product_sales_daily')
+    op.drop_table('sales_daily')
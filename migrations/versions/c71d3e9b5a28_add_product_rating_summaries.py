@@ -0,0 +1,49 @@
+"""Add per-product review rating summaries
+
+Revision ID: c71d3e9b5a28
+Revises: 8c4f2a6e1d93
+Create Date: 2026-10-18 12:26:05.917342
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c71d3e9b5a28'
+down_revision = '8c4f2a6e1d93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('product_rating_summaries',
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('review_count', sa.Integer(), nullable=False),
+    sa.Column('rating_sum', sa.Integer(), nullable=False),
+    sa.Column('stars_1', sa.Integer(), nullable=False),
+    sa.Column('stars_2', sa.Integer(), nullable=False),
+    sa.Column('stars_3', sa.Integer(), nullable=False),
+    sa.Column('stars_4', sa.Integer(), nullable=False),
+    sa.Column('stars_5', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ),
+    sa.PrimaryKeyConstraint('product_id')
+    )
+
+    # Backfill from existing reviews
+    op.execute("""
+        INSERT INTO product_rating_summaries
+            (product_id, review_count, rating_sum, stars_1, stars_2, stars_3, stars_4, stars_5)
+        SELECT product_id, COUNT(id), SUM(rating),
+            SUM(CASE WHEN rating = 1 THEN 1 ELSE 0 END),
+            SUM(CASE WHEN rating = 2 THEN 1 ELSE 0 END),
+            SUM(CASE WHEN rating = 3 THEN 1 ELSE 0 END),
+            SUM(CASE WHEN rating = 4 THEN 1 ELSE 0 END),
+            SUM(CASE WHEN rating = 5 THEN 1 ELSE 0 END)
+        FROM reviews
+        GROUP BY product_id
+    """)
+
+
+def downgrade():
+    op.drop_table('product_rating_summaries')
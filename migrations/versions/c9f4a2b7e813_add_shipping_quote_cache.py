@@ -0,0 +1,58 @@
+"""Cache carrier quotes in shipping_quotes
+
+Revision ID: c9f4a2b7e813
+Revises: b6e1c8d94a27
+Create Date: 2026-10-18 17:14:36.207459
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c9f4a2b7e813'
+down_revision = 'b6e1c8d94a27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Databases built from migrations alone never got this table
+    if 'shipping_quotes' not in sa.inspect(op.get_bind()).get_table_names():
+        op.create_table('shipping_quotes',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('order_id', sa.Integer(), nullable=True),
+        sa.Column('carrier_id', sa.Integer(), nullable=True),
+        sa.Column('method_id', sa.Integer(), nullable=True),
+        sa.Column('quote_key', sa.String(length=200), nullable=True),
+        sa.Column('cost', sa.Float(), nullable=False),
+        sa.Column('currency', sa.String(length=3), nullable=True),
+        sa.Column('quote_data', sa.JSON(), nullable=True),
+        sa.Column('is_selected', sa.Boolean(), nullable=True),
+        sa.Column('valid_until', sa.DateTime(), nullable=True),
+        sa.Column('date_created', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['carrier_id'], ['shipping_carriers.id'], ),
+        sa.ForeignKeyConstraint(['method_id'], ['shipping_methods.id'], ),
+        sa.ForeignKeyConstraint(['order_id'], ['orders.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        with op.batch_alter_table('shipping_quotes', schema=None) as batch_op:
+            batch_op.create_index(batch_op.f('ix_shipping_quotes_quote_key'), ['quote_key'], unique=False)
+        return
+
+    with op.batch_alter_table('shipping_quotes', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('quote_key', sa.String(length=200), nullable=True))
+        batch_op.alter_column('order_id', existing_type=sa.Integer(), nullable=True)
+        batch_op.alter_column('carrier_id', existing_type=sa.Integer(), nullable=True)
+        batch_op.alter_column('method_id', existing_type=sa.Integer(), nullable=True)
+        batch_op.create_index(batch_op.f('ix_shipping_quotes_quote_key'), ['quote_key'], unique=False)
+
+
+def downgrade():
+    op.execute("DELETE FROM shipping_quotes WHERE order_id IS NULL OR carrier_id IS NULL OR method_id IS NULL")
+    with op.batch_alter_table('shipping_quotes', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_shipping_quotes_quote_key'))
+        batch_op.alter_column('method_id', existing_type=sa.Integer(), nullable=False)
+        batch_op.alter_column('carrier_id', existing_type=sa.Integer(), nullable=False)
+        batch_op.alter_column('order_id', existing_type=sa.Integer(), nullable=False)
+        batch_op.drop_column('quote_key')
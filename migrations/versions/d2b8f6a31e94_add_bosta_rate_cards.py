@@ -0,0 +1,33 @@
+"""Add Bosta rate cards
+
+Revision ID: d2b8f6a31e94
+Revises: c9f4a2b7e813
+Create Date: 2026-10-18 17:52:21.640318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2b8f6a31e94'
+down_revision = 'c9f4a2b7e813'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('bosta_rate_cards',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('pickup_city', sa.String(length=100), nullable=False),
+    sa.Column('dropoff_city', sa.String(length=100), nullable=False),
+    sa.Column('size', sa.String(length=20), nullable=False),
+    sa.Column('tier', sa.JSON(), nullable=False),
+    sa.Column('date_updated', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('pickup_city', 'dropoff_city', 'size', name='uq_bosta_rate_card_route')
+    )
+
+
+def downgrade():
+    op.drop_table('bosta_rate_cards')
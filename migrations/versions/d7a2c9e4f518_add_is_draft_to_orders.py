@@ -0,0 +1,40 @@
+"""Add is_draft to orders
+
+Revision ID: d7a2c9e4f518
+Revises: c5f8a3d1e927
+Create Date: 2026-10-19 09:12:40.418263
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd7a2c9e4f518'
+down_revision = 'c5f8a3d1e927'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('orders', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('is_draft', sa.Boolean(), nullable=False, server_default=sa.false()))
+
+    # Mark the unpaid orders opened from checkout drafts, and the ones the
+    # old checkout page created on every visit: pending zero-shipping COD
+    # orders that never took any stock (f3b8d1c05e72 gave them no
+    # committed reservation)
+    op.execute("""
+        UPDATE orders SET is_draft = TRUE
+        WHERE status = 'pending' AND payment_status IN ('pending', 'failed')
+          AND paymob_payment_id IS NULL AND stripe_payment_id IS NULL AND delivery_order_id IS NULL
+          AND (payment_method = 'card'
+               OR (payment_method = 'cod' AND shipping_cost = 0
+                   AND NOT EXISTS (SELECT 1 FROM stock_reservations r
+                                   WHERE r.order_id = orders.id AND r.expires_at IS NULL)))
+    """)
+
+
+def downgrade():
+    with op.batch_alter_table('orders', schema=None) as batch_op:
+        batch_op.drop_column('is_draft')
@@ -0,0 +1,28 @@
+"""Add catalog version counters
+
+Revision ID: e2a9b47c6f15
+Revises: c71d3e9b5a28
+Create Date: 2026-10-18 13:48:51.602214
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2a9b47c6f15'
+down_revision = 'c71d3e9b5a28'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('catalog_versions',
+    sa.Column('name', sa.String(length=64), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade():
+    op.drop_table('catalog_versions')
@@ -0,0 +1,26 @@
+"""Add next_attempt_at to the email outbox
+
+Revision ID: e3b7d5a1c824
+Revises: d7a2c9e4f518
+Create Date: 2026-10-19 10:03:27.651094
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e3b7d5a1c824'
+down_revision = 'd7a2c9e4f518'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('email_outbox', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('next_attempt_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('email_outbox', schema=None) as batch_op:
+        batch_op.drop_column('next_attempt_at')
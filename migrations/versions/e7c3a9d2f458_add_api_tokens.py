@@ -0,0 +1,32 @@
+"""Add shared API tokens
+
+Revision ID: e7c3a9d2f458
+Revises: d2b8f6a31e94
+Create Date: 2026-10-18 19:06:43.218957
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7c3a9d2f458'
+down_revision = 'd2b8f6a31e94'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('api_tokens',
+    sa.Column('name', sa.String(length=64), nullable=False),
+    sa.Column('token', sa.Text(), nullable=True),
+    sa.Column('expires_at', sa.DateTime(), nullable=True),
+    sa.Column('locked_until', sa.DateTime(), nullable=True),
+    sa.Column('lock_owner', sa.String(length=64), nullable=True),
+    sa.Column('date_updated', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade():
+    op.drop_table('api_tokens')
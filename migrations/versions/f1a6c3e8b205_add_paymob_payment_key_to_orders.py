@@ -0,0 +1,30 @@
+"""Add PayMob amount and payment key to orders
+
+Revision ID: f1a6c3e8b205
+Revises: e7c3a9d2f458
+Create Date: 2026-10-18 19:48:12.530714
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1a6c3e8b205'
+down_revision = 'e7c3a9d2f458'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('orders', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('paymob_amount_cents', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('paymob_payment_key', sa.Text(), nullable=True))
+        batch_op.add_column(sa.Column('paymob_payment_key_expires_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('orders', schema=None) as batch_op:
+        batch_op.drop_column('paymob_payment_key_expires_at')
+        batch_op.drop_column('paymob_payment_key')
+        batch_op.drop_column('paymob_amount_cents')
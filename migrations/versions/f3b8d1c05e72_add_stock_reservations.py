@@ -0,0 +1,55 @@
+"""Add stock reservations
+
+Revision ID: f3b8d1c05e72
+Revises: e2a9b47c6f15
+Create Date: 2026-10-18 15:20:13.774025
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3b8d1c05e72'
+down_revision = 'e2a9b47c6f15'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('stock_reservations',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('order_id', sa.Integer(), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('quantity', sa.Integer(), nullable=False),
+    sa.Column('expires_at', sa.DateTime(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['order_id'], ['orders.id'], ),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('stock_reservations', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_stock_reservations_order_id'), ['order_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_stock_reservations_expires_at'), ['expires_at'], unique=False)
+
+    # Open orders placed through the checkout form already had their stock
+    # subtracted; record that as committed reservations so cancelling them
+    # still gives it back. The checkout page opened a zero-shipping COD
+    # order on every visit without taking stock, and paying one through
+    # PayMob took none either, so those orders get no reservation
+    op.execute("""
+        INSERT INTO stock_reservations (order_id, product_id, quantity, expires_at, created_at)
+        SELECT order_items.order_id, order_items.product_id, order_items.quantity, NULL, orders.date_created
+        FROM order_items JOIN orders ON orders.id = order_items.order_id
+        WHERE orders.status IN ('pending', 'processing', 'paid')
+          AND orders.paymob_order_id IS NULL
+          AND (orders.stripe_payment_id IS NOT NULL OR orders.shipping_cost > 0)
+    """)
+
+
+def downgrade():
+    with op.batch_alter_table('stock_reservations', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_stock_reservations_expires_at'))
+        batch_op.drop_index(batch_op.f('ix_stock_reservations_order_id'))
+
+    op.drop_table('stock_reservations')
@@ -6,7 +6,7 @@ from app import create_app
 from app.extensions import db
 from app.models.product import Product
 from app.models.user import User
-from app.models.review import Review
+from app.models.review import Review, ProductRatingSummary
 import random
 from datetime import datetime, timedelta
 
@@ -85,6 +85,7 @@ def create_sample_reviews():
         
         try:
             db.session.commit()
+            ProductRatingSummary.rebuild()
             print(f"Successfully added {reviews_added} sample reviews")
         except Exception as e:
             db.session.rollback()
@@ -0,0 +1,46 @@
+import sys
+import os
+import argparse
+import json
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tests.fakes.bosta import FakeBosta
+
+def simulate(args):
+    """Serve the Bosta simulator until interrupted"""
+    simulator = FakeBosta(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        token_ttl=args.token_ttl,
+        email=args.email,
+        password=args.password,
+        pickup_city=args.pickup_city,
+        seed=args.seed
+    )
+    simulator.start(port=args.port)
+    print(f"Bosta simulator listening on {simulator.url}")
+    print(f"Point the shop at it with BOSTA_BASE_URL={simulator.url}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        simulator.stop()
+        print(f"Calls: {json.dumps(dict(simulator.calls))}")
+        print(f"Responses: {json.dumps({str(status): count for status, count in simulator.statuses.items()})}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Serve a local Bosta API built from bosta.yaml')
+    parser.add_argument('--port', type=int, default=8090, help='Port to listen on')
+    parser.add_argument('--latency', type=float, default=0.15, help='Mean seconds each call takes')
+    parser.add_argument('--jitter', type=float, default=0.05, help='Spread of the latency, in seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of calls answered with a 500')
+    parser.add_argument('--token-ttl', type=float, default=None, help='Seconds a login token is accepted')
+    parser.add_argument('--email', default=None, help='Only accept logins with this email')
+    parser.add_argument('--password', default=None, help='Only accept logins with this password')
+    parser.add_argument('--pickup-city', default='Ismailia', help='City of the default pickup location')
+    parser.add_argument('--seed', type=int, default=None, help='Seed for latency and errors')
+    simulate(parser.parse_args())
@@ -0,0 +1,69 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import datetime, timedelta
+from app import create_app
+from app.extensions import db
+from app.models.cart import Cart
+from app.models.coupon import Coupon
+from app.models.order import Order
+from app.models.product import Product
+from app.models.review import Review
+from app.models.wishlist import Wishlist
+from app.utils.pagination import SORT_KEYS
+
+def _listing(sort_by, category_id=None):
+    query = Product.query.filter_by(is_active=True, is_deleted=False)
+    if category_id is not None:
+        query = query.filter_by(category_id=category_id)
+    order_by = [column.desc() if descending else column for column, descending in SORT_KEYS[sort_by]]
+    return query.order_by(*order_by).limit(13)
+
+def hot_queries():
+    """The queries behind the busiest routes, with representative parameters"""
+    since = datetime.utcnow() - timedelta(days=30)
+    return [
+        ('shop, price low to high', _listing('price_low')),
+        ('shop, newest first', _listing('newest')),
+        ('category, price high to low', _listing('price_high', category_id=1)),
+        ('category, newest first', _listing('newest', category_id=1)),
+        ('product page reviews', Review.query.filter_by(product_id=1).order_by(Review.created_at.desc())),
+        ('add to cart lookup', Cart.query.filter_by(user_id=1, product_id=1)),
+        ('wishlist toggle lookup', Wishlist.query.filter_by(user_id=1, product_id=1)),
+        ('my orders', Order.query.filter_by(user_id=1).order_by(Order.date_created.desc())),
+        ('PayMob callback', Order.query.filter_by(paymob_order_id='123456')),
+        ('Bosta webhook', Order.query.filter_by(delivery_id='abc123')),
+        ('admin orders by payment status', Order.query.filter(
+            Order.payment_status == 'paid', Order.status == 'processing', Order.date_created >= since
+        ).order_by(Order.date_created.desc())),
+        ('apply coupon', Coupon.query.filter_by(code='WELCOME10')),
+    ]
+
+def explain(query):
+    """Run EXPLAIN for a query with its parameters bound, as the route runs it"""
+    dialect = db.engine.dialect
+    compiled = query.statement.compile(dialect=dialect)
+    params = compiled.params
+    if compiled.positional:
+        params = tuple(params[name] for name in compiled.positiontup)
+    prefix = 'EXPLAIN QUERY PLAN ' if dialect.name == 'sqlite' else 'EXPLAIN '
+    with db.engine.connect() as connection:
+        return connection.exec_driver_sql(prefix + str(compiled), params).fetchall()
+
+def explain_hot_queries():
+    """Print the query plan of every hot route query"""
+    app = create_app()
+    
+    with app.app_context():
+        for name, query in hot_queries():
+            print(f"== {name}")
+            try:
+                for row in explain(query):
+                    print("   ", row[-1] if db.engine.dialect.name == 'sqlite' else row[0])
+            except Exception as e:
+                print(f"    Error explaining query: {str(e)}")
+            print()
+
+if __name__ == "__main__":
+    explain_hot_queries()
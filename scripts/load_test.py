@@ -0,0 +1,91 @@
+import sys
+import os
+import argparse
+import json
+import logging
+import tempfile
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from tests.fakes.bosta import FakeBosta
+from tests.fakes.paymob import FakePayMob
+from tests.load.harness import HMAC_SECRET, LiveServer, load_test_config, prepare_shop, run_load
+from tests.load.report import compare_reports
+
+def load_test(args):
+    """Load-test the shop on a local server against fake Bosta and PayMob"""
+    database = args.database or os.path.join(tempfile.mkdtemp(prefix='shop-load-'), 'shop.db')
+    if os.path.exists(database):
+        print(f"Refusing to seed over an existing database: {database}")
+        return 1
+
+    # One access log line per request would drown the results
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    
+    with FakeBosta(latency=args.bosta_latency, jitter=args.jitter, seed=args.seed,
+                   error_rate=args.bosta_error_rate, token_ttl=args.bosta_token_ttl) as bosta, \
+            FakePayMob(latency=args.paymob_latency, jitter=args.jitter, seed=args.seed,
+                       decline_rate=args.decline_rate, hmac_secret=HMAC_SECRET) as paymob:
+        app = create_app(load_test_config(f'sqlite:///{database}', bosta.url, paymob.url))
+        with app.app_context():
+            customers, product_ids = prepare_shop(args.users)
+
+        print(f"Running {args.users} shoppers for {args.iterations or 'unlimited'} journeys "
+              f"or {args.duration}s against {database}")
+        with LiveServer(app) as server:
+            recorder, elapsed = run_load(server.url, customers, product_ids, paymob.url,
+                                         users=args.users, duration=args.duration, iterations=args.iterations,
+                                         think=args.think, seed=args.seed)
+
+    report = recorder.report(elapsed, settings={
+        'users': args.users,
+        'duration_s': args.duration,
+        'iterations': args.iterations,
+        'think_s': args.think,
+        'bosta_latency_s': args.bosta_latency,
+        'paymob_latency_s': args.paymob_latency,
+        'jitter_s': args.jitter,
+        'bosta_error_rate': args.bosta_error_rate,
+        'bosta_token_ttl_s': args.bosta_token_ttl,
+        'decline_rate': args.decline_rate,
+        'seed': args.seed,
+        'upstream_calls': {'bosta': dict(bosta.calls), 'paymob': dict(paymob.calls)},
+        'bosta_responses': {str(status): count for status, count in bosta.statuses.items()},
+    })
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print(f"{'step':<18}{'requests':>9}{'errors':>8}{'req/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for name, stats in list(report['steps'].items()) + [('total', report['total'])]:
+        print(f"{name:<18}{stats['requests']:>9}{stats['errors']:>8}{stats['throughput_rps']:>8}"
+              f"{stats['p50_ms']:>9}{stats['p95_ms']:>9}{stats['p99_ms']:>9}")
+    print(f"Journeys: {json.dumps(report['journeys'])}")
+    print(f"Report written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print(f"\nChanges against {args.baseline}:")
+        for step, metric, old, new, change in compare_reports(baseline, report):
+            print(f"{step:<18}{metric:<16}{str(old):>10} -> {str(new):<10}"
+                  f"{'' if change is None else f'{change:+.1f}%'}")
+    return 1 if report['total']['errors'] else 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Run scripted shopper journeys against a local shop '
+                                                 'with fake Bosta and PayMob, and report latency per step')
+    parser.add_argument('--users', type=int, default=10, help='Concurrent shoppers')
+    parser.add_argument('--duration', type=float, default=60, help='Seconds to run for')
+    parser.add_argument('--iterations', type=int, default=None, help='Stop each shopper after this many journeys')
+    parser.add_argument('--think', type=float, default=0.5, help='Mean pause before each step, in seconds')
+    parser.add_argument('--bosta-latency', type=float, default=0.15, help='Seconds each fake Bosta call takes')
+    parser.add_argument('--paymob-latency', type=float, default=0.25, help='Seconds each fake PayMob call takes')
+    parser.add_argument('--jitter', type=float, default=0.05, help='Spread of the upstream latencies, in seconds')
+    parser.add_argument('--bosta-error-rate', type=float, default=0.0, help='Share of Bosta calls answered with a 500')
+    parser.add_argument('--bosta-token-ttl', type=float, default=None, help='Seconds a Bosta login token is accepted')
+    parser.add_argument('--decline-rate', type=float, default=0.0, help='Share of card payments PayMob declines')
+    parser.add_argument('--seed', type=int, default=1, help='Seed for the shoppers and fakes')
+    parser.add_argument('--database', default=None, help='SQLite file to create (default: a temporary one)')
+    parser.add_argument('--output', default='load_report.json', help='Where to write the JSON report')
+    parser.add_argument('--baseline', default=None, help='Earlier report to compare against')
+    sys.exit(load_test(parser.parse_args()))
@@ -0,0 +1,22 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from app.extensions import db
+from app.models.review import ProductRatingSummary
+
+def rebuild_rating_summaries():
+    """Recompute every product's review count, rating sum and star histogram"""
+    app = create_app()
+    
+    with app.app_context():
+        try:
+            products = ProductRatingSummary.rebuild()
+            print(f"Rebuilt rating summaries for {products} products")
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error rebuilding rating summaries: {str(e)}")
+
+if __name__ == "__main__":
+    rebuild_rating_summaries()
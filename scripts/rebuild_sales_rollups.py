@@ -0,0 +1,32 @@
+import sys
+import os
+import argparse
+from datetime import datetime
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from app.extensions import db
+from app.models.sales_rollup import rebuild_sales_rollups
+
+def _date(value):
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+def rebuild(date_from, date_to):
+    """Recompute the daily sales rollups from the orders table"""
+    app = create_app()
+    
+    with app.app_context():
+        try:
+            days = rebuild_sales_rollups(date_from, date_to)
+            db.session.commit()
+            print(f"Rebuilt sales rollups for {days} days")
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error rebuilding sales rollups: {str(e)}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Recompute the daily sales rollups from the orders table')
+    parser.add_argument('--from', dest='date_from', type=_date, default=None, help='First day, YYYY-MM-DD')
+    parser.add_argument('--to', dest='date_to', type=_date, default=None, help='Last day, YYYY-MM-DD')
+    args = parser.parse_args()
+    rebuild(args.date_from, args.date_to)
@@ -0,0 +1,30 @@
+import sys
+import os
+import argparse
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from app.extensions import db
+from app.shipping.city_index import city_index_stale, refresh_city_index
+
+def refresh_bosta_cities(if_stale=False):
+    """Download Bosta's city list into the local city index"""
+    app = create_app()
+    
+    with app.app_context():
+        if if_stale and not city_index_stale():
+            print("Bosta city index is up to date")
+            return
+        try:
+            count = refresh_city_index()
+            db.session.commit()
+            print(f"Stored {count} Bosta cities")
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error refreshing Bosta cities: {str(e)}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Refresh the local index of Bosta cities')
+    parser.add_argument('--if-stale', action='store_true',
+                        help='Only refresh when the stored list is older than BOSTA_CITY_INDEX_TTL_HOURS')
+    refresh_bosta_cities(parser.parse_args().if_stale)
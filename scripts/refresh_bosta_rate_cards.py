@@ -0,0 +1,29 @@
+import sys
+import os
+import argparse
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from app.extensions import db
+from app.shipping.services import BostaShippingService
+from app.shipping.rate_card import refresh_rate_cards
+
+def refresh_bosta_rate_cards(pickup_city, sizes):
+    """Fetch Bosta's pricing tier for every governorate into the local rate card"""
+    app = create_app()
+    
+    with app.app_context():
+        try:
+            count = refresh_rate_cards(BostaShippingService(), pickup_city=pickup_city, sizes=sizes)
+            db.session.commit()
+            print(f"Stored {count} Bosta rate cards")
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error refreshing Bosta rate cards: {str(e)}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Refresh the local Bosta rate card')
+    parser.add_argument('--pickup', help='Pickup city (defaults to BOSTA_PICKUP_CITY)')
+    parser.add_argument('--size', action='append', dest='sizes', help='Package size, may be repeated (default MEDIUM)')
+    args = parser.parse_args()
+    refresh_bosta_rate_cards(args.pickup, tuple(args.sizes or ['MEDIUM']))
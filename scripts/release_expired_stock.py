@@ -0,0 +1,23 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from app.extensions import db
+from app.utils.inventory import release_expired
+
+def release_expired_stock():
+    """Give back the stock of checkout holds whose payment window lapsed"""
+    app = create_app()
+    
+    with app.app_context():
+        try:
+            released = release_expired()
+            db.session.commit()
+            print(f"Released {released} expired stock holds")
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error releasing expired stock holds: {str(e)}")
+
+if __name__ == "__main__":
+    release_expired_stock()
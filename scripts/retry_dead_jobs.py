@@ -0,0 +1,27 @@
+import sys
+import os
+import argparse
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from app.extensions import db
+from app.utils.jobs import retry_dead_jobs
+
+def retry(job_type):
+    """Queue dead-lettered background jobs again"""
+    app = create_app()
+    
+    with app.app_context():
+        try:
+            count = retry_dead_jobs(job_type)
+            db.session.commit()
+            print(f"Queued {count} dead jobs again")
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error retrying dead jobs: {str(e)}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Queue dead-lettered background jobs again')
+    parser.add_argument('--type', dest='job_type', default=None, help='Only jobs of this type, e.g. bosta.create_shipment')
+    args = parser.parse_args()
+    retry(args.job_type)
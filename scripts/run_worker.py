@@ -0,0 +1,48 @@
+import sys
+import os
+import argparse
+import threading
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from app.extensions import db
+from app.utils.jobs import Worker
+
+def work(app, once, max_jobs):
+    """Run queued background jobs in one thread"""
+    with app.app_context():
+        try:
+            count = Worker().work(once=once, max_jobs=max_jobs)
+            print(f"Ran {count} jobs")
+        except KeyboardInterrupt:
+            pass
+        except Exception as e:
+            db.session.rollback()
+            print(f"Job worker stopped: {str(e)}")
+        finally:
+            db.session.remove()
+
+def run(threads, once, max_jobs):
+    """Run the job worker, optionally with several threads"""
+    app = create_app()
+    
+    if threads == 1:
+        work(app, once, max_jobs)
+        return
+    
+    workers = [threading.Thread(target=work, args=(app, once, max_jobs), daemon=True) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Run queued background jobs (emails, Bosta shipments)')
+    parser.add_argument('--threads', type=int, default=1, help='Jobs run at the same time by this process')
+    parser.add_argument('--once', action='store_true', help='Exit when no job is due')
+    parser.add_argument('--max-jobs', type=int, default=None, help='Exit after running this many jobs')
+    args = parser.parse_args()
+    run(args.threads, args.once, args.max_jobs)
@@ -0,0 +1,30 @@
+import sys
+import os
+import argparse
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from app.extensions import db
+from app.utils.checkout import sweep_abandoned_orders
+
+def sweep(hours, dry_run):
+    """Delete pending orders that were never paid for or placed"""
+    app = create_app()
+    
+    with app.app_context():
+        try:
+            count = sweep_abandoned_orders(hours=hours, dry_run=dry_run)
+            if dry_run:
+                print(f"{count} abandoned orders older than {hours} hours would be deleted")
+            else:
+                print(f"Deleted {count} abandoned orders older than {hours} hours")
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error sweeping abandoned orders: {str(e)}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Delete abandoned pending orders')
+    parser.add_argument('--hours', type=int, default=24, help='Only delete orders older than this')
+    parser.add_argument('--dry-run', action='store_true', help='Only count the orders')
+    args = parser.parse_args()
+    sweep(args.hours, args.dry_run)
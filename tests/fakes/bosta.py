@@ -0,0 +1,309 @@
+"""Bosta API simulator built from the OpenAPI spec in bosta.yaml
+
+Serves the endpoints BostaShippingService calls, with responses shaped
+like the spec's examples for each operation (the example is copied and the
+fields that vary per call filled in) and request bodies checked against
+the spec's required fields:
+
+* ``POST /users/login``
+* ``GET /cities`` (the governorates of app.utils.city_mapping, each with a
+  zone and district)
+* ``GET /pickup-locations``
+* ``POST /deliveries``
+* ``GET /deliveries/business/<trackingNumber>``, and
+  ``GET /deliveries/tracking/<trackingNumber>`` which the shop calls and
+  the spec doesn't list, answered the same way
+* ``GET /pricing/shipment/calculator``; the spec gives no example, so it
+  answers with the pricing tier the shop reads (``data.tier``)
+* ``DELETE /deliveries/business/<trackingNumber>/terminate``
+
+Every call but login needs a token from login; tokens stop being accepted
+after ``token_ttl`` seconds (or on expire_tokens()) and get the spec's 401,
+so the shop's re-login path can be exercised. Latency and error rates are
+configured as for any FakeUpstream. Run it standalone with
+``scripts/bosta_simulator.py``.
+"""
+import copy
+import itertools
+import os
+import threading
+import time
+from datetime import datetime
+from functools import lru_cache
+import yaml
+from app.utils.city_mapping import CITIES
+from tests.fakes.upstream import FakeUpstream
+
+SPEC_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'bosta.yaml')
+
+# Delivery types the calculator accepts, per the spec
+CALCULATOR_TYPES = ('SEND', 'CASH_COLLECTION', 'CUSTOMER_RETURN_PICKUP', 'EXCHANGE', 'SIGN_AND_RETURN')
+TERMINATED = {'code': 46, 'value': 'Terminated'}
+# Priced as Bosta's far zones by the calculator
+REMOTE_CITIES = frozenset(['Aswan', 'Luxor', 'Qena', 'Sohag', 'Red Sea', 'New Valley', 'North Coast'])
+
+
+@lru_cache(maxsize=None)
+def load_spec(path=SPEC_PATH):
+    """The parsed OpenAPI document, read once per process"""
+    with open(path, encoding='utf-8') as f:
+        return yaml.load(f, Loader=getattr(yaml, 'CSafeLoader', yaml.SafeLoader))
+
+
+class BostaSpec:
+    """Lookups into the Bosta OpenAPI document"""
+
+    def __init__(self, path=SPEC_PATH):
+        self.document = load_spec(path)
+
+    def operation(self, method, path):
+        return self.document['paths'][path][method.lower()]
+
+    def example(self, method, path, status='200'):
+        """A deep copy of the JSON example for one response of an operation"""
+        response = self.operation(method, path)['responses'][status]
+        return copy.deepcopy(response['content']['application/json']['example'])
+
+    def required_fields(self, method, path):
+        """Top-level fields the operation's request body must have"""
+        schema = self.operation(method, path)['requestBody']['content']['application/json']['schema']
+        return self._resolve(schema).get('required', [])
+
+    def _resolve(self, schema):
+        ref = schema.get('$ref')
+        if not ref:
+            return schema
+        node = self.document
+        for part in ref.lstrip('#/').split('/'):
+            node = node[part]
+        return node
+
+
+def simulated_cities():
+    """Bosta's governorate list, one zone and district per city"""
+    cities = []
+    for name, data in CITIES.items():
+        code = data['code']
+        number = code.split('-')[1]
+        cities.append({
+            '_id': f'city-{number}',
+            'name': name,
+            'nameAr': data['ar'],
+            'alias': name,
+            'code': code,
+            'sector': int(number),
+            'hub': {'_id': f'hub-{number}', 'name': f'{name} Hub'},
+            'pickupAvailability': True,
+            'dropOffAvailability': True,
+            'showAsDropOffCity': True,
+            'showAsPickupCity': True,
+            'zones': [{'_id': f'zone-{number}', 'name': name,
+                       'districts': [{'_id': f'district-{number}', 'name': name}]}],
+        })
+    return cities
+
+
+class FakeBosta(FakeUpstream):
+    """Simulated Bosta API
+
+    Args:
+        token_ttl (float): Seconds a login token is accepted; None for ever
+        email (str): Only this login is accepted, when given
+        password (str): Only this password is accepted, when given
+        pickup_city (str): City of the default pickup location
+        spec_path (str): OpenAPI document the responses are taken from
+        **kwargs: Latency, error rate and seed, see FakeUpstream
+    """
+
+    name = 'bosta'
+
+    def __init__(self, token_ttl=None, email=None, password=None, pickup_city='Ismailia', spec_path=SPEC_PATH,
+                 **kwargs):
+        super().__init__(**kwargs)
+        self.spec = BostaSpec(spec_path)
+        self.token_ttl = token_ttl
+        self.email = email
+        self.password = password
+        self.pickup_city = pickup_city
+        self.cities = {city['name'].casefold(): city for city in simulated_cities()}
+        self.deliveries = {}
+        self._tokens = {}
+        self._ids = itertools.count(5100001)
+        self._state_lock = threading.Lock()
+
+        self.route('POST', '/users/login', self.login)
+        self.route('GET', '/cities', self.list_cities)
+        self.route('GET', '/pickup-locations', self.pickup_locations)
+        self.route('POST', '/deliveries', self.create_delivery)
+        self.route('GET', r'/deliveries/business/(?P<tracking_number>[\w-]+)', self.view_delivery)
+        self.route('GET', r'/deliveries/tracking/(?P<tracking_number>[\w-]+)', self.view_delivery)
+        self.route('GET', '/pricing/shipment/calculator', self.calculator)
+        self.route('DELETE', r'/deliveries/business/(?P<tracking_number>[\w-]+)/terminate', self.terminate_delivery)
+
+    def expire_tokens(self):
+        """Reject every token issued so far, as if they had all expired"""
+        with self._state_lock:
+            self._tokens.clear()
+
+    def error_response(self, request):
+        return 500, self.spec.example('POST', '/users/login', '500')
+
+    # Endpoints
+
+    def login(self, request):
+        data = request.get_json(silent=True) or {}
+        missing = self._missing(data, 'POST', '/users/login')
+        if missing:
+            return missing
+        if (self.email and data['email'] != self.email) or (self.password and data['password'] != self.password):
+            return 401, self.spec.example('POST', '/users/login', '401')
+        token = f'sim-{next(self._ids)}'
+        with self._state_lock:
+            self._tokens[token] = time.monotonic()
+        body = self.spec.example('POST', '/users/login')
+        body['data']['token'] = f'Bearer {token}'
+        body['data']['user']['emails'][0]['address'] = data['email']
+        return 200, body
+
+    def list_cities(self, request):
+        denied = self._authorize(request, 'GET', '/cities')
+        if denied:
+            return denied
+        body = self.spec.example('GET', '/cities')
+        body['data']['list'] = list(self.cities.values())
+        return 200, body
+
+    def pickup_locations(self, request):
+        denied = self._authorize(request, 'GET', '/pickup-locations')
+        if denied:
+            return denied
+        body = self.spec.example('GET', '/pickup-locations')
+        city = self.cities[self.pickup_city.casefold()]
+        default = body['data']['list'][0]
+        default['address']['city'] = {'_id': city['_id'], 'name': city['name']}
+        default['address']['district'] = city['name']
+        return 200, body
+
+    def create_delivery(self, request):
+        denied = self._authorize(request, 'POST', '/deliveries')
+        if denied:
+            return denied
+        data = request.get_json(silent=True) or {}
+        missing = self._missing(data, 'POST', '/deliveries')
+        if missing:
+            return missing
+
+        number = next(self._ids)
+        view = self.spec.example('GET', '/deliveries/business/{trackingNumber}')['data']
+        view.update({
+            '_id': f'delivery-{number}',
+            'trackingNumber': str(number),
+            'cod': data['cod'],
+            'notes': data.get('notes', ''),
+            'businessReference': data.get('businessReference'),
+            'createdAt': _timestamp(),
+            'updatedAt': _timestamp(),
+        })
+        receiver = data.get('receiver') or {}
+        view['receiver'] = dict(receiver, fullName=f"{receiver.get('firstName', '')} {receiver.get('lastName', '')}".strip())
+        with self._state_lock:
+            self.deliveries[view['trackingNumber']] = view
+
+        body = self.spec.example('POST', '/deliveries')
+        body['data'].update(_id=view['_id'], trackingNumber=view['trackingNumber'], state=copy.deepcopy(view['state']))
+        return 200, body
+
+    def view_delivery(self, request, tracking_number):
+        denied = self._authorize(request, 'GET', '/deliveries/business/{trackingNumber}')
+        if denied:
+            return denied
+        delivery = self._find_delivery(tracking_number)
+        if delivery is None:
+            return 404, {'success': False, 'message': 'Delivery not found', 'errorCode': 1004, 'data': None}
+        body = self.spec.example('GET', '/deliveries/business/{trackingNumber}')
+        body['data'] = copy.deepcopy(delivery)
+        return 200, body
+
+    def calculator(self, request):
+        denied = self._authorize(request, 'GET', '/pricing/shipment/calculator')
+        if denied:
+            return denied
+        delivery_type = request.args.get('type', 'SEND')
+        dropoff = self.cities.get(request.args.get('dropOffCity', '').casefold())
+        pickup = self.cities.get(request.args.get('pickupCity', self.pickup_city).casefold())
+        if delivery_type not in CALCULATOR_TYPES or not dropoff or not pickup:
+            return 400, {'success': False, 'message': 'Invalid pickup city, drop-off city or type',
+                         'errorCode': 1001, 'data': None}
+        return 200, {'success': True, 'message': 'Done successfully.', 'data': {
+            'tier': self.tier(pickup, dropoff),
+            'dropOffCity': dropoff['name'],
+            'pickupCity': pickup['name'],
+        }}
+
+    def terminate_delivery(self, request, tracking_number):
+        denied = self._authorize(request, 'DELETE', '/deliveries/business/{trackingNumber}/terminate')
+        if denied:
+            return denied
+        delivery = self._find_delivery(tracking_number)
+        if delivery is None:
+            return 404, {'success': False, 'message': 'Delivery not found', 'errorCode': 1004, 'data': None}
+        with self._state_lock:
+            delivery['state'] = dict(TERMINATED)
+            delivery['updatedAt'] = _timestamp()
+        body = self.spec.example('DELETE', '/deliveries/business/{trackingNumber}/terminate')
+        body['data']['_id'] = delivery['_id']
+        return 200, body
+
+    # Helpers
+
+    @staticmethod
+    def tier(pickup, dropoff):
+        """Pricing tier for a route: cheapest within a city, dearest to remote cities"""
+        if pickup['name'] == dropoff['name']:
+            cost = 45
+        elif dropoff['name'] in REMOTE_CITIES:
+            cost = 80
+        else:
+            cost = 55
+        return {
+            'cost': cost,
+            'openingPackageFee': {'amount': 0},
+            'bostaMaterialFee': {'amount': 0},
+            'extraCodFee': {'percentage': 0.01, 'minimumFeeAmount': 10},
+        }
+
+    def _authorize(self, request, method, path):
+        """The spec's 401 unless the request carries a live token"""
+        token = request.headers.get('Authorization', '').removeprefix('Bearer ').strip()
+        with self._state_lock:
+            issued = self._tokens.get(token)
+            if issued is not None and self.token_ttl is not None and time.monotonic() - issued >= self.token_ttl:
+                del self._tokens[token]
+                issued = None
+        if issued is None:
+            return 401, self._unauthorized(method, path)
+        return None
+
+    def _unauthorized(self, method, path):
+        try:
+            return self.spec.example(method, path, '401')
+        except KeyError:
+            return self.spec.example('POST', '/users/login', '401')
+
+    def _missing(self, data, method, path):
+        missing = [field for field in self.spec.required_fields(method, path) if data.get(field) is None]
+        if missing:
+            return 400, {'success': False, 'message': f'Missing required fields: {", ".join(missing)}',
+                         'errorCode': 1001, 'data': None}
+        return None
+
+    def _find_delivery(self, key):
+        with self._state_lock:
+            delivery = self.deliveries.get(key)
+            if delivery is None:
+                delivery = next((d for d in self.deliveries.values() if d['_id'] == key), None)
+            return delivery
+
+
+def _timestamp():
+    return datetime.utcnow().isoformat(timespec='seconds') + 'Z'
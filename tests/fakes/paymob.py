@@ -0,0 +1,79 @@
+"""Fake PayMob Accept API: auth, orders, payment keys and the card iframe"""
+import itertools
+import threading
+from datetime import datetime
+from app.utils.paymob_utils import transaction_hmac
+from tests.fakes.upstream import FakeUpstream
+
+
+class FakePayMob(FakeUpstream):
+    """Registers orders and payment keys like PayMob's Accept API
+
+    Paying in the iframe is simulated by GET
+    ``/acceptance/iframes/<id>?payment_token=<key>``, which answers with the
+    transaction callback PayMob would send to PAYMOB_CALLBACK_URL: the
+    ``type``/``obj`` body and the ``hmac`` that goes in its query string,
+    signed with ``hmac_secret``. The caller delivers it to the shop.
+
+    Args:
+        decline_rate (float): Share of payments that are declined
+        hmac_secret (str): The shop's PAYMOB_HMAC_SECRET
+    """
+
+    name = 'paymob'
+
+    def __init__(self, decline_rate=0.0, hmac_secret='fake-paymob-hmac', **kwargs):
+        super().__init__(**kwargs)
+        self.decline_rate = decline_rate
+        self.hmac_secret = hmac_secret
+        self._ids = itertools.count(1000)
+        self._payment_keys = {}
+        self._keys_lock = threading.Lock()
+        self.route('POST', '/auth/tokens', self.auth_token)
+        self.route('POST', '/ecommerce/orders', self.create_order)
+        self.route('POST', '/acceptance/payment_keys', self.payment_key)
+        self.route('GET', r'/acceptance/iframes/(?P<iframe_id>\w+)', self.pay)
+
+    def auth_token(self, request):
+        return 201, {'token': f'fake-paymob-auth-{next(self._ids)}'}
+
+    def create_order(self, request):
+        data = request.get_json()
+        return 201, {'id': next(self._ids), 'amount_cents': data.get('amount_cents'), 'currency': data.get('currency')}
+
+    def payment_key(self, request):
+        data = request.get_json()
+        key = f'fake-payment-key-{next(self._ids)}'
+        with self._keys_lock:
+            self._payment_keys[key] = (data['order_id'], data['amount_cents'])
+        return 201, {'token': key}
+
+    def pay(self, request, iframe_id):
+        with self._keys_lock:
+            payment = self._payment_keys.get(request.args.get('payment_token'))
+        if payment is None:
+            return 404, {'detail': 'Unknown payment token'}
+        order_id, amount_cents = payment
+        with self._lock:
+            success = self.random.random() >= self.decline_rate
+        transaction = {
+            'id': next(self._ids),
+            'pending': False,
+            'amount_cents': amount_cents,
+            'success': success,
+            'is_auth': False,
+            'is_capture': False,
+            'is_standalone_payment': True,
+            'is_refunded': False,
+            'is_3d_secure': True,
+            'integration_id': 1,
+            'has_parent_transaction': False,
+            'order': {'id': order_id},
+            'created_at': datetime.utcnow().isoformat(timespec='microseconds'),
+            'currency': 'EGP',
+            'source_data': {'type': 'card', 'pan': '2346', 'sub_type': 'MasterCard'},
+            'error_occured': False,
+            'owner': 1,
+        }
+        return 200, {'type': 'TRANSACTION', 'obj': transaction,
+                     'hmac': transaction_hmac(transaction, self.hmac_secret)}
@@ -0,0 +1,112 @@
+"""Local HTTP stand-ins for the shop's upstream APIs
+
+A FakeUpstream is a small threaded WSGI server on 127.0.0.1 answering a
+table of routes with canned JSON, after sleeping for a configurable
+latency and failing a configurable share of requests, so the shop can be
+run (and load- or soak-tested) end to end without calling Bosta or PayMob.
+Point BOSTA_BASE_URL / PAYMOB_BASE_URL at its ``url``.
+"""
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from werkzeug.serving import make_server
+from werkzeug.wrappers import Request, Response
+
+
+class FakeUpstream:
+    """Threaded fake API server with injected latency
+
+    Subclasses register routes with ``self.route(method, pattern, handler)``;
+    a handler takes the werkzeug Request and the pattern's named groups and
+    returns ``(status, body)``, body being JSON-serializable.
+
+    Args:
+        latency (float): Mean seconds each response is delayed by
+        jitter (float): Delays are spread uniformly over latency +/- jitter
+        latencies (dict): Mean latency per handler name, overriding ``latency``
+        error_rate (float): Share of requests answered with error_response()
+        error_rates (dict): Error rate per handler name, overriding ``error_rate``
+        seed (int): Seeds the delay, error (and subclasses') randomness
+    """
+
+    name = 'upstream'
+
+    def __init__(self, latency=0.0, jitter=0.0, latencies=None, error_rate=0.0, error_rates=None, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.latencies = latencies or {}
+        self.error_rate = error_rate
+        self.error_rates = error_rates or {}
+        self.random = random.Random(seed)
+        self.calls = Counter()
+        self.statuses = Counter()
+        self._routes = []
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    def route(self, method, pattern, handler):
+        self._routes.append((method, re.compile(pattern + '$'), handler))
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self._server.server_port}'
+
+    def start(self, port=0):
+        self._server = make_server('127.0.0.1', port, self, threaded=True)
+        self._thread = threading.Thread(target=self._server.serve_forever, name=f'fake-{self.name}', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def delay(self, handler_name):
+        latency = self.latencies.get(handler_name, self.latency)
+        with self._lock:
+            seconds = self.random.uniform(latency - self.jitter, latency + self.jitter)
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def should_fail(self, handler_name):
+        error_rate = self.error_rates.get(handler_name, self.error_rate)
+        if not error_rate:
+            return False
+        with self._lock:
+            return self.random.random() < error_rate
+
+    def error_response(self, request):
+        """Status and body of an injected failure"""
+        return 500, {'message': 'Injected failure'}
+
+    def __call__(self, environ, start_response):
+        request = Request(environ)
+        for method, pattern, handler in self._routes:
+            match = pattern.match(request.path)
+            if method == request.method and match:
+                with self._lock:
+                    self.calls[handler.__name__] += 1
+                self.delay(handler.__name__)
+                if self.should_fail(handler.__name__):
+                    status, body = self.error_response(request)
+                else:
+                    status, body = handler(request, **match.groupdict())
+                break
+        else:
+            status, body = 404, {'success': False, 'message': f'No route for {request.method} {request.path}'}
+        with self._lock:
+            self.statuses[status] += 1
+        response = Response(json.dumps(body), status=status, mimetype='application/json')
+        return response(environ, start_response)
@@ -0,0 +1,143 @@
+"""Run the shop on a local server against fake upstreams and put load on it
+
+Used by scripts/load_test.py and tests/test_load_harness.py. The shop runs
+in this process on a threaded werkzeug server with a SQLite file database
+seeded by tests/seed.py; Bosta and PayMob are tests.fakes servers with
+injected latency.
+"""
+import random
+import threading
+import time
+from collections import namedtuple
+from werkzeug.serving import make_server
+from app.extensions import db
+from app.models.address import Address
+from app.models.coupon import Coupon
+from app.models.product import Product
+from app.models.user import User
+from config import Config
+from tests.load.journeys import JOURNEYS, VirtualUser
+from tests.load.report import Recorder
+from tests.seed import seed_shop
+
+Customer = namedtuple('Customer', ['email', 'password', 'address_id'])
+
+PASSWORD = 'LoadTest#2024'
+COUPON = 'LOAD10'
+IFRAME_ID = '4242'
+HMAC_SECRET = 'fake-paymob-hmac'
+
+
+def load_test_config(database_uri, bosta_url, paymob_url):
+    """Config for a shop under load, calling the given fake upstreams"""
+
+    class LoadTestConfig(Config):
+        SQLALCHEMY_DATABASE_URI = database_uri
+        SQLALCHEMY_ECHO = False
+        # Plenty of time for writers queueing on the SQLite lock
+        SQLALCHEMY_ENGINE_OPTIONS = {'connect_args': {'timeout': 30}}
+        SESSION_COOKIE_SECURE = False
+        MAIL_SUPPRESS_SEND = True
+        BOSTA_BASE_URL = bosta_url
+        BOSTA_EMAIL = 'load@example.com'
+        BOSTA_PASSWORD = 'fake-bosta-password'
+        BOSTA_API_KEY = 'fake-bosta-key'
+        PAYMOB_BASE_URL = paymob_url
+        PAYMOB_API_KEY = 'fake-paymob-key'
+        PAYMOB_INTEGRATION_ID = '1'
+        PAYMOB_IFRAME_ID = IFRAME_ID
+        PAYMOB_HMAC_SECRET = HMAC_SECRET
+
+    return LoadTestConfig
+
+
+def prepare_shop(customers, products=60):
+    """Create the schema and seed a shop for ``customers`` shoppers
+
+    Stock is topped up so checkouts never run out, and a 10% coupon is
+    added. Needs an app context.
+
+    Returns:
+        tuple: (list of Customer, list of product IDs)
+    """
+    db.create_all()
+    shop = seed_shop(products=products, customers=max(customers, 2), orders=2 * customers)
+    Product.query.update({Product.stock: 10 ** 6})
+    db.session.add(Coupon(COUPON, 'percentage', 10))
+
+    shoppers = User.query.filter(User.id != shop.admin_id).order_by(User.id).limit(customers).all()
+    shoppers[0].set_password(PASSWORD)
+    for user in shoppers[1:]:
+        user.password_hash = shoppers[0].password_hash
+    addresses = {address.user_id: address.id for address in Address.query.filter_by(is_default=True)}
+    db.session.commit()
+    return [Customer(user.email, PASSWORD, addresses[user.id]) for user in shoppers], shop.product_ids
+
+
+class LiveServer:
+    """The app served over HTTP from a background thread"""
+
+    def __init__(self, app):
+        self._server = make_server('127.0.0.1', 0, app, threaded=True)
+        self._thread = threading.Thread(target=self._server.serve_forever, name='shop', daemon=True)
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self._server.server_port}'
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def run_load(base_url, customers, product_ids, paymob_url, users=10, duration=60.0, iterations=None,
+             think=0.5, seed=1, journeys=None):
+    """Run ``users`` concurrent shoppers and time every step
+
+    Each shopper logs in, then picks weighted journeys until ``duration``
+    seconds have passed or it has run ``iterations`` of them.
+
+    Args:
+        customers (list): Customer accounts, one per concurrent user
+        journeys (dict): Journey weights, defaults to JOURNEYS
+
+    Returns:
+        tuple: (Recorder, seconds elapsed)
+    """
+    journeys = journeys or JOURNEYS
+    names, weights = list(journeys), list(journeys.values())
+    recorder = Recorder()
+    started = time.perf_counter()
+    deadline = started + duration if duration else None
+
+    def shopper(number):
+        rng = random.Random(seed * 1000 + number)
+        user = VirtualUser(base_url, customers[number % len(customers)], product_ids, recorder, rng,
+                           paymob_url=paymob_url, iframe_id=IFRAME_ID, coupon=COUPON, think=think)
+        user.login()
+        done = 0
+        while (iterations is None or done < iterations) and (deadline is None or time.perf_counter() < deadline):
+            user.run(rng.choices(names, weights)[0])
+            done += 1
+
+    threads = [threading.Thread(target=_guard(shopper, recorder), args=(n,), name=f'shopper-{n}')
+               for n in range(users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return recorder, time.perf_counter() - started
+
+
+def _guard(shopper, recorder):
+    """Count a shopper that could not log in as a failed journey, not a crash"""
+    def run(number):
+        try:
+            shopper(number)
+        except Exception:
+            recorder.journey('login', False)
+    return run
@@ -0,0 +1,203 @@
+"""Scripted shopper journeys for the load test
+
+A VirtualUser is one logged-in customer with its own cookie session,
+walking the shop the way the browser does: pages are fetched, AJAX calls
+carry the page's CSRF token, and the PayMob card payment goes through the
+fake iframe followed by PayMob's callback to the shop. Each HTTP request
+the shop answers is timed as a named step.
+"""
+import re
+import time
+from urllib.parse import urlparse
+import requests
+
+CSRF_META = re.compile(r'<meta name="csrf-token" content="([^"]+)"')
+DRAFT_TOKEN = re.compile(r"draft_token: '([^']+)'")
+ORDER_PAGE = re.compile(r'^/order/\d+$')
+SEARCH_TERMS = ['product', 'handmade', 'product 1', 'number 4', 'kind']
+
+# Relative weight of each journey in the mix
+JOURNEYS = {
+    'browse': 4,
+    'search': 2,
+    'checkout_cod': 1,
+    'checkout_paymob': 1,
+}
+
+
+class StepFailed(Exception):
+    """A step got an error response; the rest of the journey is skipped"""
+
+
+class VirtualUser:
+    """One shopper driving the shop over HTTP
+
+    Args:
+        base_url (str): Root URL of the shop under test
+        customer (Customer): Credentials and address of the shopper
+        product_ids (list): Products the shopper may look at and buy
+        recorder (Recorder): Where step timings go
+        rng (random.Random): Drives the shopper's choices
+        paymob_url (str): Root of the (fake) PayMob API
+        iframe_id (str): PayMob iframe the card payment goes through
+        coupon (str): Code applied during cash-on-delivery checkouts
+        think (float): Mean seconds the shopper pauses before each step
+    """
+
+    def __init__(self, base_url, customer, product_ids, recorder, rng, paymob_url=None, iframe_id=None,
+                 coupon=None, think=0.0):
+        self.base_url = base_url.rstrip('/')
+        self.customer = customer
+        self.product_ids = product_ids
+        self.recorder = recorder
+        self.rng = rng
+        self.paymob_url = paymob_url
+        self.iframe_id = iframe_id
+        self.coupon = coupon
+        self.think = think
+        self.http = requests.Session()
+        self.csrf_token = None
+
+    def run(self, journey):
+        """Run one journey by name, recording whether it got to the end"""
+        try:
+            getattr(self, journey)()
+        except (StepFailed, requests.exceptions.RequestException):
+            self.recorder.journey(journey, False)
+            return False
+        self.recorder.journey(journey, True)
+        return True
+
+    # Journeys
+
+    def browse(self):
+        self.shop()
+        for product_id in self.rng.sample(self.product_ids, 2):
+            self.product(product_id)
+
+    def search(self):
+        self.search_products(self.rng.choice(SEARCH_TERMS))
+        self.product(self.rng.choice(self.product_ids))
+
+    def checkout_cod(self):
+        self._fill_cart()
+        if self.coupon:
+            self.apply_coupon(self.coupon)
+        self.checkout()
+        self.quote_shipping('cod')
+        self.place_cod_order()
+
+    def checkout_paymob(self):
+        self._fill_cart()
+        draft_token = self.checkout()
+        self.quote_shipping('card')
+        payment_key = self.paymob_payment(draft_token)
+        self.paymob_callback(self._pay(payment_key))
+
+    def _fill_cart(self):
+        self.shop()
+        for product_id in self.rng.sample(self.product_ids, self.rng.randint(1, 3)):
+            self.product(product_id)
+            self.add_to_cart(product_id, self.rng.randint(1, 2))
+        self.cart()
+
+    # Steps
+
+    def login(self):
+        self._request('login_page', 'GET', '/auth/login')
+        response = self._request('login', 'POST', '/auth/login', data={
+            'csrf_token': self.csrf_token,
+            'email': self.customer.email,
+            'password': self.customer.password,
+        }, check=lambda response: urlparse(response.url).path != '/auth/login')
+        return response
+
+    def shop(self):
+        return self._request('shop', 'GET', '/shop', params={'sort': self.rng.choice(['newest', 'price_low'])})
+
+    def product(self, product_id):
+        return self._request('product_detail', 'GET', f'/product/{product_id}')
+
+    def search_products(self, query):
+        return self._request('search', 'GET', '/search', params={'q': query})
+
+    def add_to_cart(self, product_id, quantity=1):
+        return self._ajax('add_to_cart', f'/cart/add/{product_id}', data={'quantity': quantity})
+
+    def cart(self):
+        return self._request('cart', 'GET', '/cart/')
+
+    def apply_coupon(self, code):
+        return self._ajax('apply_coupon', '/cart/coupons/apply', json={'code': code})
+
+    def checkout(self):
+        """Open the checkout page and return its checkout draft token"""
+        response = self._request('checkout', 'GET', '/order/checkout',
+                                 check=lambda response: DRAFT_TOKEN.search(response.text) is not None)
+        return DRAFT_TOKEN.search(response.text).group(1)
+
+    def quote_shipping(self, payment_method):
+        return self._ajax('quote_shipping', '/shipping/calculate', json={
+            'address_id': self.customer.address_id,
+            'carrier_code': 'bosta',
+            'payment_method': payment_method,
+        }, check=lambda response: response.ok and isinstance(response.json(), list))
+
+    def place_cod_order(self):
+        return self._request('place_cod_order', 'POST', '/order/process-checkout', data={
+            'csrf_token': self.csrf_token,
+            'payment_method': 'cod',
+            'shipping_address_id': self.customer.address_id,
+        }, check=lambda response: ORDER_PAGE.match(urlparse(response.url).path) is not None)
+
+    def paymob_payment(self, draft_token):
+        """Turn the checkout draft into an order and get its payment key"""
+        response = self._ajax('paymob_payment', '/order/process-paymob-payment', json={
+            'draft_token': draft_token,
+            'shipping_address_id': self.customer.address_id,
+        })
+        return response.json()['payment_key']
+
+    def _pay(self, payment_key):
+        """Pay in the fake PayMob iframe; not a shop request, so not timed"""
+        response = requests.get(f'{self.paymob_url}/acceptance/iframes/{self.iframe_id}',
+                                params={'payment_token': payment_key}, timeout=30)
+        if not response.ok:
+            raise StepFailed(f'PayMob iframe answered {response.status_code}')
+        return response.json()
+
+    def paymob_callback(self, callback):
+        """Deliver PayMob's signed transaction callback, which has no shopper session"""
+        started = time.perf_counter()
+        response = requests.post(f'{self.base_url}/order/paymob-callback', params={'hmac': callback['hmac']},
+                                 json={'type': callback['type'], 'obj': callback['obj']}, timeout=30)
+        ok = response.ok and response.json().get('success') == callback['obj']['success']
+        self.recorder.step('paymob_callback', time.perf_counter() - started, ok)
+        if not ok:
+            raise StepFailed(f'paymob_callback answered {response.status_code}')
+        return response
+
+    def _ajax(self, step, path, check=None, **kwargs):
+        """POST like the shop's scripts do, with the page's CSRF token"""
+        return self._request(step, 'POST', path, headers={'X-CSRFToken': self.csrf_token}, check=check or (
+            lambda response: response.ok and response.json().get('success') is True), **kwargs)
+
+    def _request(self, step, method, path, check=None, **kwargs):
+        if self.think:
+            time.sleep(self.rng.uniform(0.5, 1.5) * self.think)
+        started = time.perf_counter()
+        response = self.http.request(method, self.base_url + path, timeout=30, **kwargs)
+        elapsed = time.perf_counter() - started
+        try:
+            ok = check(response) if check else response.ok
+        except ValueError:
+            # Expected JSON, got a page (usually an error redirect)
+            ok = False
+        ok = ok and response.ok
+        self.recorder.step(step, elapsed, ok)
+        if not ok:
+            raise StepFailed(f'{step} answered {response.status_code}')
+        token = CSRF_META.search(response.text) if 'text/html' in response.headers.get('Content-Type', '') else None
+        if token:
+            self.csrf_token = token.group(1)
+        return response
@@ -0,0 +1,95 @@
+"""Collect load-test timings and turn them into a comparable JSON report"""
+import math
+import threading
+from collections import Counter, defaultdict
+from datetime import datetime
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of a sorted list, ``q`` in 0-100"""
+    if not values:
+        return None
+    rank = max(1, math.ceil(q / 100 * len(values)))
+    return values[rank - 1]
+
+
+class Recorder:
+    """Thread-safe store of step timings and journey outcomes"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._steps = defaultdict(list)
+        self._errors = Counter()
+        self._journeys = defaultdict(Counter)
+
+    def step(self, name, seconds, ok):
+        with self._lock:
+            self._steps[name].append(seconds)
+            if not ok:
+                self._errors[name] += 1
+
+    def journey(self, name, ok):
+        with self._lock:
+            self._journeys[name]['completed' if ok else 'failed'] += 1
+
+    @property
+    def errors(self):
+        with self._lock:
+            return sum(self._errors.values())
+
+    def report(self, elapsed, settings=None):
+        """Throughput and latency percentiles per step, and journey counts
+
+        Args:
+            elapsed (float): Wall-clock seconds the load ran for
+            settings (dict): Run parameters, stored alongside the figures
+        """
+        with self._lock:
+            steps = {name: _summary(timings, self._errors[name], elapsed)
+                     for name, timings in sorted(self._steps.items())}
+            everything = [seconds for timings in self._steps.values() for seconds in timings]
+            total = _summary(everything, sum(self._errors.values()), elapsed)
+            journeys = {name: dict(completed=counts['completed'], failed=counts['failed'])
+                        for name, counts in sorted(self._journeys.items())}
+        return {
+            'generated_at': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+            'elapsed_s': round(elapsed, 2),
+            'settings': settings or {},
+            'total': total,
+            'steps': steps,
+            'journeys': journeys,
+        }
+
+
+def _summary(timings, errors, elapsed):
+    timings = sorted(timings)
+    ms = lambda seconds: round(1000 * seconds, 1) if seconds is not None else None
+    return {
+        'requests': len(timings),
+        'errors': errors,
+        'throughput_rps': round(len(timings) / elapsed, 2) if elapsed else None,
+        'mean_ms': ms(sum(timings) / len(timings)) if timings else None,
+        'p50_ms': ms(percentile(timings, 50)),
+        'p95_ms': ms(percentile(timings, 95)),
+        'p99_ms': ms(percentile(timings, 99)),
+        'max_ms': ms(timings[-1]) if timings else None,
+    }
+
+
+def compare_reports(baseline, current):
+    """Per-step changes between two reports
+
+    Returns:
+        list: (step, metric, baseline value, current value, change in %)
+        for throughput and each latency percentile; steps missing from
+        either report are skipped
+    """
+    rows = []
+    for step in ['total'] + sorted(set(baseline['steps']) & set(current['steps'])):
+        before = baseline['total'] if step == 'total' else baseline['steps'][step]
+        after = current['total'] if step == 'total' else current['steps'][step]
+        for metric in ('throughput_rps', 'p50_ms', 'p95_ms', 'p99_ms'):
+            old, new = before.get(metric), after.get(metric)
+            change = round(100 * (new - old) / old, 1) if old and new is not None else None
+            rows.append((step, metric, old, new, change))
+    return rows
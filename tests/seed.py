@@ -0,0 +1,105 @@
+"""Seed a realistic shop into the test database
+
+Used by the query-budget tests: enough categories, products, images,
+reviews, users and orders that a per-row query in a listing, cart or report
+shows up as a repeated statement instead of hiding behind a single row.
+"""
+import random
+from collections import namedtuple
+from datetime import datetime, timedelta
+from app.extensions import db
+from app.models.address import Address
+from app.models.cart import Cart
+from app.models.category import Category
+from app.models.order import Order, OrderItem
+from app.models.product import Product, ProductImage
+from app.models.review import ProductRatingSummary, Review
+from app.models.shipping import ShippingCarrier, ShippingMethod
+from app.models.user import User
+from app.models.wishlist import Wishlist
+
+Shop = namedtuple('Shop', ['admin_id', 'customer_id', 'product_ids', 'cart_item_ids', 'order_ids'])
+
+STATUSES = [('pending', 'pending'), ('processing', 'paid'), ('shipped', 'paid'),
+            ('delivered', 'paid'), ('cancelled', 'refunded')]
+
+
+def seed_shop(categories=6, products=60, customers=12, orders=80, seed=7):
+    """Create a catalog, customers with carts and wishlists, and order history
+
+    Returns:
+        Shop: IDs of the admin, of a customer with a full cart, of the
+        products, of that customer's cart items and of all orders; IDs
+        rather than objects so callers can start from an empty session
+    """
+    rng = random.Random(seed)
+
+    category_rows = [Category(f'Category {i}', f'Things of kind {i}') for i in range(categories)]
+    db.session.add_all(category_rows)
+    db.session.flush()
+
+    product_rows = [
+        Product(f'Product {i}', f'Handmade product number {i}', round(rng.uniform(20, 400), 2),
+                category_rows[i % categories].id, stock=rng.randint(20, 100), sku=f'SKU-{i:04d}', weight=0.5)
+        for i in range(products)
+    ]
+    db.session.add_all(product_rows)
+    db.session.flush()
+    for product in product_rows:
+        for n in range(3):
+            db.session.add(ProductImage(f'/static/uploads/p{product.id}-{n}.jpg', product.id, is_primary=n == 0))
+
+    admin = _user('admin@example.com', 'Admin', is_admin=True)
+    customer_rows = [_user(f'customer{i}@example.com', f'Customer{i}') for i in range(customers)]
+    db.session.flush()
+
+    for customer in customer_rows:
+        db.session.add(Address(user_id=customer.id, name='Home', phone='01000000000', street='1 Nile St',
+                               city='Cairo', district='Zamalek', is_default=True))
+        for product in rng.sample(product_rows, 4):
+            review = Review(product.id, customer.id, rng.randint(1, 5), 'Lovely')
+            db.session.add(review)
+            ProductRatingSummary.record(review)
+            db.session.flush()
+        for product in rng.sample(product_rows, 5):
+            db.session.add(Wishlist(user_id=customer.id, product_id=product.id))
+
+    customer = customer_rows[0]
+    cart_items = [Cart(user_id=customer.id, product_id=product.id, quantity=rng.randint(1, 3))
+                  for product in rng.sample(product_rows, 8)]
+    db.session.add_all(cart_items)
+
+    carrier = ShippingCarrier(name='Bosta', code='bosta', base_cost=45.0, is_active=True)
+    db.session.add(carrier)
+    db.session.flush()
+    db.session.add(ShippingMethod(carrier_id=carrier.id, name='Standard', code='standard', estimated_days='2-3 days'))
+
+    addresses = {a.user_id: a.id for a in Address.query.all()}
+    order_rows = []
+    start = datetime.utcnow() - timedelta(days=60)
+    for i in range(orders):
+        buyer = rng.choice(customer_rows)
+        status, payment_status = rng.choice(STATUSES)
+        lines = [(product, rng.randint(1, 3)) for product in rng.sample(product_rows, rng.randint(1, 4))]
+        subtotal = round(sum(product.price * quantity for product, quantity in lines), 2)
+        order = Order(user_id=buyer.id, shipping_address_id=addresses[buyer.id], subtotal=subtotal,
+                      shipping_cost=45.0, total=subtotal + 45.0, status=status, payment_status=payment_status,
+                      payment_method=rng.choice(['card', 'cod']),
+                      date_created=start + timedelta(hours=18 * i))
+        order.items = [OrderItem(product_id=product.id, quantity=quantity, price=product.price)
+                       for product, quantity in lines]
+        db.session.add(order)
+        order_rows.append(order)
+
+    db.session.commit()
+    return Shop(admin.id, customer.id, [p.id for p in product_rows], [c.id for c in cart_items],
+                [o.id for o in order_rows])
+
+
+def _user(email, first_name, is_admin=False):
+    user = User(email)
+    user.first_name = first_name
+    user.last_name = 'Tester'
+    user.is_admin = is_admin
+    db.session.add(user)
+    return user
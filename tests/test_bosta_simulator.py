@@ -0,0 +1,83 @@
+"""The Bosta shipping service running against the local Bosta simulator"""
+import pytest
+import requests
+from app.models.address import Address
+from app.models.order import Order
+from app.shipping.city_index import refresh_city_index
+from app.shipping.services import BostaShippingService
+from app.utils.city_mapping import CITIES
+from app.utils.http_client import reset_clients
+from tests.fakes.bosta import FakeBosta
+
+
+@pytest.fixture
+def simulator(app, monkeypatch):
+    """Start a simulator with the given options and point the app at it"""
+    started = []
+
+    def simulator(**options):
+        bosta = FakeBosta(**options).start()
+        started.append(bosta)
+        app.config.update(BOSTA_BASE_URL=bosta.url, BOSTA_EMAIL='shop@example.com',
+                          BOSTA_PASSWORD='secret', BOSTA_API_KEY='key')
+        # A fresh service, without another test's pickup location
+        monkeypatch.setattr(BostaShippingService, '_instance', None)
+        return bosta, BostaShippingService()
+
+    reset_clients()
+    yield simulator
+    for bosta in started:
+        bosta.stop()
+    reset_clients()
+
+
+def test_quotes_come_from_the_simulator(simulator):
+    bosta, service = simulator()
+    assert len(service.get_cities()) == len(CITIES)
+    assert service.default_location['address']['city']['name'] == 'Ismailia'
+    # Flat 55 to Cairo plus the 10 EGP minimum COD fee
+    assert service.estimate_shipping_cost('Ismailia', 'Cairo', cod_amount=100) == 65.0
+    assert bosta.calls['login'] == 1 and bosta.calls['calculator'] == 1
+
+
+def test_deliveries_are_created_tracked_and_terminated(db, simulator, make_user):
+    bosta, service = simulator()
+    refresh_city_index(service.get_cities())
+    customer = make_user()
+    address = Address(user_id=customer.id, name='Mona Adel', phone='01000000000', street='1 Nile St',
+                      city='Cairo', district='Zamalek')
+    db.session.add(address)
+    db.session.flush()
+    order = Order(user_id=customer.id, shipping_address_id=address.id, subtotal=100.0, shipping_cost=65.0,
+                  total=165.0, payment_method='cod')
+    db.session.add(order)
+    db.session.commit()
+
+    delivery = service.create_shipping_order(order)
+    assert delivery['status'] == 'Pickup requested'
+    tracked = service.track_shipment(delivery['tracking_number'])
+    assert tracked['cod'] == 165.0 and tracked['receiver']['fullName'] == 'Mona Adel'
+    assert tracked['businessReference'] == str(order.id)
+
+    assert service.cancel_shipping_order(delivery['delivery_id']) is True
+    assert service.track_shipment(delivery['tracking_number'])['state']['value'] == 'Terminated'
+
+
+def test_expired_token_is_replaced_by_a_new_login(simulator):
+    bosta, service = simulator(token_ttl=3600)
+    service.get_cities()
+    bosta.expire_tokens()
+    service.get_cities()
+    assert bosta.calls['login'] == 2 and bosta.statuses[401] == 1
+
+
+def test_errors_and_bad_requests_follow_the_spec(simulator):
+    bosta, service = simulator(error_rates={'list_cities': 1.0}, password='secret')
+    with pytest.raises(ValueError):
+        service.get_cities()
+    assert bosta.statuses[500] == 1
+
+    response = requests.post(f'{bosta.url}/users/login', json={'email': 'shop@example.com'})
+    assert response.status_code == 400 and 'password' in response.json()['message']
+    response = requests.post(f'{bosta.url}/users/login', json={'email': 'shop@example.com', 'password': 'wrong'})
+    assert response.status_code == 401 and response.json()['errorCode'] == 1007
@@ -0,0 +1,94 @@
+"""Tests for the shared cart pricing component"""
+import pytest
+from contextlib import contextmanager
+from sqlalchemy import event
+from app.models.cart import Cart
+from app.models.category import Category
+from app.models.coupon import Coupon
+from app.models.product import Product
+from app.utils.cart_pricing import CartPricing
+from tests.conftest import login
+
+
+@pytest.fixture
+def customer(client, make_user):
+    user = make_user()
+    login(client, user)
+    return user
+
+
+@pytest.fixture
+def cart(db, customer):
+    category = Category('Chains')
+    db.session.add(category)
+    db.session.flush()
+    products = [Product('Chain', 'A chain', 100.0, category.id, stock=10),
+                Product('Clasp', 'A clasp', 25.0, category.id, stock=10)]
+    db.session.add_all(products)
+    db.session.flush()
+    items = [Cart(user_id=customer.id, product_id=products[0].id, quantity=2),
+             Cart(user_id=customer.id, product_id=products[1].id, quantity=1)]
+    db.session.add_all(items)
+    db.session.add_all([
+        Coupon('TENOFF', 'percentage', 10, max_discount_amount=15),
+        Coupon('FIFTY', 'fixed', 50),
+        Coupon('SHIPFREE', 'free_shipping', 0),
+    ])
+    db.session.commit()
+    return items
+
+
+@contextmanager
+def _statements(db):
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+
+
+@pytest.mark.parametrize('code, shipping, discount', [
+    (None, 0.0, 0),
+    ('TENOFF', 0.0, 15),  # 10% of 225 capped at 15
+    ('FIFTY', 20.0, 50),
+    ('SHIPFREE', 20.0, 20.0),
+    ('MISSING', 0.0, 0),
+])
+def test_totals(db, customer, cart, code, shipping, discount):
+    totals = CartPricing(customer.id, code).totals(shipping)
+    assert totals.subtotal == 225.0
+    assert totals.item_count == 3
+    assert totals.discount == discount
+    assert totals.total == 225.0 + shipping - discount
+    assert [item.id for item in totals.items] == [item.id for item in cart]
+
+
+def test_single_query_for_lines(db, customer, cart):
+    user_id = customer.id
+    db.session.expire_all()
+    with _statements(db) as statements:
+        totals = CartPricing(user_id, 'FIFTY').totals()
+        names = [item.product.name for item in totals.items]
+    assert names == ['Chain', 'Clasp']
+    # One joined query for lines and products, one for the coupon
+    assert len(statements) == 2
+
+
+def test_routes_agree(client, db, customer, cart):
+    with client.session_transaction() as session:
+        session['coupon_code'] = 'TENOFF'
+    response = client.get('/cart/')
+    assert b'EGP 210.00' in response.data
+
+    response = client.post(f'/cart/update/{cart[1].id}', json={'quantity': 3}).get_json()
+    assert response['subtotal'] == 275.0
+    assert response['total'] == 260.0
+    assert response['cart_count'] == 5
+
+    response = client.post('/cart/coupons/remove').get_json()
+    assert response['total'] == response['subtotal'] == 275.0
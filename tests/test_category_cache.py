@@ -0,0 +1,69 @@
+"""Tests for the versioned per-worker category cache"""
+import pytest
+from contextlib import contextmanager
+from sqlalchemy import event
+from app.models.category import Category, CatalogVersion
+from app.utils.category_cache import get_categories
+from tests.conftest import login
+
+
+@pytest.fixture
+def categories(db):
+    categories = [Category('Rings'), Category('Earrings')]
+    db.session.add_all(categories)
+    db.session.commit()
+    return categories
+
+
+@pytest.fixture
+def admin(make_user):
+    return make_user(is_admin=True)
+
+
+@contextmanager
+def _statements(db):
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+
+
+def test_cached_pages_run_no_category_queries(app, client, db, categories):
+    app.config['CATALOG_VERSION_CHECK_INTERVAL'] = 60
+    assert [c.name for c in get_categories()] == ['Rings', 'Earrings']
+
+    with _statements(db) as statements:
+        assert client.get('/shop').status_code == 200
+        assert client.get('/about').status_code == 200
+    assert not [s for s in statements if 'categories' in s or 'catalog_versions' in s]
+
+
+def test_unchanged_version_keeps_snapshot(app, db, categories):
+    app.config['CATALOG_VERSION_CHECK_INTERVAL'] = 0
+    first = get_categories()
+    with _statements(db) as statements:
+        assert get_categories() is first
+    assert len(statements) == 1 and 'catalog_versions' in statements[0]
+
+
+def test_admin_changes_refresh_menu(app, client, db, categories, admin):
+    app.config['CATALOG_VERSION_CHECK_INTERVAL'] = 60
+    get_categories()
+    login(client, admin)
+
+    client.post('/admin/categories/new', data={'name': 'Anklets', 'description': ''})
+    assert 'Anklets' in [c.name for c in get_categories()]
+    assert CatalogVersion.current('categories') == 1
+
+    client.post(f'/admin/categories/{categories[0].id}/edit', data={'name': 'Bands', 'description': ''})
+    assert 'Bands' in [c.name for c in get_categories()]
+
+    client.post(f'/admin/categories/{categories[1].id}/delete')
+    assert [c.name for c in get_categories()] == ['Bands', 'Anklets']
+    assert CatalogVersion.current('categories') == 3
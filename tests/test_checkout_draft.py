@@ -0,0 +1,121 @@
+"""Tests for session checkout drafts and the abandoned order sweeper"""
+import pytest
+from datetime import datetime, timedelta
+from app.models.address import Address
+from app.models.cart import Cart
+from app.models.category import Category
+from app.models.inventory import StockReservation
+from app.models.order import Order, OrderItem
+from app.models.product import Product
+from app.models.shipping import ShippingCarrier, ShippingMethod
+from app.utils.cart_pricing import CartPricing
+from app.utils.checkout import SESSION_KEY, CheckoutDraft, sweep_abandoned_orders
+from app.utils.inventory import commit_order_stock, hold_order_stock
+from tests.conftest import login
+
+
+@pytest.fixture
+def product(db):
+    category = Category('Scarves')
+    db.session.add(category)
+    db.session.flush()
+    product = Product('Scarf', 'A silk scarf', 60.0, category.id, stock=5)
+    db.session.add(product)
+    db.session.commit()
+    return product
+
+
+@pytest.fixture
+def customer(make_user):
+    return make_user()
+
+
+@pytest.fixture
+def address(db, customer):
+    address = Address(user_id=customer.id, name='Home', phone='01000000000',
+                      street='1 Nile St', city='Cairo')
+    db.session.add(address)
+    db.session.commit()
+    return address
+
+
+@pytest.fixture
+def cart(db, customer, product):
+    db.session.add(Cart(user_id=customer.id, product_id=product.id, quantity=2))
+    db.session.commit()
+
+
+def _old_order(db, address, product, age_hours=48, shipping_cost=0.0, **fields):
+    order = Order(user_id=address.user_id, shipping_address_id=address.id, subtotal=60.0,
+                  shipping_cost=shipping_cost, total=60.0 + shipping_cost,
+                  status='pending', payment_status='pending', **fields)
+    order.date_created = datetime.utcnow() - timedelta(hours=age_hours)
+    order.items.append(OrderItem(product_id=product.id, quantity=1, price=60.0))
+    db.session.add(order)
+    db.session.commit()
+    return order
+
+
+def test_checkout_page_creates_no_order(client, db, customer, address, cart):
+    carrier = ShippingCarrier(name='Bosta', code='bosta', base_cost=50.0)
+    carrier.shipping_methods.append(ShippingMethod(name='Standard', code='standard'))
+    db.session.add(carrier)
+    db.session.commit()
+    login(client, customer)
+
+    first = client.get('/order/checkout')
+    second = client.get('/order/checkout')
+    assert first.status_code == second.status_code == 200
+    assert Order.query.count() == 0
+    with client.session_transaction() as session:
+        token = session[SESSION_KEY]['token']
+    # Reloading an unchanged cart keeps the same draft
+    assert token.encode() in second.data
+
+
+def test_resubmitting_draft_reuses_order(app, db, customer, address, cart):
+    with app.test_request_context():
+        draft = CheckoutDraft.start(CartPricing(customer.id).totals())
+
+        first = draft.to_order(customer.id, address.id)
+        db.session.commit()
+        again = CheckoutDraft.load(draft.token).to_order(customer.id, address.id, shipping_cost=45.0)
+        db.session.commit()
+
+        assert again.id == first.id
+        assert Order.query.count() == 1
+        assert again.total == 165.0
+        assert CheckoutDraft.load('another-token') is None
+
+
+def test_sweeper_deletes_only_abandoned_orders(db, address, product):
+    old_page_draft = _old_order(db, address, product, payment_method='cod', is_draft=True)
+    unpaid_card = _old_order(db, address, product, payment_method='card', is_draft=True)
+    hold_order_stock(unpaid_card, minutes=1)
+    db.session.commit()
+    # Placed COD orders are never drafts, even with free shipping
+    placed_cod = _old_order(db, address, product, payment_method='cod')
+    commit_order_stock(placed_cod)
+    db.session.commit()
+    recent = _old_order(db, address, product, age_hours=1, payment_method='card', is_draft=True)
+
+    assert sweep_abandoned_orders(hours=24, dry_run=True) == 2
+    assert sweep_abandoned_orders(hours=24) == 2
+
+    remaining = {order.id for order in Order.query}
+    assert remaining == {placed_cod.id, recent.id}
+    assert OrderItem.query.count() == 2
+    assert StockReservation.query.one().order_id == placed_cod.id
+    # The hold of the unpaid card order went back on the shelf
+    db.session.expire(product)
+    assert product.stock == 4
+
+
+def test_sweeper_keeps_drafts_with_committed_stock(db, address, product):
+    paid_late = _old_order(db, address, product, payment_method='card', is_draft=True)
+    commit_order_stock(paid_late)
+    db.session.commit()
+
+    assert sweep_abandoned_orders(hours=24) == 0
+    db.session.expire(product)
+    assert product.stock == 4
@@ -0,0 +1,90 @@
+"""Tests for the local Bosta city index"""
+from datetime import datetime, timedelta
+import pytest
+from app.models.shipping import BostaCity
+from app.models.category import CatalogVersion
+from app.shipping.city_index import (CITIES_VERSION, refresh_city_index, find_city, get_city_index,
+                                    city_index_stale, invalidate_city_index)
+from app.shipping.services import BostaShippingService
+
+CITIES = [
+    {'_id': 'city-cairo', 'name': 'Cairo', 'nameAr': 'القاهرة', 'code': 'EG-01',
+     'zones': [{'_id': 'zone-1', 'districts': [{'_id': 'district-1'}]}]},
+    {'_id': 'city-minya', 'name': 'Menya', 'nameAr': 'المنيا', 'code': 'EG-19', 'zones': []},
+]
+
+
+def test_lookup_by_name_arabic_code_and_alias(db):
+    assert refresh_city_index(CITIES) == 2
+    db.session.commit()
+
+    cairo = find_city(' cairo ')
+    assert (cairo.zone_id, cairo.district_id) == ('city-cairo', 'district-1')
+    assert find_city('القاهرة') == cairo
+    assert find_city('EG-01') == cairo
+    # Aliases come from the static city table; cities without districts use their own id
+    minya = find_city('Minya')
+    assert (minya.zone_id, minya.district_id) == ('city-minya', 'city-minya')
+    assert find_city('Atlantis') is None
+
+
+def test_index_reloads_after_refresh_and_expires(app, db):
+    refresh_city_index(CITIES[:1])
+    db.session.commit()
+    assert 'المنيا' not in get_city_index()
+
+    refresh_city_index(CITIES)
+    db.session.commit()
+    assert 'المنيا' in get_city_index()
+    assert not city_index_stale()
+
+    stale = datetime.utcnow() - timedelta(hours=app.config['BOSTA_CITY_INDEX_TTL_HOURS'] + 1)
+    BostaCity.query.update({BostaCity.date_updated: stale})
+    CatalogVersion.bump(CITIES_VERSION)
+    db.session.commit()
+    invalidate_city_index()
+    assert city_index_stale()
+
+
+@pytest.fixture
+def bosta_cities(app, monkeypatch):
+    """Answer BostaShippingService.get_cities() with the given list, counting calls"""
+    app.config.update(BOSTA_EMAIL='shop@example.com', BOSTA_PASSWORD='secret', BOSTA_API_KEY='key')
+    monkeypatch.setattr(BostaShippingService, '_instance', None)
+
+    def bosta_cities(cities):
+        calls = []
+
+        def get_cities(self):
+            calls.append(1)
+            return cities
+        monkeypatch.setattr(BostaShippingService, 'get_cities', get_cities)
+        return calls
+    return bosta_cities
+
+
+def test_stale_index_is_used_without_calling_bosta(app, db, bosta_cities):
+    refresh_city_index(CITIES)
+    stale = datetime.utcnow() - timedelta(hours=app.config['BOSTA_CITY_INDEX_TTL_HOURS'] + 1)
+    BostaCity.query.update({BostaCity.date_updated: stale})
+    db.session.commit()
+    calls = bosta_cities(CITIES[:1])
+
+    assert find_city('Minya').zone_id == 'city-minya'
+    assert calls == []
+
+
+def test_empty_index_is_filled_and_survives_a_colliding_fill(db, bosta_cities):
+    bosta_cities(CITIES)
+    assert find_city('Cairo').zone_id == 'city-cairo'
+    db.session.commit()
+
+    # A fill that collides with rows another worker stored is rolled back
+    BostaCity.query.delete()
+    CatalogVersion.bump(CITIES_VERSION)
+    db.session.commit()
+    invalidate_city_index()
+    calls = bosta_cities(CITIES + CITIES)
+    assert find_city('Cairo') is None
+    assert calls == [1]
+    assert BostaCity.query.count() == 0
@@ -0,0 +1,37 @@
+"""Tests for the city name resolver"""
+import pytest
+from app.utils.city_mapping import resolve_city, get_city_code, city_key, BostaCityMapping
+
+
+@pytest.mark.parametrize('name, city', [
+    ('Cairo', 'Cairo'),
+    ('  cAIRO ', 'Cairo'),
+    ('EG-02', 'Alexandria'),
+    ('Minya', 'Menya'),
+    ('kafr al-sheikh', 'Kafr Alsheikh'),
+    # Arabic spelling variants: ta marbuta, hamza on alef, alef maqsura, diacritics
+    ('القاهره', 'Cairo'),
+    ('الاسكندرية', 'Alexandria'),
+    ('الوادي الجديد', 'New Valley'),
+    ('الْقَاهِرَة', 'Cairo'),
+    # Close misspellings
+    ('Alexandrya', 'Alexandria'),
+    ('بورسعيد', 'Port Said'),
+])
+def test_resolves_variants(name, city):
+    assert resolve_city(name) == city
+
+
+def test_unknown_and_empty_names():
+    assert resolve_city('Atlantis') is None
+    assert resolve_city('Alexandrya', fuzzy=False) is None
+    assert resolve_city('x' * 200) is None
+    assert resolve_city('') is None and resolve_city(None) is None
+    assert city_key('   ') is None
+
+
+def test_codes_and_class_interface():
+    assert get_city_code('giza') == 'EG-25'
+    assert BostaCityMapping.get_code('القاهرة') == 'EG-01'
+    assert BostaCityMapping.normalize_name('ALEXANDRIA') == 'Alexandria'
+    assert ('Cairo', 'Cairo (القاهرة)') in BostaCityMapping.get_city_choices()
@@ -0,0 +1,72 @@
+"""Tests for the shared per-request cart and wishlist counters"""
+import pytest
+from contextlib import contextmanager
+from sqlalchemy import event
+from app.models.category import Category
+from app.models.product import Product
+from tests.conftest import login
+
+
+@pytest.fixture
+def products(db):
+    category = Category('Pendants')
+    db.session.add(category)
+    db.session.flush()
+    products = [Product(f'Pendant {i}', 'A pendant', 80.0, category.id, stock=10) for i in range(2)]
+    db.session.add_all(products)
+    db.session.commit()
+    return products
+
+
+@pytest.fixture
+def customer(client, make_user):
+    user = make_user()
+    login(client, user)
+    return user
+
+
+@contextmanager
+def _counter_queries(db):
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        if 'FROM cart' in statement or 'FROM wishlist' in statement:
+            statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+
+
+def test_writes_return_fresh_counts(client, products, customer):
+    response = client.post(f'/cart/add/{products[0].id}', data={'quantity': 2}).get_json()
+    assert response['cart_total'] == 2
+    response = client.post(f'/cart/add/{products[1].id}', data={'quantity': 1}).get_json()
+    assert response['cart_total'] == 3
+
+    response = client.post(f'/wishlist/toggle/{products[0].id}').get_json()
+    assert response['wishlist_total'] == 1
+    response = client.post(f'/wishlist/toggle/{products[0].id}').get_json()
+    assert response['wishlist_total'] == 0
+
+    assert client.get('/api/counts').get_json() == {'cart_count': 3, 'wishlist_count': 0}
+
+
+def test_page_render_reads_counts_once(client, db, products, customer):
+    client.post(f'/cart/add/{products[0].id}', data={'quantity': 1})
+    client.post(f'/wishlist/toggle/{products[1].id}')
+
+    with _counter_queries(db) as statements:
+        response = client.get('/about')
+    assert response.status_code == 200
+    assert len(statements) == 1
+    assert b'id="wishlist-total">1<' in response.data
+    assert b'id="cart-total">1<' in response.data
+
+
+def test_anonymous_requests_skip_counts(client, db, products):
+    with _counter_queries(db) as statements:
+        assert client.get('/shop').status_code == 200
+    assert statements == []
@@ -0,0 +1,140 @@
+"""Tests for the email outbox and its batched sender"""
+import smtplib
+import pytest
+from flask_mail import Connection
+from app.extensions import mail
+from app.models.address import Address
+from app.models.email_outbox import OutboxEmail
+from app.models.job import Job
+from app.models.order import Order
+from app.utils import email as email_utils
+from app.utils.email import drain_outbox, send_email, send_order_confirmation
+
+
+@pytest.fixture
+def connections(monkeypatch):
+    """Counts SMTP connections opened by the drainer"""
+    opened = []
+    connect = mail.connect
+
+    def counting_connect():
+        opened.append(1)
+        return connect()
+
+    monkeypatch.setattr(mail, 'connect', counting_connect)
+    return opened
+
+
+def _queue(db, count):
+    for i in range(count):
+        send_email(f'Message {i}', sender='shop@example.com', recipients=[f'c{i}@example.com'], text_body='Hi')
+    db.session.commit()
+
+
+def test_burst_shares_one_drain_job(db):
+    _queue(db, 5)
+    assert OutboxEmail.query.count() == 5
+    assert Job.query.filter_by(type='email.drain').count() == 1
+
+
+def test_batches_reuse_one_connection(db, connections):
+    _queue(db, 5)
+    with mail.record_messages() as outbox:
+        assert drain_outbox(batch_size=2) == 5
+    assert [msg.subject for msg in outbox] == [f'Message {i}' for i in range(5)]
+    assert len(connections) == 3
+    assert OutboxEmail.query.count() == 0
+
+
+def test_rate_limit_spaces_messages(db, monkeypatch):
+    clock = [1000.0]
+    pauses = []
+
+    def sleep(seconds):
+        pauses.append(seconds)
+        clock[0] += seconds
+
+    monkeypatch.setattr(email_utils.time, 'monotonic', lambda: clock[0])
+    monkeypatch.setattr(email_utils.time, 'sleep', sleep)
+    _queue(db, 3)
+    drain_outbox(rate_limit=10)
+    assert pauses == [pytest.approx(0.1), pytest.approx(0.1)]
+
+
+def test_rejected_message_does_not_stop_the_batch(db, app, monkeypatch):
+    app.config['MAIL_MAX_ATTEMPTS'] = 1
+    send = Connection.send
+
+    def refusing_send(self, message, envelope_from=None):
+        if 'c1@example.com' in message.recipients:
+            raise smtplib.SMTPRecipientsRefused({'c1@example.com': (550, b'No such user')})
+        return send(self, message, envelope_from)
+
+    monkeypatch.setattr(Connection, 'send', refusing_send)
+    _queue(db, 3)
+    assert drain_outbox() == 2
+    failed = OutboxEmail.query.one()
+    assert failed.status == 'failed' and 'SMTPRecipientsRefused' in failed.last_error
+
+
+def test_rejected_message_is_retried_on_a_later_drain(db, app, monkeypatch, connections):
+    app.config.update(MAIL_MAX_ATTEMPTS=3, MAIL_RETRY_DELAY=60)
+    refused = []
+
+    def refusing_send(self, message, envelope_from=None):
+        refused.append(message)
+        raise smtplib.SMTPRecipientsRefused({'c0@example.com': (451, b'Try again later')})
+
+    monkeypatch.setattr(Connection, 'send', refusing_send)
+    _queue(db, 1)
+    Job.query.delete()
+    assert drain_outbox() == 0
+    assert len(refused) == 1 and len(connections) == 1
+
+    email = OutboxEmail.query.one()
+    assert email.status == 'queued' and email.attempts == 1
+    retry = Job.query.filter_by(type='email.drain', status='queued').one()
+    assert abs((retry.run_at - email.next_attempt_at).total_seconds()) < 5
+
+    # Not due yet: a drain in the meantime leaves it alone
+    assert drain_outbox() == 0
+    assert len(refused) == 1
+
+
+def test_dropped_connection_keeps_progress(db, monkeypatch):
+    send = Connection.send
+    sent = []
+
+    def flaky_send(self, message, envelope_from=None):
+        if len(sent) == 2:
+            raise smtplib.SMTPServerDisconnected('Connection unexpectedly closed')
+        sent.append(message)
+        return send(self, message, envelope_from)
+
+    monkeypatch.setattr(Connection, 'send', flaky_send)
+    _queue(db, 4)
+    with pytest.raises(smtplib.SMTPServerDisconnected):
+        drain_outbox()
+    remaining = OutboxEmail.query.order_by(OutboxEmail.id).all()
+    assert [e.subject for e in remaining] == ['Message 2', 'Message 3']
+    assert all(e.status == 'queued' for e in remaining)
+
+
+def test_order_confirmation_is_rendered_when_queued(app, db, make_user):
+    customer = make_user(first_name='Mona')
+    address = Address(user_id=customer.id, name='Home', phone='01000000000',
+                      street='1 Nile St', city='Cairo')
+    db.session.add(address)
+    db.session.flush()
+    order = Order(user_id=customer.id, shipping_address_id=address.id, subtotal=60.0,
+                  shipping_cost=45.0, total=105.0)
+    db.session.add(order)
+    db.session.commit()
+
+    with app.test_request_context():
+        send_order_confirmation(order)
+    db.session.commit()
+    queued = OutboxEmail.query.one()
+    assert queued.recipients == [customer.email]
+    assert 'Dear Mona' in queued.text_body and '1 Nile St' in queued.text_body
+    assert 'EGP 105.00' in queued.html_body
@@ -0,0 +1,132 @@
+"""Tests for the shared outbound HTTP client"""
+import io
+import pytest
+import requests
+from app.utils import http_client
+from app.utils.http_client import CircuitBreaker, CircuitOpenError, HttpClient, get_client, upstream_stats
+
+
+def _response(status):
+    response = requests.Response()
+    response.status_code = status
+    response.raw = io.BytesIO()
+    return response
+
+
+class Session:
+    """Plays back a script of responses and exceptions"""
+
+    def __init__(self, *script):
+        self.script = list(script)
+        self.calls = []
+
+    def request(self, method, url, **kwargs):
+        self.calls.append((method, url, kwargs))
+        outcome = self.script.pop(0) if self.script else 200
+        if isinstance(outcome, Exception):
+            raise outcome
+        return _response(outcome)
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(HttpClient, '_pause', lambda self, attempt: None)
+
+
+def test_default_and_per_call_timeouts():
+    session = Session()
+    client = HttpClient('bosta', timeout=(1, 5), session=session)
+    client.get('https://bosta.test/cities')
+    client.get('https://bosta.test/pricing', timeout=(1, 2))
+    assert [call[2]['timeout'] for call in session.calls] == [(1, 5), (1, 2)]
+
+
+def test_idempotent_requests_are_retried():
+    session = Session(requests.exceptions.ConnectTimeout(), 503, 200)
+    client = HttpClient('bosta', retries=2, session=session)
+    assert client.get('https://bosta.test/cities').status_code == 200
+    assert len(session.calls) == 3
+    stats = client.stats()
+    assert stats['requests'] == 3 and stats['errors'] == 2 and stats['retries'] == 2
+    assert stats['statuses'] == {'error': 1, '503': 1, '200': 1}
+
+
+def test_posts_are_not_retried_unless_asked():
+    session = Session(503, 503, 200)
+    client = HttpClient('paymob', retries=2, session=session)
+    assert client.post('https://paymob.test/orders').status_code == 503
+    assert len(session.calls) == 1
+    assert client.post('https://paymob.test/orders', retries=1).status_code == 200
+
+
+def test_last_failure_is_raised():
+    session = Session(*[requests.exceptions.ReadTimeout()] * 3)
+    client = HttpClient('bosta', retries=2, session=session)
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        client.get('https://bosta.test/cities')
+    assert len(session.calls) == 3
+
+
+def test_circuit_opens_fails_fast_and_recovers(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(http_client.time, 'monotonic', lambda: now[0])
+    session = Session(*[requests.exceptions.ConnectionError()] * 3)
+    client = HttpClient('bosta', retries=0, breaker=CircuitBreaker(threshold=3, reset_timeout=30),
+                        session=session)
+
+    for _ in range(3):
+        with pytest.raises(requests.exceptions.ConnectionError):
+            client.get('https://bosta.test/cities')
+    assert client.breaker.state == 'open'
+
+    # Open: no request reaches the upstream
+    with pytest.raises(CircuitOpenError):
+        client.get('https://bosta.test/cities')
+    assert len(session.calls) == 3
+    assert client.stats()['short_circuited'] == 1
+
+    # After the reset timeout one trial request goes through and closes it
+    now[0] += 31
+    assert client.breaker.state == 'half_open'
+    assert client.get('https://bosta.test/cities').status_code == 200
+    assert client.breaker.state == 'closed'
+
+
+def test_failed_trial_reopens_the_circuit(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(http_client.time, 'monotonic', lambda: now[0])
+    breaker = CircuitBreaker(threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    now[0] += 31
+    assert breaker.allow()
+    assert not breaker.allow()  # only one trial at a time
+    breaker.record_failure()
+    assert breaker.state == 'open'
+
+
+def test_unexpected_error_ends_the_trial(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(http_client.time, 'monotonic', lambda: now[0])
+    session = Session(ValueError('bad header'))
+    client = HttpClient('bosta', breaker=CircuitBreaker(threshold=1, reset_timeout=30), session=session)
+    client.breaker.record_failure()
+    now[0] += 31
+
+    with pytest.raises(ValueError):
+        client.get('https://bosta.test/cities')
+    assert client.breaker.state == 'open'
+    # The next trial is let through once the circuit may reset again
+    now[0] += 31
+    assert client.get('https://bosta.test/cities').status_code == 200
+    assert client.breaker.state == 'closed'
+
+
+def test_clients_are_shared_per_upstream(app):
+    http_client.reset_clients()
+    try:
+        assert get_client('bosta') is get_client('bosta')
+        assert get_client('bosta') is not get_client('paymob')
+        assert get_client('bosta').timeout == app.config['HTTP_TIMEOUT']
+        assert list(upstream_stats()) == ['bosta', 'paymob']
+    finally:
+        http_client.reset_clients()
@@ -0,0 +1,29 @@
+"""Tests for the hot query indexes"""
+import pytest
+from sqlalchemy.exc import IntegrityError
+from app.models.cart import Cart
+from app.models.category import Category
+from app.models.product import Product
+from scripts.explain_hot_queries import hot_queries, explain
+
+
+def test_cart_lines_are_unique_per_product(db, make_user):
+    user = make_user()
+    category = Category('Rings')
+    db.session.add(category)
+    db.session.flush()
+    product = Product('Ring', 'A ring', 25.0, category.id)
+    db.session.add(product)
+    db.session.flush()
+    db.session.add_all([Cart(user_id=user.id, product_id=product.id),
+                        Cart(user_id=user.id, product_id=product.id)])
+    with pytest.raises(IntegrityError):
+        db.session.commit()
+    db.session.rollback()
+
+
+def test_hot_queries_use_an_index(db):
+    for name, query in hot_queries():
+        plan = ' '.join(row[-1] for row in explain(query))
+        assert 'USING INDEX' in plan, f'{name}: {plan}'
+        assert 'TEMP B-TREE' not in plan, f'{name}: {plan}'
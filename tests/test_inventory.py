@@ -0,0 +1,262 @@
+"""Tests for atomic stock reservation during checkout"""
+import pytest
+from datetime import datetime, timedelta
+from app.models.address import Address
+from app.models.cart import Cart
+from app.models.email_outbox import OutboxEmail
+from app.models.category import Category
+from app.models.inventory import StockReservation
+from app.models.order import Order, OrderItem
+from app.models.product import Product
+from app.utils.inventory import (InsufficientStockError, hold_order_stock, commit_order_stock,
+                                 release_order_stock, release_expired)
+from app.utils.paymob_utils import transaction_hmac
+from tests.conftest import login
+
+
+@pytest.fixture
+def product(db):
+    category = Category('Brooches')
+    db.session.add(category)
+    db.session.flush()
+    product = Product('Brooch', 'A brooch', 40.0, category.id, stock=3)
+    db.session.add(product)
+    db.session.commit()
+    return product
+
+
+@pytest.fixture
+def customer(make_user):
+    return make_user()
+
+
+@pytest.fixture
+def paymob_callback(app, client, monkeypatch):
+    """Deliver a PayMob callback for a transaction, signed like PayMob signs it"""
+    monkeypatch.setitem(app.config, 'PAYMOB_HMAC_SECRET', 'test-hmac')
+
+    def paymob_callback(method='POST', secret='test-hmac', **transaction):
+        signature = transaction_hmac(transaction, secret)
+        if method == 'GET':
+            return client.get('/order/paymob-callback', query_string=dict(transaction, hmac=signature))
+        return client.post('/order/paymob-callback', query_string={'hmac': signature},
+                           json={'type': 'TRANSACTION', 'obj': transaction})
+    return paymob_callback
+
+
+@pytest.fixture
+def make_order(db, customer, product):
+    def make_order(quantity, **fields):
+        order = Order(user_id=customer.id, subtotal=40.0 * quantity, shipping_cost=0.0,
+                      total=40.0 * quantity, **fields)
+        order.items.append(OrderItem(product_id=product.id, quantity=quantity, price=40.0))
+        db.session.add(order)
+        db.session.commit()
+        return order
+    return make_order
+
+
+def _stock(db, product):
+    db.session.expire(product)
+    return product.stock
+
+
+def test_hold_commit_and_release(db, product, make_order):
+    order = make_order(2)
+    hold_order_stock(order)
+    db.session.commit()
+    assert _stock(db, product) == 1
+    assert StockReservation.query.one().is_hold
+
+    assert commit_order_stock(order) == {}
+    db.session.commit()
+    assert _stock(db, product) == 1
+    assert not StockReservation.query.one().is_hold
+
+    assert release_order_stock(order) == 1
+    db.session.commit()
+    assert _stock(db, product) == 3
+    # Releasing twice gives nothing back
+    assert release_order_stock(order) == 0
+
+
+def test_hold_cannot_oversell(db, product, make_order):
+    first, second = make_order(2), make_order(2)
+    hold_order_stock(first)
+    db.session.commit()
+    with pytest.raises(InsufficientStockError):
+        hold_order_stock(second)
+    db.session.rollback()
+    assert _stock(db, product) == 1
+
+
+def test_rehold_refreshes_instead_of_doubling(db, product, make_order):
+    order = make_order(2)
+    hold_order_stock(order)
+    hold_order_stock(order)
+    db.session.commit()
+    assert _stock(db, product) == 1
+    assert StockReservation.query.count() == 1
+
+
+def test_expired_holds_are_released_in_bulk(db, product, make_order):
+    orders = [make_order(1), make_order(1)]
+    for order in orders:
+        hold_order_stock(order, minutes=1)
+    db.session.commit()
+    assert _stock(db, product) == 1
+
+    assert release_expired(now=datetime.utcnow() + timedelta(minutes=2)) == 2
+    db.session.commit()
+    assert _stock(db, product) == 3
+    assert StockReservation.query.count() == 0
+
+    # A late payment takes the stock again if it is still there
+    assert commit_order_stock(orders[0]) == {}
+    db.session.commit()
+    assert _stock(db, product) == 2
+
+
+def test_commit_reports_shortfall(db, product, make_order):
+    late = make_order(2)
+    hold_order_stock(make_order(2))
+    db.session.commit()
+    assert commit_order_stock(late) == {product.id: 2}
+
+
+def test_cod_checkout_takes_stock_once(client, db, product, customer):
+    address = Address(user_id=customer.id, name='Home', phone='01000000000',
+                      street='1 Nile St', city='Cairo')
+    db.session.add(address)
+    db.session.add(Cart(user_id=customer.id, product_id=product.id, quantity=2))
+    db.session.commit()
+    login(client, customer)
+    with client.session_transaction() as session:
+        session['shipping_cost'] = 0.0
+        session['shipping_address_id'] = address.id
+
+    client.post('/order/process-checkout', data={'payment_method': 'cod', 'shipping_address_id': address.id})
+    assert _stock(db, product) == 1
+    order = Order.query.one()
+
+    client.post(f'/order/cancel/{order.id}')
+    assert _stock(db, product) == 3
+
+
+@pytest.fixture
+def checkout_address(db, client, customer):
+    """A shipping address with a quote in the session, ready for checkout"""
+    address = Address(user_id=customer.id, name='Home', phone='01000000000',
+                      street='1 Nile St', city='Cairo')
+    db.session.add(address)
+    db.session.commit()
+    login(client, customer)
+    with client.session_transaction() as session:
+        session['shipping_cost'] = 0.0
+        session['shipping_address_id'] = address.id
+    return address
+
+
+def test_card_checkout_holds_stock_before_charging(client, db, product, customer, make_order,
+                                                   checkout_address, monkeypatch):
+    charged = []
+
+    class Intent:
+        status = 'succeeded'
+
+    monkeypatch.setattr('app.order.routes.confirm_payment_intent', lambda intent_id: charged.append(intent_id) or Intent)
+    db.session.add(Cart(user_id=customer.id, product_id=product.id, quantity=2))
+    db.session.commit()
+    hold_order_stock(make_order(2))
+    db.session.commit()
+
+    form = {'payment_method': 'card', 'shipping_address_id': checkout_address.id, 'payment_intent_id': 'pi_1'}
+    client.post('/order/process-checkout', data=form)
+    assert charged == []
+    assert Order.query.count() == 1
+
+    db.session.execute(StockReservation.__table__.delete())
+    Product.query.update({Product.stock: 3})
+    db.session.commit()
+    client.post('/order/process-checkout', data=form)
+    assert charged == ['pi_1']
+    order = Order.query.filter_by(stripe_payment_id='pi_1').one()
+    assert order.payment_status == 'paid'
+    assert not StockReservation.query.filter_by(order_id=order.id).one().is_hold
+    assert _stock(db, product) == 1
+
+
+def test_paymob_payment_only_for_unpaid_card_orders(client, db, product, customer, make_order):
+    order = make_order(2, payment_method='cod')
+    commit_order_stock(order)
+    db.session.commit()
+    login(client, customer)
+
+    response = client.post('/order/process-paymob-payment', json={'order_id': order.id})
+    assert response.get_json()['success'] is False
+    assert _stock(db, product) == 1
+    assert StockReservation.query.count() == 1
+
+
+def test_failed_payment_releases_hold(db, product, make_order, paymob_callback):
+    order = make_order(3, paymob_order_id='pm-1')
+    hold_order_stock(order)
+    db.session.commit()
+    assert _stock(db, product) == 0
+
+    paymob_callback(order={'id': 'pm-1'}, success=False, id='tx-1')
+    assert _stock(db, product) == 3
+
+
+def test_late_failure_keeps_paid_order(db, product, make_order, paymob_callback):
+    order = make_order(3, paymob_order_id='pm-1', payment_status='paid', status='processing')
+    commit_order_stock(order)
+    db.session.commit()
+
+    paymob_callback(order={'id': 'pm-1'}, success=False, id='tx-2')
+    db.session.expire(order)
+    assert order.payment_status == 'paid'
+    assert _stock(db, product) == 0
+    assert StockReservation.query.count() == 1
+
+
+def test_repeated_success_callback_applies_once(db, product, make_order, paymob_callback):
+    order = make_order(1, paymob_order_id='pm-1')
+    hold_order_stock(order)
+    db.session.commit()
+
+    # PayMob's webhook, then the customer's redirect for the same payment
+    paymob_callback(order={'id': 'pm-1'}, success=True, id='tx-1')
+    response = paymob_callback('GET', order='pm-1', success='true', id='tx-1')
+    assert response.status_code == 302
+    db.session.expire(order)
+    assert order.payment_status == 'paid' and order.paymob_payment_id == 'tx-1'
+    assert OutboxEmail.query.count() == 1
+    assert _stock(db, product) == 2
+
+
+def test_unsigned_callback_is_refused(db, product, make_order, paymob_callback):
+    order = make_order(3, paymob_order_id='pm-1')
+    hold_order_stock(order)
+    db.session.commit()
+
+    assert paymob_callback(order={'id': 'pm-1'}, success=True, id='tx-1', secret='forged').status_code == 403
+    assert paymob_callback('GET', order='pm-1', success='false', id='tx-1', secret='forged').status_code == 403
+    db.session.expire(order)
+    assert order.payment_status == 'pending'
+    assert _stock(db, product) == 0
+
+
+def test_checkout_page_polls_the_callback_result(client, db, customer, make_user, make_order, paymob_callback):
+    order = make_order(1, paymob_order_id='pm-1', payment_method='card')
+    login(client, customer)
+    assert client.get(f'/order/payment-status/{order.id}').get_json() == {'success': True,
+                                                                          'payment_status': 'pending'}
+
+    paymob_callback(order={'id': 'pm-1'}, success=True, id='tx-1')
+    status = client.get(f'/order/payment-status/{order.id}').get_json()
+    assert status['payment_status'] == 'paid'
+    assert status['redirect_url'] == f'/order/order-confirmation/{order.id}'
+
+    login(client, make_user())
+    assert client.get(f'/order/payment-status/{order.id}').status_code == 403
@@ -0,0 +1,108 @@
+"""Tests for the background job queue"""
+from datetime import datetime, timedelta
+import pytest
+from app.extensions import mail
+from app.models.job import Job
+from app.utils import jobs
+from app.utils.email import send_email
+from app.utils.jobs import Worker, enqueue, job_handler, retry_dead_jobs
+
+calls = []
+
+
+@job_handler('test.record', max_attempts=3)
+def record(value):
+    calls.append(value)
+
+
+@job_handler('test.fail', max_attempts=2)
+def fail():
+    raise RuntimeError('upstream down')
+
+
+@job_handler('test.limited', concurrency=1)
+def limited():
+    pass
+
+
+@pytest.fixture(autouse=True)
+def reset_calls():
+    calls.clear()
+
+
+def test_jobs_run_once_and_are_removed(db):
+    enqueue('test.record', value=1)
+    enqueue('test.record', value=2)
+    db.session.commit()
+
+    assert Worker().work(once=True) == 2
+    assert calls == [1, 2]
+    assert Job.query.count() == 0
+
+
+def test_keys_deduplicate_unfinished_jobs(db):
+    first = enqueue('test.record', key='order:1', value=1)
+    db.session.commit()
+    assert enqueue('test.record', key='order:1', value=1) is first
+    db.session.commit()
+    assert Job.query.count() == 1
+
+
+def test_failures_back_off_then_dead_letter(db, monkeypatch):
+    monkeypatch.setattr(jobs, 'backoff_seconds', lambda attempts: 60)
+    job_id = enqueue('test.fail').id
+    db.session.commit()
+    worker = Worker()
+
+    assert worker.work(once=True) == 1
+    job = db.session.get(Job, job_id, populate_existing=True)
+    assert job.status == 'queued' and job.attempts == 1
+    assert job.run_at > datetime.utcnow() + timedelta(seconds=50)
+    assert 'upstream down' in job.last_error
+    # Not due yet
+    assert worker.work(once=True) == 0
+
+    job.run_at = datetime.utcnow()
+    db.session.commit()
+    worker.work(once=True)
+    job = db.session.get(Job, job_id, populate_existing=True)
+    assert job.status == 'dead' and job.attempts == 2
+
+    assert retry_dead_jobs('test.fail') == 1
+    db.session.commit()
+    job = db.session.get(Job, job_id, populate_existing=True)
+    assert job.status == 'queued' and job.attempts == 0
+
+
+def test_concurrency_limit_per_type(db):
+    enqueue('test.limited')
+    enqueue('test.limited')
+    enqueue('test.record', value=1)
+    db.session.commit()
+
+    first = Worker().claim()
+    assert first.type == 'test.limited'
+    # The other limited job has to wait, other types don't
+    other = Worker()
+    assert other.claim().type == 'test.record'
+    assert other.claim() is None
+
+
+def test_abandoned_claims_are_taken_over(db):
+    job_id = enqueue('test.record', value=1).id
+    db.session.commit()
+    assert Worker().claim().id == job_id
+
+    job = db.session.get(Job, job_id, populate_existing=True)
+    job.locked_until = datetime.utcnow() - timedelta(seconds=1)
+    db.session.commit()
+    assert Worker().work(once=True) == 1
+    assert calls == [1]
+
+
+def test_emails_are_sent_by_the_worker(db):
+    send_email('Hello', sender='shop@example.com', recipients=['customer@example.com'], text_body='Hi')
+    db.session.commit()
+    with mail.record_messages() as outbox:
+        Worker().work(once=True)
+    assert [msg.subject for msg in outbox] == ['Hello']
@@ -0,0 +1,65 @@
+"""Smoke test for the load-test harness and the fake Bosta and PayMob servers"""
+import json
+import random
+import pytest
+from app import create_app
+from app.models.order import Order
+from app.utils.http_client import reset_clients
+from tests.fakes.bosta import FakeBosta
+from tests.fakes.paymob import FakePayMob
+from tests.load.harness import COUPON, HMAC_SECRET, IFRAME_ID, LiveServer, load_test_config, prepare_shop, run_load
+from tests.load.journeys import VirtualUser
+from tests.load.report import Recorder, compare_reports, percentile
+
+
+@pytest.fixture
+def shop(tmp_path):
+    reset_clients()
+    with FakeBosta() as bosta, FakePayMob(hmac_secret=HMAC_SECRET) as paymob:
+        app = create_app(load_test_config(f"sqlite:///{tmp_path / 'shop.db'}", bosta.url, paymob.url))
+        with app.app_context():
+            customers, product_ids = prepare_shop(2, products=12)
+        with LiveServer(app) as server:
+            yield app, server, bosta, paymob, customers, product_ids
+    reset_clients()
+
+
+def test_every_journey_completes(shop):
+    app, server, bosta, paymob, customers, product_ids = shop
+    recorder = Recorder()
+    user = VirtualUser(server.url, customers[0], product_ids, recorder, random.Random(1),
+                       paymob_url=paymob.url, iframe_id=IFRAME_ID, coupon=COUPON)
+    user.login()
+    for journey in ('browse', 'search', 'checkout_cod', 'checkout_paymob'):
+        assert user.run(journey), journey
+
+    report = recorder.report(elapsed=1.0)
+    assert report['total']['errors'] == 0
+    assert {'apply_coupon', 'quote_shipping', 'place_cod_order', 'paymob_payment', 'paymob_callback'} <= set(report['steps'])
+    assert report['journeys']['checkout_paymob'] == {'completed': 1, 'failed': 0}
+    assert bosta.calls['calculator'] >= 1 and paymob.calls['pay'] == 1
+
+    with app.app_context():
+        orders = Order.query.filter(Order.id > 4).order_by(Order.id).all()
+        assert [(o.payment_method, o.payment_status) for o in orders] == [('cod', 'pending'), ('card', 'paid')]
+        assert orders[0].discount > 0
+
+
+def test_concurrent_shoppers_report_percentiles(shop):
+    app, server, bosta, paymob, customers, product_ids = shop
+    recorder, elapsed = run_load(server.url, customers, product_ids, paymob.url, users=2, duration=None,
+                                 iterations=3, think=0, journeys={'browse': 1, 'search': 1})
+    report = json.loads(json.dumps(recorder.report(elapsed)))
+    assert report['total']['requests'] > 6 and report['total']['errors'] == 0
+    assert sum(j['completed'] for j in report['journeys'].values()) == 6
+    product = report['steps']['product_detail']
+    assert product['p50_ms'] <= product['p95_ms'] <= product['p99_ms'] <= product['max_ms']
+
+    [row] = [row for row in compare_reports(report, report) if row[:2] == ('total', 'p95_ms')]
+    assert row[4] == 0
+
+
+def test_percentile_is_nearest_rank():
+    values = list(range(1, 101))
+    assert [percentile(values, q) for q in (50, 95, 99, 100)] == [50, 95, 99, 100]
+    assert percentile([7], 99) == 7 and percentile([], 50) is None
@@ -0,0 +1,96 @@
+"""Data migrations, run against the test database put back in its pre-migration state"""
+import importlib.util
+import os
+from datetime import datetime, timedelta
+import pytest
+from alembic.migration import MigrationContext
+from alembic.operations import Operations
+from sqlalchemy import text
+from app.models.category import Category
+from app.models.inventory import StockReservation
+from app.models.order import Order, OrderItem
+from app.models.product import Product
+from app.utils.checkout import sweep_abandoned_orders
+from app.utils.inventory import release_order_stock
+
+VERSIONS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations', 'versions')
+
+
+def run_upgrade(db, revision):
+    """Run the upgrade() of one revision on the test database"""
+    name = next(name for name in os.listdir(VERSIONS) if name.startswith(revision))
+    spec = importlib.util.spec_from_file_location(f'migration_{revision}', os.path.join(VERSIONS, name))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    db.session.commit()
+    with db.engine.begin() as connection, Operations.context(MigrationContext.configure(connection)):
+        module.upgrade()
+    db.session.expire_all()
+
+
+@pytest.fixture
+def product(db):
+    category = Category('Brooches')
+    db.session.add(category)
+    db.session.flush()
+    product = Product('Brooch', 'A brooch', 40.0, category.id, stock=10)
+    db.session.add(product)
+    db.session.commit()
+    return product
+
+
+@pytest.fixture
+def legacy_order(db, make_user, product):
+    """Orders as the checkout of the time left them"""
+    customer = make_user()
+
+    def legacy_order(quantity=1, **fields):
+        fields.setdefault('shipping_cost', 0.0)
+        order = Order(user_id=customer.id, subtotal=40.0 * quantity, total=40.0 * quantity + fields['shipping_cost'],
+                      **fields)
+        order.items.append(OrderItem(product_id=product.id, quantity=quantity, price=40.0))
+        db.session.add(order)
+        db.session.commit()
+        return order
+    return legacy_order
+
+
+def test_reservations_backfill_only_orders_that_took_stock(db, product, legacy_order):
+    placed_cod = legacy_order(2, status='pending', payment_status='pending', payment_method='cod', shipping_cost=50.0)
+    placed_card = legacy_order(1, status='paid', payment_status='paid', payment_method='card',
+                               stripe_payment_id='pi_1', shipping_cost=50.0)
+    page_draft = legacy_order(3, status='pending', payment_status='pending', payment_method='cod')
+    paid_draft = legacy_order(1, status='processing', payment_status='paid', payment_method='card',
+                              paymob_order_id='pm-1', paymob_payment_id='tx-1')
+    db.session.execute(text('DROP TABLE stock_reservations'))
+
+    run_upgrade(db, 'f3b8d1c05e72')
+    assert {r.order_id: r.quantity for r in StockReservation.query} == {placed_cod.id: 2, placed_card.id: 1}
+
+    # Cancelling an order that never took stock gives none back
+    for order in (page_draft, paid_draft):
+        assert release_order_stock(order) == 0
+    assert release_order_stock(placed_cod) == 1
+    db.session.commit()
+    db.session.refresh(product)
+    assert product.stock == 12
+
+
+def test_legacy_checkout_page_orders_are_swept(db, legacy_order):
+    yesterday = datetime.utcnow() - timedelta(days=1)
+    placed = legacy_order(2, status='pending', payment_status='pending', payment_method='cod', shipping_cost=50.0,
+                          date_created=yesterday)
+    page_draft = legacy_order(3, status='pending', payment_status='pending', payment_method='cod',
+                              date_created=yesterday)
+    draft_id = page_draft.id
+    db.session.execute(text('DROP TABLE stock_reservations'))
+    db.session.execute(text('ALTER TABLE orders DROP COLUMN is_draft'))
+
+    run_upgrade(db, 'f3b8d1c05e72')
+    run_upgrade(db, 'd7a2c9e4f518')
+    assert db.session.get(Order, draft_id).is_draft is True
+    assert placed.is_draft is False
+
+    assert sweep_abandoned_orders(hours=1) == 1
+    assert db.session.get(Order, draft_id) is None
+    assert Order.query.count() == 1
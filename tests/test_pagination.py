@@ -0,0 +1,78 @@
+"""Tests for keyset (cursor) pagination of product listings"""
+import pytest
+from datetime import datetime, timedelta
+from app.models.category import Category
+from app.models.product import Product
+from app.utils.pagination import SORT_KEYS, keyset_paginate
+
+
+@pytest.fixture
+def catalog(db):
+    category = Category('Rings')
+    db.session.add(category)
+    db.session.flush()
+    base = datetime(2025, 1, 1)
+    products = []
+    for i in range(7):
+        # Duplicate prices and names so ties must be broken by id
+        product = Product(f'Ring {i % 3}', 'A ring', 10.0 * (i % 4), category.id)
+        product.created_at = base + timedelta(days=i % 2)
+        products.append(product)
+    db.session.add_all(products)
+    db.session.commit()
+    return products
+
+
+def _walk(query, sort_by, per_page=3):
+    """Collect every page of a listing by following next_after tokens"""
+    seen, after, total = [], None, None
+    while True:
+        page = keyset_paginate(query, SORT_KEYS[sort_by], sort_by, after=after,
+                               per_page=per_page, with_total=True)
+        seen.extend(page.items)
+        total = page.total if total is None else total
+        assert page.total == total
+        if not page.has_next:
+            return seen, total
+        after = page.next_after
+
+
+@pytest.mark.parametrize('sort_by', sorted(SORT_KEYS))
+def test_pages_match_offset_ordering(catalog, sort_by):
+    ordering = [expr.desc() if desc else expr for expr, desc in SORT_KEYS[sort_by]]
+    expected = Product.query.order_by(*ordering).all()
+    seen, total = _walk(Product.query, sort_by)
+    assert seen == expected
+    assert total == len(catalog)
+
+
+def test_cursor_from_other_sort_restarts(catalog):
+    first = keyset_paginate(Product.query, SORT_KEYS['price_low'], 'price_low', per_page=2)
+    restarted = keyset_paginate(Product.query, SORT_KEYS['name_asc'], 'name_asc',
+                                after=first.next_after, per_page=2)
+    assert restarted.is_first
+
+
+def test_tampered_cursor_restarts(catalog):
+    page = keyset_paginate(Product.query, SORT_KEYS['default'], 'default',
+                           after='not-a-token', per_page=2)
+    assert page.is_first
+    assert [p.id for p in page.items] == [catalog[0].id, catalog[1].id]
+
+
+def test_json_listing_follows_cursor(client, catalog):
+    response = client.get('/api/products?sort=price_high').get_json()
+    assert response['total'] == len(catalog)
+    ids = [item['id'] for item in response['items']]
+    while response['next_after']:
+        response = client.get(f"/api/products?sort=price_high&after={response['next_after']}").get_json()
+        ids.extend(item['id'] for item in response['items'])
+    assert len(ids) == len(set(ids)) == len(catalog)
+
+
+def test_shop_page_links_to_next_cursor(app, client, catalog):
+    app.config['PRODUCTS_PER_PAGE'] = 3
+    response = client.get('/shop?sort=name_asc')
+    assert response.status_code == 200
+    assert b'after=' in response.data
+    assert client.get('/shop?page=2').status_code == 200
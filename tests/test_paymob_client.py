@@ -0,0 +1,143 @@
+"""Tests for PayMob auth token caching, payment key reuse and callback signatures"""
+import hashlib
+import hmac
+import io
+import json
+from datetime import datetime, timedelta
+import pytest
+import requests
+from app.models.address import Address
+from app.models.order import Order
+from app.utils import http_client
+from app.utils.http_client import HttpClient
+from app.utils.paymob_utils import (AUTH_URL, ORDER_URL, PAYMENT_KEY_URL, payment_key_for_order,
+                                    verify_webhook_signature)
+
+ITEMS = [{'name': 'Scarf', 'amount_cents': 6000, 'description': 'Scarf x 1', 'quantity': 1}]
+BILLING = {'first_name': 'Test', 'email': 'customer@example.com'}
+
+
+class PayMob:
+    """Answers like PayMob and records the calls made"""
+
+    def __init__(self):
+        self.calls = []
+        self.reject = set()
+
+    def request(self, method, url, **kwargs):
+        self.calls.append(url)
+        response = requests.Response()
+        response.raw = io.BytesIO()
+        response.status_code = 200
+        count = self.calls.count(url)
+        if url in self.reject:
+            self.reject.discard(url)
+            response.status_code = 401
+            body = {'detail': 'Invalid token'}
+        elif url == AUTH_URL:
+            body = {'token': f'auth-{count}'}
+        elif url == ORDER_URL:
+            body = {'id': 100 + count}
+        else:
+            body = {'token': f'key-{count}'}
+        response._content = json.dumps(body).encode()
+        return response
+
+    def count(self, url):
+        return self.calls.count(url)
+
+
+@pytest.fixture
+def paymob(monkeypatch):
+    paymob = PayMob()
+    monkeypatch.setitem(http_client._clients, 'paymob', HttpClient('paymob', session=paymob))
+    return paymob
+
+
+@pytest.fixture
+def order(db, make_user):
+    customer = make_user()
+    address = Address(user_id=customer.id, name='Home', phone='01000000000',
+                      street='1 Nile St', city='Cairo')
+    db.session.add(address)
+    db.session.flush()
+    order = Order(user_id=customer.id, shipping_address_id=address.id, subtotal=60.0,
+                  shipping_cost=45.0, total=105.0)
+    db.session.add(order)
+    db.session.commit()
+    return order
+
+
+def _pay(order):
+    return payment_key_for_order(order, ITEMS, dict(BILLING), integration_id='123')
+
+
+def test_repeated_clicks_reuse_the_payment_key(paymob, order):
+    assert _pay(order) == 'key-1'
+    assert order.paymob_order_id == '101' and order.paymob_amount_cents == 10500
+    assert paymob.calls == [AUTH_URL, ORDER_URL, PAYMENT_KEY_URL]
+
+    assert _pay(order) == 'key-1'
+    assert len(paymob.calls) == 3
+
+
+def test_expired_key_reuses_the_paymob_order(paymob, order):
+    _pay(order)
+    order.paymob_payment_key_expires_at = datetime.utcnow() + timedelta(minutes=1)
+    assert _pay(order) == 'key-2'
+    assert order.paymob_order_id == '101'
+    # The auth token is cached as well
+    assert paymob.count(AUTH_URL) == 1 and paymob.count(ORDER_URL) == 1
+
+
+def test_changed_amount_registers_a_new_paymob_order(paymob, order):
+    _pay(order)
+    order.total = 120.0
+    assert _pay(order) == 'key-2'
+    assert order.paymob_order_id == '102' and order.paymob_amount_cents == 12000
+
+
+def test_rejected_auth_token_is_renewed_once(paymob, order):
+    _pay(order)
+    order.paymob_payment_key = None
+    paymob.reject.add(PAYMENT_KEY_URL)
+    assert _pay(order) == 'key-3'
+    assert paymob.count(AUTH_URL) == 2
+
+
+# The query string of PayMob's transaction response redirect, with
+# source_data flattened and fields PayMob doesn't sign mixed in
+REDIRECT = {
+    'id': '192036465', 'pending': 'false', 'amount_cents': '100', 'success': 'true', 'is_auth': 'false',
+    'is_capture': 'false', 'is_standalone_payment': 'true', 'is_voided': 'false', 'is_refunded': 'false',
+    'is_3d_secure': 'true', 'integration_id': '4097558', 'profile_id': '164295', 'has_parent_transaction': 'false',
+    'order': '217503754', 'created_at': '2024-06-13T11:33:44.592345', 'currency': 'EGP', 'merchant_commission': '0',
+    'discount_details': '[]', 'is_void': 'false', 'is_refund': 'false', 'error_occured': 'false',
+    'refunded_amount_cents': '0', 'captured_amount': '0', 'updated_at': '2024-06-13T11:33:55.034672',
+    'is_settled': 'false', 'bill_balanced': 'false', 'is_bill': 'false', 'owner': '302852',
+    'merchant_order_id': '42', 'data.message': 'Approved', 'source_data.type': 'card', 'source_data.pan': '2346',
+    'source_data.sub_type': 'MasterCard', 'acq_response_code': '00', 'txn_response_code': 'APPROVED',
+}
+# PayMob's HMAC message for REDIRECT: the signed fields' values in PayMob's order
+REDIRECT_MESSAGE = ('1002024-06-13T11:33:44.592345EGPfalsefalse1920364654097558truefalsefalsefalsetrue'
+                    '217503754302852false2346MasterCardcardtrue')
+
+
+def test_redirect_query_string_is_verified():
+    signature = hmac.new(b'secret', REDIRECT_MESSAGE.encode(), hashlib.sha512).hexdigest()
+    assert verify_webhook_signature(REDIRECT, signature, 'secret')
+    assert not verify_webhook_signature(dict(REDIRECT, amount_cents='1'), signature, 'secret')
+    assert not verify_webhook_signature(REDIRECT, signature, 'other-secret')
+    assert not verify_webhook_signature(REDIRECT, signature, None)
+
+
+def test_webhook_body_signs_like_the_redirect():
+    signature = hmac.new(b'secret', REDIRECT_MESSAGE.encode(), hashlib.sha512).hexdigest()
+    transaction = {
+        'id': 192036465, 'pending': False, 'amount_cents': 100, 'success': True, 'is_auth': False,
+        'is_capture': False, 'is_standalone_payment': True, 'is_refunded': False, 'is_3d_secure': True,
+        'integration_id': 4097558, 'has_parent_transaction': False, 'order': {'id': 217503754, 'items': []},
+        'created_at': '2024-06-13T11:33:44.592345', 'currency': 'EGP', 'error_occured': False, 'owner': 302852,
+        'source_data': {'type': 'card', 'pan': '2346', 'sub_type': 'MasterCard'},
+    }
+    assert verify_webhook_signature(transaction, signature, 'secret')
@@ -0,0 +1,72 @@
+"""Tests for denormalized primary images and batch image preloading"""
+import pytest
+from contextlib import contextmanager
+from sqlalchemy import event
+from app.models.category import Category
+from app.models.product import Product, ProductImage
+
+
+@pytest.fixture
+def products(db):
+    category = Category('Necklaces')
+    db.session.add(category)
+    db.session.flush()
+    products = [Product(f'Necklace {i}', 'A necklace', 100.0, category.id) for i in range(4)]
+    db.session.add_all(products)
+    db.session.flush()
+    for product in products[:3]:
+        db.session.add(ProductImage(f'/static/uploads/{product.id}-a.jpg', product.id))
+        db.session.add(ProductImage(f'/static/uploads/{product.id}-b.jpg', product.id, is_primary=True))
+        db.session.flush()
+        product.refresh_primary_image()
+    db.session.commit()
+    return products
+
+
+@contextmanager
+def _count_queries(db):
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+
+
+def test_primary_image_url_prefers_flagged_image(products):
+    product = products[0]
+    assert product.image_url == f'/static/uploads/{product.id}-b.jpg'
+    assert products[3].image_url is None
+
+
+def test_refresh_falls_back_to_first_image(db, products):
+    product = products[0]
+    db.session.delete(product.primary_image)
+    product.refresh_primary_image()
+    db.session.commit()
+    assert product.image_url == f'/static/uploads/{product.id}-a.jpg'
+
+
+def test_preload_images_uses_one_query(db, products):
+    db.session.expire_all()
+    page = Product.query.order_by(Product.id).all()
+    with _count_queries(db) as statements:
+        Product.preload_images(page)
+        galleries = [product.gallery for product in page]
+        urls = [product.image_url for product in page]
+    assert len(statements) == 1
+    assert [len(gallery) for gallery in galleries] == [2, 2, 2, 0]
+    assert all(gallery[0].is_primary for gallery in galleries[:3])
+    assert urls[3] is None
+
+
+def test_shop_grid_query_count_is_flat(app, client, db, products):
+    app.config['LISTING_SHOW_TOTAL'] = False
+    with _count_queries(db) as statements:
+        assert client.get('/shop').status_code == 200
+    # Listing, images and categories, independent of the page size
+    assert len(statements) <= 4
@@ -0,0 +1,60 @@
+"""Query budgets for the busiest endpoints
+
+Each endpoint runs against a seeded shop (tests/seed.py) and must stay
+within its declared number of SQL statements and DB time, as measured by
+app.utils.sql_metrics. A lazy load in a loop over the seeded rows blows the
+budget and fails the test, naming the statement that repeated.
+
+Budgets are set a little above what the endpoints need today. Raise one
+only when the extra queries are a deliberate trade-off, not an N+1. DB time
+budgets are generous, since they are measured on in-memory SQLite.
+"""
+from collections import namedtuple
+import pytest
+from app.models.user import User
+from app.utils.sql_metrics import record_queries
+from tests.conftest import login
+from tests.seed import seed_shop
+
+Budget = namedtuple('Budget', ['endpoint', 'user', 'method', 'path', 'max_queries', 'max_db_ms'])
+
+BUDGETS = [
+    Budget('main.shop', None, 'GET', lambda shop: '/shop', 5, 250),
+    Budget('main.shop', 'customer', 'GET', lambda shop: '/shop?sort=price_low', 7, 250),
+    Budget('main.search', None, 'GET', lambda shop: '/search?q=product', 5, 250),
+    Budget('main.product_detail', 'customer', 'GET', lambda shop: f'/product/{shop.product_ids[0]}', 8, 250),
+    Budget('cart.cart', 'customer', 'GET', lambda shop: '/cart/', 4, 250),
+    Budget('cart.update_cart', 'customer', 'POST', lambda shop: f'/cart/update/{shop.cart_item_ids[0]}', 6, 250),
+    Budget('order.checkout', 'customer', 'GET', lambda shop: '/order/checkout', 6, 250),
+    Budget('admin.orders', 'admin', 'GET', lambda shop: '/admin/orders', 5, 250),
+    Budget('admin.sales_report', 'admin', 'GET', lambda shop: '/admin/sales_report', 7, 250),
+    Budget('wishlist.wishlist', 'customer', 'GET', lambda shop: '/wishlist/', 5, 250),
+]
+
+
+@pytest.fixture
+def shop(db):
+    return seed_shop()
+
+
+@pytest.mark.parametrize('budget', BUDGETS, ids=lambda budget: f'{budget.endpoint}:{budget.path.__code__.co_firstlineno}')
+def test_endpoint_stays_within_query_budget(client, db, shop, budget):
+    if budget.user:
+        login(client, db.session.get(User, getattr(shop, f'{budget.user}_id')))
+    path = budget.path(shop)
+    # Warm per-worker caches (categories, rate cards) like a running server would
+    client.open(path, method=budget.method, json={'quantity': 1} if budget.method == 'POST' else None)
+    # The tests share one session; start empty so lazy loads really hit the DB
+    db.session.remove()
+
+    with record_queries() as requests:
+        response = client.open(path, method=budget.method, json={'quantity': 2} if budget.method == 'POST' else None)
+    assert response.status_code == 200
+
+    [queries] = requests
+    assert queries.endpoint == budget.endpoint
+    assert queries.count <= budget.max_queries, (
+        f'{budget.endpoint} ran {queries.count} queries (budget {budget.max_queries}); '
+        f'most repeated: {queries.statements.most_common(3)}'
+    )
+    assert queries.duration_ms <= budget.max_db_ms
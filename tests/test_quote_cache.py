@@ -0,0 +1,114 @@
+"""Tests for the shipping quote cache"""
+import threading
+import time
+from app.models.shipping import ShippingQuote
+from app.shipping.quote_cache import QuoteCache, get_quote_cache, quote_key
+from app.shipping.services import price_from_tier
+from tests.conftest import login
+
+TIER = {'cost': 60, 'openingPackageFee': {'amount': 5}, 'bostaMaterialFee': {'amount': 3},
+        'extraCodFee': {'percentage': 0.01, 'minimumFeeAmount': 10}}
+
+
+class Loader:
+    def __init__(self, value=TIER):
+        self.value = value
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.value
+
+
+def test_price_from_tier():
+    assert price_from_tier(TIER) == 68.0
+    assert price_from_tier(TIER, cod_amount=500) == 78.0
+    assert price_from_tier(TIER, cod_amount=3000) == 98.0
+
+
+def test_cod_amounts_share_buckets(app):
+    assert quote_key('Ismailia', 'Cairo', 'MEDIUM', 0) == 'bosta:ismailia:cairo:medium:0'
+    assert quote_key('Ismailia', 'Cairo', 'MEDIUM', 120) == quote_key('Ismailia', 'Cairo', 'MEDIUM', 480)
+    assert quote_key('Ismailia', 'Cairo', 'MEDIUM', 120) != quote_key('Ismailia', 'Cairo', 'MEDIUM', 620)
+
+
+def test_memory_then_database_hits(db):
+    loader = Loader()
+    cache = QuoteCache(ttl=60)
+    assert cache.get_or_load('k', loader, cost=price_from_tier) == TIER
+    assert cache.get_or_load('k', loader) == TIER
+    assert loader.calls == 1
+    quote = ShippingQuote.query.filter_by(quote_key='k').one()
+    assert quote.order_id is None and quote.cost == 68.0
+
+    # Another worker (or a restart) finds the stored quote
+    other = QuoteCache(ttl=60)
+    assert other.get_or_load('k', loader) == TIER
+    assert loader.calls == 1
+    assert cache.stats()['hits'] == 1 and other.stats()['db_hits'] == 1
+
+
+def test_expired_and_missing_quotes_are_loaded(db):
+    cache = QuoteCache(ttl=0)
+    loader = Loader()
+    cache.get_or_load('k', loader)
+    cache.get_or_load('k', loader)
+    assert loader.calls == 2
+
+    nothing = Loader(value=None)
+    assert cache.get_or_load('none', nothing) is None
+    assert cache.get_or_load('none', nothing) is None
+    assert nothing.calls == 2
+
+    # Expired quotes are still available as a fallback
+    assert cache.get_stale('k') == TIER
+    assert cache.get_stale('missing') is None
+
+
+def test_lru_evicts_oldest(db):
+    cache = QuoteCache(maxsize=2, ttl=60)
+    for key in ('a', 'b', 'c'):
+        cache.get_or_load(key, Loader())
+    assert cache.stats()['size'] == 2
+    assert cache._get_memory('a') is None and cache._get_memory('c') == TIER
+
+
+def test_concurrent_misses_share_one_load(app, db):
+    release = threading.Event()
+    calls = []
+
+    def slow_loader():
+        calls.append(1)
+        release.wait(5)
+        return TIER
+
+    cache = QuoteCache(ttl=60)
+    results = []
+
+    def lookup():
+        with app.app_context():
+            results.append(cache.get_or_load('k', slow_loader))
+
+    threads = [threading.Thread(target=lookup) for _ in range(3)]
+    for number, thread in enumerate(threads):
+        thread.start()
+        # Start the next caller only once this one is loading or waiting
+        while cache.stats()['misses'] + cache.stats()['coalesced'] <= number:
+            time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results == [TIER] * 3
+    assert cache.stats()['coalesced'] == 2
+
+
+def test_stats_are_served_with_the_upstream_metrics(app, client, make_user):
+    cache = get_quote_cache()
+    cache.get_or_load('bosta:ismailia:cairo:medium:0', Loader(), cost=price_from_tier)
+    cache.get_or_load('bosta:ismailia:cairo:medium:0', Loader(), cost=price_from_tier)
+    login(client, make_user(is_admin=True))
+
+    stats = client.get('/admin/api/upstreams').get_json()['shipping_quote_cache']
+    assert stats['hits'] == 1 and stats['misses'] == 1 and stats['size'] == 1
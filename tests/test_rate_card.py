@@ -0,0 +1,77 @@
+"""Tests for the local Bosta rate card"""
+from app.models.category import CatalogVersion
+from app.models.shipping import BostaRateCard
+from app.shipping.rate_card import (RATE_CARDS_VERSION, refresh_rate_cards, rate_card_tier, quote_all_destinations,
+                                    invalidate_rate_cards)
+from app.utils.city_mapping import CITIES
+
+
+def _tier(cost):
+    return {'cost': cost, 'extraCodFee': {'percentage': 0.01, 'minimumFeeAmount': 10}}
+
+
+class Calculator:
+    """Answers like Bosta's calculator: more expensive further from Ismailia"""
+
+    def __init__(self):
+        self.calls = []
+
+    def _fetch_pricing_tier(self, pickup_city, dropoff_city, size, cod_amount):
+        self.calls.append(dropoff_city)
+        if dropoff_city == 'North Coast':
+            return None
+        return _tier(55 if dropoff_city in ('Ismailia', 'Cairo') else 80)
+
+
+def test_refresh_stores_every_governorate(db):
+    calculator = Calculator()
+    assert refresh_rate_cards(calculator) == len(CITIES) - 1
+    db.session.commit()
+    assert len(calculator.calls) == len(CITIES)
+
+    assert rate_card_tier('Ismailia', 'Cairo') == _tier(55)
+    assert rate_card_tier('Ismailia', 'North Coast') is None
+
+    # A second refresh replaces the cards instead of duplicating them
+    refresh_rate_cards(calculator)
+    db.session.commit()
+    assert len(quote_all_destinations()) == len(CITIES) - 1
+
+
+def test_quote_all_destinations(db):
+    refresh_rate_cards(Calculator())
+    db.session.commit()
+
+    rates = quote_all_destinations(pickup_city='الإسماعيلية', cod_amount=2000)
+    assert rates['Cairo'] == 75.0
+    assert rates['Aswan'] == 100.0
+    assert list(rates) == sorted(rates)
+    assert quote_all_destinations(size='LARGE') == {}
+
+
+def test_rates_endpoint(client, db):
+    refresh_rate_cards(Calculator())
+    db.session.commit()
+    data = client.get('/shipping/rates?cod=0').get_json()
+    assert {'city': 'Giza', 'cost': 80.0} in data['rates']
+
+
+def test_cards_are_keyed_by_pickup_city_code(app, db):
+    app.config['BOSTA_PICKUP_CITY'] = 'ismailia'
+    refresh_rate_cards(Calculator())
+    db.session.commit()
+    assert {card.pickup_city for card in BostaRateCard.query} == {'EG-11'}
+
+    # However the pickup location spells the city
+    for pickup in ('Ismailia', 'الإسماعيلية', 'EG-11'):
+        assert rate_card_tier(pickup, 'Cairo') == _tier(55)
+
+    # Cards stored under the city name before are still found, and replaced
+    BostaRateCard.query.update({BostaRateCard.pickup_city: 'Ismailia'})
+    CatalogVersion.bump(RATE_CARDS_VERSION)
+    db.session.commit()
+    invalidate_rate_cards()
+    assert rate_card_tier('Ismailia', 'Cairo') == _tier(55)
+    refresh_rate_cards(Calculator())
+    db.session.commit()
+    assert BostaRateCard.query.filter_by(pickup_city='Ismailia').count() == 0
@@ -0,0 +1,75 @@
+"""Tests for incrementally maintained product rating summaries"""
+import pytest
+from app.models.category import Category
+from app.models.product import Product
+from app.models.review import Review, ProductRatingSummary
+from tests.conftest import login
+
+
+@pytest.fixture
+def product(db):
+    category = Category('Bracelets')
+    db.session.add(category)
+    db.session.flush()
+    product = Product('Bracelet', 'A bracelet', 50.0, category.id)
+    db.session.add(product)
+    db.session.commit()
+    return product
+
+
+@pytest.fixture
+def users(make_user):
+    return [make_user() for _ in range(3)]
+
+
+def test_reviews_update_summary(client, db, product, users):
+    for user, rating in zip(users, [5, 4, 5]):
+        login(client, user)
+        client.post(f'/review/{product.id}', data={'rating': rating, 'comment': 'Lovely piece, fits well'})
+
+    db.session.expire_all()
+    assert product.rating_count == 3
+    assert product.average_rating == pytest.approx(14 / 3)
+    assert product.rating_histogram == {1: 0, 2: 0, 3: 0, 4: 1, 5: 2}
+
+    review = Review.query.filter_by(user_id=users[1].id).one()
+    login(client, users[1])
+    assert client.delete(f'/reviews/review/{review.id}').status_code == 200
+
+    db.session.expire_all()
+    assert product.rating_count == 2
+    assert product.average_rating == 5
+    assert product.rating_histogram[4] == 0
+
+
+def test_product_without_reviews(product):
+    assert product.average_rating == 0
+    assert product.rating_count == 0
+    assert product.rating_histogram == {1: 0, 2: 0, 3: 0, 4: 0, 5: 0}
+
+
+def test_rebuild_matches_reviews(db, product, users):
+    for user, rating in zip(users, [1, 3, 3]):
+        db.session.add(Review(product.id, user.id, rating, 'Meh'))
+    db.session.commit()
+    assert product.rating_count == 0
+
+    assert ProductRatingSummary.rebuild() == 1
+    db.session.expire_all()
+    assert product.rating_count == 3
+    assert product.rating_histogram == {1: 1, 2: 0, 3: 2, 4: 0, 5: 0}
+    assert product.to_dict()['average_rating'] == pytest.approx(7 / 3)
+
+
+def test_deleting_user_discards_their_reviews(db, product, users):
+    for user, rating in zip(users, [2, 5]):
+        review = Review(product.id, user.id, rating, 'Nice')
+        db.session.add(review)
+        ProductRatingSummary.record(review)
+    db.session.commit()
+
+    db.session.delete(users[0])
+    db.session.commit()
+    db.session.expire_all()
+    assert product.rating_count == 1
+    assert product.rating_histogram == {1: 0, 2: 0, 3: 0, 4: 0, 5: 1}
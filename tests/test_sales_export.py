@@ -0,0 +1,79 @@
+"""Tests for the streaming sales report export"""
+import csv
+import io
+from datetime import datetime
+import openpyxl
+import pytest
+from app.models.category import Category
+from app.models.order import Order, OrderItem
+from app.models.product import Product
+from app.utils.sales_export import HEADERS, sales_rows
+from tests.conftest import login
+
+
+@pytest.fixture
+def admin(make_user):
+    return make_user(is_admin=True)
+
+
+@pytest.fixture
+def orders(db, make_user):
+    """Three orders of two items each; the last one is unpaid"""
+    category = Category('Rings')
+    db.session.add(category)
+    db.session.flush()
+    ring = Product('Ring', 'A ring', 50.0, category.id, stock=10)
+    band = Product('Band', 'A band', 20.0, category.id, stock=10)
+    db.session.add_all([ring, band])
+    db.session.flush()
+
+    customer = make_user()
+    orders = []
+    for day, status, payment_status in [(1, 'confirmed', 'paid'), (5, 'delivered', 'paid'), (9, 'pending', 'pending')]:
+        order = Order(user_id=customer.id, subtotal=70.0, shipping_cost=0.0, total=70.0, status=status,
+                      payment_status=payment_status, date_created=datetime(2026, 3, day, 12, 0))
+        order.items = [OrderItem(product_id=ring.id, quantity=1, price=45.0),
+                       OrderItem(product_id=band.id, quantity=2, price=12.5)]
+        db.session.add(order)
+        orders.append(order)
+    db.session.commit()
+    return orders
+
+
+def test_rows_are_read_in_batches_newest_first(db, orders):
+    batches = list(sales_rows(batch_size=3))
+    assert [len(batch) for batch in batches] == [3, 1]
+    rows = [row for batch in batches for row in batch]
+    assert [row[0] for row in rows] == [orders[1].id, orders[1].id, orders[0].id, orders[0].id]
+    # The price charged, not the product's current price
+    assert rows[0][2:5] == ['Ring', 1, 45.0]
+
+
+def test_csv_export_streams_filtered_rows(client, admin, orders):
+    login(client, admin)
+    response = client.get('/admin/sales_report?format=csv&status=delivered&date_from=2026-03-05&date_to=2026-03-05')
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert response.mimetype == 'text/csv'
+    rows = list(csv.reader(io.StringIO(response.get_data(as_text=True))))
+    assert rows[0] == HEADERS
+    assert [row[2] for row in rows[1:]] == ['Ring', 'Band']
+    assert {row[0] for row in rows[1:]} == {str(orders[1].id)}
+
+
+def test_excel_export_is_a_workbook(client, admin, orders):
+    login(client, admin)
+    response = client.get('/admin/sales_report?format=excel&date_to=2026-03-02')
+    assert response.status_code == 200
+    assert 'sales_report.xlsx' in response.headers['Content-Disposition']
+    sheet = openpyxl.load_workbook(io.BytesIO(response.get_data())).active
+    rows = list(sheet.iter_rows(values_only=True))
+    assert list(rows[0]) == HEADERS
+    assert [row[0] for row in rows[1:]] == [orders[0].id, orders[0].id]
+
+
+def test_report_page_accepts_date_filters(client, admin, orders):
+    login(client, admin)
+    response = client.get('/admin/sales_report?date_from=2026-03-04')
+    assert response.status_code == 200
+    assert b'Band' in response.data
@@ -0,0 +1,124 @@
+"""Tests for the incrementally maintained daily sales rollups"""
+from datetime import date, datetime
+import pytest
+from app.models.category import Category
+from app.models.order import Order, OrderItem
+from app.models.product import Product
+from app.models.sales_rollup import DailyProductSales, DailySales, rebuild_sales_rollups
+from app.utils.checkout import sweep_abandoned_orders
+from app.utils.sales_rollups import sales_totals, top_categories, top_products
+from tests.conftest import login
+
+DAY = date(2026, 3, 1)
+
+
+@pytest.fixture
+def products(db):
+    rings, scarves = Category('Rings'), Category('Scarves')
+    db.session.add_all([rings, scarves])
+    db.session.flush()
+    ring = Product('Ring', 'A ring', 50.0, rings.id, stock=10)
+    scarf = Product('Scarf', 'A scarf', 30.0, scarves.id, stock=10)
+    db.session.add_all([ring, scarf])
+    db.session.commit()
+    return ring, scarf
+
+
+@pytest.fixture
+def place_order(db, make_user, products):
+    ring, scarf = products
+    customer = make_user()
+
+    def place_order(payment_status='pending', status='pending'):
+        order = Order(user_id=customer.id, subtotal=110.0, shipping_cost=45.0, discount=5.0, total=150.0,
+                      status=status, payment_status=payment_status, date_created=datetime(2026, 3, 1, 10))
+        order.items = [OrderItem(product_id=ring.id, quantity=1, price=50.0),
+                       OrderItem(product_id=scarf.id, quantity=2, price=30.0)]
+        db.session.add(order)
+        db.session.commit()
+        return order
+    return place_order
+
+
+def _snapshot():
+    """Non-empty rollup rows; orders that moved away leave rows of zeros behind"""
+    rows = DailySales.query.filter(DailySales.orders != 0)\
+        .order_by(DailySales.status, DailySales.payment_status).all()
+    products = DailyProductSales.query.filter(DailyProductSales.orders != 0)\
+        .order_by(DailyProductSales.product_id, DailyProductSales.status).all()
+    return ([(r.day, r.status, r.payment_status, r.orders, r.units, r.revenue, r.discount, r.shipping) for r in rows],
+            [(r.day, r.product_id, r.status, r.payment_status, r.orders, r.units, r.revenue) for r in products])
+
+
+def test_new_paid_order_is_counted(place_order):
+    place_order('paid', 'processing')
+    assert sales_totals() == (1, 3, 150.0, 5.0, 45.0)
+    assert [(p.name, p.units, p.revenue) for p in top_products()] == [('Scarf', 2, 60.0), ('Ring', 1, 50.0)]
+    assert [c.name for c in top_categories()] == ['Scarves', 'Rings']
+
+
+def test_payment_and_status_changes_move_the_order(db, place_order):
+    order = place_order()
+    assert sales_totals().orders == 0
+    assert sales_totals(paid_only=False).orders == 1
+
+    # Changed after a commit, so the old values have to be loaded
+    order.payment_status = 'paid'
+    order.status = 'processing'
+    db.session.commit()
+    assert sales_totals() == (1, 3, 150.0, 5.0, 45.0)
+    assert sales_totals(status='pending').orders == 0
+
+    order.cancel_order('admin')
+    db.session.commit()
+    assert sales_totals(status='cancelled').orders == 1
+    assert sales_totals(status='processing').orders == 0
+    assert sales_totals(paid_only=False).orders == 1
+
+
+def test_item_and_order_deletes_are_taken_out(db, place_order):
+    order = place_order('paid', 'processing')
+    db.session.delete(order.items[0])
+    db.session.commit()
+    assert sales_totals().units == 2
+
+    db.session.delete(order)
+    db.session.commit()
+    assert sales_totals(paid_only=False) == (0, 0, 0, 0, 0)
+
+
+def test_rebuild_matches_incremental_rollups(db, place_order):
+    order = place_order()
+    place_order('paid', 'delivered')
+    order.payment_status = 'paid'
+    db.session.commit()
+    incremental = _snapshot()
+
+    assert rebuild_sales_rollups() == 1
+    db.session.commit()
+    assert _snapshot() == incremental
+    assert rebuild_sales_rollups(date_from=DAY, date_to=DAY) == 1
+
+
+def test_dashboard_and_report_read_rollups(client, make_user, place_order):
+    place_order('paid', 'delivered')
+    login(client, make_user(is_admin=True))
+    assert client.get('/admin/').status_code == 200
+    response = client.get('/admin/sales_report?status=delivered&date_from=2026-03-01&date_to=2026-03-01')
+    assert response.status_code == 200
+    assert b'Scarves' in response.data and b'2026-03-01' in response.data
+
+
+def test_swept_orders_are_taken_out(db, place_order):
+    kept = place_order()
+    swept = place_order()
+    swept.is_draft = True
+    db.session.commit()
+    assert sales_totals(paid_only=False).orders == 2
+
+    assert sweep_abandoned_orders(hours=24) == 1
+    assert sales_totals(paid_only=False) == (1, 3, 150.0, 5.0, 45.0)
+    assert Order.query.one().id == kept.id
+    incremental = _snapshot()
+    rebuild_sales_rollups()
+    assert _snapshot() == incremental
@@ -0,0 +1,59 @@
+"""Tests for the full-text product search index"""
+from app.models.category import Category
+from app.models.product import Product
+from app.utils.search import search_products
+
+
+def _catalog(db):
+    category = Category('Rings')
+    db.session.add(category)
+    db.session.flush()
+    products = [
+        Product('Gold Ring', 'A classic band', 100.0, category.id),
+        Product('Silver Bracelet', 'Pairs well with a gold ring', 50.0, category.id),
+        Product('Pearl Necklace', 'Freshwater pearls', 80.0, category.id),
+    ]
+    db.session.add_all(products)
+    db.session.commit()
+    return products
+
+
+def test_search_ranks_name_matches_first(db):
+    ring, bracelet, _ = _catalog(db)
+    results = search_products(Product.query, 'gold ring').all()
+    assert results == [ring, bracelet]
+
+
+def test_search_matches_prefixes(db):
+    _, _, necklace = _catalog(db)
+    assert search_products(Product.query, 'neck').all() == [necklace]
+
+
+def test_index_follows_edits(db):
+    ring, _, _ = _catalog(db)
+    ring.name = 'Platinum Ring'
+    db.session.commit()
+    assert search_products(Product.query, 'platinum').all() == [ring]
+    assert ring not in search_products(Product.query, 'classic gold').all()
+
+
+def test_search_route_hides_soft_deleted_products(db, client):
+    ring, _, _ = _catalog(db)
+    ring.is_deleted = True
+    ring.is_active = False
+    db.session.commit()
+
+    response = client.get('/search?q=gold')
+    assert response.status_code == 200
+    assert b'Silver Bracelet' in response.data
+    assert b'Gold Ring' not in response.data
+
+    ring.is_deleted = False
+    ring.is_active = True
+    db.session.commit()
+    assert b'Gold Ring' in client.get('/search?q=gold').data
+
+
+def test_search_ignores_query_syntax(db):
+    _catalog(db)
+    assert search_products(Product.query, '"gold* (').count() == 2
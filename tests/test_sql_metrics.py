@@ -0,0 +1,62 @@
+"""Tests for the per-request SQL instrumentation"""
+import json
+import logging
+import pytest
+from sqlalchemy import select
+from app.models.category import Category
+from app.utils.sql_metrics import endpoint_stats, fingerprint, record_queries
+from tests.conftest import login
+
+
+@pytest.fixture
+def lookups(app, db):
+    """A route that looks categories up one by one, like a lazy load in a loop"""
+    categories = [Category(f'Category {i}') for i in range(6)]
+    db.session.add_all(categories)
+    db.session.commit()
+    ids = [category.id for category in categories]
+
+    @app.route('/_test/lookups')
+    def one_by_one():
+        for category_id in ids:
+            db.session.execute(select(Category.name).where(Category.id == category_id)).scalar()
+        return 'ok'
+
+    return ids
+
+
+def test_fingerprint_ignores_values():
+    assert fingerprint("SELECT * FROM t WHERE id = 12 AND name = 'x'") == \
+        fingerprint("SELECT *\n  FROM t WHERE id = 7 AND name = 'it''s'")
+    assert fingerprint('SELECT * FROM t WHERE id IN (?, ?, ?)') == 'SELECT * FROM t WHERE id IN (?)'
+
+
+def test_server_timing_header_counts_queries(client, lookups):
+    with record_queries() as requests:
+        response = client.get('/_test/lookups')
+    queries = requests[0]
+    assert queries.endpoint == 'one_by_one' and queries.count >= 6
+    timing = response.headers['Server-Timing']
+    assert timing.startswith('db;dur=') and f'desc="{queries.count} queries"' in timing
+
+
+def test_repeated_statements_are_logged_as_n_plus_one(client, lookups, caplog):
+    with caplog.at_level(logging.WARNING), record_queries() as requests:
+        client.get('/_test/lookups')
+    [(statement, count)] = requests[0].repeated()
+    assert count == 6 and 'FROM categories' in statement
+
+    [line] = [r.getMessage() for r in caplog.records if r.getMessage().startswith('sql ')]
+    logged = json.loads(line[len('sql '):])
+    assert logged['endpoint'] == 'one_by_one' and logged['repeated'][0]['count'] == 6
+
+
+def test_endpoint_stats_are_served_to_admins(client, make_user, lookups):
+    client.get('/_test/lookups')
+    client.get('/_test/lookups')
+    assert endpoint_stats()['one_by_one']['requests'] == 2
+    assert endpoint_stats()['one_by_one']['n_plus_one'] == 2
+
+    login(client, make_user(is_admin=True))
+    stats = client.get('/admin/api/queries').get_json()
+    assert stats['one_by_one']['max_queries'] >= 6
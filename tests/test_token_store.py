@@ -0,0 +1,120 @@
+"""Tests for the shared upstream token store"""
+import io
+import threading
+from datetime import datetime, timedelta
+import pytest
+import requests
+from app.models.api_token import ApiToken
+from app.shipping.services import BOSTA_TOKEN, BostaShippingService
+from app.utils import http_client
+from app.utils.http_client import HttpClient
+from app.utils.token_store import TokenStore
+
+
+class Login:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return f'token-{self.calls}'
+
+
+def test_one_login_serves_every_worker(db):
+    login = Login()
+    worker, other_worker = TokenStore(), TokenStore()
+    assert worker.get('bosta', login, 3600) == 'token-1'
+    assert worker.get('bosta', login, 3600) == 'token-1'
+    assert other_worker.get('bosta', login, 3600) == 'token-1'
+    assert login.calls == 1
+    assert db.session.get(ApiToken, 'bosta').lock_owner is None
+
+
+def test_tokens_are_refreshed_before_expiry(db):
+    login = Login()
+    store = TokenStore(refresh_margin=300)
+    store.put('bosta', 'old', 200)
+    assert store.get('bosta', login, 3600) == 'token-1'
+    assert login.calls == 1
+
+
+def test_valid_token_is_used_while_another_worker_refreshes(db):
+    login = Login()
+    refreshing, waiting = TokenStore(refresh_margin=300), TokenStore(refresh_margin=300)
+    refreshing.put('bosta', 'old', 200)
+    assert refreshing._claim('bosta')
+    assert waiting.get('bosta', login, 3600) == 'old'
+    assert login.calls == 0
+
+
+def test_failed_login_releases_the_claim(db):
+    def broken():
+        raise ValueError('Bosta is down')
+
+    store = TokenStore()
+    with pytest.raises(ValueError):
+        store.get('bosta', broken, 3600)
+    assert store.get('bosta', Login(), 3600) == 'token-1'
+
+
+def test_concurrent_callers_share_one_login(app, db):
+    login = Login()
+    store = TokenStore()
+    results = []
+
+    def get():
+        with app.app_context():
+            results.append(store.get('bosta', login, 3600))
+
+    threads = [threading.Thread(target=get) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == ['token-1'] * 5
+    assert login.calls == 1
+
+
+def test_rejected_token_is_replaced_once(db):
+    login = Login()
+    store, other = TokenStore(), TokenStore()
+    store.get('bosta', login, 3600)
+    other.get('bosta', login, 3600)
+
+    store.invalidate('bosta', 'token-1')
+    assert store.get('bosta', login, 3600) == 'token-2'
+    # A late rejection of the old token doesn't throw away the new one
+    other.invalidate('bosta', 'token-1')
+    assert other.get('bosta', login, 3600) == 'token-2'
+    assert login.calls == 2
+
+
+class Session:
+    """Answers with the given status codes and records the tokens sent"""
+
+    def __init__(self, *statuses):
+        self.statuses = list(statuses)
+        self.tokens = []
+
+    def request(self, method, url, headers=None, **kwargs):
+        self.tokens.append(headers['Authorization'])
+        response = requests.Response()
+        response.status_code = self.statuses.pop(0)
+        response.raw = io.BytesIO()
+        return response
+
+
+def test_bosta_401_logs_in_again_once(app, db, monkeypatch):
+    session = Session(401, 200)
+    monkeypatch.setitem(http_client._clients, 'bosta', HttpClient('bosta', session=session))
+    service = object.__new__(BostaShippingService)
+    service.api_key = 'key'
+    login = Login()
+    monkeypatch.setattr(service, '_login', login, raising=False)
+
+    service.token = 'expired'
+    assert service.token_valid
+    assert service._api('GET', 'https://bosta.test/cities').status_code == 200
+    assert session.tokens == ['Bearer expired', 'Bearer token-1']
+    assert login.calls == 1
+    assert db.session.get(ApiToken, BOSTA_TOKEN).expires_at > datetime.utcnow() + timedelta(minutes=30)